@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+离线基准：合成 N 只股票 × D 个交易日的行情（日线 / 每日指标 / 资金流 / 季度财务 / 大盘指数）写入独立的基准库，
+以假 Tushare pro 与假 OpenAI 客户端（延迟可配）替换外部依赖，依次计时 增量日线（含选股特征物化）/ 技术信号 / 大盘信号 /
+K 线形态 / 新闻舆论 各 Agent，输出耗时、吞吐与耗时最多的阶段（src/metrics），并与 benchmarks/baseline.json 中同规模（及同假延迟）的基线对比。
+不访问网络、不触碰业务库；基准库按规模与种子缓存，规模不变时重复运行直接复用。
+用法（在 backend-services 目录下）：
+  python benchmarks/run_benchmarks.py                                  # 默认 5000 只 × 500 日
+  python benchmarks/run_benchmarks.py --stocks 200 --days 120           # 小规模冒烟
+  python benchmarks/run_benchmarks.py --api-latency-ms 50 --llm-latency-ms 800 --agents signal,news_signal
+  python benchmarks/run_benchmarks.py --tushare-cache replay --agents incremental_daily   # 先以 record 录制一轮
+  python benchmarks/run_benchmarks.py --save-baseline                   # 以本次结果更新同规模基线
+  python benchmarks/run_benchmarks.py --tolerance 0.3 --json            # 超出基线 30% 视为回退（退出码 1）
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.chdir(BASE_DIR)
+
+# 加载 .env（连接参数沿用业务配置，库名另行覆盖）
+env_path = BASE_DIR / ".env"
+if env_path.is_file():
+    with open(env_path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                k, v = line.split("=", 1)
+                os.environ.setdefault(k.strip(), v.strip().strip('"').strip("'"))
+
+MIGRATIONS_DIR = BASE_DIR.parent / "db" / "migrations"
+INIT_SQL = BASE_DIR.parent / "db" / "init.sql"
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+CACHE_DIR = Path(__file__).resolve().parent / ".tushare_cache"
+# 分区迁移（014 起）须在数据入库后执行，分区范围才能覆盖合成行情的日期
+LOAD_BEFORE = "014"
+AGENTS = ["incremental_daily", "signal", "index_signal", "pattern", "news_signal"]
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="离线 Agent 基准（合成行情 + 假 Tushare / LLM 客户端）")
+    p.add_argument("--stocks", type=int, default=5000, help="股票数（默认 5000）")
+    p.add_argument("--days", type=int, default=500, help="入库交易日数（默认 500；另有 1 日留给增量日线拉取）")
+    p.add_argument("--seed", type=int, default=42, help="随机种子（默认 42）")
+    p.add_argument("--watchlist", type=int, default=50, help="收藏跟踪股票数（增量日线的资金流 / 财务逐只拉取；默认 50）")
+    p.add_argument("--signal-codes", type=int, default=500, help="技术信号 Agent 计算的股票数（默认 500）")
+    p.add_argument("--news-codes", type=int, default=10, help="新闻舆论 Agent 处理的股票数（上限 20；默认 10）")
+    p.add_argument("--agents", default=",".join(AGENTS), help=f"逗号分隔，默认全部：{','.join(AGENTS)}")
+    p.add_argument("--api-latency-ms", type=float, default=0.0, help="假 Tushare 每次调用延迟（毫秒，默认 0）")
+    p.add_argument("--llm-latency-ms", type=float, default=0.0, help="假 LLM 每次调用延迟（毫秒，默认 0）")
+    p.add_argument("--jitter", type=float, default=0.3, help="延迟抖动比例（默认 ±30%%）")
+    p.add_argument(
+        "--tushare-cache",
+        choices=["off", "record", "replay"],
+        default="off",
+        help="假 Tushare 外再套响应缓存（benchmarks/.tushare_cache/<规模>）：record 录制，replay 只读回放（默认 off）",
+    )
+    p.add_argument("--keep-delay", action="store_true", help="保留各 Agent 的请求间隔 DELAY（默认置 0，只测本地开销与假延迟）")
+    p.add_argument("--database", default=os.getenv("BENCH_PG_DATABASE", "stock_bench"), help="基准库名（默认 stock_bench；规模 / 种子不符时整库重建，勿指向业务库）")
+    p.add_argument("--rebuild", action="store_true", help="强制重建基准库")
+    p.add_argument("--tolerance", type=float, default=0.2, help="相对基线的允许变慢比例（默认 0.2）")
+    p.add_argument("--save-baseline", action="store_true", help="将本次结果写入 baseline.json（按规模分键）")
+    p.add_argument("--json", action="store_true", help="以 JSON 输出报告")
+    return p.parse_args()
+
+
+def _log(args, msg: str) -> None:
+    if not args.json:
+        print(msg, flush=True)
+
+
+# ---- 基准库 ----
+def _admin_conninfo() -> str:
+    from src.config import PG_HOST, PG_PASSWORD, PG_PORT, PG_USER
+
+    return f"host={PG_HOST} port={PG_PORT} dbname=postgres user={PG_USER} password={PG_PASSWORD}"
+
+
+def _scale_key(args) -> str:
+    return f"{args.stocks}x{args.days}"
+
+
+def _baseline_key(args) -> str:
+    """基线按规模分键；假延迟非 0 时一并计入，避免与零延迟结果互比。"""
+    key = _scale_key(args)
+    if args.tushare_cache == "replay":
+        key += "@replay"
+    if args.api_latency_ms or args.llm_latency_ms:
+        key += f"@api{args.api_latency_ms:g}ms,llm{args.llm_latency_ms:g}ms"
+    return key
+
+
+def _bench_meta(conn) -> dict:
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT meta FROM public.bench_meta LIMIT 1")
+            row = cur.fetchone()
+        return row[0] if row else {}
+    except Exception:
+        conn.rollback()
+        return {}
+
+
+def _apply_sql(conn, path: Path) -> None:
+    conn.execute(path.read_text(encoding="utf-8"))
+    conn.commit()
+
+
+def _build_database(args, market) -> None:
+    """重建基准库：init.sql 与 014 之前的迁移 → 合成数据 COPY → 其余迁移（分区、覆盖索引、code_latest 回填）。"""
+    import psycopg
+
+    from src.db import get_conn
+    from benchmarks.synthetic import load_market
+
+    with psycopg.connect(_admin_conninfo(), autocommit=True) as admin:
+        admin.execute(f'DROP DATABASE IF EXISTS "{args.database}"')
+        admin.execute(f'CREATE DATABASE "{args.database}"')
+    migrations = sorted(MIGRATIONS_DIR.glob("*.sql"))
+    with get_conn() as conn:
+        _apply_sql(conn, INIT_SQL)
+        for path in migrations:
+            if path.name < LOAD_BEFORE:
+                _apply_sql(conn, path)
+        t0 = time.perf_counter()
+        load_market(conn, market, args.watchlist, log=lambda m: _log(args, m))
+        conn.commit()
+        _log(args, f"  synthetic data loaded in {time.perf_counter() - t0:.1f}s")
+        for path in migrations:
+            if path.name >= LOAD_BEFORE:
+                _apply_sql(conn, path)
+        meta = {"scale": _scale_key(args), "seed": args.seed, "watchlist": args.watchlist, "end": market.dates[-1].isoformat()}
+        conn.execute("CREATE TABLE public.bench_meta (meta JSONB NOT NULL)")
+        conn.execute("INSERT INTO public.bench_meta (meta) VALUES (%s::jsonb)", (json.dumps(meta),))
+        conn.commit()
+        conn.autocommit = True
+        conn.execute("VACUUM ANALYZE")
+
+
+def _ensure_database(args, market) -> bool:
+    """基准库规模 / 种子 / 末日与本次一致则复用，否则重建；返回是否重建。"""
+    import psycopg
+
+    from src.db import get_conn
+
+    want = {"scale": _scale_key(args), "seed": args.seed, "watchlist": args.watchlist, "end": market.dates[-1].isoformat()}
+    if not args.rebuild:
+        try:
+            with get_conn() as conn:
+                if _bench_meta(conn) == want:
+                    return False
+        except psycopg.OperationalError:
+            pass
+    _log(args, f"building {args.database} ({want['scale']}, seed={args.seed}) ...")
+    _build_database(args, market)
+    return True
+
+
+def _reset_state(market) -> None:
+    """每轮计时前把基准库恢复到入库状态：删除末日数据与各 Agent 的产出，code_latest 回到倒数第二日。"""
+    from src.db import get_conn
+
+    final, last_loaded = market.dates[-1], market.dates[-2]
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            for table in ("stex.stock_day", "stex.technicals", "stex.moneyflow", "stex.screen_daily"):
+                cur.execute(f"DELETE FROM {table} WHERE trade_date >= %s", (final,))
+            cur.execute("DELETE FROM stex.fundamentals WHERE report_date >= %s", (final,))
+            cur.execute("TRUNCATE stex.signals, stex.pattern_signal, stex.news_opinion_record")
+            cur.execute(
+                "UPDATE stex.code_latest SET last_trade_date = LEAST(last_trade_date, %s), last_signal_date = NULL, last_news_date = NULL",
+                (last_loaded,),
+            )
+        conn.commit()
+
+
+# ---- 替换外部依赖 ----
+def _install_fakes(args, market) -> dict:
+    """假 tushare 模块、假 OpenAI 与空检索注入各 Agent 模块；返回假客户端以便统计调用次数。"""
+    from benchmarks.synthetic import FakeOpenAI, FakePro, fake_news_items, fake_tushare
+
+    pro = FakePro(market, latency_ms=args.api_latency_ms, jitter=args.jitter)
+    sys.modules["tushare"] = fake_tushare(pro)
+    llm = FakeOpenAI(latency_ms=args.llm_latency_ms, jitter=args.jitter, seed=args.seed)
+
+    from src.agents import incremental_daily_agent, news_signal_agent, watchlist_data_agent
+
+    news_signal_agent.OpenAI = lambda *a, **kw: llm
+    news_signal_agent.MOONSHOT_API_KEY = "bench"
+    news_signal_agent._web_search = lambda q, max_results=5, **kw: []
+    news_signal_agent._news_search = lambda q, max_results=10, **kw: []
+    news_signal_agent.gather_from_specified_sources = lambda code, corp_name, **kw: fake_news_items(market, code)
+    if not args.keep_delay:
+        incremental_daily_agent.DELAY = 0
+        watchlist_data_agent.DELAY = 0
+    return {"pro": pro, "llm": llm}
+
+
+def _agent_calls(args, market) -> dict:
+    from src.agents.incremental_daily_agent import run_incremental_daily_agent
+    from src.agents.index_signal_agent import run_index_signal_agent
+    from src.agents.news_signal_agent import run_news_signal_agent
+    from src.agents.pattern_agent import run_pattern_agent
+    from src.agents.signal_agent import run_signal_agent
+
+    final = market.dates[-1].strftime("%Y%m%d")
+    return {
+        "incremental_daily": lambda: run_incremental_daily_agent(trade_date=final),
+        "signal": lambda: run_signal_agent(codes=market.codes[: args.signal_codes]),
+        "index_signal": lambda: run_index_signal_agent(),
+        "pattern": lambda: run_pattern_agent(limit_codes=args.stocks),
+        "news_signal": lambda: run_news_signal_agent(codes=market.codes[: args.news_codes]),
+    }
+
+
+def _summarize(name: str, result: dict, wall: float, fakes: dict, calls_before: dict) -> dict:
+    m = (result or {}).get("metrics") or {}
+    stages = sorted((m.get("stages") or {}).items(), key=lambda kv: -kv[1].get("total_sec", 0))
+    return {
+        "agent": name,
+        "ok": bool((result or {}).get("ok")),
+        "error": (result or {}).get("error"),
+        "elapsed_sec": round(wall, 3),
+        "python_sec": m.get("python_sec"),
+        "throughput_per_sec": m.get("throughput_per_sec"),
+        "counters": m.get("counters") or {},
+        "api_calls": fakes["pro"].calls - calls_before["pro"],
+        "llm_calls": fakes["llm"].calls - calls_before["llm"],
+        "top_stages": [{"stage": k, "calls": v.get("calls"), "total_sec": v.get("total_sec"), "p95_ms": v.get("p95_ms")} for k, v in stages[:5]],
+    }
+
+
+def _compare(report: list[dict], baseline: dict, tolerance: float) -> list[dict]:
+    out = []
+    for r in report:
+        base = baseline.get(r["agent"])
+        if not base or not base.get("elapsed_sec"):
+            continue
+        ratio = r["elapsed_sec"] / base["elapsed_sec"]
+        r["baseline_sec"] = base["elapsed_sec"]
+        r["vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            out.append({"agent": r["agent"], "elapsed_sec": r["elapsed_sec"], "baseline_sec": base["elapsed_sec"], "ratio": round(ratio, 3)})
+    return out
+
+
+def _print_report(args, report: list[dict], regressions: list[dict]) -> None:
+    print(f"\n{'agent':<18}{'ok':<5}{'elapsed':>10}{'baseline':>10}{'ratio':>8}{'api':>7}{'llm':>6}  throughput")
+    for r in report:
+        base = f"{r['baseline_sec']:.2f}" if r.get("baseline_sec") else "-"
+        ratio = f"{r['vs_baseline']:.2f}" if r.get("vs_baseline") else "-"
+        tp = ", ".join(f"{k}={v}" for k, v in (r["throughput_per_sec"] or {}).items()) or "-"
+        print(f"{r['agent']:<18}{'Y' if r['ok'] else 'N':<5}{r['elapsed_sec']:>10.2f}{base:>10}{ratio:>8}{r['api_calls']:>7}{r['llm_calls']:>6}  {tp}")
+        if r["error"]:
+            print(f"    error: {r['error']}")
+        for s in r["top_stages"]:
+            print(f"    {s['stage']:<28}{s['calls']:>8} calls {s['total_sec']:>9.3f}s  p95 {s['p95_ms']} ms")
+    if regressions:
+        print(f"\n回退（超出基线 {args.tolerance:.0%}）：")
+        for g in regressions:
+            print(f"  {g['agent']}: {g['elapsed_sec']:.2f}s vs {g['baseline_sec']:.2f}s (x{g['ratio']})")
+
+
+def main():
+    args = _parse_args()
+    os.environ["PG_DATABASE"] = args.database
+    os.environ["TUSHARE_TOKEN"] = "bench"
+    os.environ["MOONSHOT_API_KEY"] = "bench"
+    os.environ["OHLCV_STORE_DIR"] = ""
+    os.environ["TUSHARE_CACHE_DIR"] = "" if args.tushare_cache == "off" else str(CACHE_DIR / f"{_scale_key(args)}-{args.seed}")
+    os.environ["TUSHARE_CACHE_MODE"] = args.tushare_cache
+    names = [a.strip() for a in args.agents.split(",") if a.strip()]
+    unknown = [a for a in names if a not in AGENTS]
+    if unknown:
+        sys.exit(f"未知 agent: {', '.join(unknown)}；可选: {', '.join(AGENTS)}")
+
+    from benchmarks.synthetic import Market
+
+    t0 = time.perf_counter()
+    market = Market(args.stocks, args.days, seed=args.seed)
+    _log(args, f"synthetic market {args.stocks} x {args.days} ({market.dates[0]} ~ {market.dates[-1]}) generated in {time.perf_counter() - t0:.1f}s")
+    rebuilt = _ensure_database(args, market)
+    fakes = _install_fakes(args, market)
+    calls = _agent_calls(args, market)
+    _reset_state(market)
+
+    report = []
+    for name in names:
+        before = {"pro": fakes["pro"].calls, "llm": fakes["llm"].calls}
+        _log(args, f"running {name} ...")
+        t = time.perf_counter()
+        result = calls[name]()
+        report.append(_summarize(name, result, time.perf_counter() - t, fakes, before))
+    _reset_state(market)
+
+    baselines = json.loads(BASELINE_PATH.read_text(encoding="utf-8")) if BASELINE_PATH.is_file() else {}
+    key = _baseline_key(args)
+    regressions = _compare(report, (baselines.get(key) or {}).get("agents") or {}, args.tolerance)
+    if args.save_baseline:
+        baselines[key] = {
+            "recorded_at": date.today().isoformat(),
+            "python": platform.python_version(),
+            "agents": {r["agent"]: {"elapsed_sec": r["elapsed_sec"], "throughput_per_sec": r["throughput_per_sec"]} for r in report if r["ok"]},
+        }
+        BASELINE_PATH.write_text(json.dumps(baselines, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    failed = [r["agent"] for r in report if not r["ok"]]
+    if args.json:
+        print(json.dumps({"scale": key, "rebuilt": rebuilt, "agents": report, "regressions": regressions, "failed": failed}, ensure_ascii=False, indent=2, default=str))
+    else:
+        _print_report(args, report, regressions)
+        if args.save_baseline:
+            print(f"\n基线已写入 {BASELINE_PATH}（{key}）")
+    sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+合成行情：按种子确定性生成 N 只股票 × D 个交易日的日线、每日指标、资金流、季度财务与大盘指数，批量 COPY 进基准库；
+另提供按同一数据应答的假 Tushare pro 接口与假 OpenAI 客户端（延迟可配），供 run_benchmarks.py 离线计时各 Agent。
+最后一个交易日（market.dates[-1]）不入库，只由假 pro 返回，供增量日线 Agent 拉取。
+"""
+import io
+import time
+import types
+import zlib
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+CHUNK = 500  # 生成 / COPY 的每块代码数
+MF_LEVELS = ("sm", "md", "lg", "elg")
+MF_SHARES = (0.35, 0.3, 0.2, 0.15)  # 各档成交额占比
+INDUSTRIES = ["电子", "计算机", "国防军工", "电气设备", "通信", "传媒", "汽车", "机械设备", "医药生物", "银行"]
+
+
+def _ts_code(code: str) -> str:
+    return f"{code}.SH" if code.startswith("6") else f"{code}.SZ"
+
+
+def _ymd(d: date) -> str:
+    return d.strftime("%Y%m%d")
+
+
+class Market:
+    """确定性合成行情（float32 矩阵：代码 × 交易日）。"""
+
+    def __init__(self, stocks: int = 5000, days: int = 500, seed: int = 42, end: Optional[date] = None):
+        self.stocks, self.days, self.seed = stocks, days, seed
+        end = end or date.today() - timedelta(days=1)
+        self.dates = [d.date() for d in pd.bdate_range(end=end, periods=days + 1)]
+        self.date_index = {_ymd(d): i for i, d in enumerate(self.dates)}
+        half = stocks // 2
+        self.codes = [f"{600000 + i:06d}" for i in range(half)] + [f"{1 + i:06d}" for i in range(stocks - half)]
+        self.code_index = {c: i for i, c in enumerate(self.codes)}
+        self.ts_index = {_ts_code(c): i for i, c in enumerate(self.codes)}
+        self._generate()
+
+    def _paths(self, rng: np.random.Generator, n: int, p0: np.ndarray, sigma: np.ndarray) -> dict[str, np.ndarray]:
+        t = self.days + 1
+        r = rng.normal(0.0003, 1.0, (n, t)) * sigma[:, None]
+        close = p0[:, None] * np.exp(np.cumsum(r, axis=1))
+        prev = np.concatenate([p0[:, None], close[:, :-1]], axis=1)
+        open_ = prev * np.exp(rng.normal(0, 0.3, (n, t)) * sigma[:, None])
+        hi = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.4, (n, t))) * sigma[:, None])
+        lo = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.4, (n, t))) * sigma[:, None])
+        return {"open": open_, "high": hi, "low": lo, "close": close, "ret": r}
+
+    def _generate(self) -> None:
+        rng = np.random.default_rng(self.seed)
+        n, t = self.stocks, self.days + 1
+        p0 = np.exp(rng.normal(2.6, 0.8, n))
+        sigma = rng.uniform(0.01, 0.04, n)
+        paths = self._paths(rng, n, p0, sigma)
+        base_vol = np.exp(rng.normal(11.5, 1.0, n))  # 手
+        vol = base_vol[:, None] * np.exp(rng.normal(0, 0.35, (n, t)) + 8 * np.abs(paths["ret"]))
+        self.float_shares = base_vol * 100 / rng.uniform(0.005, 0.03, n)  # 股，换手率约 0.5%～3%
+        self.eps = p0 / rng.uniform(8, 80, n)
+        self.bps = p0 / rng.uniform(0.8, 8, n)
+        self.sps = p0 / rng.uniform(0.5, 10, n)
+        self.total_shares = self.float_shares * rng.uniform(1.0, 2.0, n)
+        self.revenue_q = self.sps * self.total_shares / 4
+        self.margin = rng.uniform(-0.05, 0.25, n)
+        f32 = np.float32
+        self.open, self.high, self.low, self.close = (paths[k].astype(f32) for k in ("open", "high", "low", "close"))
+        self.vol = vol.astype(f32)
+        self.amount = (self.vol.astype(np.float64) * 100 * self.close).astype(f32)  # 元
+        self.turnover = (self.vol.astype(np.float64) * 100 / self.float_shares[:, None] * 100).astype(f32)
+        self.net_mf = (self.amount / 1e4 * rng.normal(0, 0.06, (n, t))).astype(f32)  # 万元
+        # 大盘指数
+        from src.agents.index_data_agent import INDEX_CODES
+
+        self.index_codes = INDEX_CODES
+        k = len(INDEX_CODES)
+        ip = self._paths(rng, k, np.array([3000.0, 10000.0, 2000.0, 3800.0, 5800.0][:k] + [3000.0] * max(0, k - 5)), np.full(k, 0.012))
+        self.index = {key: ip[key] for key in ("open", "high", "low", "close")}
+        self.index_vol = np.exp(rng.normal(19, 0.3, (k, t)))
+
+    # ---- 派生量 ----
+    def moneyflow(self, rows, cols) -> pd.DataFrame:
+        """资金流（万元 / 手），由成交额与净流入确定性拆分到小/中/大/特大单；rows / cols 为代码与交易日下标（切片或数组）。"""
+        amt = self.amount[rows, cols].astype(np.float64) / 1e4
+        vol = self.vol[rows, cols].astype(np.float64)
+        net = self.net_mf[rows, cols].astype(np.float64)
+        out = {"net_mf_amount": np.round(net, 2), "net_mf_vol": (net / np.maximum(amt, 1e-6) * vol).astype(np.int64)}
+        for lvl, share in zip(MF_LEVELS, MF_SHARES):
+            tilt = net * (share if lvl in ("lg", "elg") else -share / 2)
+            out[f"buy_{lvl}_amount"] = np.round(amt * share / 2 + tilt / 2, 2)
+            out[f"sell_{lvl}_amount"] = np.round(amt * share / 2 - tilt / 2, 2)
+            out[f"buy_{lvl}_vol"] = (vol * share / 2).astype(np.int64)
+            out[f"sell_{lvl}_vol"] = (vol * share / 2).astype(np.int64)
+        return pd.DataFrame({k: np.ravel(v) for k, v in out.items()})
+
+    def quarters(self, upto: date, n: int = 8) -> list[date]:
+        out, y, q = [], upto.year, (upto.month - 1) // 3
+        while len(out) < n:
+            if q == 0:
+                y, q = y - 1, 4
+            out.append(date(y, 3 * q, 31 if q in (1, 4) else 30))
+            q -= 1
+        return out
+
+    def financial_row(self, i: int, k: int) -> tuple[float, float, float]:
+        """第 k 个季度前（k=0 为最近一季）的营收、净利润、总资产（元）。"""
+        growth = 1 + 0.03 * ((zlib.crc32(self.codes[i].encode()) % 11) - 3)
+        rev = float(self.revenue_q[i]) / growth ** k
+        return round(rev, 2), round(rev * float(self.margin[i]), 2), round(float(self.bps[i] * self.total_shares[i]) * 2.5, 2)
+
+
+# ---- 入库 ----
+def _copy(conn, table: str, columns: list[str], df: pd.DataFrame) -> None:
+    buf = io.StringIO()
+    df.to_csv(buf, header=False, index=False, na_rep="")
+    with conn.cursor() as cur:
+        with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)") as cp:
+            cp.write(buf.getvalue())
+
+
+def load_market(conn, m: Market, watchlist: int, log=print) -> None:
+    """前 days 个交易日写入 stex 各表（最后一日留给假 pro）；watchlist 取前 watchlist 只。不提交。"""
+    t_hist = m.days
+    dates = np.array(m.dates[:t_hist], dtype="datetime64[D]")
+    corp = pd.DataFrame(
+        {
+            "code": m.codes,
+            "name": [f"合成{c}" for c in m.codes],
+            "market": ["上证" if c.startswith("6") else "深证" for c in m.codes],
+            "industry": [INDUSTRIES[zlib.crc32(c.encode()) % len(INDUSTRIES)] for c in m.codes],
+            "market_cap": np.round(m.close[:, t_hist - 1] * m.total_shares, 2),
+        }
+    )
+    _copy(conn, "stex.corp", list(corp.columns), corp)
+    wl = pd.DataFrame({"code": m.codes[:watchlist]})
+    _copy(conn, "stex.watchlist", ["code"], wl)
+
+    for lo in range(0, m.stocks, CHUNK):
+        hi = min(lo + CHUNK, m.stocks)
+        n = hi - lo
+        code_col = np.repeat(np.array(m.codes[lo:hi]), t_hist)
+        date_col = np.tile(dates, n)
+
+        def flat(a):
+            return a[lo:hi, :t_hist].reshape(-1)
+
+        day = pd.DataFrame(
+            {
+                "code": code_col,
+                "trade_date": date_col,
+                "open": np.round(flat(m.open), 4),
+                "high": np.round(flat(m.high), 4),
+                "low": np.round(flat(m.low), 4),
+                "close": np.round(flat(m.close), 4),
+                "volume": flat(m.vol).astype(np.int64),
+                "amount": np.round(flat(m.amount).astype(np.float64), 2),
+                "turnover_rate": np.round(flat(m.turnover), 4),
+            }
+        )
+        _copy(conn, "stex.stock_day", list(day.columns), day)
+        close = pd.DataFrame(m.close[lo:hi, :t_hist].T.astype(np.float64))
+        tech = pd.DataFrame(
+            {
+                "code": code_col,
+                "trade_date": date_col,
+                **{f"ma{w}": np.round(close.rolling(w).mean().to_numpy().T.reshape(-1), 4) for w in (5, 10, 20)},
+            }
+        )
+        _copy(conn, "stex.technicals", list(tech.columns), tech)
+        c = m.close[lo:hi, :t_hist].astype(np.float64)
+        fund = pd.DataFrame(
+            {
+                "code": code_col,
+                "report_date": date_col,
+                "pe": np.round((c / m.eps[lo:hi, None]).reshape(-1), 4),
+                "pb": np.round((c / m.bps[lo:hi, None]).reshape(-1), 4),
+                "ps": np.round((c / m.sps[lo:hi, None]).reshape(-1), 4),
+                "market_cap": np.round((c * m.total_shares[lo:hi, None]).reshape(-1), 2),
+            }
+        )
+        _copy(conn, "stex.fundamentals", list(fund.columns), fund)
+        mf = m.moneyflow(slice(lo, hi), slice(0, t_hist))
+        mf.insert(0, "trade_date", date_col)
+        mf.insert(0, "code", code_col)
+        _copy(conn, "stex.moneyflow", list(mf.columns), mf)
+        fin_rows = []
+        for i in range(lo, hi):
+            for k, q in enumerate(m.quarters(m.dates[t_hist - 1])):
+                rev, np_, ta = m.financial_row(i, k)
+                fin_rows.append((m.codes[i], q, "季度", rev, np_, ta))
+        fin = pd.DataFrame(fin_rows, columns=["code", "report_date", "report_type", "revenue", "net_profit", "total_assets"])
+        _copy(conn, "stex.financial", list(fin.columns), fin)
+        log(f"  loaded {hi}/{m.stocks} codes")
+
+    k = len(m.index_codes)
+    close = m.index["close"][:, :t_hist]
+    pre = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+    idx = pd.DataFrame(
+        {
+            "index_code": np.repeat(np.array(m.index_codes), t_hist),
+            "trade_date": np.tile(dates, k),
+            "open": np.round(m.index["open"][:, :t_hist].reshape(-1), 4),
+            "high": np.round(m.index["high"][:, :t_hist].reshape(-1), 4),
+            "low": np.round(m.index["low"][:, :t_hist].reshape(-1), 4),
+            "close": np.round(close.reshape(-1), 4),
+            "pre_close": np.round(pre.reshape(-1), 4),
+            "pct_chg": np.round(((close / pre - 1) * 100).reshape(-1), 4),
+            "vol": np.round(m.index_vol[:, :t_hist].reshape(-1), 2),
+            "amount": np.round((m.index_vol[:, :t_hist] * close).reshape(-1), 2),
+        }
+    )
+    _copy(conn, "stex.index_day", list(idx.columns), idx)
+
+
+# ---- 假客户端 ----
+class _Latency:
+    def __init__(self, latency_ms: float, jitter: float, seed: int):
+        self.latency_ms, self.jitter = latency_ms, jitter
+        self._rng = np.random.default_rng(seed)
+        self.calls = 0
+
+    def wait(self) -> None:
+        self.calls += 1
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000 * (1 + self.jitter * self._rng.uniform(-1, 1)))
+
+
+class FakePro(_Latency):
+    """Tushare pro 接口子集（trade_cal / daily / daily_basic / moneyflow / income / balancesheet），数据来自 Market。"""
+
+    def __init__(self, market: Market, latency_ms: float = 0.0, jitter: float = 0.3):
+        super().__init__(latency_ms, jitter, market.seed + 1)
+        self.m = market
+
+    def _span(self, start_date: str, end_date: str) -> list[int]:
+        return [j for d, j in self.m.date_index.items() if start_date <= d <= end_date]
+
+    def trade_cal(self, exchange: str = "SSE", start_date: str = "", end_date: str = "", is_open: str = "1", **_):
+        self.wait()
+        return pd.DataFrame({"cal_date": [_ymd(self.m.dates[j]) for j in self._span(start_date, end_date)]})
+
+    def daily(self, trade_date: str = "", **_):
+        self.wait()
+        j = self.m.date_index.get(trade_date)
+        if j is None:
+            return pd.DataFrame()
+        m = self.m
+        return pd.DataFrame(
+            {
+                "ts_code": [_ts_code(c) for c in m.codes],
+                "trade_date": trade_date,
+                "open": np.round(m.open[:, j], 4),
+                "high": np.round(m.high[:, j], 4),
+                "low": np.round(m.low[:, j], 4),
+                "close": np.round(m.close[:, j], 4),
+                "vol": m.vol[:, j].astype(np.int64),
+                "amount": np.round(m.amount[:, j].astype(np.float64) / 1000, 3),  # 千元
+            }
+        )
+
+    def daily_basic(self, trade_date: str = "", fields: str = "", **_):
+        self.wait()
+        j = self.m.date_index.get(trade_date)
+        if j is None:
+            return pd.DataFrame()
+        m = self.m
+        c = m.close[:, j].astype(np.float64)
+        return pd.DataFrame(
+            {
+                "ts_code": [_ts_code(x) for x in m.codes],
+                "trade_date": trade_date,
+                "pe": np.round(c / m.eps, 4),
+                "pb": np.round(c / m.bps, 4),
+                "ps": np.round(c / m.sps, 4),
+                "total_mv": np.round(c * m.total_shares / 1e4, 2),  # 万元
+                "turnover_rate": np.round(m.turnover[:, j], 4),
+            }
+        )
+
+    def moneyflow(self, ts_code: str = "", start_date: str = "", end_date: str = "", **_):
+        self.wait()
+        i = self.m.ts_index.get(ts_code)
+        if i is None:
+            return pd.DataFrame()
+        cols = self._span(start_date, end_date)
+        df = self.m.moneyflow(i, cols)
+        df.insert(0, "trade_date", [_ymd(self.m.dates[j]) for j in cols])
+        df.insert(0, "ts_code", ts_code)
+        return df
+
+    def _financials(self, ts_code: str):
+        i = self.m.ts_index.get(ts_code)
+        if i is None:
+            return None, []
+        return i, self.m.quarters(self.m.dates[-1])
+
+    def income(self, ts_code: str = "", **_):
+        self.wait()
+        i, qs = self._financials(ts_code)
+        if i is None:
+            return pd.DataFrame()
+        rows = [self.m.financial_row(i, k) for k in range(len(qs))]
+        return pd.DataFrame({"end_date": [_ymd(q) for q in qs], "revenue": [r[0] for r in rows], "n_income": [r[1] for r in rows]})
+
+    def balancesheet(self, ts_code: str = "", **_):
+        self.wait()
+        i, qs = self._financials(ts_code)
+        if i is None:
+            return pd.DataFrame()
+        return pd.DataFrame({"end_date": [_ymd(q) for q in qs], "total_assets": [self.m.financial_row(i, k)[2] for k in range(len(qs))]})
+
+
+def fake_tushare(pro: FakePro) -> types.ModuleType:
+    """替换 sys.modules["tushare"] 的模块：pro_api() 返回 pro。"""
+    mod = types.ModuleType("tushare")
+    mod.pro_api = lambda token=None, *a, **kw: pro
+    mod.set_token = lambda token: None
+    return mod
+
+
+class FakeOpenAI(_Latency):
+    """OpenAI 客户端子集：chat.completions.create 按提示词哈希确定性返回 看涨/看跌/中性/无信号 + 理由。"""
+
+    VERDICTS = ("看涨", "看跌", "中性", "无信号")
+
+    def __init__(self, latency_ms: float = 0.0, jitter: float = 0.3, seed: int = 7, **_):
+        super().__init__(latency_ms, jitter, seed)
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, model: str = "", messages: Optional[list] = None, max_tokens: int = 0, **_):
+        self.wait()
+        prompt = (messages or [{}])[-1].get("content", "")
+        verdict = self.VERDICTS[zlib.crc32(prompt.encode()) % len(self.VERDICTS)]
+        content = f"{verdict}\n合成新闻显示公司近期经营{'向好' if verdict == '看涨' else '承压' if verdict == '看跌' else '平稳'}。"
+        message = types.SimpleNamespace(content=content, role="assistant")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message, finish_reason="stop")])
+
+
+def fake_news_items(market: Market, code: str, n: int = 8) -> list[dict]:
+    """近 n 个交易日各一条合成新闻。"""
+    t = market.days
+    return [
+        {"date": market.dates[t - 1 - k].isoformat(), "title": f"{code} 合成新闻 {k}", "body": f"合成新闻正文 {code} {k}", "source": "bench"}
+        for k in range(n)
+    ]
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 """
-分析指定股票在指定区间的日线数据，识别「持续低量横盘后放量上涨」形态。
+识别「持续低量横盘后放量上涨」形态（向量化扫描，见 src/quant/low_vol_breakout.py）。
+单只/多只股票打印命中明细；不传代码则扫描全市场，--save 写入 stex.pattern_signal（pattern_type = low_vol_breakout）。
 用法（在 backend-services 目录下）：
   python scripts/analyze_low_vol_breakout.py 002440 2026-01-10 2026-01-25
+  python scripts/analyze_low_vol_breakout.py 002440,600519 --start 2025-10-01
+  python scripts/analyze_low_vol_breakout.py --start 2025-01-01 --end 2025-12-31 --save
+  python scripts/analyze_low_vol_breakout.py --params '{"surge_ratio": 1.5, "cons_days": 5}'
 """
+import argparse
+import json
 import os
 import sys
-from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -21,103 +26,54 @@ if os.path.isfile(env_path):
                 k, v = line.split("=", 1)
                 os.environ.setdefault(k.strip(), v.strip().strip('"').strip("'"))
 
-def main():
-    code = (sys.argv[1] or "002440").strip()
-    start = (sys.argv[2] or "2026-01-10").strip()[:10]
-    end = (sys.argv[3] or "2026-01-25").strip()[:10]
-
-    from src.db import get_conn
-
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT trade_date, open, high, low, close, volume, turnover_rate
-                FROM stex.stock_day
-                WHERE code = %s AND trade_date >= %s::date - INTERVAL '30 days' AND trade_date <= %s::date
-                ORDER BY trade_date
-                """,
-                (code, start, end),
-            )
-            rows = cur.fetchall()
-
-    if not rows:
-        print(f"无数据：{code} 在 {start} 至 {end} 区间")
-        return 1
-
-    # 转为 list[dict]，日期升序
-    days = []
-    for r in rows:
-        td = r[0]
-        td_str = td.isoformat()[:10] if hasattr(td, "isoformat") else str(td)[:10]
-        days.append({
-            "trade_date": td_str,
-            "open": float(r[1]) if r[1] is not None else None,
-            "high": float(r[2]) if r[2] is not None else None,
-            "low": float(r[3]) if r[3] is not None else None,
-            "close": float(r[4]) if r[4] is not None else None,
-            "volume": float(r[5]) or 0 if r[5] is not None else 0,
-            "turnover_rate": float(r[6]) if r[6] is not None else None,
-        })
-
-    # 筛选目标区间
-    in_range = [d for d in days if start <= d["trade_date"] <= end]
-    if not in_range:
-        print(f"区间 {start}～{end} 内无交易日数据")
-        return 1
-
-    print(f"股票 {code}：{start} ～ {end} 共 {len(in_range)} 个交易日")
-    print("-" * 72)
-    print(f"{'日期':<12} {'收盘':>8} {'成交量':>12} {'换手%':>6} {'涨跌幅':>8}")
-    print("-" * 72)
 
-    for i, d in enumerate(in_range):
-        close = d["close"]
-        vol = d["volume"]
-        tr = d["turnover_rate"]
-        pct = ""
-        if i > 0:
-            prev = in_range[i - 1]["close"]
-            if prev and prev != 0 and close is not None:
-                pct = f"{(close - prev) / prev * 100:+.2f}%"
-        vol_str = f"{int(vol):,}" if vol else "-"
-        tr_str = f"{tr:.2f}" if tr is not None else "-"
-        print(f"{d['trade_date']:<12} {close or '-':>8} {vol_str:>12} {tr_str:>6} {pct:>8}")
-
-    # 分析：持续低量横盘 + 放量上涨
-    # 1) 区间内 20 日量均（用 days 全量）
-    vol_list = [d["volume"] for d in days if d["volume"]]
-    avg_vol_20 = sum(vol_list[-20:]) / len(vol_list[-20:]) if len(vol_list) >= 20 else (sum(vol_list) / len(vol_list) if vol_list else 0)
-    # 2) 区间内前几日是否「低量横盘」：取前 5 日（若不足则前 N 日），量 < 0.8*avg_vol_20，收盘振幅 (max-min)/mid < 5%
-    # 3) 某日「放量上涨」：量 > 1.5*avg_vol_20 且 涨幅 > 0
-
-    print()
-    print("形态简析（持续低量横盘 + 放量上涨）：")
-    print(f"  区间及前段 20 日平均成交量: {int(avg_vol_20):,}" if avg_vol_20 else "  无成交量数据")
-    look_back = 5
-    for i in range(look_back, len(in_range)):
-        window = in_range[i - look_back:i]
-        closes = [d["close"] for d in window if d["close"] is not None]
-        vols = [d["volume"] for d in window if d["volume"]]
-        if not closes or not vols:
-            continue
-        mid = (min(closes) + max(closes)) / 2
-        range_pct = (max(closes) - min(closes)) / mid * 100 if mid else 0
-        avg_win = sum(vols) / len(vols)
-        low_vol_sideways = avg_win < 0.8 * avg_vol_20 and range_pct < 5.0
-
-        today = in_range[i]
-        today_vol = today["volume"] or 0
-        prev_close = in_range[i - 1]["close"] if i else None
-        today_close = today["close"]
-        pct_up = (today_close - prev_close) / prev_close * 100 if prev_close and prev_close != 0 and today_close else 0
-        volume_surge = today_vol >= 1.5 * avg_vol_20 if avg_vol_20 else False
-
-        if low_vol_sideways and volume_surge and pct_up > 0:
-            print(f"  → {today['trade_date']}: 前{look_back}日低量横盘(均量{int(avg_win):,}<0.8*均20, 振幅{range_pct:.1f}%<5%)，当日放量({int(today_vol):,}≥1.5*均20)且上涨{pct_up:.2f}%")
-
-    print()
-    print("说明：样本数较少时仅为示意；实盘信号需在 signal_agent 中按全市场逐日计算。")
+def main():
+    parser = argparse.ArgumentParser(description="低量横盘放量突破形态扫描")
+    parser.add_argument("codes", nargs="?", default="", help="股票代码，逗号分隔；不传为全市场")
+    parser.add_argument("start_pos", nargs="?", default=None, metavar="start", help="起始日期 YYYY-MM-DD")
+    parser.add_argument("end_pos", nargs="?", default=None, metavar="end", help="结束日期 YYYY-MM-DD")
+    parser.add_argument("--start", default=None, help="起始日期，默认结束日（或今日）前 60 日")
+    parser.add_argument("--end", default=None, help="结束日期，默认不限")
+    parser.add_argument("--params", default="", help='参数覆盖 JSON，如 {"surge_ratio": 1.5}')
+    parser.add_argument("--save", action="store_true", help="命中写入 stex.pattern_signal")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    from src.quant.low_vol_breakout import DEFAULT_PARAMS, scan
+
+    params = json.loads(args.params) if args.params else None
+    result = scan(
+        codes=[c.strip() for c in args.codes.split(",") if c.strip()] or None,
+        start=args.start or args.start_pos,
+        end=args.end or args.end_pos,
+        params=params,
+        save=args.save,
+        details=True,
+    )
+    if args.json or not result.get("ok"):
+        print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+        return 0 if result.get("ok") else 1
+
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    saved = f"，已写入 {result['saved']} 条" if args.save else ""
+    print(
+        f"扫描 {result['codes']} 只，{result['start']} ～ {result['end'] or '最新'}，命中 {result['hits']} 次{saved}，"
+        f"耗时 {result['elapsed_sec']}s"
+    )
+    print(
+        f"条件：前{p['gap'] + 1}～{p['gap'] + p['cons_days']}日低量横盘（均量<{p['cons_vol_ratio']}×前{p['ma_days']}日均量、"
+        f"振幅<{p['max_range_pct']}%），当日放量≥{p['surge_ratio']}×前{p['ma_days']}日均量且收涨"
+    )
+    if not result["signals"]:
+        return 0
+    print("-" * 96)
+    print(f"{'日期':<12} {'代码':<8} {'收盘':>10} {'成交量':>14} {'前均量':>14} {'横盘均量':>14} {'振幅%':>7} {'涨幅%':>7}")
+    print("-" * 96)
+    for s in result["signals"]:
+        print(
+            f"{str(s['trade_date']):<12} {s['code']:<8} {s['close']:>10.2f} {int(s['volume']):>14,} {int(s['vol_ma']):>14,} "
+            f"{int(s['cons_vol']):>14,} {s['range_pct']:>7.2f} {s['pct_up']:>+7.2f}"
+        )
     return 0
 
 
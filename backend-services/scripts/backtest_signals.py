@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+回测 signal_agent / index_signal_agent 的各类信号：统计前瞻 N 日命中率、平均收益、持有期最大回撤。
+用法（在 backend-services 目录下）：
+  python scripts/backtest_signals.py --start 2023-01-01 --end 2025-12-31 --horizon 5
+  python scripts/backtest_signals.py --codes 600519,000001 --horizon 10
+  python scripts/backtest_signals.py --kind index --horizon 5
+  python scripts/backtest_signals.py --params '{"成交量涨跌幅": {"volume_ratio_th": 1.5}}'
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 加载 .env
+env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+if os.path.isfile(env_path):
+    with open(env_path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                k, v = line.split("=", 1)
+                os.environ.setdefault(k.strip(), v.strip().strip('"').strip("'"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="信号回测")
+    parser.add_argument("--codes", default="", help="股票/指数代码，逗号分隔；不传为全部")
+    parser.add_argument("--start", default=None, help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--end", default=None, help="结束日期 YYYY-MM-DD")
+    parser.add_argument("--horizon", type=int, default=5, help="持有交易日数，默认 5")
+    parser.add_argument("--kind", choices=["stock", "index"], default="stock")
+    parser.add_argument("--signals", default="", help="只回测指定信号类型，逗号分隔")
+    parser.add_argument("--params", default="", help='参数覆盖 JSON，如 {"支撑阻力位": {"near_pct": 0.03}}')
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    from src.quant.backtest import run_backtest
+
+    result = run_backtest(
+        codes=[c for c in args.codes.split(",") if c.strip()] or None,
+        start=args.start,
+        end=args.end,
+        horizon=args.horizon,
+        kind=args.kind,
+        params=json.loads(args.params) if args.params else None,
+        signals=[s for s in args.signals.split(",") if s.strip()] or None,
+    )
+    if args.json or not result.get("ok"):
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0 if result.get("ok") else 1
+
+    print(f"回测 {result['codes']} 只，持有 {result['horizon']} 日，区间 {args.start or '-'} ～ {args.end or '-'}，耗时 {result['elapsed_sec']}s")
+    print("-" * 96)
+    print(f"{'信号类型':<12} {'方向':<6} {'样本数':>10} {'命中率':>8} {'平均收益':>10} {'平均回撤':>10} {'最大回撤':>10}")
+    print("-" * 96)
+    for r in result["results"]:
+        print(
+            f"{r['signal_type']:<12} {r['direction']:<6} {r['count']:>10,} {r['hit_rate'] * 100:>7.2f}% "
+            f"{r['avg_return'] * 100:>9.3f}% {r['avg_drawdown'] * 100:>9.3f}% {r['max_drawdown'] * 100:>9.3f}%"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+索引顾问：按各 Agent 实际执行的语句形态检查 stex 表的执行计划与索引使用情况。
+- 语句来源：pg_stat_statements（需 shared_preload_libraries = 'pg_stat_statements' 并 CREATE EXTENSION），
+  按总耗时取涉及 stex 的前 N 条，以 EXPLAIN (GENERIC_PLAN) 看参数化计划（PostgreSQL 16+）；
+  另内置一组 Agent / 选股的典型查询（--workload），以实际参数 EXPLAIN ANALYZE
+- 计划中的大表顺序扫描、大排序、回表多的索引扫描给出提示；另列出未使用过的索引与被其他索引覆盖的重复索引
+用法（在 backend-services 目录下）：
+  python scripts/index_advisor.py --reset          # 清空统计，随后跑一轮 Agent
+  python scripts/index_advisor.py --top 20
+  python scripts/index_advisor.py --workload --json
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 加载 .env
+env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+if os.path.isfile(env_path):
+    with open(env_path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                k, v = line.split("=", 1)
+                os.environ.setdefault(k.strip(), v.strip().strip('"').strip("'"))
+
+# Agent / 选股的典型查询形态：{code} 为样例代码，{ref} 为最新交易日
+WORKLOAD = {
+    "全市场选批（最旧日线优先）": """
+        SELECT c.code FROM stex.corp c LEFT JOIN stex.code_latest l ON l.code = c.code
+        ORDER BY l.last_trade_date ASC NULLS FIRST, c.code LIMIT 80
+    """,
+    "新闻舆论选批（最早新闻优先）": """
+        SELECT w.code FROM stex.watchlist w
+        LEFT JOIN (
+            SELECT code, MAX(ref_date) AS last_ref FROM stex.signals
+            WHERE signal_type = '新闻舆论' AND ref_date IS NOT NULL GROUP BY code
+        ) s ON s.code = w.code
+        ORDER BY s.last_ref ASC NULLS FIRST, w.code LIMIT 20
+    """,
+    "单只最近 65 日日线": """
+        SELECT trade_date, close, volume FROM stex.stock_day WHERE code = '{code}' ORDER BY trade_date DESC LIMIT 65
+    """,
+    "单只最新交易日": """
+        SELECT trade_date FROM stex.stock_day WHERE code = '{code}' ORDER BY trade_date DESC LIMIT 1
+    """,
+    "选股日线窗口（全市场 LATERAL）": """
+        SELECT c.code, d.trade_date, d.close, d.volume, d.turnover_rate FROM stex.corp c
+        CROSS JOIN LATERAL (
+            SELECT trade_date, close, volume, turnover_rate FROM stex.stock_day
+            WHERE code = c.code AND trade_date <= '{ref}' ORDER BY trade_date DESC LIMIT 82
+        ) d
+    """,
+    "选股均线（最近 MA 齐全日）": """
+        SELECT c.code, t.ma5, t.ma10, t.ma20 FROM stex.corp c
+        LEFT JOIN LATERAL (
+            SELECT trade_date, ma5, ma10, ma20 FROM stex.technicals
+            WHERE code = c.code AND trade_date <= '{ref}' AND ma5 IS NOT NULL AND ma10 IS NOT NULL AND ma20 IS NOT NULL
+            ORDER BY trade_date DESC LIMIT 1
+        ) t ON true
+    """,
+    "企业增长（最近 4 期财务）": """
+        SELECT c.code, f.revenue, f.net_profit FROM stex.corp c
+        CROSS JOIN LATERAL (
+            SELECT report_date, revenue, net_profit FROM stex.financial
+            WHERE code = c.code AND revenue IS NOT NULL AND net_profit IS NOT NULL AND report_date <= '{ref}'
+            ORDER BY report_date DESC LIMIT 4
+        ) f
+    """,
+    "经典形态（近 60 日）": """
+        SELECT DISTINCT code FROM stex.pattern_signal
+        WHERE pattern_type = ANY(ARRAY['cup_handle', 'rising_three']) AND ref_date >= '{ref}'::date - 60 AND ref_date <= '{ref}'
+    """,
+    "形态计数（近 60 日）": """
+        SELECT pattern_type, COUNT(*) FROM stex.pattern_signal WHERE ref_date >= CURRENT_DATE - INTERVAL '60 days' GROUP BY pattern_type
+    """,
+    "详情页信号（最近 30 条）": """
+        SELECT * FROM stex.signals WHERE code = '{code}' ORDER BY ref_date DESC NULLS LAST, created_at DESC LIMIT 30
+    """,
+}
+
+
+def _has_pg_stat_statements(conn) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+        if not cur.fetchone():
+            return False
+        try:
+            cur.execute("SELECT 1 FROM pg_stat_statements LIMIT 1")
+            return True
+        except Exception:
+            # 扩展已建但未预加载
+            conn.rollback()
+            return False
+
+
+def _top_statements(conn, top: int) -> list[dict]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT query, calls, total_exec_time, mean_exec_time, rows, shared_blks_hit, shared_blks_read
+            FROM pg_stat_statements
+            WHERE query ILIKE '%%stex.%%' AND query !~* '^\\s*(begin|commit|rollback|set|show|explain|create|drop|alter)'
+            ORDER BY total_exec_time DESC
+            LIMIT %s
+            """,
+            (top,),
+        )
+        cols = [d.name for d in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def _explain(conn, sql: str, analyze: bool) -> dict:
+    opts = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "GENERIC_PLAN, FORMAT JSON"
+    with conn.cursor() as cur:
+        try:
+            cur.execute(f"EXPLAIN ({opts}) {sql}")
+            return cur.fetchone()[0][0]
+        except Exception as e:
+            conn.rollback()
+            return {"error": str(e).splitlines()[0]}
+
+
+def _reltuples(conn) -> dict[str, float]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.relname, c.reltuples FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'stex' AND c.relkind IN ('r', 'p')
+            """
+        )
+        return {r[0]: float(r[1]) for r in cur.fetchall()}
+
+
+def _walk(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def _plan_hints(plan: dict, sizes: dict[str, float], min_rows: int) -> list[str]:
+    """执行计划 -> 提示：大表顺序扫描、大排序、索引扫描回表（可考虑 INCLUDE 覆盖）、大表聚合。"""
+    hints = []
+    for n in _walk(plan.get("Plan", {})):
+        kind, rel = n.get("Node Type", ""), n.get("Relation Name", "")
+        rows = n.get("Actual Rows", n.get("Plan Rows", 0)) * max(n.get("Actual Loops", 1), 1)
+        if kind == "Seq Scan" and sizes.get(rel, 0) >= min_rows:
+            cond = n.get("Filter", "")
+            hints.append(f"顺序扫描 {rel}（约 {int(sizes[rel])} 行）{'，过滤 ' + cond if cond else ''} → 按过滤列建索引或部分索引")
+        elif kind in ("Sort", "Incremental Sort") and rows >= min_rows:
+            hints.append(f"排序 {int(rows)} 行（{', '.join(n.get('Sort Key', []))}）→ 建与 ORDER BY 同序的索引可免排序")
+        elif kind == "Index Scan" and rows >= min_rows / 10:
+            hints.append(f"索引扫描 {rel} 经 {n.get('Index Name')} 回表 {int(rows)} 行 → 所需列不多时可 INCLUDE 成覆盖索引走仅索引扫描")
+        elif kind == "Index Only Scan" and n.get("Heap Fetches", 0) >= min_rows / 10:
+            hints.append(f"仅索引扫描 {rel} 仍回表 {n['Heap Fetches']} 次 → 表需 VACUUM 以更新可见性映射")
+        elif kind in ("HashAggregate", "GroupAggregate") and any(
+            c.get("Node Type") == "Seq Scan" and sizes.get(c.get("Relation Name", ""), 0) >= min_rows for c in n.get("Plans", [])
+        ):
+            hints.append(f"{kind} 聚合整表 → 如为「每代码最新值」可维护汇总表（如 stex.code_latest）或 (分组列, 排序列) 索引")
+    return hints
+
+
+def _index_report(conn) -> dict[str, list[dict]]:
+    """未使用过的非唯一索引；列为同表另一索引前缀（且谓词相同、非唯一）的重复索引。分区子索引随父索引，不单列。"""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.relname, s.indexrelname, s.idx_scan, i.indisunique, i.indkey::text,
+                   COALESCE(pg_get_expr(i.indpred, i.indrelid), ''), pg_relation_size(s.indexrelid)
+            FROM pg_stat_user_indexes s JOIN pg_index i ON i.indexrelid = s.indexrelid
+            JOIN pg_class ic ON ic.oid = s.indexrelid
+            WHERE s.schemaname = 'stex' AND NOT ic.relispartition
+            """
+        )
+        rows = cur.fetchall()
+    unused = [
+        {"table": t, "index": name, "size_bytes": size}
+        for t, name, scans, uniq, _, _, size in rows
+        if scans == 0 and not uniq
+    ]
+    duplicate = []
+    for t, name, _, uniq, keys, pred, _ in rows:
+        if uniq:
+            continue
+        cols = keys.split()
+        for t2, name2, _, _, keys2, pred2, _ in rows:
+            if t2 == t and name2 != name and pred2 == pred and keys2.split()[: len(cols)] == cols and (keys2 != keys or name2 < name):
+                duplicate.append({"table": t, "index": name, "covered_by": name2})
+                break
+    return {"unused": unused, "duplicate": duplicate}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按查询形态给出索引建议")
+    parser.add_argument("--top", type=int, default=15, help="pg_stat_statements 按总耗时取前 N 条，默认 15")
+    parser.add_argument("--workload", action="store_true", help="EXPLAIN ANALYZE 内置的 Agent 典型查询")
+    parser.add_argument("--min-rows", type=int, default=10000, help="视为大表/大排序的行数阈值，默认 10000")
+    parser.add_argument("--reset", action="store_true", help="清空 pg_stat_statements 后退出")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    from src.db import get_conn
+
+    report: dict = {"statements": [], "workload": [], "indexes": {}}
+    with get_conn() as conn:
+        has_pss = _has_pg_stat_statements(conn)
+        if args.reset:
+            if not has_pss:
+                print("未启用 pg_stat_statements：postgresql.conf 设置 shared_preload_libraries = 'pg_stat_statements' 并重启，"
+                      "再执行 CREATE EXTENSION pg_stat_statements;")
+                return 1
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_stat_statements_reset()")
+            print("已清空 pg_stat_statements，跑一轮 Agent 后再执行本脚本")
+            return 0
+        sizes = _reltuples(conn)
+        if has_pss:
+            for st in _top_statements(conn, args.top):
+                plan = _explain(conn, st["query"], analyze=False)
+                st["hints"] = _plan_hints(plan, sizes, args.min_rows) if "error" not in plan else []
+                st["plan_error"] = plan.get("error")
+                report["statements"].append(st)
+        elif not args.workload:
+            report["note"] = "未启用 pg_stat_statements，改用 --workload 检查内置查询形态"
+            args.workload = True
+        if args.workload:
+            with conn.cursor() as cur:
+                cur.execute("SELECT code FROM stex.corp ORDER BY code LIMIT 1")
+                row = cur.fetchone()
+                code = row[0] if row else "000001"
+                cur.execute("SELECT MAX(last_trade_date) FROM stex.code_latest")
+                ref = cur.fetchone()[0]
+            for name, sql in WORKLOAD.items():
+                plan = _explain(conn, sql.format(code=code, ref=ref or "2099-12-31"), analyze=True)
+                report["workload"].append(
+                    {
+                        "name": name,
+                        "ms": plan.get("Execution Time"),
+                        "error": plan.get("error"),
+                        "hints": _plan_hints(plan, sizes, args.min_rows) if "error" not in plan else [],
+                    }
+                )
+        report["indexes"] = _index_report(conn)
+        conn.rollback()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+        return 0
+    if report.get("note"):
+        print(report["note"])
+    for st in report["statements"]:
+        print(f"\n[{st['calls']} 次, 共 {st['total_exec_time']:.1f} ms, 均 {st['mean_exec_time']:.2f} ms, 读盘块 {st['shared_blks_read']}]")
+        print("  " + " ".join(st["query"].split())[:300])
+        for h in st["hints"]:
+            print(f"  - {h}")
+    for w in report["workload"]:
+        status = f"失败: {w['error']}" if w["error"] else f"{w['ms']:.2f} ms"
+        print(f"\n{w['name']}：{status}")
+        for h in w["hints"]:
+            print(f"  - {h}")
+    idx = report["indexes"]
+    if idx["unused"]:
+        print("\n未使用过的非唯一索引（统计自上次重置）：")
+        for u in idx["unused"]:
+            print(f"  {u['table']}.{u['index']}  {u['size_bytes'] // 1024} KB")
+    if idx["duplicate"]:
+        print("\n可被同表其他索引覆盖的重复索引：")
+        for d in idx["duplicate"]:
+            print(f"  {d['table']}.{d['index']} ⊂ {d['covered_by']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+信号阈值参数寻优：网格/随机搜索 + 多进程评估，按样本外命中率排序，最优参数写入 stex.app_config（signal_agent / index_signal_agent 运行时读取）。
+用法（在 backend-services 目录下）：
+  python scripts/optimize_signals.py --start 2022-01-01 --end 2025-12-31 --horizon 5
+  python scripts/optimize_signals.py --method random --n-iter 10 --signals 支撑阻力位,换手率 --workers 8
+  python scripts/optimize_signals.py --kind index --split 2025-01-01 --dry-run
+  python scripts/optimize_signals.py --cache-dir data/opt_cache   # 保留行情缓存，参数相同时复用
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 加载 .env
+env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+if os.path.isfile(env_path):
+    with open(env_path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                k, v = line.split("=", 1)
+                os.environ.setdefault(k.strip(), v.strip().strip('"').strip("'"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="信号阈值参数寻优")
+    parser.add_argument("--codes", default="", help="股票/指数代码，逗号分隔；不传为全部")
+    parser.add_argument("--start", default=None, help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--end", default=None, help="结束日期 YYYY-MM-DD")
+    parser.add_argument("--horizon", type=int, default=5, help="持有交易日数，默认 5")
+    parser.add_argument("--kind", choices=["stock", "index"], default="stock")
+    parser.add_argument("--signals", default="", help="只寻优指定信号类型，逗号分隔")
+    parser.add_argument("--method", choices=["grid", "random"], default="grid")
+    parser.add_argument("--n-iter", type=int, default=20, help="random 时每个信号抽取的组合数")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--split", default=None, help="样本外起始日 YYYY-MM-DD；不传按 --oos-ratio 划分")
+    parser.add_argument("--oos-ratio", type=float, default=0.3, help="样本外占有效交易日比例，默认 0.3")
+    parser.add_argument("--min-samples", type=int, default=30, help="样本外最少信号数，默认 30")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--top", type=int, default=5, help="每个信号输出前 N 名")
+    parser.add_argument("--cache-dir", default=None, help="行情缓存目录（保留并复用）")
+    parser.add_argument("--dry-run", action="store_true", help="只输出结果，不写入 app_config")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    from src.quant.optimizer import run_optimizer
+
+    result = run_optimizer(
+        codes=[c for c in args.codes.split(",") if c.strip()] or None,
+        start=args.start,
+        end=args.end,
+        horizon=args.horizon,
+        kind=args.kind,
+        signals=[s for s in args.signals.split(",") if s.strip()] or None,
+        method=args.method,
+        n_iter=args.n_iter,
+        oos_ratio=args.oos_ratio,
+        split=args.split,
+        min_samples=args.min_samples,
+        workers=args.workers,
+        seed=args.seed,
+        top=args.top,
+        save=not args.dry_run,
+        cache_dir=args.cache_dir,
+    )
+    if args.json or not result.get("ok"):
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0 if result.get("ok") else 1
+
+    print(
+        f"寻优 {result['codes']} 只，持有 {result['horizon']} 日，样本外自 {result['split']}，"
+        f"{result['combos']} 组参数，耗时 {result['elapsed_sec']}s，{'已写入 app_config' if result['saved'] else '未写入'}"
+    )
+    for sig, rows in result["results"].items():
+        print("-" * 96)
+        print(f"{sig}  最优: {json.dumps(result['best'].get(sig), ensure_ascii=False)}")
+        print(f"  {'参数':<44} {'样本内命中':>10} {'样本外命中':>10} {'样本外信号数':>12}")
+        for r in rows:
+            is_acc = f"{r['is_accuracy'] * 100:.2f}%" if r["is_accuracy"] is not None else "-"
+            oos_acc = f"{r['oos_accuracy'] * 100:.2f}%" if r["oos_accuracy"] is not None else "-"
+            tag = " (默认)" if r["is_default"] else ""
+            print(f"  {json.dumps(r['params'], ensure_ascii=False) + tag:<44} {is_acc:>10} {oos_acc:>10} {r['oos_count']:>12,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,18 +7,26 @@ Agent：采集 A 股各板块上市公司基础数据，写入 stex.corp。
 网络说明：需能访问东方财富等数据源，若报连接/超时错误请检查网络、代理或稍后重试。
 """
 import logging
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Callable, Optional, TypeVar
 
 import pandas as pd
 
-from ..collectors.corp import upsert_corp
+from ..collectors.corp import upsert_corps
 from ..db import get_conn
+from ..metrics import bind, instrument, instrumented, sleep
 
 logger = logging.getLogger(__name__)
 
-# 请求间隔（秒），避免触发限流/RemoteDisconnected
+# 请求间隔（秒），避免触发限流/RemoteDisconnected；并发时为每个 worker 的请求间隔
 REQUEST_DELAY = 0.6
+# 板块成分股并发抓取数（有界并发，避免压垮数据源）
+CRAWL_WORKERS = 4
+# 全局重试预算：所有板块共享的重试次数上限
+RETRY_BUDGET = 40
+# 熔断：连续失败的板块数达到该值即停止后续抓取
+CIRCUIT_BREAK_FAILURES = 8
 
 T = TypeVar("T")
 
@@ -33,30 +41,67 @@ except ImportError:
     ProtocolError = Exception  # noqa
 
 
+class _CrawlBudget:
+    """并发抓取共享的重试预算与熔断器（线程安全）。"""
+
+    def __init__(self, retries: int = RETRY_BUDGET, break_after: int = CIRCUIT_BREAK_FAILURES):
+        self._lock = threading.Lock()
+        self.retries_left = retries
+        self.retries_used = 0
+        self.break_after = break_after
+        self.consecutive_failures = 0
+        self.open = False
+
+    def take_retry(self) -> bool:
+        """申请一次重试；预算耗尽或已熔断时返回 False。"""
+        with self._lock:
+            if self.open or self.retries_left <= 0:
+                return False
+            self.retries_left -= 1
+            self.retries_used += 1
+            return True
+
+    def success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+
+    def failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.break_after and not self.open:
+                self.open = True
+                logger.warning("corp_agent: 连续 %s 个板块失败，熔断停止抓取", self.consecutive_failures)
+
+
 def _retry_request(
     fn: Callable[[], T],
     max_attempts: int = 3,
     delay: float = 2.0,
+    budget: Optional[_CrawlBudget] = None,
 ) -> T:
-    """对无参可调用 fn 做重试；RemoteDisconnected/ProtocolError 时等待 delay 秒再试。"""
+    """
+    对无参可调用 fn 做重试；RemoteDisconnected/ProtocolError 时等待 delay 秒再试。
+    传入 budget 时每次重试消耗共享预算，预算耗尽或熔断后不再重试，直接抛出最后一次异常。
+    """
     last_err = None
     for attempt in range(max_attempts):
         try:
-            return fn()
+            result = fn()
+            if budget is not None:
+                budget.success()
+            return result
         except (RemoteDisconnected, ProtocolError, ConnectionError, OSError) as e:
             last_err = e
-            if attempt < max_attempts - 1:
-                logger.warning("attempt %s failed (connection): %s, retry in %.1fs", attempt + 1, e, delay)
-                time.sleep(delay)
-            else:
-                raise
+            kind = " (connection)"
         except Exception as e:
             last_err = e
-            if attempt < max_attempts - 1:
-                logger.warning("attempt %s failed: %s, retry in %.1fs", attempt + 1, e, delay)
-                time.sleep(delay)
-            else:
-                raise
+            kind = ""
+        if attempt >= max_attempts - 1 or (budget is not None and not budget.take_retry()):
+            break
+        logger.warning("attempt %s failed%s: %s, retry in %.1fs", attempt + 1, kind, last_err, delay)
+        sleep(delay)
+    if budget is not None:
+        budget.failure()
     raise last_err
 
 # 市场分类：按股票代码前缀（券商常用）
@@ -91,35 +136,69 @@ def _col(df: pd.DataFrame, *names: str) -> Optional[str]:
     return None
 
 
-def _safe_float(row: pd.Series, col: Optional[str]) -> Optional[float]:
-    if col is None or col not in row:
+def _board_records(
+    cons_df: pd.DataFrame,
+    industry_name: str,
+    code_col: str,
+    name_col: Optional[str],
+    pe_col: Optional[str],
+    pb_col: Optional[str],
+    cap_col: Optional[str],
+) -> pd.DataFrame:
+    """板块成分股 -> stex.corp 记录（整列处理，数值/空值由 upsert_corps 统一规范化）。"""
+    codes = cons_df[code_col].astype(str).str.strip()
+    out = pd.DataFrame({"code": codes})
+    out["name"] = cons_df[name_col].astype(str).str.strip() if name_col else None
+    out["market"] = codes.map(_market_from_code)
+    out["industry"] = industry_name
+    out["sector"] = industry_name
+    out["pe"] = cons_df[pe_col] if pe_col else None
+    out["pb"] = cons_df[pb_col] if pb_col else None
+    out["market_cap"] = cons_df[cap_col] if cap_col else None
+    return out[(codes != "") & (codes.str.len() <= 10)]
+
+
+def _fetch_board(ak, industry_name: str, budget: _CrawlBudget) -> Optional[pd.DataFrame]:
+    """抓取单个行业板块成分股并转为 stex.corp 记录；熔断后直接跳过返回 None。"""
+    if budget.open:
         return None
-    try:
-        v = row[col]
-        if v is None or (isinstance(v, float) and (v != v or v == float("inf"))):
-            return None
-        return float(v)
-    except (TypeError, ValueError):
+    sleep(REQUEST_DELAY)
+    cons_df = _retry_request(
+        lambda: ak.stock_board_industry_cons_em(symbol=industry_name),
+        max_attempts=3,
+        delay=2.0,
+        budget=budget,
+    )
+    if cons_df is None or cons_df.empty:
+        return None
+    code_col = _col(cons_df, "代码", "code", "股票代码")
+    if not code_col:
         return None
+    name_col_cons = _col(cons_df, "名称", "name", "股票名称")
+    pe_col = _col(cons_df, "市盈率-动态", "市盈率", "pe")
+    pb_col = _col(cons_df, "市净率", "pb")
+    cap_col = _col(cons_df, "总市值", "市值", "market_cap")
+    return _board_records(cons_df, industry_name, code_col, name_col_cons, pe_col, pb_col, cap_col)
 
 
+@instrumented("corp_agent")
 def run_corp_agent() -> dict[str, Any]:
     """
     拉取东方财富行业板块及成分股，写入 stex.corp。
     市场：按代码分类（上证/深证/科创/创业/北证）；行业/板块为板块名称；
     市值、市盈率、市净率：从成分股或 A 股实时行情获取。
-    返回：{ "ok", "industries", "total_upserted", "error" }
+    板块成分股以 CRAWL_WORKERS 有界并发抓取，共享重试预算并带熔断；成分股在内存按 code 去重后一次批量写入。
+    返回：{ "ok", "industries", "boards_ok", "boards_failed", "retries_used", "circuit_open", "total_rows", "total_upserted", "error" }
     """
     try:
-        import akshare as ak
+        import akshare
     except ImportError:
         return {"ok": False, "error": "请安装 akshare: pip install akshare", "industries": 0, "total_upserted": 0}
+    ak = instrument(akshare, "api.akshare")
 
     try:
         # 不再调用 stock_zh_a_spot_em()：该接口一次拉全市场，易触发 RemoteDisconnected。
         # 总市值仅从行业成分股接口取（若该接口有 总市值/市值 列则写入，否则为 null）。
-        spot_market_cap: dict[str, float] = {}
-
         # 行业板块列表
         name_df = _retry_request(lambda: ak.stock_board_industry_name_em(), max_attempts=3, delay=2.0)
         if name_df is None or name_df.empty:
@@ -128,57 +207,52 @@ def run_corp_agent() -> dict[str, Any]:
         name_col = _col(name_df, "板块名称", "name", "行业") or (name_df.columns[0] if len(name_df.columns) > 0 else None)
         if name_col is None:
             return {"ok": True, "industries": 0, "total_upserted": 0, "message": "无板块名称列"}
-        industry_names = name_df[name_col].dropna().unique().tolist()
+        industry_names = [n for n in (str(x).strip() for x in name_df[name_col].dropna().unique().tolist()) if n]
+        budget = _CrawlBudget()
+        boards_failed = 0
 
-        total = 0
-        for industry_name in industry_names:
-            industry_name = str(industry_name).strip()
-            if not industry_name:
-                continue
-            time.sleep(REQUEST_DELAY)
+        def _task(industry_name: str) -> Optional[pd.DataFrame]:
             try:
-                cons_df = _retry_request(
-                    lambda s=industry_name: ak.stock_board_industry_cons_em(symbol=s),
-                    max_attempts=3,
-                    delay=2.0,
-                )
-                if cons_df is None or cons_df.empty:
-                    continue
-                code_col = _col(cons_df, "代码", "code", "股票代码")
-                name_col_cons = _col(cons_df, "名称", "name", "股票名称")
-                pe_col = _col(cons_df, "市盈率-动态", "市盈率", "pe")
-                pb_col = _col(cons_df, "市净率", "pb")
-                cap_col = _col(cons_df, "总市值", "市值", "market_cap")
-                if not code_col:
-                    continue
-                for _, row in cons_df.iterrows():
-                    code = str(row.get(code_col, "")).strip()
-                    if not code or len(code) > 10:
-                        continue
-                    name = str(row.get(name_col_cons, "")).strip() if name_col_cons else None
-                    market = _market_from_code(code)
-                    pe = _safe_float(row, pe_col)
-                    pb = _safe_float(row, pb_col)
-                    market_cap = _safe_float(row, cap_col)
-                    if market_cap is None and code in spot_market_cap:
-                        market_cap = spot_market_cap[code]
-                    upsert_corp(
-                        code=code,
-                        name=name or None,
-                        market=market or None,
-                        industry=industry_name,
-                        sector=industry_name,
-                        list_date=None,
-                        market_cap=market_cap,
-                        pe=pe,
-                        pb=pb,
-                    )
-                    total += 1
+                return _fetch_board(ak, industry_name, budget)
             except Exception as e:
                 logger.warning("industry %s: %s", industry_name, e)
-                continue
+                raise
+
+        # 有界并发抓取；按板块原顺序收集结果，保证同一股票多板块时「后出现的板块」生效（与逐个写入一致）
+        frames: list[pd.DataFrame] = []
+        with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as pool:
+            futures = [pool.submit(bind(_task), name) for name in industry_names]
+            for fut in futures:
+                try:
+                    df = fut.result()
+                except Exception:
+                    boards_failed += 1
+                    continue
+                if df is not None and not df.empty:
+                    frames.append(df)
+
+        total_rows = sum(len(f) for f in frames)
+        total = 0
+        if frames:
+            # 内存去重：同一 code 取各列最后一个非空值，再一次性批量写入
+            merged = pd.concat(frames, ignore_index=True).groupby("code", sort=False).last().reset_index()
+            total = upsert_corps(merged)
 
-        return {"ok": True, "industries": len(industry_names), "total_upserted": total}
+        out = {
+            "ok": bool(frames) or not budget.open,
+            "industries": len(industry_names),
+            "boards_ok": len(frames),
+            "boards_failed": boards_failed,
+            "retries_used": budget.retries_used,
+            "circuit_open": budget.open,
+            "total_rows": total_rows,
+            "total_upserted": total,
+        }
+        if budget.open:
+            out["message"] = f"连续失败触发熔断，已写入 {total} 只（请检查网络、代理或稍后重试）"
+            if not frames:
+                out["error"] = out["message"]
+        return out
     except Exception as e:
         logger.exception("corp_agent")
         err_msg = str(e)
@@ -5,12 +5,18 @@ Agent：增量拉取全市场「最近一个交易日」（含今日）的日线
 写入 stex.stock_day、stex.fundamentals、stex.technicals；对 watchlist 写入 stex.moneyflow。
 """
 import logging
-import time
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 from typing import Any, Optional, Tuple
 
+from ..code_latest import touch_trade_dates
+from ..collectors.stock import today_cn
+from ..collectors.tushare_cache import cached_pro
 from ..db import get_conn
+from ..metrics import instrument, instrumented, sleep
+from ..partitions import ensure_partitions
+from ..store.ohlcv_parquet import mark_dirty, sync_after_ingest
+from ..trade_calendar import get_calendar
 
 logger = logging.getLogger(__name__)
 DELAY = 0.3  # 与 watchlist_data_agent 一致，请求间隔防限流
@@ -137,18 +143,8 @@ def _compute_ma_for_date(conn, code: str, trade_date: str, limit: int = 65) -> T
 
 
 def _get_last_trade_date(pro) -> Optional[str]:
-    """获取「含今天在内」的最近一个交易日，格式 YYYYMMDD。收盘后执行可拉到当日数据。"""
-    from zoneinfo import ZoneInfo
-    today = datetime.now(ZoneInfo("Asia/Shanghai")).date()
-    end = today.strftime("%Y%m%d")  # 包含今天，收盘后 Tushare 有当日数据时可更新到今日
-    start = (today - timedelta(days=14)).strftime("%Y%m%d")
-    try:
-        cal = pro.trade_cal(exchange="SSE", start_date=start, end_date=end, is_open="1")
-        if cal is not None and not cal.empty and "cal_date" in cal.columns:
-            return str(cal["cal_date"].max() or "")[:8]
-    except Exception as e:
-        logger.warning("trade_cal failed: %s", e)
-    return (today - timedelta(days=1)).strftime("%Y%m%d")
+    """获取「含今天在内」的最近一个交易日（共享交易日历），格式 YYYYMMDD。收盘后执行可拉到当日数据。"""
+    return get_calendar(pro).prev(today_cn(), inclusive=True).strftime("%Y%m%d")
 
 
 def _get_trade_dates_between(pro, start_date: str, end_date: str) -> list[str]:
@@ -157,14 +153,7 @@ def _get_trade_dates_between(pro, start_date: str, end_date: str) -> list[str]:
     end_str = str(end_date).strip().replace("-", "")[:8]
     if not start_str or not end_str or start_str > end_str:
         return []
-    try:
-        cal = pro.trade_cal(exchange="SSE", start_date=start_str, end_date=end_str, is_open="1")
-        if cal is not None and not cal.empty and "cal_date" in cal.columns:
-            dates = sorted([str(d)[:8] for d in cal["cal_date"].tolist()])
-            return dates
-    except Exception as e:
-        logger.warning("trade_cal between %s %s failed: %s", start_str, end_str, e)
-    return []
+    return [d.strftime("%Y%m%d") for d in get_calendar(pro).range(start_str, end_str)]
 
 
 def _normalize_date(s: Optional[str]) -> Optional[str]:
@@ -175,6 +164,7 @@ def _normalize_date(s: Optional[str]) -> Optional[str]:
     return s if len(s) == 8 else None
 
 
+@instrumented("incremental_daily_agent")
 def run_incremental_daily_agent(
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
@@ -199,7 +189,7 @@ def run_incremental_daily_agent(
     except ImportError:
         return {"ok": False, "error": "请安装 tushare: pip install tushare", "rows_stock_day": 0, "rows_fundamentals": 0}
 
-    pro = ts.pro_api(TUSHARE_TOKEN)
+    pro = instrument(cached_pro(ts.pro_api(TUSHARE_TOKEN)), "api.tushare")
 
     # 确定要处理的交易日列表
     if _normalize_date(start_date):
@@ -229,11 +219,14 @@ def run_incremental_daily_agent(
         with conn.cursor() as cur:
             cur.execute("SELECT code FROM stex.watchlist ORDER BY code")
             watchlist_codes = [str(r[0]) for r in cur.fetchall()]
+        # 日线按月分区：写入前确保所涉月份及未来分区已建
+        first = min(dates_to_process)
+        ensure_partitions(conn, ["stex.stock_day", "stex.signals"], start=date(int(first[:4]), int(first[4:6]), int(first[6:8])))
 
     for trade_date in dates_to_process:
         rows_stock_day = 0
         rows_fundamentals = 0
-        codes_with_day = set()
+        codes_with_day: dict[str, str] = {}  # code -> 本批该代码最新交易日（YYYYMMDD）
 
         # 1) 全市场当日日线
         try:
@@ -263,8 +256,12 @@ def run_incremental_daily_agent(
                     vol, amt = row.get("vol"), row.get("amount")
                     _upsert_stock_day(conn, code, td, o, h, l, c, vol, amt)
                     rows_stock_day += 1
-                    codes_with_day.add(code)
+                    if td > codes_with_day.get(code, ""):
+                        codes_with_day[code] = td
+                touch_trade_dates(conn, codes_with_day.items())
             conn.commit()
+        if rows_stock_day:
+            mark_dirty(trade_date)
 
         # 2) 全市场当日每日指标
         try:
@@ -298,6 +295,8 @@ def run_incremental_daily_agent(
                     if row.get("turnover_rate") is not None:
                         _update_stock_day_turnover(conn, code, td, row.get("turnover_rate"))
             conn.commit()
+        if rows_fundamentals:
+            mark_dirty(trade_date)
 
         # 3) 当日 MA 写入 technicals
         rows_technicals = 0
@@ -316,7 +315,7 @@ def run_incremental_daily_agent(
         if watchlist_codes:
             with get_conn() as conn:
                 for code in watchlist_codes:
-                    time.sleep(DELAY)
+                    sleep(DELAY)
                     ts_code = _code_to_ts_code(code)
                     if not ts_code:
                         continue
@@ -372,10 +371,10 @@ def run_incremental_daily_agent(
                 ts_code = _code_to_ts_code(code)
                 if not ts_code:
                     continue
-                time.sleep(DELAY)
+                sleep(DELAY)
                 try:
                     inc = pro.income(ts_code=ts_code, start_date=start_str[:4] + "0101", end_date=end_str, report_type="1", fields="end_date,revenue,n_income")
-                    time.sleep(DELAY)
+                    sleep(DELAY)
                     bal = pro.balancesheet(ts_code=ts_code, start_date=start_str[:4] + "0101", end_date=end_str, report_type="1", fields="end_date,total_assets")
                     by_ed: dict[str, dict] = {}
                     if inc is not None and not inc.empty:
@@ -399,9 +398,22 @@ def run_incremental_daily_agent(
             conn.commit()
         logger.info("incremental_daily: 财务指标(watchlist) written %s rows", total_financial)
 
+    # 6) 作废进程内面板缓存；日线列式镜像增量同步（已配置 OHLCV_STORE_DIR 时，含各日写入留下的脏标记）
+    from ..store.panel import invalidate_panels
+
+    invalidate_panels()
+    store_sync = sync_after_ingest(since=dates_to_process[0] if dates_to_process else None)
+
+    # 7) 选股特征物化（最新交易日 → stex.screen_daily）
+    from .screen_feature_agent import run_screen_feature_agent
+
+    screen_features = run_screen_feature_agent()
+
     last_date = dates_to_process[-1] if dates_to_process else None
     return {
         "ok": True,
+        "ohlcv_store": store_sync,
+        "screen_features": screen_features,
         "trade_date": last_date,
         "dates_updated": dates_to_process if len(dates_to_process) != 1 else None,
         "rows_stock_day": total_stock_day,
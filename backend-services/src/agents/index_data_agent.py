@@ -1,20 +1,32 @@
 """
-Agent：采集大盘指数日线（上证、深证、创业板、沪深300 等），写入 stex.index_day。
-用于股票详情页展示同日大盘涨跌幅，并对比股票是否跑赢大盘。
-数据来源：Tushare index_daily。
+Agent：采集指数日线，写入 stex.index_day。
+范围（stex.index_basic，迁移 018）：核心大盘指数（上证、深证、创业板、沪深300、中证500，详情页对比与前端展示）
++ INDEX_UNIVERSE 配置的行业指数分组（申万一 / 二级、中证行业指数），供 index_signal_agent 计算板块级信号。
+- 每个指数从已入库的最新日期增量拉取（新指数回补约 2 年），已是最新交易日的不再请求
+- 申万指数缺的交易日少于待更新指数数时按交易日整表拉取（sw_daily 一次返回全部申万指数），否则逐指数拉取
+- 全部结果一次 COPY upsert 写入
+数据来源：Tushare index_daily / sw_daily，范围来自 index_basic / index_classify。
 """
 import logging
-import time
-from datetime import datetime, timedelta
-from decimal import Decimal
-from typing import Any, Optional
-from zoneinfo import ZoneInfo
+from datetime import date, timedelta
+from typing import Any, Iterable, Optional
 
-from ..config import TUSHARE_TOKEN
-from ..db import get_conn
+import numpy as np
+import pandas as pd
+import psycopg
+
+from ..collectors.stock import today_cn
+from ..collectors.tushare_cache import cached_pro
+from ..config import INDEX_UNIVERSE, TUSHARE_TOKEN
+from ..db import copy_upsert, get_conn
+from ..metrics import instrument, instrumented, sleep
+from ..store.panel import invalidate_panels
+from ..trade_calendar import get_calendar
 
 logger = logging.getLogger(__name__)
 DELAY = 0.3
+BACKFILL_DAYS = 365 * 2
+UNIVERSE_REFRESH_DAYS = 7  # 行业指数列表每周与 Tushare 同步一次
 
 # Tushare 指数代码 -> 展示名（前端用）
 INDEX_NAMES = {
@@ -25,61 +37,208 @@ INDEX_NAMES = {
     "000905.SH": "中证500",
 }
 
-# 采集的指数列表（与 INDEX_NAMES 一致）
+# 核心大盘指数（始终采集，与 INDEX_NAMES 一致）
 INDEX_CODES = list(INDEX_NAMES.keys())
 
+# 采集分组：core 为核心大盘指数；sw_l* 为申万行业（SW2021，日线走 sw_daily）；csi_industry 为中证行业指数（index_daily）
+GROUPS = ("core", "sw_l1", "sw_l2", "csi_industry")
+SW_LEVELS = {"sw_l1": "L1", "sw_l2": "L2"}
+
+# sw_daily 的 vol / amount 为万股 / 万元，换算为 index_daily 的手 / 千元后入库，stex.index_day 全表同一单位
+SW_VOL_SCALE = 100.0
+SW_AMOUNT_SCALE = 10.0
+
+DAY_COLUMNS = ["index_code", "trade_date", "open", "high", "low", "close", "pre_close", "pct_chg", "vol", "amount"]
+BASIC_COLUMNS = ["index_code", "name", "category", "market", "parent_code"]
+
+
+def _groups(groups: Optional[Iterable[str]] = None) -> list[str]:
+    """规范化分组（未知分组忽略），core 总在其中。"""
+    raw = groups if groups is not None else INDEX_UNIVERSE.split(",")
+    out = ["core"]
+    for g in raw:
+        g = str(g).strip().lower()
+        if g in GROUPS and g not in out:
+            out.append(g)
+    return out
 
-def _safe_num(v) -> Optional[Decimal]:
-    if v is None or (isinstance(v, float) and (v != v)):
-        return None
+
+def index_universe(conn, groups: Optional[Iterable[str]] = None) -> dict[str, str]:
+    """enabled 的指数代码 -> 分组（核心指数在前）；未执行迁移 018 时只有核心指数。"""
+    out = {c: "core" for c in INDEX_CODES}
     try:
-        return Decimal(str(v))
-    except Exception:
-        return None
-
-
-def _upsert_index_day(
-    conn,
-    index_code: str,
-    trade_date: str,
-    open_,
-    high,
-    low,
-    close,
-    pre_close,
-    pct_chg,
-    vol,
-    amount,
-) -> None:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT index_code, category FROM stex.index_basic
+                    WHERE enabled AND category = ANY(%s) ORDER BY category, index_code
+                    """,
+                    (_groups(groups),),
+                )
+                rows = cur.fetchall()
+    except psycopg.errors.UndefinedTable:
+        logger.warning("stex.index_basic 不存在（未执行迁移 018），仅采集核心大盘指数")
+        return out
+    for code, category in rows:
+        out.setdefault(code, category)
+    return out
+
+
+def _universe_stale(conn, groups: list[str]) -> bool:
+    """任一非核心分组没有指数，或最近一次同步早于 UNIVERSE_REFRESH_DAYS 天。"""
+    extra = [g for g in groups if g != "core"]
+    if not extra:
+        return False
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT category, MAX(updated_at) FROM stex.index_basic
+            WHERE category = ANY(%s) GROUP BY category
+            """,
+            (extra,),
+        )
+        synced = {r[0]: r[1] for r in cur.fetchall()}
+        cur.execute("SELECT NOW() - make_interval(days => %s)", (UNIVERSE_REFRESH_DAYS,))
+        cutoff = cur.fetchone()[0]
+    return any(synced.get(g) is None or synced[g] < cutoff for g in extra)
+
+
+def sync_index_universe(conn, pro: Any, groups: list[str]) -> int:
+    """经 index_classify（申万）/ index_basic（中证行业）刷新 stex.index_basic 的非核心分组，不提交。返回写入行数。"""
+    rows: list[tuple] = []
+    for group, level in SW_LEVELS.items():
+        if group not in groups:
+            continue
+        sleep(DELAY)
+        df = pro.index_classify(level=level, src="SW2021")
+        if df is None or df.empty:
+            continue
+        parent = df["parent_code"] if "parent_code" in df.columns else [None] * len(df)
+        for code, name, p in zip(df["index_code"], df["industry_name"], parent):
+            # 一级行业的 parent_code 为 0
+            p = str(p) if p is not None and str(p) not in ("0", "nan", "") else None
+            if p and "." not in p:
+                p += ".SI"
+            rows.append((str(code), name, group, "SW", p))
+    if "csi_industry" in groups:
+        sleep(DELAY)
+        df = pro.index_basic(market="CSI")
+        if df is not None and not df.empty:
+            df = df[df["category"].fillna("").str.contains("行业")]
+            if "exp_date" in df.columns:
+                df = df[df["exp_date"].isna() | (df["exp_date"].astype(str) > today_cn().strftime("%Y%m%d"))]
+            rows += [(str(c), n, "csi_industry", "CSI", None) for c, n in zip(df["ts_code"], df["name"])]
+    core = set(INDEX_CODES)
+    rows = [r for r in rows if r[0] not in core]
+    return copy_upsert(
+        conn,
+        "stex.index_basic",
+        BASIC_COLUMNS,
+        rows,
+        ["index_code"],
+        update_columns=["name", "category", "market", "parent_code"],
+        extra_set="updated_at = NOW()",
+    )
+
+
+def _last_dates(conn, codes: list[str]) -> dict[str, Optional[date]]:
+    """各指数已入库的最新交易日（主键逆序取一行）。"""
     with conn.cursor() as cur:
         cur.execute(
             """
-            INSERT INTO stex.index_day (index_code, trade_date, open, high, low, close, pre_close, pct_chg, vol, amount)
-            VALUES (%s, %s::date, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (index_code, trade_date) DO UPDATE SET
-              open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
-              close = EXCLUDED.close, pre_close = EXCLUDED.pre_close,
-              pct_chg = EXCLUDED.pct_chg, vol = EXCLUDED.vol, amount = EXCLUDED.amount
+            SELECT c.code, (SELECT MAX(trade_date) FROM stex.index_day WHERE index_code = c.code)
+            FROM unnest(%s::text[]) AS c(code)
             """,
-            (
-                index_code,
-                trade_date,
-                _safe_num(open_),
-                _safe_num(high),
-                _safe_num(low),
-                _safe_num(close),
-                _safe_num(pre_close),
-                _safe_num(pct_chg),
-                _safe_num(vol),
-                _safe_num(amount),
-            ),
+            (codes,),
         )
+        return {r[0]: r[1] for r in cur.fetchall()}
 
 
-def run_index_data_agent() -> dict[str, Any]:
+def _day_rows(
+    df: Optional[pd.DataFrame], after: Optional[dict[str, Optional[date]]] = None, sw: bool = False
+) -> list[tuple]:
     """
-    拉取大盘指数日线（上证/深证/创业板/沪深300/中证500），写入 stex.index_day。
-    日期范围：最近约 2 年，与 watchlist 日线一致。
+    index_daily / sw_daily 结果 -> DAY_COLUMNS 行；sw_daily 无 pre_close 由 close - change 推算、涨跌幅列名为 pct_change。
+    after 给出时只保留各代码晚于该日期的行（按交易日整表拉取时过滤）。
+    sw=True 时 vol / amount 由万股 / 万元换算为手 / 千元（与 index_daily 一致）。
+    """
+    if df is None or df.empty:
+        return []
+    dates = pd.to_datetime(df["trade_date"].astype(str), format="%Y%m%d", errors="coerce")
+    keep = dates.notna().to_numpy()
+    codes = df["ts_code"].astype(str).to_numpy()
+    days = dates.dt.date.to_numpy()
+    if after is not None:
+        keep = np.array(
+            [k and c in after and (after[c] is None or d > after[c]) for k, c, d in zip(keep, codes, days)], dtype=bool
+        )
+    if not keep.any():
+        return []
+
+    def col(name: str) -> np.ndarray:
+        if name not in df.columns:
+            return np.full(len(df), np.nan)
+        return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+
+    close = col("close")
+    pre_close = col("pre_close") if "pre_close" in df.columns else close - col("change")
+    pct = col("pct_chg") if "pct_chg" in df.columns else col("pct_change")
+    vol, amount = col("vol"), col("amount")
+    if sw:
+        vol, amount = vol * SW_VOL_SCALE, amount * SW_AMOUNT_SCALE
+    values = [col("open"), col("high"), col("low"), close, pre_close, pct, vol, amount]
+    idx = np.flatnonzero(keep)
+    nums = [[None if x != x else x for x in v[idx].tolist()] for v in values]
+    return list(zip(codes[idx].tolist(), days[idx].tolist(), *nums))
+
+
+def _pull_per_code(fetch, codes: list[str], last: dict, end: date, stats: dict, sw: bool = False) -> list[tuple]:
+    rows: list[tuple] = []
+    end_str = end.strftime("%Y%m%d")
+    for code in codes:
+        start = last.get(code) + timedelta(days=1) if last.get(code) else end - timedelta(days=BACKFILL_DAYS)
+        sleep(DELAY)
+        try:
+            df = fetch(ts_code=code, start_date=start.strftime("%Y%m%d"), end_date=end_str)
+            stats["api_calls"] += 1
+        except Exception as e:
+            stats["errors"] += 1
+            logger.warning("index daily %s: %s", code, e)
+            continue
+        rows += _day_rows(df, sw=sw)
+    return rows
+
+
+def _pull_sw(pro, codes: list[str], last: dict, end: date, stats: dict) -> list[tuple]:
+    """申万指数：已有历史的按缺失交易日整表拉取（日数少于代码数时），其余逐指数。"""
+    have = [c for c in codes if last.get(c)]
+    new = [c for c in codes if not last.get(c)]
+    rows: list[tuple] = []
+    if have:
+        dates = get_calendar().range(min(last[c] for c in have) + timedelta(days=1), end)
+        if len(dates) < len(have):
+            after = {c: last[c] for c in have}
+            for d in dates:
+                sleep(DELAY)
+                try:
+                    df = pro.sw_daily(trade_date=d.strftime("%Y%m%d"))
+                    stats["api_calls"] += 1
+                except Exception as e:
+                    stats["errors"] += 1
+                    logger.warning("sw_daily %s: %s", d, e)
+                    continue
+                rows += _day_rows(df, after=after, sw=True)
+        else:
+            new += have
+    return rows + _pull_per_code(pro.sw_daily, new, last, end, stats, sw=True)
+
+
+@instrumented("index_data_agent")
+def run_index_data_agent(groups: Optional[list[str]] = None, refresh_universe: bool = False) -> dict[str, Any]:
+    """
+    增量拉取指数日线（核心大盘指数 + INDEX_UNIVERSE / groups 指定的行业指数分组），批量写入 stex.index_day。
+    行业指数列表每 UNIVERSE_REFRESH_DAYS 天（或 refresh_universe=True 时）经 Tushare 刷新到 stex.index_basic。
     """
     if not TUSHARE_TOKEN:
         return {"ok": False, "error": "请设置 TUSHARE_TOKEN", "days_updated": 0}
@@ -89,49 +248,47 @@ def run_index_data_agent() -> dict[str, Any]:
     except ImportError:
         return {"ok": False, "error": "请安装 tushare: pip install tushare", "days_updated": 0}
 
-    pro = ts.pro_api(TUSHARE_TOKEN)
-    end = datetime.now(ZoneInfo("Asia/Shanghai")).date()
-    start = end - timedelta(days=365 * 2)
-    start_str = start.strftime("%Y%m%d")
-    end_str = end.strftime("%Y%m%d")
+    pro = instrument(cached_pro(ts.pro_api(TUSHARE_TOKEN)), "api.tushare")
+    groups = _groups(groups)
+    end = get_calendar(pro).prev(today_cn(), inclusive=True)
+    stats = {"api_calls": 0, "errors": 0}
 
     total_days = 0
+    synced = None
     with get_conn() as conn:
-        for index_code in INDEX_CODES:
-            time.sleep(DELAY)
+        if len(groups) > 1:
             try:
-                df = pro.index_daily(
-                    ts_code=index_code,
-                    start_date=start_str,
-                    end_date=end_str,
-                )
-                if df is None or df.empty:
-                    continue
-                for _, row in df.iterrows():
-                    td = str(row.get("trade_date", ""))
-                    if len(td) < 8:
-                        continue
-                    _upsert_index_day(
-                        conn,
-                        index_code,
-                        td,
-                        row.get("open"),
-                        row.get("high"),
-                        row.get("low"),
-                        row.get("close"),
-                        row.get("pre_close"),
-                        row.get("pct_chg"),
-                        row.get("vol"),
-                        row.get("amount"),
-                    )
-                    total_days += 1
+                with conn.transaction():
+                    if refresh_universe or _universe_stale(conn, groups):
+                        synced = sync_index_universe(conn, pro, groups)
+                conn.commit()
+            except psycopg.errors.UndefinedTable:
+                logger.warning("stex.index_basic 不存在（未执行迁移 018），仅采集核心大盘指数")
             except Exception as e:
-                logger.warning("index_daily %s: %s", index_code, e)
-        conn.commit()
+                logger.warning("index universe sync failed: %s", e)
+        universe = index_universe(conn, groups)
+        last = _last_dates(conn, list(universe))
+        stale = [c for c in universe if not last.get(c) or last[c] < end]
+        sw = [c for c in stale if universe[c].startswith("sw_")]
+        rest = [c for c in stale if not universe[c].startswith("sw_")]
+
+        rows = _pull_per_code(pro.index_daily, rest, last, end, stats)
+        if sw:
+            rows += _pull_sw(pro, sw, last, end, stats)
+        if rows:
+            total_days = copy_upsert(conn, "stex.index_day", DAY_COLUMNS, rows, ["index_code", "trade_date"])
+            conn.commit()
+    if total_days:
+        invalidate_panels()
 
     return {
-        "ok": True,
-        "indices": INDEX_CODES,
+        "ok": total_days > 0 or stats["errors"] == 0,
+        "groups": groups,
+        "indices": len(universe),
+        "indices_pulled": len(stale),
+        "universe_synced": synced,
         "days_updated": total_days,
-        "request_date_range": {"start": start_str, "end": end_str},
+        "api_calls": stats["api_calls"],
+        "errors": stats["errors"],
+        "request_date_range": {"end": end.strftime("%Y%m%d")},
     }
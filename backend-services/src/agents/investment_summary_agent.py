@@ -10,11 +10,15 @@ from typing import Any, Optional
 from openai import OpenAI
 
 from ..config import MOONSHOT_API_KEY, MOONSHOT_BASE_URL
+from ..context_builder import ContextBuilder, prompt_budget, summarize_bars, summarize_series
 from ..db import get_conn
+from ..metrics import instrumented, span
 
 logger = logging.getLogger(__name__)
 
 LIMIT_DAYS = 30
+MAX_TOKENS = 4000  # 输出上限；上下文窗口其余部分为数据段预算
+USER_SUFFIX = "\n\n请按上述要求输出投资总结（建仓区间、持仓时间、关注信号）。"
 
 
 def _float(v) -> Optional[float]:
@@ -36,22 +40,26 @@ def _str_date(d) -> str:
 
 def _llm(client: OpenAI, prompt: str, max_tokens: int = 4000) -> str:
     try:
-        resp = client.chat.completions.create(
-            model="moonshot-v1-8k",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-        )
+        with span("llm"):
+            resp = client.chat.completions.create(
+                model="moonshot-v1-8k",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+            )
         return (resp.choices[0].message.content or "").strip()
     except Exception as e:
         logger.exception("llm call failed: %s", e)
         raise
 
 
-def _gather_context(conn, code: str, corp_name: str) -> str:
-    """从数据库汇总该股票近 30 日相关数据，拼成供 LLM 使用的文本。"""
-    parts = []
+def _gather_context(conn, code: str, corp_name: str, budget: int) -> str:
+    """
+    从数据库汇总该股票近 30 日相关数据，按 token 预算装配供 LLM 使用的文本：
+    日线 / 技术指标 / 大盘压缩为统计摘要（附最近几根 K 线与最新一行指标），信号、估值、财务、企业分析按优先级截短。
+    """
+    builder = ContextBuilder(f"股票代码：{code}\n公司名称：{corp_name or '未知'}")
 
-    # 1) 日线（近 30 日，升序）
+    # 1) 日线（近 30 日，升序）→ 区间、趋势、均线、量能、回撤、异动 + 最近 5 根
     with conn.cursor() as cur:
         cur.execute(
             """
@@ -62,18 +70,15 @@ def _gather_context(conn, code: str, corp_name: str) -> str:
         )
         day_rows = cur.fetchall()
     if day_rows:
-        dates_sorted = sorted(set(_str_date(r[0]) for r in day_rows))
-        day_by_date = {_str_date(r[0]): r for r in day_rows}
-        lines = []
-        for d in dates_sorted:
-            r = day_by_date.get(d)
-            if not r:
-                continue
-            o, h, l, c, vol, amt = _float(r[1]), _float(r[2]), _float(r[3]), _float(r[4]), _float(r[5]), _float(r[6])
-            lines.append(f"{d} O:{o} H:{h} L:{l} C:{c} 量:{vol} 额:{amt}")
-        parts.append("【近30日日线】\n" + "\n".join(lines[-LIMIT_DAYS:]))
-
-    # 2) 技术指标（ma5/10/20, macd, rsi, kdj）
+        rows = sorted(day_rows, key=lambda r: _str_date(r[0]))
+        cols = list(zip(*rows))
+        builder.add(
+            f"近{LIMIT_DAYS}日日线",
+            summarize_bars([_str_date(d) for d in cols[0]], *cols[1:6], amount=cols[6], tail=5),
+            priority=100,
+        )
+
+    # 2) 技术指标（ma5/10/20, macd, rsi, kdj）→ 最新一行 + MACD 柱 / RSI / KDJ-J 序列摘要
     with conn.cursor() as cur:
         cur.execute(
             """
@@ -84,21 +89,24 @@ def _gather_context(conn, code: str, corp_name: str) -> str:
         )
         tech_rows = cur.fetchall()
     if tech_rows:
-        tech_by_date = {_str_date(r[0]): r for r in tech_rows}
-        dates_tech = sorted(tech_by_date.keys())
-        lines = []
-        for d in dates_tech[-LIMIT_DAYS:]:
-            r = tech_by_date[d]
-            ma5, ma10, ma20 = _float(r[1]), _float(r[2]), _float(r[3])
-            macd, sig, hist = _float(r[4]), _float(r[5]), _float(r[6])
-            rsi, k, d_, j = _float(r[7]), _float(r[8]), _float(r[9]), _float(r[10])
-            line = f"{d} MA5:{ma5} MA10:{ma10} MA20:{ma20}"
-            if macd is not None or rsi is not None:
-                line += f" MACD:{macd} signal:{sig} hist:{hist} RSI:{rsi} KDJ(K:{k} D:{d_} J:{j})"
-            lines.append(line)
-        parts.append("【技术指标】\n" + "\n".join(lines))
-
-    # 3) 系统计算信号（近 30 条，按 ref_date）
+        rows = sorted(tech_rows, key=lambda r: _str_date(r[0]))
+        dates = [_str_date(r[0]) for r in rows]
+        r = rows[-1]
+        ma5, ma10, ma20 = _float(r[1]), _float(r[2]), _float(r[3])
+        macd, sig, hist = _float(r[4]), _float(r[5]), _float(r[6])
+        rsi, k, d_, j = _float(r[7]), _float(r[8]), _float(r[9]), _float(r[10])
+        latest = f"{dates[-1]} MA5:{ma5} MA10:{ma10} MA20:{ma20}"
+        if macd is not None or rsi is not None:
+            latest += f" MACD:{macd} signal:{sig} hist:{hist} RSI:{rsi} KDJ(K:{k} D:{d_} J:{j})"
+        lines = [
+            latest,
+            summarize_series("MACD柱", dates, [x[6] for x in rows], nd=3, zero_cross=True),
+            summarize_series("RSI", dates, [x[7] for x in rows], nd=1, bands=(30, 70)),
+            summarize_series("KDJ-J", dates, [x[10] for x in rows], nd=1, bands=(0, 100)),
+        ]
+        builder.add("技术指标", lines, priority=90)
+
+    # 3) 系统计算信号（近 30 条，按 ref_date，新者在前）
     with conn.cursor() as cur:
         cur.execute(
             """
@@ -113,9 +121,9 @@ def _gather_context(conn, code: str, corp_name: str) -> str:
         for r in sig_rows:
             stype, direction, reason, ref = r[0], r[1], (r[2] or "")[:200], _str_date(r[3])
             lines.append(f"{ref} [{stype}] {direction} {reason}")
-        parts.append("【系统信号】\n" + "\n".join(lines))
+        builder.add("系统信号", lines, priority=80)
 
-    # 4) 企业核心竞争力分析
+    # 4) 企业核心竞争力分析（长文本，预算不足时截短）
     with conn.cursor() as cur:
         cur.execute(
             "SELECT business_intro, competitiveness_analysis FROM stex.corp_analysis WHERE code = %s",
@@ -125,9 +133,9 @@ def _gather_context(conn, code: str, corp_name: str) -> str:
     if row and (row[0] or row[1]):
         intro = (row[0] or "")[:2000]
         comp = (row[1] or "")[:3000]
-        parts.append("【企业分析】\n主营业务摘要：" + intro + "\n核心竞争力分析：" + comp)
+        builder.add("企业分析", ["主营业务摘要：" + intro, "核心竞争力分析：" + comp], priority=40, min_tokens=120)
 
-    # 5) 大盘指数（与日线同期的交易日：取该股近 30 日交易日对应的指数涨跌幅）
+    # 5) 大盘指数（与日线同期的交易日）→ 每个指数一行摘要
     if day_rows:
         trade_dates = list({_str_date(r[0]) for r in day_rows})
         if trade_dates:
@@ -139,20 +147,25 @@ def _gather_context(conn, code: str, corp_name: str) -> str:
                     FROM stex.index_day
                     WHERE trade_date IN ({placeholders})
                     AND index_code IN ('000001.SH','399006.SZ')
-                    ORDER BY trade_date DESC, index_code
+                    ORDER BY index_code, trade_date
                     """,
                     trade_dates,
                 )
                 idx_rows = cur.fetchall()
             if idx_rows:
-                by_d = {}
+                by_code: dict[str, list] = {}
                 for r in idx_rows:
-                    td = _str_date(r[0])
-                    if td not in by_d:
-                        by_d[td] = []
-                    by_d[td].append(f"{r[1]}:收{r[2]} 涨跌{r[3]}%")
-                lines = [f"{d} " + " | ".join(by_d[d]) for d in sorted(by_d.keys(), reverse=True)[:LIMIT_DAYS]]
-                parts.append("【大盘同期表现】\n" + "\n".join(lines))
+                    by_code.setdefault(r[1], []).append(r)
+                lines = []
+                for ic, rs in by_code.items():
+                    closes = [_float(r[2]) for r in rs]
+                    chg = (closes[-1] / closes[0] - 1) * 100 if closes[0] and closes[-1] is not None else None
+                    lines.append(
+                        summarize_series(ic + " 收盘", [_str_date(r[0]) for r in rs], closes)
+                        + (f"，区间涨跌 {chg:.2f}%" if chg is not None else "")
+                        + (f"，最新日涨跌 {_float(rs[-1][3])}%" if rs[-1][3] is not None else "")
+                    )
+                builder.add("大盘同期表现", lines, priority=60)
 
     # 6) 基本面/估值（fundamentals 最近几条）
     with conn.cursor() as cur:
@@ -171,7 +184,7 @@ def _gather_context(conn, code: str, corp_name: str) -> str:
             pe, pb, ps = _float(r[1]), _float(r[2]), _float(r[3])
             cap, rev, profit, growth, roe = _float(r[4]), _float(r[5]), _float(r[6]), _float(r[7]), _float(r[8])
             lines.append(f"{d} PE:{pe} PB:{pb} PS:{ps} 市值:{cap} 营收:{rev} 净利润:{profit} 利润增速:{growth}% ROE:{roe}%")
-        parts.append("【基本面/估值】\n" + "\n".join(lines))
+        builder.add("基本面/估值", lines, priority=70)
 
     # 7) 企业财务披露（financial）
     with conn.cursor() as cur:
@@ -189,12 +202,13 @@ def _gather_context(conn, code: str, corp_name: str) -> str:
             d, rtype = _str_date(r[0]), r[1] or ""
             rev, profit, assets = _float(r[2]), _float(r[3]), _float(r[4])
             lines.append(f"{d} {rtype} 营收:{rev} 净利润:{profit} 总资产:{assets}")
-        parts.append("【财务披露】\n" + "\n".join(lines))
+        builder.add("财务披露", lines, priority=50)
 
-    header = f"股票代码：{code}\n公司名称：{corp_name or '未知'}\n\n"
-    if not parts:
-        return header.rstrip()  # 无任何数据时仅返回头部，调用方据此判断跳过 LLM
-    return header + "\n\n".join(parts)
+    # 无任何数据时仅返回头部，调用方据此判断跳过 LLM
+    context = builder.build(budget)
+    if builder.trimmed or builder.dropped:
+        logger.info("investment_summary %s: context trimmed=%s dropped=%s", code, builder.trimmed, builder.dropped)
+    return context
 
 
 def _upsert_summary(conn, code: str, content: str) -> None:
@@ -210,6 +224,7 @@ def _upsert_summary(conn, code: str, content: str) -> None:
     conn.commit()
 
 
+@instrumented("investment_summary_agent")
 def run_investment_summary_agent(codes: Optional[list[str]] = None) -> dict[str, Any]:
     """
     对指定股票执行「股票投资总结」：汇总信号、日线、技术指标、企业分析、大盘、财务，
@@ -267,16 +282,16 @@ def run_investment_summary_agent(codes: Optional[list[str]] = None) -> dict[str,
                     row = cur.fetchone()
                 corp_name = (row[0] or "").strip() if row else ""
 
-                context = _gather_context(conn, code, corp_name)
+                context = _gather_context(conn, code, corp_name, prompt_budget(MAX_TOKENS, sys_prompt, USER_SUFFIX))
                 header_only = f"股票代码：{code}\n公司名称：{corp_name or '未知'}"
                 if not context.strip() or context.strip() == header_only:
                     results.append({"code": code, "ok": False, "error": "无日线等数据，无法生成总结"})
                     continue
 
-                user_content = context + "\n\n请按上述要求输出投资总结（建仓区间、持仓时间、关注信号）。"
+                user_content = context + USER_SUFFIX
                 prompt = sys_prompt + "\n\n---\n\n" + user_content
 
-                content = _llm(client, prompt, max_tokens=4000)
+                content = _llm(client, prompt, max_tokens=MAX_TOKENS)
                 if not content:
                     content = "（生成失败或为空）"
                 _upsert_summary(conn, code, content)
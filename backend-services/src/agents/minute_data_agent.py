@@ -0,0 +1,142 @@
+"""
+Agent：分钟线采集。按 MINUTE_SOURCE（akshare / tushare / file 回放）逐只拉取 1 分钟线，
+整批向量化聚合为 5/15/30/60 分钟，按交易日分批 COPY 写入 stex.stock_min（collectors.stock）。
+"""
+import logging
+import time
+from datetime import date, timedelta
+from typing import Any, Optional
+
+import pandas as pd
+
+from ..collectors.stock import (
+    AGG_INTERVALS,
+    MINUTE_SOURCES,
+    aggregate_minutes,
+    check_intervals,
+    fetch_minute,
+    save_minute_bars,
+    today_cn,
+)
+from ..db import get_conn
+from ..metrics import instrumented, sleep, span
+from ..partitions import ensure_partitions
+
+logger = logging.getLogger(__name__)
+DELAY = 0.3  # 远程数据源请求间隔，避免限流
+# 每累计这么多只代码聚合入库一次，控制内存
+FLUSH_CODES = 50
+# 未指定起始日时回看的日历日数（akshare 1 分钟线仅提供近 5 个交易日）
+DEFAULT_LOOKBACK_DAYS = 7
+
+
+def _to_date(v) -> Optional[date]:
+    if v is None or v == "":
+        return None
+    if isinstance(v, date):
+        return v
+    s = str(v).strip().replace("-", "")[:8]
+    return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+
+
+def _get_watchlist_codes(conn) -> list[str]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT code FROM stex.watchlist ORDER BY code")
+        return [str(r[0]) for r in cur.fetchall()]
+
+
+def _flush(conn, frames: list[pd.DataFrame], intervals: list[int]) -> tuple[int, int]:
+    """1 分钟线与聚合线一并入库，返回 (1 分钟根数, 写入行数)。"""
+    bars = pd.concat(frames, ignore_index=True)
+    frames.clear()
+    with span("compute.aggregate"):
+        out = pd.concat([bars.assign(interval_min=1), aggregate_minutes(bars, intervals)], ignore_index=True)
+    return len(bars), save_minute_bars(conn, out)
+
+
+@instrumented("minute_data_agent")
+def run_minute_data_agent(
+    codes: Optional[list[str]] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    source: Optional[str] = None,
+    intervals: Optional[list[int]] = None,
+) -> dict[str, Any]:
+    """
+    采集 codes（为空则 watchlist 全部）[start_date, end_date] 的分钟线（end 默认北京时间今日，start 默认 end 前 7 日），
+    source 默认 MINUTE_SOURCE，intervals 默认 5/15/30/60（1 分钟原始线总会写入）。
+    返回：{ ok, source, codes_processed, bars_1m, rows_written, failed, elapsed_sec, error }
+    """
+    from ..config import MINUTE_SOURCE
+
+    t0 = time.time()
+    source = (source or MINUTE_SOURCE).strip().lower()
+    end = _to_date(end_date) or today_cn()
+    start = _to_date(start_date) or end - timedelta(days=DEFAULT_LOOKBACK_DAYS)
+    if source not in MINUTE_SOURCES:
+        return {"ok": False, "error": f"未知分钟线数据源: {source}；可选: {' | '.join(MINUTE_SOURCES)}", "source": source}
+    try:
+        intervals = check_intervals(intervals or AGG_INTERVALS)
+    except ValueError as e:
+        return {"ok": False, "error": str(e), "source": source}
+    processed = bars_1m = written = 0
+    failed: list[dict[str, str]] = []
+    try:
+        with get_conn() as conn:
+            if codes is not None:
+                codes = [str(c).strip() for c in codes if c and str(c).strip()]
+            if not codes:
+                codes = _get_watchlist_codes(conn)
+            if not codes:
+                return {"ok": True, "source": source, "codes_processed": 0, "bars_1m": 0, "rows_written": 0, "message": "暂无收藏跟踪股票"}
+            # 分钟线按日分区：写入前确保 [start, 今日 + 预建天数] 的日分区已建（更早的落 _history 分区）
+            ensure_partitions(conn, ["stex.stock_min"], start=start)
+            frames: list[pd.DataFrame] = []
+            for code in codes:
+                try:
+                    with span(f"api.{source}"):
+                        df = fetch_minute(code, start, end, source=source)
+                except RuntimeError:
+                    # 依赖缺失 / 未配置，后续代码同样失败
+                    raise
+                except Exception as e:
+                    logger.warning("minute_data_agent %s: %s", code, e)
+                    failed.append({"code": code, "error": str(e)})
+                    continue
+                processed += 1
+                if not df.empty:
+                    frames.append(df)
+                if len(frames) >= FLUSH_CODES:
+                    n, w = _flush(conn, frames, intervals)
+                    bars_1m += n
+                    written += w
+                if source != "file":
+                    sleep(DELAY)
+            if frames:
+                n, w = _flush(conn, frames, intervals)
+                bars_1m += n
+                written += w
+    except Exception as e:
+        logger.exception("minute_data_agent failed")
+        return {
+            "ok": False,
+            "error": str(e),
+            "source": source,
+            "codes_processed": processed,
+            "bars_1m": bars_1m,
+            "rows_written": written,
+            "failed": failed,
+        }
+    logger.info("minute_data_agent: %s codes, %s 1m bars, %s rows", processed, bars_1m, written)
+    return {
+        "ok": True,
+        "source": source,
+        "start": str(start),
+        "end": str(end),
+        "intervals": [1] + intervals,
+        "codes_processed": processed,
+        "bars_1m": bars_1m,
+        "rows_written": written,
+        "failed": failed,
+        "elapsed_sec": round(time.time() - t0, 2),
+    }
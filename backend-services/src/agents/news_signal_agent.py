@@ -3,14 +3,19 @@ Agent：新闻舆论信号 —— 指定信息源采集 + AI 大模型
 信息源：巨潮资讯网、财联社电报、证券时报、中国证券报（RSS/RSSHub）、雪球个股新闻、东方财富股吧（DDG 站内），
 以及 DDG 综合新闻与多站点搜索兜底。由 LLM 判断利好/利空，输出 看涨/看跌/中性/无信号，写入 stex.signals。
 """
+import bisect
 import logging
 from datetime import datetime
 from typing import Any, Optional
 
 from openai import OpenAI
 
+from ..code_latest import latest_trade_date, stalest_codes, touch_news_dates
 from ..config import MOONSHOT_API_KEY, MOONSHOT_BASE_URL
+from ..context_builder import ContextBuilder, dedupe_snippets, prompt_budget, truncate_to_tokens
 from ..db import get_conn
+from ..metrics import instrumented, span
+from ..trade_calendar import get_calendar
 from .parse_corp_agent import _get_corp_name, _llm, _web_search
 from .news_sources import gather_from_specified_sources
 
@@ -22,6 +27,11 @@ DIR_BEAR = "看跌"
 DIR_NEUTRAL = "中性"
 DIR_NONE = "无信号"
 
+# 单个 ref_date 的新闻上下文：总 token 上限与单条摘要上限（多源转载的重复条目先去重）
+NEWS_CONTEXT_TOKENS = 2500
+NEWS_SNIPPET_TOKENS = 300
+NEWS_MAX_TOKENS = 400
+
 # 兜底：多站点 DDG 搜索（当未配置 RSSHub 或需补充时）
 NEWS_SITE_QUERIES = [
     "site:eastmoney.com",
@@ -36,52 +46,34 @@ NEWS_SITE_QUERIES = [
 
 
 def _get_latest_trade_date(code: str) -> Optional[str]:
-    """该股票在 stock_day 中的最新交易日，返回 YYYY-MM-DD。"""
+    """该股票的最新交易日（stex.code_latest 主键查询），返回 YYYY-MM-DD。"""
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT trade_date FROM stex.stock_day WHERE code = %s ORDER BY trade_date DESC LIMIT 1",
-                (code,),
-            )
-            row = cur.fetchone()
-    if not row:
+        td = latest_trade_date(conn, code)
+    if not td:
         return None
-    td = row[0]
     if hasattr(td, "isoformat"):
         return td.isoformat()[:10]
     return str(td)[:10]
 
 
-def _get_recent_trade_dates(code: str, limit: int = 10) -> list[str]:
-    """该股票最近 limit 个交易日，降序，返回 YYYY-MM-DD 列表。"""
-    rows = []
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT trade_date FROM stex.stock_day WHERE code = %s ORDER BY trade_date DESC LIMIT %s",
-                (code, limit),
-            )
-            rows = cur.fetchall()
-    out = []
-    for row in rows:
-        td = row[0]
-        s = td.isoformat()[:10] if hasattr(td, "isoformat") else str(td)[:10]
-        out.append(s)
-    return out
+def _get_recent_trade_dates(latest_ref: str, limit: int = 10) -> list[str]:
+    """截至 latest_ref（该股最新交易日）最近 limit 个交易日（共享交易日历），降序，返回 YYYY-MM-DD 列表。"""
+    return [d.isoformat() for d in get_calendar().recent(latest_ref, limit)]
+
+
+def _news_context(snippets: list[str], budget: int) -> str:
+    """去重后按原顺序（指定信息源在前）装入预算，单条过长的摘要截短。"""
+    lines = [truncate_to_tokens(" ".join(sn.split()), NEWS_SNIPPET_TOKENS) for sn in dedupe_snippets(snippets)]
+    return ContextBuilder().add("", lines).build(min(budget, NEWS_CONTEXT_TOKENS))
 
 
 def _news_date_to_ref_date(news_date_str: str, trade_dates_desc: list[str]) -> Optional[str]:
-    """将新闻日期（YYYY-MM-DD）映射到最近的交易日（<= 该日）。"""
+    """将新闻日期（YYYY-MM-DD）映射到最近的交易日（<= 该日，二分查找）；早于全部交易日时取最早一日。"""
     if not trade_dates_desc:
         return None
-    try:
-        d = news_date_str[:10]
-        for td in trade_dates_desc:
-            if td <= d:
-                return td
-        return trade_dates_desc[-1]
-    except Exception:
-        return trade_dates_desc[0] if trade_dates_desc else None
+    asc = trade_dates_desc[::-1]
+    i = bisect.bisect_right(asc, (news_date_str or "")[:10])
+    return asc[i - 1] if i else asc[0]
 
 
 def _news_search(keywords: str, max_results: int = 10, timelimit: str = "w") -> list[dict]:
@@ -89,7 +81,7 @@ def _news_search(keywords: str, max_results: int = 10, timelimit: str = "w") ->
     try:
         from duckduckgo_search import DDGS
 
-        with DDGS() as ddgs:
+        with span("search"), DDGS() as ddgs:
             raw = ddgs.news(
                 keywords=keywords,
                 region="wt-wt",
@@ -151,6 +143,7 @@ def _upsert_news_signal(
                 """,
                 (code, SIGNAL_TYPE_NEWS, direction, ref_date, reason or "新闻舆论", "news_signal_agent"),
             )
+        touch_news_dates(conn, [(code, ref_date)])
         conn.commit()
 
 
@@ -195,6 +188,7 @@ def _parse_direction_from_llm(text: str) -> tuple[str, str]:
     return DIR_NEUTRAL, text[:200] if len(text) > 200 else text
 
 
+@instrumented("news_signal_agent")
 def run_news_signal_agent(codes: Optional[list[str]] = None) -> dict[str, Any]:
     """
     对指定股票（或单只）执行「新闻舆论」信号：多源搜索近期新闻 + LLM 判断利好/利空，
@@ -207,24 +201,9 @@ def run_news_signal_agent(codes: Optional[list[str]] = None) -> dict[str, Any]:
     norm_codes = [str(c).strip() for c in (codes or []) if c and str(c).strip()]
     if not norm_codes:
         # 批量模式：优先选取尚未采集或最早采集过新闻舆论的跟踪股票（最多 20 只），多次运行可覆盖全列表
+        # 按 stex.code_latest.last_news_date 排序，不再对 signals 聚合
         with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT w.code
-                    FROM stex.watchlist w
-                    LEFT JOIN (
-                        SELECT code, MAX(ref_date) AS last_ref
-                        FROM stex.signals
-                        WHERE signal_type = %s AND ref_date IS NOT NULL
-                        GROUP BY code
-                    ) s ON s.code = w.code
-                    ORDER BY s.last_ref ASC NULLS FIRST, w.code
-                    LIMIT 20
-                    """,
-                    (SIGNAL_TYPE_NEWS,),
-                )
-                norm_codes = [str(r[0]) for r in cur.fetchall()]
+            norm_codes = stalest_codes(conn, 20, column="last_news_date", universe="watchlist")
         logger.info("news_signal: batch mode, selected %s codes (no/oldest news first)", len(norm_codes))
     if not norm_codes:
         logger.warning("news_signal: no codes to process (watchlist empty or none given)")
@@ -239,7 +218,7 @@ def run_news_signal_agent(codes: Optional[list[str]] = None) -> dict[str, Any]:
             latest_ref = _get_latest_trade_date(code)
             if not latest_ref:
                 latest_ref = datetime.now().strftime("%Y-%m-%d")
-            trade_dates = _get_recent_trade_dates(code, limit=10)
+            trade_dates = _get_recent_trade_dates(latest_ref, limit=10)
             if not trade_dates:
                 trade_dates = [latest_ref]
 
@@ -277,22 +256,23 @@ def run_news_signal_agent(codes: Optional[list[str]] = None) -> dict[str, Any]:
             for ref_date in trade_dates:
                 if ref_date not in by_ref or not by_ref[ref_date]:
                     continue
-                context = "\n\n".join(by_ref[ref_date][:15])[:5000]
-                if not context.strip():
-                    continue
-                prompt = f"""你是一位 A 股舆情分析助手。根据以下与该公司/股票相关的新闻或政策摘要，判断对该公司股价的影响是 利好 还是 利空 或 中性；若无有效信息则判断为 无信号。
+                template = f"""你是一位 A 股舆情分析助手。根据以下与该公司/股票相关的新闻或政策摘要，判断对该公司股价的影响是 利好 还是 利空 或 中性；若无有效信息则判断为 无信号。
 
 股票代码：{code}
 公司名称：{corp_name or '未知'}
 信号日期：{ref_date}
 
 新闻/政策摘要：
-{context}
+{{context}}
 
 请严格按以下格式回答（只输出一行结论，不要多余解释）：
 第一行：仅输出四个词之一 —— 看涨、看跌、中性、无信号
 第二行起（可选）：用一句话说明理由。"""
-                raw = _llm(client, prompt, max_tokens=400)
+                context = _news_context(by_ref[ref_date], prompt_budget(NEWS_MAX_TOKENS, template))
+                if not context.strip():
+                    continue
+                prompt = template.replace("{context}", context)
+                raw = _llm(client, prompt, max_tokens=NEWS_MAX_TOKENS)
                 direction, reason = _parse_direction_from_llm(raw)
                 _upsert_news_signal(code, ref_date, direction, reason)
                 _insert_news_opinion_record(code, fetch_ts, ref_date, direction, reason, context)
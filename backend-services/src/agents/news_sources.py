@@ -12,6 +12,7 @@ from urllib.parse import quote
 import httpx
 
 from ..config import RSSHUB_BASE_URL
+from ..metrics import span
 
 logger = logging.getLogger(__name__)
 
@@ -44,7 +45,8 @@ def fetch_rss(url: str, source_label: str = "", timeout: float = 15.0) -> list[N
         return []
     out: list[NEWS_ITEM] = []
     try:
-        resp = httpx.get(url, timeout=timeout, follow_redirects=True)
+        with span("http"):
+            resp = httpx.get(url, timeout=timeout, follow_redirects=True)
         resp.raise_for_status()
         feed = feedparser.parse(resp.content)
         for e in getattr(feed, "entries", [])[:30]:
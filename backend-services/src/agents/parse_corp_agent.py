@@ -9,8 +9,10 @@ from typing import Any, Optional
 
 from openai import OpenAI
 
+from ..code_latest import touch_analysis
 from ..config import MOONSHOT_API_KEY, MOONSHOT_BASE_URL
 from ..db import get_conn
+from ..metrics import instrumented, span
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +20,7 @@ logger = logging.getLogger(__name__)
 def _web_search(query: str, max_results: int = 6) -> list[str]:
     try:
         from duckduckgo_search import DDGS
-        with DDGS() as ddgs:
+        with span("search"), DDGS() as ddgs:
             results = list(ddgs.text(query, max_results=max_results))
         return [r.get("body") or r.get("title", "") for r in results if r.get("body") or r.get("title")]
     except Exception as e:
@@ -28,11 +30,12 @@ def _web_search(query: str, max_results: int = 6) -> list[str]:
 
 def _llm(client: OpenAI, prompt: str, max_tokens: int = 2000) -> str:
     try:
-        resp = client.chat.completions.create(
-            model="moonshot-v1-8k",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-        )
+        with span("llm"):
+            resp = client.chat.completions.create(
+                model="moonshot-v1-8k",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+            )
         return (resp.choices[0].message.content or "").strip()
     except Exception as e:
         logger.exception("llm call failed: %s", e)
@@ -66,9 +69,11 @@ def _upsert_corp_analysis(
                 """,
                 (code, business_intro, competitiveness_analysis),
             )
+        touch_analysis(conn, [code])
         conn.commit()
 
 
+@instrumented("parse_corp_agent")
 def run_parse_corp_agent(codes: Optional[list[str]] = None) -> dict[str, Any]:
     """
     对指定股票代码执行「解析企业」：搜索主营业务 → LLM 整理入库；再 LLM 分析核心竞争力（中美科技竞争战略）入库。
@@ -7,6 +7,8 @@ from datetime import date, timedelta
 from typing import Any, Optional
 
 from ..db import get_conn
+from ..metrics import instrumented, span
+from ..store.stream import iter_code_windows
 
 logger = logging.getLogger(__name__)
 
@@ -23,64 +25,6 @@ def _float(v):
         return None
 
 
-def _get_codes_with_data(conn, codes: Optional[list[str]], limit: int = 8000) -> list[str]:
-    """有日线数据的股票；若传入 codes 则在其范围内筛选。"""
-    if codes:
-        codes = [str(c).strip() for c in codes if c and str(c).strip()]
-    with conn.cursor() as cur:
-        if codes:
-            placeholders = ",".join(["%s"] * len(codes))
-            cur.execute(
-                f"""
-                SELECT DISTINCT code FROM stex.stock_day
-                WHERE code IN ({placeholders})
-                GROUP BY code HAVING COUNT(*) >= 40
-                ORDER BY code
-                LIMIT %s
-                """,
-                (*codes, limit),
-            )
-        else:
-            cur.execute(
-                """
-                SELECT code FROM (
-                    SELECT code, COUNT(*) AS cnt FROM stex.stock_day GROUP BY code HAVING COUNT(*) >= 40
-                ) t ORDER BY code LIMIT %s
-                """,
-                (limit,),
-            )
-        return [str(r[0]) for r in cur.fetchall()]
-
-
-def _fetch_days(conn, code: str, limit: int = LOOKBACK_DAYS) -> list[dict]:
-    """近 limit 日 日线，按日期升序。"""
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT trade_date, open, high, low, close, volume
-            FROM stex.stock_day WHERE code = %s ORDER BY trade_date DESC LIMIT %s
-            """,
-            (code, limit),
-        )
-        rows = cur.fetchall()
-    if not rows:
-        return []
-    by_date = {}
-    for r in rows:
-        td = r[0]
-        td_str = td.isoformat()[:10] if hasattr(td, "isoformat") else str(td)[:10]
-        by_date[td_str] = {
-            "trade_date": td_str,
-            "open": _float(r[1]),
-            "high": _float(r[2]),
-            "low": _float(r[3]),
-            "close": _float(r[4]),
-            "volume": _float(r[5]) or 0,
-        }
-    dates_sorted = sorted(by_date.keys())
-    return [by_date[d] for d in dates_sorted]
-
-
 def _detect_cup_handle(days: list[dict]) -> Optional[str]:
     """
     简化杯柄：约 40 日内先有回落（杯），再回升并出现小幅回踩后收高（柄）。
@@ -150,28 +94,27 @@ def _detect_rising_three(days: list[dict]) -> Optional[str]:
     return d4["trade_date"]
 
 
+@instrumented("pattern_agent")
 def run_pattern_agent(codes: Optional[list[str]] = None, limit_codes: int = 8000) -> dict[str, Any]:
     """
     对指定或全量有日线数据的股票做形态识别，写入 stex.pattern_signal。
     codes 为空时：对有足够日线的股票全量扫描（受 limit_codes 限制）。
     """
     try:
-        with get_conn() as conn:
-            code_list = _get_codes_with_data(conn, codes, limit=limit_codes)
-        if not code_list:
-            return {"ok": True, "codes_processed": 0, "cup_handle": 0, "rising_three": 0, "message": "无足够日线数据的股票"}
-
         cup_handle_count = 0
         rising_three_count = 0
-        inserted = []
+        codes_processed = 0
 
+        # 流式按代码读取近 LOOKBACK_DAYS 日窗口（不足 40 日的跳过），拉取与识别重叠，全市场扫描内存恒定
         with get_conn() as conn:
-            for code in code_list:
-                days = _fetch_days(conn, code, limit=LOOKBACK_DAYS)
-                if len(days) < 40:
-                    continue
-                ref_cup = _detect_cup_handle(days)
-                ref_rise = _detect_rising_three(days)
+            windows = iter_code_windows(codes, limit=LOOKBACK_DAYS, min_rows=40, fields=["open", "high", "low", "close", "volume"])
+            for code, days in windows:
+                if codes_processed >= limit_codes:
+                    break
+                codes_processed += 1
+                with span("compute.detect"):
+                    ref_cup = _detect_cup_handle(days)
+                    ref_rise = _detect_rising_three(days)
                 with conn.cursor() as cur:
                     if ref_cup:
                         cur.execute(
@@ -196,6 +139,8 @@ def run_pattern_agent(codes: Optional[list[str]] = None, limit_codes: int = 8000
                         if cur.rowcount and cur.rowcount > 0:
                             rising_three_count += 1
             conn.commit()
+        if not codes_processed:
+            return {"ok": True, "codes_processed": 0, "cup_handle": 0, "rising_three": 0, "message": "无足够日线数据的股票"}
 
         # 近 60 日形态信号总数（含历史运行写入的）
         with get_conn() as conn:
@@ -209,10 +154,10 @@ def run_pattern_agent(codes: Optional[list[str]] = None, limit_codes: int = 8000
 
         return {
             "ok": True,
-            "codes_processed": len(code_list),
+            "codes_processed": codes_processed,
             "cup_handle": cup_handle_total,
             "rising_three": rising_three_total,
-            "message": f"扫描 {len(code_list)} 只，近60日杯柄 {cup_handle_total} 条、上升三法 {rising_three_total} 条",
+            "message": f"扫描 {codes_processed} 只，近60日杯柄 {cup_handle_total} 条、上升三法 {rising_three_total} 条",
         }
     except Exception as e:
         logger.exception("pattern_agent")
@@ -0,0 +1,83 @@
+"""
+Agent：选股特征物化。按交易日为全市场每只股票计算一行宽表特征（quant.features），写入 stex.screen_daily。
+增量日线入库后自动执行；选股快照（quant.screener）优先读最新交易日的物化行。
+"""
+import logging
+import time
+from datetime import date
+from typing import Any, Optional
+
+import numpy as np
+
+from ..db import copy_upsert, get_conn
+from ..metrics import instrumented, span
+from ..quant.features import FLAG_FIELDS, NUMERIC_FIELDS, TEXT_FIELDS, compute_features
+from ..quant.screener import invalidate_snapshot
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ["trade_date", "code", "last_date"] + [f for f in TEXT_FIELDS if f != "code"] + NUMERIC_FIELDS + FLAG_FIELDS
+
+
+def _to_date(v) -> Optional[date]:
+    if v is None or v == "":
+        return None
+    if isinstance(v, date):
+        return v
+    s = str(v).strip().replace("-", "")[:8]
+    return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+
+
+def _rows(trade_date: date, features: dict[str, np.ndarray]):
+    """特征数组 -> COPY 行（NaN/NaT 转 None，numpy 标量转 Python 值）。"""
+    n = len(features["code"])
+    numeric = {f: features[f].tolist() for f in NUMERIC_FIELDS}
+    flags = {f: features[f].tolist() for f in FLAG_FIELDS}
+    last_date = [None if np.isnat(d) else d.item() for d in features["last_date"]]
+    for i in range(n):
+        yield (
+            trade_date,
+            features["code"][i],
+            last_date[i],
+            *(features[f][i] for f in TEXT_FIELDS if f != "code"),
+            *(None if v != v else v for v in (numeric[f][i] for f in NUMERIC_FIELDS)),
+            *(flags[f][i] for f in FLAG_FIELDS),
+        )
+
+
+@instrumented("screen_feature_agent")
+def run_screen_feature_agent(trade_date: Optional[str] = None) -> dict[str, Any]:
+    """
+    物化 trade_date（YYYY-MM-DD 或 YYYYMMDD；不传为 stock_day 最新交易日）的选股特征，按 (trade_date, code) 覆盖。
+    返回：{ ok, trade_date, rows, elapsed_sec, error }
+    """
+    t0 = time.time()
+    try:
+        with get_conn() as conn:
+            td = _to_date(trade_date)
+            if td is None:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT MAX(trade_date) FROM stex.stock_day")
+                    row = cur.fetchone()
+                td = row[0] if row else None
+            if td is None:
+                return {"ok": True, "trade_date": None, "rows": 0, "message": "暂无日线数据"}
+            with span("compute.features"):
+                features = compute_features(conn, td)
+            written = copy_upsert(
+                conn,
+                "stex.screen_daily",
+                _COLUMNS,
+                _rows(td, features),
+                key_columns=["trade_date", "code"],
+                extra_set="updated_at = NOW()",
+            )
+            conn.commit()
+        logger.info("screen_feature_agent: %s rows for %s", written, td)
+        return {"ok": True, "trade_date": str(td), "rows": written, "elapsed_sec": round(time.time() - t0, 2)}
+    except Exception as e:
+        logger.exception("screen_feature_agent failed")
+        return {"ok": False, "error": str(e), "trade_date": str(trade_date) if trade_date else None, "rows": 0}
+    finally:
+        # 无论物化成败，快照都需按新入库数据重建
+        invalidate_snapshot()
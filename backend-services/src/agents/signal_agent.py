@@ -8,7 +8,11 @@ from datetime import date, timedelta
 from decimal import Decimal
 from typing import Any, Optional
 
+from ..code_latest import touch_signal_dates
 from ..db import get_conn
+from ..metrics import instrumented, span
+from ..quant.params import load_signal_params
+from ..store.panel import get_panel
 
 logger = logging.getLogger(__name__)
 
@@ -49,91 +53,6 @@ def _get_codes(conn, codes: Optional[list[str]]) -> list[str]:
         return [str(r[0]) for r in cur.fetchall()]
 
 
-def _fetch_days(conn, code: str, limit: int = 65) -> list[dict]:
-    """近 limit 日 日线：trade_date, open, high, low, close, volume, turnover_rate（升序日期）"""
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT trade_date, open, high, low, close, volume, turnover_rate
-            FROM stex.stock_day WHERE code = %s ORDER BY trade_date DESC LIMIT %s
-            """,
-            (code, limit),
-        )
-        rows = cur.fetchall()
-    if not rows:
-        return []
-    by_date = {}
-    for r in rows:
-        td = r[0]
-        if hasattr(td, "isoformat"):
-            td = td.isoformat()[:10]
-        else:
-            td = str(td)[:10]
-        by_date[td] = {
-            "trade_date": td,
-            "open": _float(r[1]),
-            "high": _float(r[2]),
-            "low": _float(r[3]),
-            "close": _float(r[4]),
-            "volume": _float(r[5]) or 0,
-            "turnover_rate": _float(r[6]) if len(r) > 6 else None,
-        }
-    dates_sorted = sorted(by_date.keys())
-    return [by_date[d] for d in dates_sorted]
-
-
-def _fetch_technicals(conn, code: str, limit: int = 65) -> dict[str, dict]:
-    """trade_date -> { ma5, ma10, ma20 }"""
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT trade_date, ma5, ma10, ma20
-            FROM stex.technicals WHERE code = %s ORDER BY trade_date DESC LIMIT %s
-            """,
-            (code, limit),
-        )
-        rows = cur.fetchall()
-    out = {}
-    for r in rows:
-        td = r[0]
-        if hasattr(td, "isoformat"):
-            td = td.isoformat()[:10]
-        else:
-            td = str(td)[:10]
-        out[td] = {"ma5": _float(r[1]), "ma10": _float(r[2]), "ma20": _float(r[3])}
-    return out
-
-
-def _fetch_moneyflow(conn, code: str, limit: int = 65) -> dict[str, dict]:
-    """trade_date -> { net_mf_amount, buy_elg_amount, sell_elg_amount }"""
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT trade_date, net_mf_amount, buy_elg_amount, sell_elg_amount
-            FROM stex.moneyflow WHERE code = %s ORDER BY trade_date DESC LIMIT %s
-            """,
-            (code, limit),
-        )
-        rows = cur.fetchall()
-    out = {}
-    for r in rows:
-        td = r[0]
-        if hasattr(td, "isoformat"):
-            td = td.isoformat()[:10]
-        else:
-            td = str(td)[:10]
-        net = _float(r[1])
-        buy_elg = _float(r[2])
-        sell_elg = _float(r[3])
-        out[td] = {
-            "net_mf_amount": net,
-            "buy_elg_amount": buy_elg,
-            "sell_elg_amount": sell_elg,
-            "net_elg": (buy_elg - sell_elg) if (buy_elg is not None and sell_elg is not None) else None,
-        }
-    return out
-
-
 def _signal_vol_mf_ma20(
     day: dict,
     days: list[dict],
@@ -308,8 +227,8 @@ def _signal_support_resist(
     return DIR_NEUTRAL, "未触及关键支撑/阻力位"
 
 
-def _signal_turnover(day: dict) -> tuple[str, str]:
-    """换手率信号：交投清淡(0-3%)→减分，正常活跃(3-10%)→加分，异常活跃(>10%)→小幅加分。direction 存 交投清淡/正常活跃/异常活跃。"""
+def _signal_turnover(day: dict, low_th: float = 3.0, high_th: float = 10.0) -> tuple[str, str]:
+    """换手率信号：交投清淡(0-low_th%)→减分，正常活跃(low_th-high_th%)→加分，异常活跃(>high_th%)→小幅加分。direction 存 交投清淡/正常活跃/异常活跃。"""
     rate = day.get("turnover_rate")
     if rate is None:
         return DIR_NONE, "无换手率数据"
@@ -319,9 +238,9 @@ def _signal_turnover(day: dict) -> tuple[str, str]:
         return DIR_NONE, "换手率无效"
     if r < 0:
         return DIR_NONE, "换手率为负"
-    if r < 3:
+    if r < low_th:
         return "交投清淡", f"换手率{r:.2f}%"
-    if r <= 10:
+    if r <= high_th:
         return "正常活跃", f"换手率{r:.2f}%"
     return "异常活跃", f"换手率{r:.2f}%"
 
@@ -347,6 +266,7 @@ def _upsert_signal(
         )
 
 
+@instrumented("signal_agent")
 def run_signal_agent(codes: Optional[list[str]] = None, days_per_code: int = 30) -> dict[str, Any]:
     """
     对指定股票（或 watchlist 全部）计算 6 类投资信号并入库。
@@ -359,22 +279,27 @@ def run_signal_agent(codes: Optional[list[str]] = None, days_per_code: int = 30)
             if not code_list:
                 return {"ok": True, "codes_processed": 0, "signals_written": 0, "message": "暂无股票"}
 
+            # 信号阈值：app_config.signal_params（参数寻优结果），未配置为默认值
+            params = load_signal_params(conn, "stock")
+            # 近 65 日日线/技术指标/资金流一次装入共享面板，逐只按代码切片
+            with span("compute.panel"):
+                panel = get_panel(conn, code_list, kind="stock", limit=65)
             total_signals = 0
             for code in code_list:
-                days = _fetch_days(conn, code, limit=65)
-                tech = _fetch_technicals(conn, code, limit=65)
-                mf = _fetch_moneyflow(conn, code, limit=65)
+                days = panel.days(code)
+                tech = panel.technicals(code)
+                mf = panel.moneyflow(code)
                 dates_sorted = [d["trade_date"] for d in days]
                 # 只对最近 days_per_code 个交易日计算（避免重复历史）
                 for d in days[-days_per_code:]:
                     td = d["trade_date"]
-                    dir1, reason1 = _signal_vol_mf_ma20(d, days, tech, mf)
+                    dir1, reason1 = _signal_vol_mf_ma20(d, days, tech, mf, **params[SIG_VOL_MF_MA20])
                     _upsert_signal(conn, code, td, SIG_VOL_MF_MA20, dir1, reason1)
                     total_signals += 1
-                    dir2, reason2 = _signal_vol_pct(d, days)
+                    dir2, reason2 = _signal_vol_pct(d, days, **params[SIG_VOL_PCT])
                     _upsert_signal(conn, code, td, SIG_VOL_PCT, dir2, reason2)
                     total_signals += 1
-                    dir3, reason3 = _signal_sustained_mf(td, mf, look_days=5)
+                    dir3, reason3 = _signal_sustained_mf(td, mf, **params[SIG_SUSTAINED_MF])
                     _upsert_signal(conn, code, td, SIG_SUSTAINED_MF, dir3, reason3)
                     total_signals += 1
                     dir4, reason4 = _signal_ma_cross(td, tech, dates_sorted)
@@ -383,12 +308,14 @@ def run_signal_agent(codes: Optional[list[str]] = None, days_per_code: int = 30)
                     dir5, reason5 = _signal_main_force(td, mf)
                     _upsert_signal(conn, code, td, SIG_MAIN_FORCE, dir5, reason5)
                     total_signals += 1
-                    dir6, reason6 = _signal_support_resist(d, days, look=20)
+                    dir6, reason6 = _signal_support_resist(d, days, **params[SIG_SUPPORT_RESIST])
                     _upsert_signal(conn, code, td, SIG_SUPPORT_RESIST, dir6, reason6)
                     total_signals += 1
-                    dir7, reason7 = _signal_turnover(d)
+                    dir7, reason7 = _signal_turnover(d, **params[SIG_TURNOVER])
                     _upsert_signal(conn, code, td, SIG_TURNOVER, dir7, reason7)
                     total_signals += 1
+                if days:
+                    touch_signal_dates(conn, [(code, days[-1]["trade_date"])])
                 conn.commit()
         return {
             "ok": True,
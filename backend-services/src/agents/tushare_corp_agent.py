@@ -4,20 +4,17 @@ Agent：使用 Tushare Pro 采集 A 股上市公司基础数据，写入 stex.co
 - 市值、市盈率、市净率：来自 daily_basic（总市值单位：万元，入库为元）
 """
 import logging
-from datetime import date, datetime, timedelta
 from typing import Any, Optional
-from zoneinfo import ZoneInfo
 
-from ..collectors.corp import upsert_corp
-
-logger = logging.getLogger(__name__)
+import pandas as pd
 
+from ..collectors.corp import upsert_corps
+from ..collectors.stock import today_cn
+from ..collectors.tushare_cache import cached_pro
+from ..metrics import instrument, instrumented
+from ..trade_calendar import get_calendar
 
-def _ts_code_to_code(ts_code: str) -> str:
-    """600519.SH -> 600519"""
-    if not ts_code:
-        return ""
-    return str(ts_code).split(".")[0].strip()
+logger = logging.getLogger(__name__)
 
 
 def _market_stex(ts_code: str, market_tushare: Optional[str]) -> str:
@@ -47,6 +44,7 @@ def _market_stex(ts_code: str, market_tushare: Optional[str]) -> str:
     return ""
 
 
+@instrumented("tushare_corp_agent")
 def run_tushare_corp_agent() -> dict[str, Any]:
     """
     拉取 Tushare Pro stock_basic + daily_basic，写入 stex.corp。
@@ -63,7 +61,7 @@ def run_tushare_corp_agent() -> dict[str, Any]:
         return {"ok": False, "error": "请设置 TUSHARE_TOKEN（.env 或环境变量）", "total_upserted": 0}
 
     try:
-        pro = ts.pro_api(token)
+        pro = instrument(cached_pro(ts.pro_api(token)), "api.tushare")
     except Exception as e:
         return {"ok": False, "error": f"Tushare 初始化失败: {e}", "total_upserted": 0}
 
@@ -77,77 +75,37 @@ def run_tushare_corp_agent() -> dict[str, Any]:
         if basic_df is None or basic_df.empty:
             return {"ok": True, "total_upserted": 0, "message": "无股票列表"}
 
-        # 最新交易日（用于取 daily_basic），使用中国时区“今天”
-        end = datetime.now(ZoneInfo("Asia/Shanghai")).date()
-        start = end - timedelta(days=30)
-        cal_df = pro.trade_cal(
-            exchange="SSE",
-            start_date=start.strftime("%Y%m%d"),
-            end_date=end.strftime("%Y%m%d"),
-            is_open="1",
-        )
-        trade_date = ""
-        if cal_df is not None and not cal_df.empty and "cal_date" in cal_df.columns:
-            trade_date = str(cal_df["cal_date"].max() or "")
-        if not trade_date:
-            trade_date = end.strftime("%Y%m%d")
+        # 最新交易日（用于取 daily_basic），使用中国时区“今天”，查共享交易日历
+        trade_date = get_calendar(pro).prev(today_cn(), inclusive=True).strftime("%Y%m%d")
 
         # 全市场当日指标（PE/PB/总市值），总市值单位：万元
-        daily_map: dict[str, dict] = {}
+        daily_df = None
         try:
             daily_df = pro.daily_basic(
                 trade_date=trade_date,
                 fields="ts_code,trade_date,pe,pb,total_mv",
             )
-            if daily_df is not None and not daily_df.empty:
-                for _, r in daily_df.iterrows():
-                    tc = str(r.get("ts_code", "")).strip()
-                    if tc:
-                        daily_map[tc] = {
-                            "pe": r.get("pe"),
-                            "pb": r.get("pb"),
-                            "total_mv": r.get("total_mv"),
-                        }
         except Exception as e:
             logger.warning("daily_basic 拉取失败，仅写入基础信息: %s", e)
 
-        total = 0
-        for _, row in basic_df.iterrows():
-            ts_code = str(row.get("ts_code", "")).strip()
-            code = _ts_code_to_code(ts_code)
-            if not code or len(code) > 10:
-                continue
-            name = str(row.get("name", "")).strip() or None
-            industry = str(row.get("industry", "")).strip() or None
-            market_tushare = str(row.get("market", "")).strip() or None
-            market = _market_stex(ts_code, market_tushare) or None
-            list_date = row.get("list_date")
-            if hasattr(list_date, "item"):
-                list_date = list_date.item() if list_date is not None else None
-            pe, pb, market_cap = None, None, None
-            if ts_code in daily_map:
-                d = daily_map[ts_code]
-                pe = d.get("pe")
-                pb = d.get("pb")
-                # total_mv 万元 -> 元
-                mv = d.get("total_mv")
-                if mv is not None and mv == mv:
-                    try:
-                        market_cap = float(mv) * 1e4
-                    except (TypeError, ValueError):
-                        pass
-            upsert_corp(
-                code=code,
-                name=name,
-                market=market,
-                industry=industry,
-                sector=industry,
-                list_date=list_date,
-                market_cap=market_cap,
-                pe=pe,
-                pb=pb,
-            )
-            total += 1
+        df = basic_df[["ts_code", "name", "industry", "market", "list_date"]].copy()
+        df["ts_code"] = df["ts_code"].astype(str).str.strip()
+        if daily_df is not None and not daily_df.empty:
+            daily_df = daily_df.assign(ts_code=daily_df["ts_code"].astype(str).str.strip())
+            daily_df = daily_df.drop_duplicates("ts_code", keep="last")[["ts_code", "pe", "pb", "total_mv"]]
+            df = df.merge(daily_df, on="ts_code", how="left")
+        else:
+            df["pe"] = df["pb"] = df["total_mv"] = None
+        df["code"] = df["ts_code"].str.split(".").str[0].str.strip()
+        df["market"] = [
+            _market_stex(tc, m if isinstance(m, str) else None) or None
+            for tc, m in zip(df["ts_code"], df["market"])
+        ]
+        df["sector"] = df["industry"]
+        # total_mv 万元 -> 元
+        df["market_cap"] = pd.to_numeric(df["total_mv"], errors="coerce") * 1e4
+
+        total = upsert_corps(df)
 
         return {"ok": True, "total_upserted": total, "trade_date": trade_date}
     except Exception as e:
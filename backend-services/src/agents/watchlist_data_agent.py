@@ -4,13 +4,18 @@ Agent：针对已收藏跟踪的股票，用 Tushare 拉取日线、每日指标
 日线及 MA 使用通用行情接口 pro_bar（https://tushare.pro/document/2?doc_id=109）一次拉取。
 """
 import logging
-import time
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 from typing import Any, Optional
 from zoneinfo import ZoneInfo
 
+from ..code_latest import touch_trade_dates
+from ..collectors.tushare_cache import cached_pro
 from ..db import get_conn
+from ..metrics import instrument, instrumented, sleep
+from ..partitions import ensure_partitions
+from ..store.ohlcv_parquet import mark_dirty, sync_after_ingest
+from ..store.panel import invalidate_panels
 
 logger = logging.getLogger(__name__)
 DELAY = 0.3  # 请求间隔，避免限流
@@ -208,12 +213,15 @@ def _upsert_moneyflow(
         )
 
 
-def run_watchlist_data_agent(codes: Optional[list[str]] = None) -> dict[str, Any]:
+@instrumented("watchlist_data_agent")
+def run_watchlist_data_agent(codes: Optional[list[str]] = None, sync_store: bool = True) -> dict[str, Any]:
     """
     拉取指定股票（或 watchlist 全部）的日线（含 MA5/10/20）、每日指标、财务指标，写入对应表。
     日线与 MA 使用 Tushare 通用行情接口 pro_bar 一次拉取。
     codes 为空时拉取 watchlist 全部；否则只处理 codes 中的代码（可为单只）。
-    返回：{ ok, codes_processed, days_updated, error }
+    写入日线后标记日线列式镜像待同步；sync_store=True 时结束前增量同步镜像（全市场调度按批调用时传 False，全部批次后统一同步）。
+    返回：{ ok, codes_processed, days_updated, api_calls, api_errors, failed_codes, ohlcv_store, error }
+    failed_codes 为日线（pro_bar）请求失败的代码，供全市场调度重排重试。
     """
     from ..config import TUSHARE_TOKEN
     if not TUSHARE_TOKEN:
@@ -231,7 +239,7 @@ def run_watchlist_data_agent(codes: Optional[list[str]] = None) -> dict[str, Any
     if not codes:
         return {"ok": True, "codes_processed": 0, "days_updated": 0, "message": "暂无收藏跟踪股票"}
 
-    pro = ts.pro_api(TUSHARE_TOKEN)
+    pro = instrument(cached_pro(ts.pro_api(TUSHARE_TOKEN)), "api.tushare")
     # 使用中国时区“今天”作为 end_date，避免服务器在 UTC 等时区时少拉一天
     end = datetime.now(ZoneInfo("Asia/Shanghai")).date()
     start = end - timedelta(days=365 * 2)  # 最近约 2 年
@@ -241,13 +249,20 @@ def run_watchlist_data_agent(codes: Optional[list[str]] = None) -> dict[str, Any
     total_days = 0
     latest_trade_date_seen = None  # 实际从 Tushare 拿到的最大 trade_date
     latest_trade_date_code = None  # 哪只股票对应该最新日期
+    api_calls = 0
+    api_errors = 0
+    failed_codes = []
+    earliest_td = None  # 本次写入 stock_day（日线 / 换手率）的最早交易日，用于标记镜像
 
     with _ensure_conn() as conn:
+        # 日线按月分区：确保当月及未来分区已建（2 年回补中早于首个月分区的落 _history 分区）
+        ensure_partitions(conn, ["stex.stock_day"], start=start)
         for code in codes:
             ts_code = _code_to_ts_code(code)
             if not ts_code:
                 continue
-            time.sleep(DELAY)
+            sleep(DELAY)
+            api_calls += 1
             try:
                 # 日线 + MA5/10/20：使用通用行情接口 pro_bar，一次拉取
                 df = ts.pro_bar(
@@ -271,13 +286,20 @@ def run_watchlist_data_agent(codes: Optional[list[str]] = None) -> dict[str, Any
                         vol, amt = row.get("vol"), row.get("amount")
                         _upsert_stock_day(conn, code, td, o, h, l, c, vol, amt)
                         total_days += 1
+                        if earliest_td is None or td < earliest_td:
+                            earliest_td = td
                         ma5 = row.get("ma5") if "ma5" in row else None
                         ma10 = row.get("ma10") if "ma10" in row else None
                         ma20 = row.get("ma20") if "ma20" in row else None
                         _upsert_technicals(conn, code, td, ma5, ma10, ma20, None, None, None, None, None, None, None)
+                    if max_td:
+                        touch_trade_dates(conn, [(code, max_td)])
             except Exception as e:
                 logger.warning("pro_bar(daily) %s: %s", code, e)
-            time.sleep(DELAY)
+                api_errors += 1
+                failed_codes.append(code)
+            sleep(DELAY)
+            api_calls += 1
             try:
                 # 每日指标 -> fundamentals（按交易日）
                 dbasic = pro.daily_basic(ts_code=ts_code, start_date=start_str, end_date=end_str, fields="trade_date,pe,pb,ps,total_mv,turnover_rate")
@@ -290,13 +312,17 @@ def run_watchlist_data_agent(codes: Optional[list[str]] = None) -> dict[str, Any
                         _upsert_fundamentals(conn, code, td, r.get("pe"), r.get("pb"), r.get("ps"), mv, None, None, None, None)
                         if r.get("turnover_rate") is not None:
                             _update_stock_day_turnover(conn, code, td, r.get("turnover_rate"))
+                            if earliest_td is None or td < earliest_td:
+                                earliest_td = td
             except Exception as e:
                 logger.warning("daily_basic %s: %s", code, e)
-            time.sleep(DELAY)
+                api_errors += 1
+            sleep(DELAY)
+            api_calls += 2
             try:
                 # 财务指标（季度）：利润表 -> 营收、净利润；资产负债表 -> 总资产
                 inc = pro.income(ts_code=ts_code, start_date=start_str[:4] + "0101", end_date=end_str, report_type="1", fields="end_date,revenue,n_income")
-                time.sleep(DELAY)
+                sleep(DELAY)
                 bal = pro.balancesheet(ts_code=ts_code, start_date=start_str[:4] + "0101", end_date=end_str, report_type="1", fields="end_date,total_assets")
                 by_ed: dict[str, dict] = {}
                 if inc is not None and not inc.empty:
@@ -316,7 +342,9 @@ def run_watchlist_data_agent(codes: Optional[list[str]] = None) -> dict[str, Any
                     _upsert_financial(conn, code, ed, "季度", v.get("revenue"), v.get("net_profit"), v.get("total_assets"))
             except Exception as e:
                 logger.warning("income/balancesheet %s: %s", code, e)
-            time.sleep(DELAY)
+                api_errors += 1
+            sleep(DELAY)
+            api_calls += 1
             try:
                 # 每日资金流向：净流入汇总 + 小/中/大/特大单买卖额(万元)、买卖量(手)，需 Tushare 2000+ 积分
                 mf = pro.moneyflow(ts_code=ts_code, start_date=start_str, end_date=end_str)
@@ -349,8 +377,12 @@ def run_watchlist_data_agent(codes: Optional[list[str]] = None) -> dict[str, Any
                             )
             except Exception as e:
                 logger.warning("moneyflow %s: %s", code, e)
+                api_errors += 1
             logger.info("采集完成: %s", code)
         conn.commit()
+    invalidate_panels()
+    mark_dirty(earliest_td)
+    store_sync = sync_after_ingest() if sync_store else None
 
     if latest_trade_date_seen and len(latest_trade_date_seen) >= 8:
         y, m, d = latest_trade_date_seen[:4], int(latest_trade_date_seen[4:6]), int(latest_trade_date_seen[6:8])
@@ -360,7 +392,11 @@ def run_watchlist_data_agent(codes: Optional[list[str]] = None) -> dict[str, Any
         "ok": True,
         "codes_processed": len(codes),
         "days_updated": total_days,
+        "api_calls": api_calls,
+        "api_errors": api_errors,
+        "failed_codes": failed_codes,
         "request_date_range": {"start": start_str, "end": end_str},
+        "ohlcv_store": store_sync,
     }
     if latest_trade_date_seen:
         out["latest_trade_date_from_api"] = latest_trade_date_seen
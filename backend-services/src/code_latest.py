@@ -0,0 +1,179 @@
+"""
+每只股票的数据新鲜度 stex.code_latest（迁移 015 / 016）：最新日线日期、最新技术信号日、最新新闻舆论日、最近解析企业时间。
+各写入方在同一事务内调用 touch_*()（按代码取 GREATEST，只前进不回退）；
+「最旧优先」选批直接按对应列排序，O(代码数) 读取，无需聚合 stock_day / signals。
+未执行迁移时写入静默跳过（SAVEPOINT 回滚，不影响调用方事务），读取回退到逐代码索引探测。
+"""
+import logging
+from datetime import date, datetime
+from typing import Iterable, Optional, Union
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+# 与 agents.news_signal_agent.SIGNAL_TYPE_NEWS 一致
+NEWS_SIGNAL_TYPE = "新闻舆论"
+
+# 列 -> 未执行迁移时的逐代码探测（u 为代码全集别名）
+_FALLBACK = {
+    "last_trade_date": "SELECT trade_date FROM stex.stock_day d WHERE d.code = u.code ORDER BY d.trade_date DESC LIMIT 1",
+    "last_signal_date": (
+        "SELECT ref_date FROM stex.signals s WHERE s.code = u.code AND s.ref_date IS NOT NULL "
+        f"AND s.signal_type <> '{NEWS_SIGNAL_TYPE}' ORDER BY s.ref_date DESC LIMIT 1"
+    ),
+    "last_news_date": (
+        f"SELECT ref_date FROM stex.signals s WHERE s.signal_type = '{NEWS_SIGNAL_TYPE}' "
+        "AND s.code = u.code AND s.ref_date IS NOT NULL ORDER BY s.ref_date DESC LIMIT 1"
+    ),
+    "last_analysis_at": "SELECT updated_at FROM stex.corp_analysis a WHERE a.code = u.code",
+}
+_UNIVERSE = {"corp": "stex.corp", "watchlist": "stex.watchlist"}
+_MISSING = (psycopg.errors.UndefinedTable, psycopg.errors.UndefinedColumn)
+
+
+def _as_date(v: Union[date, str]) -> date:
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    s = str(v).strip().replace("-", "")[:8]
+    return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+
+
+def _touch(conn, column: str, rows: Iterable[tuple[str, Union[date, str]]]) -> int:
+    """(code, 日期) 批量推进 column（日期列），不提交事务。返回涉及的代码数。"""
+    latest: dict[str, date] = {}
+    for code, d in rows:
+        if not code or not d:
+            continue
+        d = _as_date(d)
+        if code not in latest or d > latest[code]:
+            latest[code] = d
+    if not latest:
+        return 0
+    try:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    INSERT INTO stex.code_latest AS l (code, {column})
+                    SELECT * FROM unnest(%s::text[], %s::date[])
+                    ON CONFLICT (code) DO UPDATE SET
+                      {column} = GREATEST(l.{column}, EXCLUDED.{column}),
+                      updated_at = NOW()
+                    """,
+                    (list(latest), list(latest.values())),
+                )
+    except _MISSING:
+        logger.debug("code_latest: %s 不存在（未执行迁移 015/016），跳过", column)
+        return 0
+    return len(latest)
+
+
+def touch_trade_dates(conn, rows: Iterable[tuple[str, Union[date, str]]]) -> int:
+    """日线入库：(code, trade_date) 推进 last_trade_date。"""
+    return _touch(conn, "last_trade_date", rows)
+
+
+def touch_signal_dates(conn, rows: Iterable[tuple[str, Union[date, str]]]) -> int:
+    """技术信号入库：(code, ref_date) 推进 last_signal_date。"""
+    return _touch(conn, "last_signal_date", rows)
+
+
+def touch_news_dates(conn, rows: Iterable[tuple[str, Union[date, str]]]) -> int:
+    """新闻舆论信号入库：(code, ref_date) 推进 last_news_date。"""
+    return _touch(conn, "last_news_date", rows)
+
+
+def touch_analysis(conn, codes: Iterable[str]) -> int:
+    """解析企业入库：last_analysis_at 记为当前时间，不提交事务。"""
+    codes = sorted({c for c in codes if c})
+    if not codes:
+        return 0
+    try:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO stex.code_latest AS l (code, last_analysis_at)
+                    SELECT unnest(%s::text[]), NOW()
+                    ON CONFLICT (code) DO UPDATE SET last_analysis_at = NOW(), updated_at = NOW()
+                    """,
+                    (codes,),
+                )
+    except _MISSING:
+        logger.debug("code_latest: last_analysis_at 不存在（未执行迁移 016），跳过")
+        return 0
+    return len(codes)
+
+
+def latest_trade_date(conn, code: str) -> Optional[date]:
+    """单只股票最新日线日期：主键查 code_latest，无记录或未迁移时按 (code, trade_date) 索引探测 stock_day。"""
+    try:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute("SELECT last_trade_date FROM stex.code_latest WHERE code = %s", (code,))
+                row = cur.fetchone()
+        if row and row[0]:
+            return row[0]
+    except _MISSING:
+        pass
+    with conn.cursor() as cur:
+        cur.execute("SELECT trade_date FROM stex.stock_day WHERE code = %s ORDER BY trade_date DESC LIMIT 1", (code,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def market_latest_trade_date(conn) -> Optional[date]:
+    """全市场已入库的最新日线日期：code_latest 取 MAX（O(代码数)），未迁移时聚合 stock_day。"""
+    try:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute("SELECT MAX(last_trade_date) FROM stex.code_latest")
+                row = cur.fetchone()
+        if row and row[0]:
+            return row[0]
+    except _MISSING:
+        pass
+    with conn.cursor() as cur:
+        cur.execute("SELECT MAX(trade_date) FROM stex.stock_day")
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def stalest_codes(conn, limit: int, column: str = "last_trade_date", universe: str = "corp") -> list[str]:
+    """
+    universe（corp 全市场 / watchlist 跟踪列表）中 column 最旧（无记录优先）的 limit 只。
+    column: last_trade_date | last_signal_date | last_news_date | last_analysis_at
+    """
+    if column not in _FALLBACK:
+        raise ValueError(f"未知新鲜度列: {column}；可选: {' | '.join(_FALLBACK)}")
+    table = _UNIVERSE[universe]
+    try:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT u.code FROM {table} u
+                    LEFT JOIN stex.code_latest l ON l.code = u.code
+                    ORDER BY l.{column} ASC NULLS FIRST, u.code
+                    LIMIT %s
+                    """,
+                    (limit,),
+                )
+                return [str(r[0]) for r in cur.fetchall()]
+    except _MISSING:
+        pass
+    # 未执行迁移：每只按索引只探测最新一行
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT u.code FROM {table} u
+            LEFT JOIN LATERAL ({_FALLBACK[column]}) x(last_value) ON TRUE
+            ORDER BY x.last_value ASC NULLS FIRST, u.code
+            LIMIT %s
+            """,
+            (limit,),
+        )
+        return [str(r[0]) for r in cur.fetchall()]
@@ -4,9 +4,13 @@
 """
 from datetime import date
 from decimal import Decimal
-from typing import Optional, Union
+from typing import Any, Optional, Union
 
-from ..db import get_conn
+from ..db import copy_upsert, get_conn
+
+CORP_COLUMNS = ["code", "name", "market", "industry", "sector", "list_date", "market_cap", "pe", "pb"]
+_TEXT_COLUMNS = ["code", "name", "market", "industry", "sector"]
+_NUM_COLUMNS = ["market_cap", "pe", "pb"]
 
 
 def _parse_date(v) -> Optional[date]:
@@ -68,3 +72,49 @@ def upsert_corp(
                 (code, name, market, industry, sector, list_d, cap, pe_val, pb_val),
             )
         conn.commit()
+
+
+def _normalize_corp_frame(records: Any):
+    """DataFrame 或 dict 记录列表 -> 规范化后的 DataFrame（列即 CORP_COLUMNS），整列向量化处理类型。"""
+    import numpy as np
+    import pandas as pd
+
+    df = records.copy() if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(list(records))
+    for c in CORP_COLUMNS:
+        if c not in df.columns:
+            df[c] = None
+    df = df[CORP_COLUMNS]
+    for c in _TEXT_COLUMNS:
+        s = df[c].astype("string").str.strip()
+        df[c] = s.mask(s.isin(["", "None", "nan", "NaN"]))
+    for c in _NUM_COLUMNS:
+        df[c] = pd.to_numeric(df[c], errors="coerce").replace([np.inf, -np.inf], np.nan)
+    ld = df["list_date"].astype("string").str.split("T").str[0].str.replace("-", "", regex=False)
+    df["list_date"] = pd.to_datetime(ld, format="%Y%m%d", errors="coerce").dt.date
+    df = df[df["code"].notna() & (df["code"].str.len() <= 10)]
+    return df
+
+
+def upsert_corps(records: Any) -> int:
+    """
+    批量写入或更新 stex.corp：records 为 DataFrame 或 dict 记录的可迭代对象（键同 upsert_corp 参数）。
+    整列规范化类型后 COPY 进暂存表，一条 INSERT ... ON CONFLICT 合并，仅一次连接与提交。
+    COALESCE 语义与 upsert_corp 一致：空值不覆盖库内原值；同一 code 多次出现时后出现的非空值生效。
+    返回写入的股票数（按 code 去重后）。
+    """
+    df = _normalize_corp_frame(records)
+    if df.empty:
+        return 0
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    with get_conn() as conn:
+        n = copy_upsert(
+            conn,
+            "stex.corp",
+            CORP_COLUMNS,
+            rows,
+            key_columns=["code"],
+            coalesce=True,
+            extra_set="updated_at = NOW()",
+        )
+        conn.commit()
+    return n
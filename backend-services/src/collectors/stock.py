@@ -1,18 +1,245 @@
 """
-股票数据采集占位。实际可接入：
-- akshare: 免费，安装 pip install akshare
-- tushare: 需 token，安装 pip install tushare
+股票行情采集：
+- 日线占位（日线入库见 agents.watchlist_data_agent / incremental_daily_agent）
+- 分钟线：1 分钟 K 线多数据源拉取（akshare / tushare / 本地文件回放），向量化聚合为 5/15/30/60 分钟，
+  按交易日分批 COPY 写入 stex.stock_min（interval_min 区分周期，1 分钟原始线为 1）
+分钟线成交量统一为「手」，与 stock_day 一致；trade_time 为 K 线结束时刻（北京时间），如 09:31、11:30、15:00。
 """
-# 示例：使用 akshare 获取日线（取消注释并安装 akshare 后使用）
-# import akshare as ak
-# def fetch_daily(code: str, start: str, end: str):
-#     df = ak.stock_zh_a_hist(symbol=code, start_date=start, end_date=end, adjust="qfq")
-#     return df
+import os
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..db import copy_upsert
+from .tushare_cache import cached_pro
+
+TZ = "Asia/Shanghai"
+MINUTE_COLUMNS = ["code", "trade_time", "open", "high", "low", "close", "volume"]
+AGG_INTERVALS = (5, 15, 30, 60)
+# 连续竞价时段（自 0 点起的分钟数）：上午 09:30-11:30、下午 13:00-15:00，各 120 分钟
+_AM_OPEN, _AM_CLOSE, _PM_OPEN, _PM_CLOSE = 570, 690, 780, 900
+_SESSION_MINUTES = 120
+# tushare stk_mins 单次最多返回 8000 行，按日历日分段请求（约 21 个交易日 × 241 根）
+_TUSHARE_SPAN_DAYS = 30
+
 
 def fetch_daily(code: str, start: str, end: str):
     """占位：返回空列表，接入数据源后返回 DataFrame 或 list of dict"""
     return []
 
-def fetch_minute(code: str, period: str = "15"):
-    """占位：分钟线"""
-    return []
+
+def _normalize(df: Optional[pd.DataFrame], code: str, start: date, end: date) -> pd.DataFrame:
+    """统一列名/类型/时区，只保留 [start, end] 内的连续竞价时段，按时间升序去重。"""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=MINUTE_COLUMNS)
+    out = pd.DataFrame(
+        {
+            "code": code,
+            "trade_time": pd.to_datetime(df["trade_time"]),
+            **{c: pd.to_numeric(df[c], errors="coerce").astype("float64") for c in ["open", "high", "low", "close", "volume"]},
+        }
+    )
+    if out["trade_time"].dt.tz is None:
+        out["trade_time"] = out["trade_time"].dt.tz_localize(TZ)
+    else:
+        out["trade_time"] = out["trade_time"].dt.tz_convert(TZ)
+    local_day = out["trade_time"].dt.date
+    mod = out["trade_time"].dt.hour * 60 + out["trade_time"].dt.minute
+    keep = (
+        out["close"].notna()
+        & (local_day >= start)
+        & (local_day <= end)
+        & (((mod >= _AM_OPEN) & (mod <= _AM_CLOSE)) | ((mod > _PM_OPEN) & (mod <= _PM_CLOSE)))
+    )
+    out = out[keep].drop_duplicates("trade_time", keep="last").sort_values("trade_time")
+    return out.reset_index(drop=True)
+
+
+def _akshare_minute(code: str, start: date, end: date) -> pd.DataFrame:
+    """东方财富 1 分钟线（akshare stock_zh_a_hist_min_em，仅近若干交易日），成交量单位为手。"""
+    try:
+        import akshare as ak
+    except ImportError:
+        raise RuntimeError("请安装 akshare: pip install akshare")
+    df = ak.stock_zh_a_hist_min_em(
+        symbol=code,
+        start_date=f"{start} 09:00:00",
+        end_date=f"{end} 15:30:00",
+        period="1",
+        adjust="",
+    )
+    if df is None or df.empty:
+        return df
+    return df.rename(columns={"时间": "trade_time", "开盘": "open", "最高": "high", "最低": "low", "收盘": "close", "成交量": "volume"})
+
+
+def _tushare_minute(code: str, start: date, end: date) -> pd.DataFrame:
+    """Tushare stk_mins 1 分钟线（按 _TUSHARE_SPAN_DAYS 分段），vol 为股，换算为手。"""
+    from ..agents.watchlist_data_agent import _code_to_ts_code
+    from ..config import TUSHARE_TOKEN
+
+    if not TUSHARE_TOKEN:
+        raise RuntimeError("请设置 TUSHARE_TOKEN")
+    try:
+        import tushare as ts
+    except ImportError:
+        raise RuntimeError("请安装 tushare: pip install tushare")
+    pro = cached_pro(ts.pro_api(TUSHARE_TOKEN))
+    frames = []
+    s = start
+    while s <= end:
+        e = min(end, s + timedelta(days=_TUSHARE_SPAN_DAYS - 1))
+        df = pro.stk_mins(
+            ts_code=_code_to_ts_code(code),
+            freq="1min",
+            start_date=f"{s} 09:00:00",
+            end_date=f"{e} 15:30:00",
+        )
+        if df is not None and not df.empty:
+            frames.append(df)
+        s = e + timedelta(days=1)
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    df["volume"] = pd.to_numeric(df["vol"], errors="coerce") / 100
+    return df
+
+
+def _file_minute(code: str, start: date, end: date) -> pd.DataFrame:
+    """本地回放：MINUTE_REPLAY_DIR 下 <code>.parquet 或 <code>.csv（列 trade_time, open, high, low, close, volume，成交量为手），用于测试与补录。"""
+    from ..config import MINUTE_REPLAY_DIR
+
+    if not MINUTE_REPLAY_DIR:
+        raise RuntimeError("请设置 MINUTE_REPLAY_DIR")
+    for ext, reader in ((".parquet", pd.read_parquet), (".csv", pd.read_csv)):
+        path = os.path.join(MINUTE_REPLAY_DIR, f"{code}{ext}")
+        if os.path.isfile(path):
+            return reader(path)
+    return pd.DataFrame()
+
+
+MINUTE_SOURCES: dict[str, Callable[[str, date, date], pd.DataFrame]] = {
+    "akshare": _akshare_minute,
+    "tushare": _tushare_minute,
+    "file": _file_minute,
+}
+
+
+def fetch_minute(code: str, start: date, end: date, source: str = "akshare") -> pd.DataFrame:
+    """
+    拉取单只股票 [start, end] 的 1 分钟线，返回 MINUTE_COLUMNS 列（trade_time 为北京时间 tz-aware）。
+    source 为 MINUTE_SOURCES 之一；未知数据源抛 ValueError，依赖缺失或未配置抛 RuntimeError。
+    """
+    fetcher = MINUTE_SOURCES.get(source)
+    if fetcher is None:
+        raise ValueError(f"未知分钟线数据源: {source}；可选: {' | '.join(MINUTE_SOURCES)}")
+    return _normalize(fetcher(code, start, end), code, start, end)
+
+
+def _session_minute(minute_of_day: np.ndarray) -> np.ndarray:
+    """K 线结束时刻 -> 当日第几个交易分钟（1～240）；09:30 开盘集合竞价那根并入第 1 分钟。"""
+    am = np.clip(minute_of_day - _AM_OPEN, 1, _SESSION_MINUTES)
+    pm = np.clip(minute_of_day - _PM_OPEN, 1, _SESSION_MINUTES) + _SESSION_MINUTES
+    return np.where(minute_of_day <= _AM_CLOSE, am, pm)
+
+
+def _bucket_clock(end_minute: np.ndarray) -> np.ndarray:
+    """第 n 个交易分钟 -> 自 0 点起的分钟数（上午 09:30 起，下午 13:00 起）。"""
+    return np.where(end_minute <= _SESSION_MINUTES, _AM_OPEN + end_minute, _PM_OPEN + end_minute - _SESSION_MINUTES)
+
+
+def check_intervals(intervals: Iterable[int]) -> list[int]:
+    """聚合周期去重升序（去掉 1 分钟）；不整除 120 分钟（会跨午休）的周期抛 ValueError。"""
+    out = sorted({int(n) for n in intervals} - {1})
+    bad = [n for n in out if n < 1 or _SESSION_MINUTES % n]
+    if bad:
+        raise ValueError(f"聚合周期需整除 {_SESSION_MINUTES} 分钟（不跨午休）: {bad}")
+    return out
+
+
+def aggregate_minutes(bars: pd.DataFrame, intervals: Iterable[int] = AGG_INTERVALS) -> pd.DataFrame:
+    """
+    1 分钟线 -> 各 interval 分钟线（interval 需整除 120；不跨午休、不跨日，trade_time 为周期结束时刻，如 60 分钟为 10:30/11:30/14:00/15:00）。
+    一次排序后每个周期只做一遍 reduceat：开=首根开、收=末根收、高/低=极值（忽略缺失）、量=求和。
+    返回 MINUTE_COLUMNS + interval_min。
+    """
+    intervals = check_intervals(intervals)
+    if bars.empty or not intervals:
+        return pd.DataFrame(columns=MINUTE_COLUMNS + ["interval_min"])
+    df = bars.sort_values(["code", "trade_time"], kind="stable").reset_index(drop=True)
+    local = df["trade_time"].dt.tz_convert(TZ)
+    day = local.dt.normalize()
+    session = _session_minute((local.dt.hour * 60 + local.dt.minute).to_numpy())
+    code_id = pd.factorize(df["code"])[0]
+    day_id = (local.dt.year * 10000 + local.dt.month * 100 + local.dt.day).to_numpy()
+    o, h, l, c = (df[k].to_numpy(dtype=np.float64) for k in ["open", "high", "low", "close"])
+    v = np.nan_to_num(df["volume"].to_numpy(dtype=np.float64))
+    codes = df["code"].to_numpy()
+    frames = []
+    for n in intervals:
+        bucket = -(-session // n)
+        change = np.ones(len(df), dtype=bool)
+        change[1:] = (code_id[1:] != code_id[:-1]) | (day_id[1:] != day_id[:-1]) | (bucket[1:] != bucket[:-1])
+        starts = np.flatnonzero(change)
+        ends = np.append(starts[1:], len(df)) - 1
+        clock = _bucket_clock(bucket[starts] * n)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "code": codes[starts],
+                    "trade_time": day.iloc[starts].reset_index(drop=True) + pd.to_timedelta(clock, unit="m"),
+                    "open": o[starts],
+                    "high": np.fmax.reduceat(h, starts),
+                    "low": np.fmin.reduceat(l, starts),
+                    "close": c[ends],
+                    "volume": np.add.reduceat(v, starts),
+                    "interval_min": n,
+                }
+            )
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+def _copy_rows(df: pd.DataFrame) -> Iterable[tuple]:
+    def num(a: np.ndarray) -> list:
+        return [None if x != x else x for x in a.tolist()]
+
+    vol = df["volume"].to_numpy(dtype=np.float64)
+    volume = [None if x != x else int(round(x)) for x in vol.tolist()]
+    return zip(
+        df["code"].tolist(),
+        df["trade_time"].dt.to_pydatetime().tolist(),
+        *(num(df[k].to_numpy(dtype=np.float64)) for k in ["open", "high", "low", "close"]),
+        volume,
+        df["interval_min"].astype(int).tolist(),
+    )
+
+
+def save_minute_bars(conn, bars: pd.DataFrame) -> int:
+    """
+    分钟线（MINUTE_COLUMNS + interval_min）按交易日分批 COPY upsert 到 stex.stock_min，每个交易日提交一次，
+    单个事务只覆盖一天数据。返回写入行数。
+    """
+    if bars.empty:
+        return 0
+    written = 0
+    day = bars["trade_time"].dt.tz_convert(TZ).dt.date
+    for _, part in bars.groupby(day, sort=True):
+        written += copy_upsert(
+            conn,
+            "stex.stock_min",
+            MINUTE_COLUMNS + ["interval_min"],
+            _copy_rows(part),
+            key_columns=["code", "trade_time", "interval_min"],
+        )
+        conn.commit()
+    return written
+
+
+def today_cn() -> date:
+    """北京时间今日（服务器可能在 UTC 等时区）。"""
+    from zoneinfo import ZoneInfo
+
+    return datetime.now(ZoneInfo(TZ)).date()
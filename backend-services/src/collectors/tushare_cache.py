@@ -0,0 +1,164 @@
+"""
+Tushare 响应缓存（录制 / 回放）：包装 pro 客户端，按 接口名 + 参数 将返回的 DataFrame 存为 Parquet，
+重复请求直接读本地，不再消耗每日配额。
+- 历史已收盘日期（参数中的 trade_date / end_date / cal_date 等均早于北京时间今日）且非空的结果永久有效
+- 涉及今日及以后、未带日期或结果为空的请求按 TUSHARE_CACHE_TTL_SEC 过期后重新拉取
+- TUSHARE_CACHE_MODE=replay 时只读缓存，未命中抛 ReplayMiss，不访问网络（基准、离线调试）
+pro_bar 传入 api=包装后的 pro 时，其内部的 daily / adj_factor 等请求同样走缓存。
+依赖 pyarrow（pip install pyarrow）。
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Optional
+
+from ..metrics import count
+
+logger = logging.getLogger(__name__)
+
+MODES = ("record", "replay")
+# 视为「数据截止日」的参数；全部早于今日时结果不再变化
+DATE_PARAMS = ("trade_date", "end_date", "cal_date", "period", "ann_date")
+META_KEY = b"tushare_cache"
+
+
+class ReplayMiss(LookupError):
+    """回放模式下缓存未命中。"""
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("请安装 pyarrow: pip install pyarrow") from e
+
+
+def _params(args: tuple, kwargs: dict) -> dict:
+    """规范化参数：去掉 None 与客户端对象，位置参数记为 _0、_1…（如 query(api_name, ...)）。"""
+    out = {f"_{i}": a for i, a in enumerate(args)}
+    for k, v in kwargs.items():
+        if v is None or k == "api":
+            continue
+        out[k] = list(v) if isinstance(v, (list, tuple)) else v
+    return out
+
+
+def cache_key(endpoint: str, params: dict) -> str:
+    raw = json.dumps([endpoint, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _closed(params: dict, today: str) -> bool:
+    """参数中的截止日均早于今日（YYYYMMDD 比较）则为已收盘的历史请求；无截止日参数时不是。"""
+    dates = [str(params[k]).replace("-", "")[:8] for k in DATE_PARAMS if params.get(k)]
+    return bool(dates) and all(d.isdigit() and len(d) == 8 and d < today for d in dates)
+
+
+class TushareCache:
+    """目录结构：<cache_dir>/<endpoint>/<sha1>.parquet，接口名、参数、拉取时间与是否永久有效写在 Parquet 元数据里。"""
+
+    def __init__(self, cache_dir: str, mode: str = "record", ttl_sec: int = 900):
+        if mode not in MODES:
+            raise ValueError(f"未知 TUSHARE_CACHE_MODE: {mode}；可选: {' | '.join(MODES)}")
+        _require_pyarrow()
+        self.cache_dir, self.mode, self.ttl_sec = cache_dir, mode, ttl_sec
+
+    def _path(self, endpoint: str, key: str) -> str:
+        return os.path.join(self.cache_dir, endpoint, f"{key}.parquet")
+
+    def get(self, endpoint: str, params: dict):
+        """命中返回 DataFrame；不存在或（录制模式下）已过期返回 None。回放模式忽略过期。"""
+        import pyarrow.parquet as pq
+
+        path = self._path(endpoint, cache_key(endpoint, params))
+        if not os.path.isfile(path):
+            return None
+        try:
+            if self.mode == "record":
+                meta = json.loads((pq.read_schema(path).metadata or {}).get(META_KEY, b"{}"))
+                if not meta.get("immutable") and time.time() - meta.get("fetched_at", 0) > self.ttl_sec:
+                    return None
+            return pq.read_table(path).to_pandas()
+        except Exception as e:
+            logger.warning("tushare cache read %s failed: %s", path, e)
+            return None
+
+    def put(self, endpoint: str, params: dict, df, immutable: bool) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = self._path(endpoint, cache_key(endpoint, params))
+        meta = {"endpoint": endpoint, "params": params, "fetched_at": time.time(), "immutable": immutable}
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), META_KEY: json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8")})
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            pq.write_table(table, tmp)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning("tushare cache write %s failed: %s", path, e)
+
+    def call(self, endpoint: str, fn, args: tuple, kwargs: dict):
+        import pandas as pd
+
+        params = _params(args, kwargs)
+        df = self.get(endpoint, params)
+        if df is not None:
+            count("tushare_cache.hit")
+            return df
+        if self.mode == "replay":
+            raise ReplayMiss(f"Tushare 回放缓存未命中: {endpoint} {json.dumps(params, ensure_ascii=False, default=str)}")
+        count("tushare_cache.miss")
+        df = fn(*args, **kwargs)
+        if isinstance(df, pd.DataFrame):
+            from .stock import today_cn
+
+            self.put(endpoint, params, df, immutable=not df.empty and _closed(params, today_cn().strftime("%Y%m%d")))
+        return df
+
+
+class _CachedPro:
+    """pro 客户端代理：公开方法调用经 TushareCache，其余属性透传；回放模式下原客户端可为 None。"""
+
+    def __init__(self, pro: Any, cache: TushareCache):
+        self._pro = pro
+        self._cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._cache.mode == "replay":
+            # 回放不访问原客户端（可为 None）
+            attr = None
+        else:
+            attr = getattr(self._pro, name)
+            if not callable(attr):
+                return attr
+
+        def call(*args, **kwargs):
+            return self._cache.call(name, attr, args, kwargs)
+
+        return call
+
+
+def cached_pro(
+    pro: Any,
+    cache_dir: Optional[str] = None,
+    mode: Optional[str] = None,
+    ttl_sec: Optional[int] = None,
+) -> Any:
+    """按 TUSHARE_CACHE_DIR / MODE / TTL_SEC 包装 pro；未配置缓存目录时原样返回。"""
+    from ..config import TUSHARE_CACHE_DIR, TUSHARE_CACHE_MODE, TUSHARE_CACHE_TTL_SEC
+
+    cache_dir = cache_dir if cache_dir is not None else TUSHARE_CACHE_DIR
+    if not cache_dir:
+        return pro
+    cache = TushareCache(
+        cache_dir,
+        mode=(mode or TUSHARE_CACHE_MODE).strip().lower(),
+        ttl_sec=TUSHARE_CACHE_TTL_SEC if ttl_sec is None else ttl_sec,
+    )
+    return _CachedPro(pro, cache)
@@ -11,12 +11,48 @@ PG_PASSWORD = os.getenv("PG_PASSWORD", "")
 
 MOONSHOT_API_KEY = os.getenv("MOONSHOT_API_KEY", "")
 MOONSHOT_BASE_URL = os.getenv("MOONSHOT_BASE_URL", "https://api.moonshot.cn/v1")
+# /api/llm 共享客户端：同时进行的请求上限、排队等待上限（秒，超时返回 503）、单次请求超时（秒）、连接池大小
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_QUEUE_TIMEOUT_SEC = float(os.getenv("LLM_QUEUE_TIMEOUT_SEC", "10"))
+LLM_TIMEOUT_SEC = float(os.getenv("LLM_TIMEOUT_SEC", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+# /api/llm 提示词缓存：条目上限（0 关闭）、有效期（秒）、近似匹配方式（默认 off 只做精确匹配 | ngram | sentence-transformers 模型名）与余弦相似度阈值
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+LLM_CACHE_TTL_SEC = float(os.getenv("LLM_CACHE_TTL_SEC", "3600"))
+LLM_CACHE_EMBEDDING = (os.getenv("LLM_CACHE_EMBEDDING") or "off").strip()
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0.95"))
+# Agent 组装提示词时按此上下文窗口（token）扣除输出 max_tokens 后分配数据段预算（moonshot-v1-8k 为 8192）
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "8192"))
 
 # 数据源：tushare | akshare。corp_agent 采集时按此切换
 DATA_SOURCE = os.getenv("DATA_SOURCE", "akshare").strip().lower()
 TUSHARE_TOKEN = os.getenv("TUSHARE_TOKEN", "").strip()
+# Tushare 响应缓存（Parquet）：目录留空不启用；模式 record（读缓存 + 未命中录制）| replay（只读，不访问网络）；
+# 今日 / 无日期参数 / 空结果按 TTL（秒）过期，已收盘历史日期的结果永久有效
+TUSHARE_CACHE_DIR = (os.getenv("TUSHARE_CACHE_DIR") or "").strip()
+TUSHARE_CACHE_MODE = (os.getenv("TUSHARE_CACHE_MODE") or "record").strip().lower()
+TUSHARE_CACHE_TTL_SEC = int(os.getenv("TUSHARE_CACHE_TTL_SEC", "900"))
+# 指数采集分组（逗号分隔）：core 核心大盘指数（始终采集）| sw_l1 / sw_l2 申万一 / 二级行业 | csi_industry 中证行业指数
+INDEX_UNIVERSE = (os.getenv("INDEX_UNIVERSE") or "core,sw_l1,sw_l2,csi_industry").strip()
 
 PORT = int(os.getenv("PORT", "8000"))
 
 # 新闻舆论 agent：RSSHub 实例 base URL（可选）。配置后将从 财联社/证券时报/中证网/雪球 等 RSS 路由拉取
 RSSHUB_BASE_URL = (os.getenv("RSSHUB_BASE_URL") or "").strip().rstrip("/")
+
+# 日线列式镜像（Parquet，按月分区）目录；留空则不启用。各日线入库路径写入后自动增量同步，回测装载优先读镜像
+OHLCV_STORE_DIR = (os.getenv("OHLCV_STORE_DIR") or "").strip()
+
+# 选股引擎内存快照有效期（秒）；增量日线入库后立即作废
+SCREEN_SNAPSHOT_TTL = int(os.getenv("SCREEN_SNAPSHOT_TTL", "300"))
+
+# 分钟线数据源：akshare | tushare | file（本地回放，读 MINUTE_REPLAY_DIR 下 <code>.parquet / <code>.csv）；留空同 DATA_SOURCE
+MINUTE_SOURCE = (os.getenv("MINUTE_SOURCE") or DATA_SOURCE).strip().lower()
+MINUTE_REPLAY_DIR = (os.getenv("MINUTE_REPLAY_DIR") or "").strip()
+
+# 分钟线分区保留天数（分区维护时更早的日分区归档到 stex_archive）；0 为不清理
+STOCK_MIN_RETENTION_DAYS = int(os.getenv("STOCK_MIN_RETENTION_DAYS", "0"))
+
+# 全市场日线采集调度：并发采集线程数、批间隔初值（秒，随限流/错误自适应增减）
+FULL_MARKET_WORKERS = int(os.getenv("FULL_MARKET_WORKERS", "2"))
+FULL_MARKET_DELAY_SEC = float(os.getenv("FULL_MARKET_DELAY_SEC", "10"))
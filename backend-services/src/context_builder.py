@@ -0,0 +1,315 @@
+"""
+LLM 提示词上下文构建：按 token 预算装配各数据段，长数值序列压缩为紧凑统计，替代按行 / 按字符的硬截断。
+- estimate_tokens：粗估 token 数（中文约 1 字 1 token，其余约 3 字符 1 token，数字密集文本偏保守）
+- summarize_bars：日线 → 区间涨跌、高低点、趋势斜率与拟合度、均线排列与交叉、量比、最大回撤、异动日，附最近几根 K 线
+- summarize_series：单条指标序列 → 最新值、区间、均值、斜率，可选零轴穿越（MACD 柱）与超买超卖天数（RSI）
+- ContextBuilder：分段登记（标题、正文、优先级），build(budget) 时高优先级先占预算，放不下的段按行截短或整段舍弃，
+  输出仍按登记顺序；截短 / 舍弃计入 context.trimmed / context.dropped
+- prompt_budget：模型上下文（LLM_CONTEXT_TOKENS）减去输出 max_tokens、固定提示词与余量，得到数据段可用预算
+"""
+import math
+import re
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from .metrics import count
+
+_CJK = re.compile(r"[　-〿一-鿿＀-￯]")
+SAFETY_TOKENS = 200  # 估算误差与消息封装的余量
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 3)
+
+
+def prompt_budget(max_tokens: int, *fixed: str, context_tokens: Optional[int] = None) -> int:
+    """上下文窗口 - 输出 max_tokens - 固定提示词 - 余量；不低于 256。"""
+    if context_tokens is None:
+        from .config import LLM_CONTEXT_TOKENS
+
+        context_tokens = LLM_CONTEXT_TOKENS
+    used = max_tokens + SAFETY_TOKENS + sum(estimate_tokens(s) for s in fixed)
+    return max(256, context_tokens - used)
+
+
+def truncate_to_tokens(text: str, budget: int, ellipsis: str = "…") -> str:
+    """按字符截到不超过 budget（估算）；尽量在句读处断开。"""
+    if estimate_tokens(text) <= budget:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    cut = text[:lo]
+    for sep in ("\n", "。", "；", "，", " "):
+        i = cut.rfind(sep)
+        if i >= lo * 0.7:
+            cut = cut[: i + 1]
+            break
+    return cut.rstrip() + ellipsis if cut else ""
+
+
+def _fmt(v: Optional[float], nd: int = 2) -> str:
+    if v is None or not np.isfinite(v):
+        return "-"
+    return f"{v:.{nd}f}"
+
+
+def _amount(v: Optional[float]) -> str:
+    """成交量 / 额等大数：亿、万。"""
+    if v is None or not np.isfinite(v):
+        return "-"
+    a = abs(v)
+    if a >= 1e8:
+        return f"{v / 1e8:.2f}亿"
+    if a >= 1e4:
+        return f"{v / 1e4:.1f}万"
+    return f"{v:.0f}"
+
+
+def _arr(values: Sequence[Any]) -> np.ndarray:
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+def _slope(y: np.ndarray) -> tuple[float, float]:
+    """线性回归斜率与 R²（忽略 NaN）。"""
+    x = np.arange(len(y), dtype=np.float64)
+    ok = np.isfinite(y)
+    if ok.sum() < 3:
+        return float("nan"), float("nan")
+    x, y = x[ok], y[ok]
+    b, a = np.polyfit(x, y, 1)
+    resid = y - (a + b * x)
+    ss = float(((y - y.mean()) ** 2).sum())
+    return float(b), (1.0 - float((resid**2).sum()) / ss) if ss > 0 else 0.0
+
+
+def _ma(c: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(c), np.nan)
+    if len(c) >= n:
+        cs = np.cumsum(np.insert(c, 0, 0.0))
+        out[n - 1 :] = (cs[n:] - cs[:-n]) / n
+    return out
+
+
+def summarize_bars(
+    dates: Sequence[str],
+    open_: Sequence[Any],
+    high: Sequence[Any],
+    low: Sequence[Any],
+    close: Sequence[Any],
+    volume: Sequence[Any],
+    amount: Optional[Sequence[Any]] = None,
+    tail: int = 5,
+) -> str:
+    """日线（升序）压缩为统计摘要 + 最近 tail 根 K 线。"""
+    n = len(dates)
+    if n == 0:
+        return ""
+    o, h, l, c, v = _arr(open_), _arr(high), _arr(low), _arr(close), _arr(volume)
+    lines = []
+    chg = (c[-1] / c[0] - 1) * 100 if c[0] else float("nan")
+    lines.append(f"区间 {dates[0]}~{dates[-1]}（{n} 个交易日）：收盘 {_fmt(c[0])}→{_fmt(c[-1])}，涨跌 {_fmt(chg)}%")
+    if np.isfinite(h).any() and np.isfinite(l).any():
+        ih, il = int(np.nanargmax(h)), int(np.nanargmin(l))
+        amp = (h[ih] / l[il] - 1) * 100 if l[il] else float("nan")
+        lines.append(f"最高 {_fmt(h[ih])}（{dates[ih]}），最低 {_fmt(l[il])}（{dates[il]}），区间振幅 {_fmt(amp)}%")
+
+    ret = np.diff(c) / c[:-1] * 100 if n > 1 else np.array([])
+    logc = np.log(np.where(c > 0, c, np.nan))
+    b, r2 = _slope(logc)
+    if np.isfinite(b):
+        trend = f"趋势斜率 {_fmt((math.exp(b) - 1) * 100)}%/日（R² {_fmt(r2)}）"
+        if n >= 15:
+            b10, _ = _slope(logc[-10:])
+            trend += f"，近10日 {_fmt((math.exp(b10) - 1) * 100)}%/日"
+        if len(ret):
+            trend += f"，日波动率 {_fmt(float(np.nanstd(ret)))}%"
+        lines.append(trend)
+
+    ma5, ma10, ma20 = _ma(c, 5), _ma(c, 10), _ma(c, 20)
+    if np.isfinite(ma10[-1]):
+        m5, m10, m20 = ma5[-1], ma10[-1], ma20[-1]
+        parts = [f"MA5 {_fmt(m5)}", f"MA10 {_fmt(m10)}"]
+        if np.isfinite(m20):
+            parts.append(f"MA20 {_fmt(m20)}")
+            if c[-1] > m5 > m10 > m20:
+                state = "多头排列"
+            elif c[-1] < m5 < m10 < m20:
+                state = "空头排列"
+            else:
+                state = "均线交织，收盘在 MA20 " + ("之上" if c[-1] >= m20 else "之下")
+            parts.append(state)
+        diff = ma5 - ma10
+        ok = np.isfinite(diff)
+        sign = np.sign(diff[ok])
+        idx = np.flatnonzero(ok)
+        flips = np.flatnonzero(sign[1:] * sign[:-1] < 0)
+        if len(flips):
+            i = idx[flips[-1] + 1]
+            parts.append(f"最近 MA5/MA10 {'金叉' if diff[i] > 0 else '死叉'}于 {dates[i]}")
+        lines.append("均线：" + "，".join(parts))
+
+    if n >= 10 and np.isfinite(v).any():
+        recent, prior = np.nanmean(v[-5:]), np.nanmean(v[:-5])
+        if prior and np.isfinite(prior):
+            lines.append(f"量能：近5日均量 {_amount(recent)}，为此前均量的 {_fmt(recent / prior)} 倍")
+
+    peak = np.fmax.accumulate(np.where(np.isfinite(c), c, -np.inf))
+    dd = (c / peak - 1) * 100
+    if np.isfinite(dd).any() and np.nanmin(dd) < 0:
+        j = int(np.nanargmin(dd))
+        i = int(np.argmax(c[: j + 1] == peak[j]))
+        lines.append(f"最大回撤 {_fmt(float(dd[j]))}%（{dates[i]}→{dates[j]}）")
+
+    if len(ret) >= 3:
+        top = np.argsort(-np.abs(np.nan_to_num(ret)))[:2]
+        moves = [f"{dates[i + 1]} {'+' if ret[i] > 0 else ''}{_fmt(ret[i])}%" for i in sorted(top) if abs(ret[i]) >= 3]
+        if moves:
+            lines.append("异动：" + "，".join(moves))
+        if n >= 10 and np.isfinite(c[-1]):
+            if c[-1] >= np.nanmax(c):
+                lines.append(f"最新收盘为 {n} 日新高")
+            elif c[-1] <= np.nanmin(c):
+                lines.append(f"最新收盘为 {n} 日新低")
+
+    if tail > 0:
+        amt = _arr(amount) if amount is not None else None
+        lines.append(f"最近{min(tail, n)}日：")
+        for i in range(max(0, n - tail), n):
+            row = f"{dates[i]} O:{_fmt(o[i])} H:{_fmt(h[i])} L:{_fmt(l[i])} C:{_fmt(c[i])} 量:{_amount(v[i])}"
+            if amt is not None:
+                row += f" 额:{_amount(amt[i])}"
+            lines.append(row)
+    return "\n".join(lines)
+
+
+def summarize_series(
+    label: str,
+    dates: Sequence[str],
+    values: Sequence[Any],
+    nd: int = 2,
+    zero_cross: bool = False,
+    bands: Optional[tuple[float, float]] = None,
+) -> str:
+    """单条序列（升序）一行摘要；zero_cross 报最近一次穿越零轴，bands=(低, 高) 报区间外天数。"""
+    y = _arr(values)
+    ok = np.isfinite(y)
+    if not ok.any():
+        return ""
+    last = int(np.flatnonzero(ok)[-1])
+    b, _ = _slope(y)
+    parts = [
+        f"{label} 最新 {_fmt(y[last], nd)}（{dates[last]}）",
+        f"区间 {_fmt(float(np.nanmin(y)), nd)}~{_fmt(float(np.nanmax(y)), nd)}",
+        f"均值 {_fmt(float(np.nanmean(y)), nd)}",
+    ]
+    if np.isfinite(b):
+        parts.append(f"斜率 {'+' if b > 0 else ''}{_fmt(b, nd)}/日")
+    if zero_cross:
+        idx = np.flatnonzero(ok)
+        sign = np.sign(y[idx])
+        flips = np.flatnonzero(sign[1:] * sign[:-1] < 0)
+        if len(flips):
+            i = idx[flips[-1] + 1]
+            parts.append(f"{dates[i]} {'上穿' if y[i] > 0 else '下穿'}零轴")
+    if bands is not None:
+        lo, hi = bands
+        above, below = int((y[ok] > hi).sum()), int((y[ok] < lo).sum())
+        if above:
+            parts.append(f"{above} 日高于 {hi:g}")
+        if below:
+            parts.append(f"{below} 日低于 {lo:g}")
+    return "，".join(parts)
+
+
+def dedupe_snippets(snippets: Sequence[str], prefix_chars: int = 40) -> list[str]:
+    """去掉空白 / 全半角规范化后开头相同的重复片段（多源转载同一条新闻），保持原顺序。"""
+    from .llm_cache import normalize
+
+    seen, out = set(), []
+    for s in snippets:
+        s = (s or "").strip()
+        if not s:
+            continue
+        key = normalize(s)[:prefix_chars]
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(s)
+    return out
+
+
+class ContextBuilder:
+    """
+    分段装配：add(标题, 正文, priority) 登记，build(budget) 时按优先级（大者先，同级按登记顺序）占用预算。
+    放不下的段若剩余预算 ≥ min_tokens 则保留前若干行（调用方把最重要的行放前面），最后一行可按字符截短；否则整段舍弃。
+    """
+
+    def __init__(self, header: str = ""):
+        self.header = header.strip()
+        self._sections: list[dict[str, Any]] = []
+        self.trimmed: list[str] = []
+        self.dropped: list[str] = []
+
+    def add(self, title: str, body: Any, priority: int = 0, min_tokens: int = 40) -> "ContextBuilder":
+        if isinstance(body, (list, tuple)):
+            lines = [str(x) for x in body if x]
+        else:
+            lines = [x for x in str(body or "").split("\n") if x.strip()]
+        if lines:
+            self._sections.append({"title": title, "lines": lines, "priority": priority, "min_tokens": min_tokens})
+        return self
+
+    def _fit(self, sec: dict[str, Any], budget: int) -> Optional[str]:
+        head = f"【{sec['title']}】" if sec["title"] else ""
+        used = estimate_tokens(head) + 1
+        kept: list[str] = []
+        for line in sec["lines"]:
+            t = estimate_tokens(line) + 1
+            if used + t <= budget:
+                kept.append(line)
+                used += t
+                continue
+            if budget - used >= sec["min_tokens"] or not kept:
+                cut = truncate_to_tokens(line, budget - used - 1)
+                if cut:
+                    kept.append(cut)
+            break
+        if not kept:
+            return None
+        return "\n".join(([head] if head else []) + kept)
+
+    def build(self, budget: int) -> str:
+        self.trimmed, self.dropped = [], []
+        remaining = budget - estimate_tokens(self.header) - 2
+        order = sorted(range(len(self._sections)), key=lambda i: -self._sections[i]["priority"])
+        texts: dict[int, str] = {}
+        for i in order:
+            sec = self._sections[i]
+            full = (f"【{sec['title']}】\n" if sec["title"] else "") + "\n".join(sec["lines"])
+            cost = estimate_tokens(full) + 2
+            if cost <= remaining:
+                texts[i] = full
+                remaining -= cost
+                continue
+            part = self._fit(sec, remaining - 2) if remaining - 2 >= sec["min_tokens"] else None
+            if part is None:
+                self.dropped.append(sec["title"])
+                count("context.dropped")
+                continue
+            texts[i] = part
+            remaining -= estimate_tokens(part) + 2
+            self.trimmed.append(sec["title"])
+            count("context.trimmed")
+        body = "\n\n".join(texts[i] for i in sorted(texts))
+        if not self.header:
+            return body
+        return self.header + ("\n\n" + body if body else "")
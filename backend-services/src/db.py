@@ -1,11 +1,86 @@
+import itertools
 import psycopg
 from contextlib import contextmanager
+from typing import Iterable, Optional, Sequence
 from .config import PG_HOST, PG_PORT, PG_DATABASE, PG_USER, PG_PASSWORD
+from .metrics import TimedCursor
 
 _conninfo = f"host={PG_HOST} port={PG_PORT} dbname={PG_DATABASE} user={PG_USER} password={PG_PASSWORD}"
 
+_stage_seq = itertools.count(1)
+
 
 @contextmanager
 def get_conn():
-    with psycopg.connect(_conninfo) as conn:
+    # 游标自动计时（db / db.copy 阶段，见 metrics）
+    with psycopg.connect(_conninfo, cursor_factory=TimedCursor) as conn:
         yield conn
+
+
+def _merge_duplicates(rows: Iterable[Sequence], key_idx: list[int], coalesce: bool) -> list[tuple]:
+    """同一键多行合并：coalesce=True 时后出现的非空值覆盖前值（等价于逐行 COALESCE upsert），否则后行整体覆盖。"""
+    merged: dict[tuple, list] = {}
+    for row in rows:
+        key = tuple(row[i] for i in key_idx)
+        prev = merged.get(key)
+        if prev is None or not coalesce:
+            merged[key] = list(row)
+            continue
+        for i, v in enumerate(row):
+            if v is not None:
+                prev[i] = v
+    return [tuple(r) for r in merged.values()]
+
+
+def copy_upsert(
+    conn,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence],
+    key_columns: Sequence[str],
+    update_columns: Optional[Sequence[str]] = None,
+    coalesce: bool = False,
+    extra_set: str = "",
+    conflict_where: str = "",
+) -> int:
+    """
+    批量 upsert：COPY 写入临时暂存表（列类型同目标表），再一条 INSERT ... SELECT ... ON CONFLICT 合并。
+    - update_columns 默认为 columns 去掉 key_columns；传空列表则冲突时 DO NOTHING。
+    - coalesce=True 时冲突列按 COALESCE(EXCLUDED.x, 原值) 更新，与逐行 upsert 语义一致。
+    - extra_set 追加到 SET 子句（如 "updated_at = NOW()"）。
+    - conflict_where 为部分唯一索引的谓词（如 signals 的 "ref_date IS NOT NULL"），用于推断冲突目标。
+    不提交事务，由调用方 commit。返回写入（去重后）的行数。
+    """
+    key_idx = [list(columns).index(k) for k in key_columns]
+    data = _merge_duplicates(rows, key_idx, coalesce)
+    if not data:
+        return 0
+    if update_columns is None:
+        update_columns = [c for c in columns if c not in key_columns]
+    stage = f"_stage_{table.split('.')[-1]}_{next(_stage_seq)}"
+    col_list = ", ".join(columns)
+    if update_columns:
+        short = table.split(".")[-1]
+        sets = [
+            f"{c} = COALESCE(EXCLUDED.{c}, {short}.{c})" if coalesce else f"{c} = EXCLUDED.{c}"
+            for c in update_columns
+        ]
+        if extra_set:
+            sets.append(extra_set)
+        conflict = f"DO UPDATE SET {', '.join(sets)}"
+    else:
+        conflict = "DO NOTHING"
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {col_list} FROM {table} WITH NO DATA")
+        with cur.copy(f"COPY {stage} ({col_list}) FROM STDIN") as copy:
+            for row in data:
+                copy.write_row(row)
+        cur.execute(
+            f"""
+            INSERT INTO {table} AS {table.split('.')[-1]} ({col_list})
+            SELECT {col_list} FROM {stage}
+            ON CONFLICT ({', '.join(key_columns)}){f" WHERE {conflict_where}" if conflict_where else ""} {conflict}
+            """
+        )
+        cur.execute(f"DROP TABLE {stage}")
+    return len(data)
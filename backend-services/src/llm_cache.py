@@ -0,0 +1,219 @@
+"""
+/llm/chat 提示词缓存（进程内）：按规范化后的提示词精确命中；近似命中须显式开启。
+- 规范化：Unicode NFKC、空白压缩（中文字符与标点两侧的空白去掉），仅空白 / 全半角不同的提示词视为同一条（大小写不同不命中）
+- 近似命中（默认关闭，LLM_CACHE_EMBEDDING=off）：ngram 为字符 2/3-gram 特征哈希向量（纯 numpy，无需模型），
+  或填 sentence-transformers 模型名（如 BAAI/bge-small-zh-v1.5）用本地嵌入模型，近似比较另做大小写折叠；相似度 ≥ LLM_CACHE_SIMILARITY 只是候选，
+  还须两条提示词逐词比对的全部差异都在 IGNORABLE（客套 / 语气词与标点）之内——看涨 / 看跌、支撑 / 不支撑、
+  股票代码、日期、价格等任何实义差异都不命中（相似模板只改一两个词时余弦相似度仍可高于 0.95）
+- 同一模型与 max_tokens 之间才互相命中；TTL 过期、超过 LLM_CACHE_MAX_ENTRIES 按 LRU 淘汰
+"""
+import difflib
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+
+from .metrics import count
+
+logger = logging.getLogger(__name__)
+
+NGRAM_DIM = 1024
+_WS = re.compile(r"\s+")
+# 中文字符 / 全角标点两侧的空白无意义
+_CJK_WS = re.compile(r"\s*([　-〿一-鿿＀-￯])\s*")
+# 逐词比对的切分：数字串、拉丁词、单个中文字符、其余单个字符
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|[a-z_]+|\S")
+# 近似命中允许的差异：客套 / 语气词（长的先剔除）与不改变语义的标点；不含正负号、百分号等
+IGNORABLE_WORDS = sorted(
+    ["请", "请你", "你", "帮我", "帮忙", "麻烦", "一下", "谢谢", "您", "你好", "吗", "呢", "吧", "啊", "呀", "please"],
+    key=len,
+    reverse=True,
+)
+IGNORABLE_PUNCT = set("，,。、！!？?：:；;…~～\"'“”‘’（）()【】[]《》 ")
+
+
+def normalize(prompt: str, fold: bool = False) -> str:
+    """精确匹配键：NFKC + 空白压缩；fold=True 时再做大小写折叠（仅用于近似匹配）。"""
+    s = unicodedata.normalize("NFKC", prompt or "")
+    if fold:
+        s = s.casefold()
+    s = _WS.sub(" ", s).strip()
+    return _CJK_WS.sub(r"\1", s)
+
+
+def _ngram_vector(text: str) -> np.ndarray:
+    """字符 2/3-gram 特征哈希（带符号），L2 归一化。"""
+    v = np.zeros(NGRAM_DIM, dtype=np.float32)
+    for n in (2, 3):
+        for i in range(len(text) - n + 1):
+            h = zlib.crc32(text[i : i + n].encode("utf-8"))
+            v[h % NGRAM_DIM] += 1.0 if h & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+def _tokens(norm: str) -> list[str]:
+    return _TOKEN.findall(norm)
+
+
+def _ignorable(text: str) -> bool:
+    for w in IGNORABLE_WORDS:
+        text = text.replace(w, "")
+    return all(ch in IGNORABLE_PUNCT for ch in text)
+
+
+def only_ignorable_diff(a: str, b: str) -> bool:
+    """两条规范化提示词逐词比对，全部差异段（两侧）都只含 IGNORABLE 的词与标点时为 True。"""
+    ta, tb = _tokens(a), _tokens(b)
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, ta, tb, autojunk=False).get_opcodes():
+        if op != "equal" and not (_ignorable("".join(ta[i1:i2])) and _ignorable("".join(tb[j1:j2]))):
+            return False
+    return True
+
+
+class _Embedder:
+    """ngram 或 sentence-transformers 本地模型；返回 L2 归一化的 float32 向量。"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._model = None
+        if kind not in ("ngram", "off"):
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError("请安装 sentence-transformers: pip install sentence-transformers") from e
+            self._model = SentenceTransformer(kind)
+
+    def __call__(self, text: str) -> Optional[np.ndarray]:
+        if self.kind == "off":
+            return None
+        if self._model is None:
+            return _ngram_vector(text)
+        return np.asarray(self._model.encode(text, normalize_embeddings=True), dtype=np.float32)
+
+
+class PromptCache:
+    """LRU + TTL；向量存于按槽位预分配的矩阵，近似查找为一次矩阵乘。线程安全。"""
+
+    def __init__(self, max_entries: int = 1000, ttl_sec: float = 3600, embedding: str = "off", threshold: float = 0.95):
+        self.max_entries, self.ttl_sec, self.threshold = max_entries, ttl_sec, threshold
+        self._embed = _Embedder(embedding)
+        self._entries: "OrderedDict[str, dict[str, Any]]" = OrderedDict()
+        self._vecs: Optional[np.ndarray] = None
+        self._owner: list[Optional[str]] = [None] * max_entries  # 槽位 -> 键
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(group: str, norm: str) -> str:
+        return hashlib.sha1(f"{group}\x00{norm}".encode("utf-8")).hexdigest()
+
+    def _drop(self, key: str) -> None:
+        e = self._entries.pop(key)
+        if e["slot"] is not None:
+            self._owner[e["slot"]] = None
+            self._free.append(e["slot"])
+
+    def _expired(self, e: dict, now: float) -> bool:
+        return now - e["created"] > self.ttl_sec
+
+    def get(self, prompt: str, model: str, max_tokens: int) -> Optional[dict[str, Any]]:
+        """命中返回 {content, match: exact|semantic, similarity}，否则 None。"""
+        group = f"{model}|{max_tokens}"
+        norm = normalize(prompt)
+        key = self._key(group, norm)
+        now = time.time()
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None:
+                if not self._expired(e, now):
+                    self._entries.move_to_end(key)
+                    count("llm_cache.hit_exact")
+                    return {"content": e["content"], "match": "exact", "similarity": 1.0}
+                self._drop(key)
+        hit = self._nearest(normalize(prompt, fold=True), group, now) if self._embed.kind != "off" else None
+        count("llm_cache.hit_semantic" if hit else "llm_cache.miss")
+        return hit
+
+    def _nearest(self, norm: str, group: str, now: float) -> Optional[dict[str, Any]]:
+        vec = self._embed(norm)
+        with self._lock:
+            if self._vecs is None or not self._entries:
+                return None
+            sims = self._vecs @ vec
+            for slot in np.argsort(-sims)[:8]:
+                if sims[slot] < self.threshold:
+                    break
+                key = self._owner[slot]
+                e = self._entries.get(key) if key else None
+                if e is None or e["group"] != group or not only_ignorable_diff(norm, e["norm"]):
+                    continue
+                if self._expired(e, now):
+                    self._drop(key)
+                    continue
+                self._entries.move_to_end(key)
+                return {"content": e["content"], "match": "semantic", "similarity": round(float(sims[slot]), 4)}
+        return None
+
+    def put(self, prompt: str, model: str, max_tokens: int, content: str) -> None:
+        if self.max_entries <= 0 or not content:
+            return
+        group = f"{model}|{max_tokens}"
+        key = self._key(group, normalize(prompt))
+        norm = normalize(prompt, fold=True)
+        vec = self._embed(norm)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            while len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))
+            slot = None
+            if vec is not None:
+                if self._vecs is None:
+                    self._vecs = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+                slot = self._free.pop()
+                self._vecs[slot] = vec
+                self._owner[slot] = key
+            self._entries[key] = {
+                "content": content,
+                "created": time.time(),
+                "group": group,
+                "norm": norm if slot is not None else None,
+                "slot": slot,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+
+_cache: Optional[PromptCache] = None
+_init_lock = threading.Lock()
+
+
+def get_cache() -> Optional[PromptCache]:
+    """按配置懒建进程内缓存；LLM_CACHE_MAX_ENTRIES=0 时返回 None，嵌入模型不可用时退化为精确匹配。"""
+    global _cache
+    from .config import LLM_CACHE_EMBEDDING, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_SIMILARITY, LLM_CACHE_TTL_SEC
+
+    if LLM_CACHE_MAX_ENTRIES <= 0:
+        return None
+    with _init_lock:
+        if _cache is None:
+            try:
+                _cache = PromptCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SEC, LLM_CACHE_EMBEDDING, LLM_CACHE_SIMILARITY)
+            except ImportError as e:
+                logger.warning("llm_cache: %s；仅做精确匹配", e)
+                _cache = PromptCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SEC, "off", LLM_CACHE_SIMILARITY)
+        return _cache
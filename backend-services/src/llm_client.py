@@ -0,0 +1,144 @@
+"""
+共享异步 LLM 客户端（Moonshot，OpenAI 兼容接口），供 routers/llm.py 使用：
+- 进程内复用一个 AsyncOpenAI 与 httpx 连接池（keep-alive），每次聊天不再新建 HTTPS 连接
+- 并发上限 LLM_MAX_CONCURRENCY（信号量），排队超过 LLM_QUEUE_TIMEOUT_SEC 抛 LLMBusy
+- 单次请求超时 LLM_TIMEOUT_SEC（流式为整段输出的截止时间），超时抛 LLMTimeout
+- chat_stream 逐段产出增量文本，首个分片耗时记为 llm.first_token 阶段
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+from openai import APITimeoutError, AsyncOpenAI
+
+from .config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONNECTIONS,
+    LLM_QUEUE_TIMEOUT_SEC,
+    LLM_TIMEOUT_SEC,
+    MOONSHOT_API_KEY,
+    MOONSHOT_BASE_URL,
+)
+from .metrics import count, observe, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "moonshot-v1-8k"
+KEEPALIVE_SEC = 60.0  # 空闲连接保留时长
+
+
+class LLMBusy(RuntimeError):
+    """并发已满且排队超时。"""
+
+
+class LLMTimeout(TimeoutError):
+    """单次请求超时。"""
+
+
+# 连接池与信号量绑定事件循环；循环变化（如测试客户端各自起循环）时重建
+_state: dict[str, Any] = {"loop": None, "client": None, "sem": None}
+
+
+def _pool() -> tuple[AsyncOpenAI, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    if _state["loop"] is not loop:
+        http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_SEC,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT_SEC, connect=10.0),
+        )
+        client = AsyncOpenAI(api_key=MOONSHOT_API_KEY, base_url=MOONSHOT_BASE_URL, http_client=http, max_retries=1)
+        _state.update(loop=loop, client=client, sem=asyncio.Semaphore(LLM_MAX_CONCURRENCY))
+    return _state["client"], _state["sem"]
+
+
+async def aclose() -> None:
+    """应用关闭时释放连接池。"""
+    client = _state["client"]
+    if client is not None and _state["loop"] is asyncio.get_running_loop():
+        await client.close()
+    _state.update(loop=None, client=None, sem=None)
+
+
+@asynccontextmanager
+async def _slot(sem: asyncio.Semaphore):
+    try:
+        await asyncio.wait_for(sem.acquire(), LLM_QUEUE_TIMEOUT_SEC)
+    except asyncio.TimeoutError:
+        count("llm.busy")
+        raise LLMBusy(f"LLM 并发已满（{LLM_MAX_CONCURRENCY}），排队超过 {LLM_QUEUE_TIMEOUT_SEC:g}s")
+    try:
+        yield
+    finally:
+        sem.release()
+
+
+def _messages(prompt: str) -> list[dict[str, str]]:
+    return [{"role": "user", "content": prompt}]
+
+
+async def chat(prompt: str, model: Optional[str] = None, max_tokens: int = 1000, timeout: Optional[float] = None) -> str:
+    """单次聊天，返回完整回复（已 strip）。"""
+    client, sem = _pool()
+    async with _slot(sem):
+        try:
+            with span("llm"):
+                resp = await client.chat.completions.create(
+                    model=model or DEFAULT_MODEL,
+                    messages=_messages(prompt),
+                    max_tokens=max_tokens,
+                    timeout=timeout or LLM_TIMEOUT_SEC,
+                )
+        except APITimeoutError as e:
+            count("llm.timeout")
+            raise LLMTimeout(f"LLM 请求超时（{timeout or LLM_TIMEOUT_SEC:g}s）") from e
+    return (resp.choices[0].message.content or "").strip()
+
+
+async def chat_stream(
+    prompt: str,
+    model: Optional[str] = None,
+    max_tokens: int = 1000,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """流式聊天：逐段产出增量文本；整段输出超过 timeout 抛 LLMTimeout。调用方提前关闭时释放连接与并发名额。"""
+    client, sem = _pool()
+    timeout = timeout or LLM_TIMEOUT_SEC
+    async with _slot(sem):
+        t0 = time.perf_counter()
+        try:
+            stream = await client.chat.completions.create(
+                model=model or DEFAULT_MODEL,
+                messages=_messages(prompt),
+                max_tokens=max_tokens,
+                stream=True,
+                timeout=timeout,
+            )
+        except APITimeoutError as e:
+            count("llm.timeout")
+            raise LLMTimeout(f"LLM 请求超时（{timeout:g}s）") from e
+        first = True
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first:
+                    observe("llm.first_token", time.perf_counter() - t0)
+                    first = False
+                yield delta
+                if time.perf_counter() - t0 > timeout:
+                    count("llm.timeout")
+                    raise LLMTimeout(f"LLM 流式输出超时（{timeout:g}s）")
+        except APITimeoutError as e:
+            count("llm.timeout")
+            raise LLMTimeout(f"LLM 流式输出超时（{timeout:g}s）") from e
+        finally:
+            await stream.close()
+            observe("llm.stream", time.perf_counter() - t0)
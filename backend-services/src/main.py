@@ -1,9 +1,22 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from . import llm_client
 from .config import MOONSHOT_API_KEY
-from .routers import trigger, llm
+from .metrics import render as render_metrics
+from .routers import trigger, llm, screen
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 释放共享 LLM 连接池
+    await llm_client.aclose()
 
-app = FastAPI(title="StEx Backend Services", version="0.1.0")
+
+app = FastAPI(title="StEx Backend Services", version="0.1.0", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 
@@ -12,5 +25,12 @@ def health():
     return {"ok": True, "service": "stex-python", "llm_configured": bool(MOONSHOT_API_KEY)}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus 抓取：各 Agent 分阶段耗时直方图、计数与运行次数。"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(trigger.router, prefix="/api", tags=["trigger"])
 app.include_router(llm.router, prefix="/api", tags=["llm"])
+app.include_router(screen.router, prefix="/api", tags=["screen"])
@@ -0,0 +1,352 @@
+"""
+轻量埋点：按阶段计时（span）与计数（count），汇总进各 Agent 返回结果（写入 workflow_log.output_snapshot），并以 Prometheus 文本格式暴露（/metrics）。
+- span(stage)：上下文管理器，记录阶段的「独占」耗时（嵌套子阶段的时间从父阶段扣除），各阶段之和 + python_sec ≈ 总耗时
+- 阶段命名：api.<源>.<接口>（instrument 包装的 Tushare 等客户端）、db / db.copy（get_conn 的游标自动计时）、llm、search、http、sleep、compute.<名>
+- @instrumented("agent")：为 run_* 建立本次运行的记录器，结果 dict 附 metrics：{ elapsed_sec, python_sec, stages: { 阶段: calls/total_sec/p50_ms/p95_ms/max_ms }, counters, throughput }
+- 进程内累计直方图与计数供 /metrics 抓取；无运行上下文时（如 HTTP 路由直接查询）记在 agent="-" 下
+只用标准库，单次埋点开销为两次 perf_counter 与一次加锁。
+"""
+import contextvars
+import functools
+import inspect
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+import psycopg
+
+# 直方图桶（秒）：覆盖单条 SQL（毫秒级）到单次 LLM / 限流等待（数十秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+RESERVOIR = 5000  # 单次运行每阶段保留的耗时样本上限（蓄水池抽样，算分位数用）
+
+_current: contextvars.ContextVar[Optional["Recorder"]] = contextvars.ContextVar("stex_metrics_recorder", default=None)
+_stack: contextvars.ContextVar[tuple] = contextvars.ContextVar("stex_metrics_stack", default=())
+
+
+class _Series:
+    """单阶段样本：调用次数、总耗时、最大值与蓄水池样本。"""
+
+    __slots__ = ("calls", "total", "max", "samples")
+
+    def __init__(self):
+        self.calls, self.total, self.max, self.samples = 0, 0.0, 0.0, []
+
+    def add(self, sec: float) -> None:
+        self.calls += 1
+        self.total += sec
+        self.max = max(self.max, sec)
+        if len(self.samples) < RESERVOIR:
+            self.samples.append(sec)
+        else:
+            j = random.randrange(self.calls)
+            if j < RESERVOIR:
+                self.samples[j] = sec
+
+    def merge(self, other: "_Series") -> None:
+        for s in other.samples:
+            self.add(s)
+        # 被抽样掉的部分按总量补齐
+        self.calls += other.calls - len(other.samples)
+        self.total += other.total - sum(other.samples)
+        self.max = max(self.max, other.max)
+
+    def summary(self) -> dict[str, Any]:
+        ordered = sorted(self.samples)
+
+        def q(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3) if ordered else 0.0
+
+        return {
+            "calls": self.calls,
+            "total_sec": round(self.total, 3),
+            "p50_ms": q(0.5),
+            "p95_ms": q(0.95),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Recorder:
+    """一次 Agent 运行的阶段耗时与计数（线程安全）。"""
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self.t0 = time.perf_counter()
+        self.stages: dict[str, _Series] = {}
+        self.counters: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, sec: float) -> None:
+        with self._lock:
+            self.stages.setdefault(stage, _Series()).add(sec)
+
+    def incr(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def absorb(self, other: "Recorder") -> None:
+        """嵌套运行（如 Agent 内调另一 Agent）的样本并入外层。"""
+        with self._lock:
+            for stage, series in other.stages.items():
+                self.stages.setdefault(stage, _Series()).merge(series)
+            for name, n in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self, result: Optional[dict] = None) -> dict[str, Any]:
+        elapsed = time.perf_counter() - self.t0
+        with self._lock:
+            stages = {k: v.summary() for k, v in sorted(self.stages.items(), key=lambda kv: -kv[1].total)}
+            counters = dict(self.counters)
+        out = {
+            "elapsed_sec": round(elapsed, 3),
+            "python_sec": round(max(0.0, elapsed - sum(s["total_sec"] for s in stages.values())), 3),
+            "stages": stages,
+        }
+        if counters:
+            out["counters"] = counters
+        # 吞吐：计数与结果中的整数量（rows_* / codes_processed / signals_written 等）按总耗时折算
+        volumes = dict(counters)
+        for k, v in (result or {}).items():
+            if isinstance(v, int) and not isinstance(v, bool) and v > 0:
+                volumes.setdefault(k, v)
+        if volumes and elapsed > 0:
+            out["throughput_per_sec"] = {k: round(v / elapsed, 2) for k, v in volumes.items()}
+        return out
+
+
+class _Registry:
+    """进程内累计：(agent, stage) 直方图、(agent, name) 计数、(agent, status) 运行次数与耗时。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hist: dict[tuple[str, str], list] = {}  # -> [桶计数..., +Inf 计数, 总和]
+        self.counters: dict[tuple[str, str], float] = {}
+        self.runs: dict[tuple[str, str], list] = {}  # -> [次数, 总秒数]
+
+    def observe(self, agent: str, stage: str, sec: float) -> None:
+        with self._lock:
+            h = self.hist.get((agent, stage))
+            if h is None:
+                h = self.hist[(agent, stage)] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, b in enumerate(BUCKETS):
+                if sec <= b:
+                    h[i] += 1
+            h[len(BUCKETS)] += 1
+            h[-1] += sec
+
+    def incr(self, agent: str, name: str, n: float) -> None:
+        with self._lock:
+            self.counters[(agent, name)] = self.counters.get((agent, name), 0) + n
+
+    def run_done(self, agent: str, status: str, sec: float) -> None:
+        with self._lock:
+            r = self.runs.setdefault((agent, status), [0, 0.0])
+            r[0] += 1
+            r[1] += sec
+
+    def render(self) -> str:
+        def lbl(**kw) -> str:
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in kw.items()) + "}"
+
+        lines = [
+            "# HELP stex_stage_seconds Exclusive time spent per agent stage.",
+            "# TYPE stex_stage_seconds histogram",
+        ]
+        with self._lock:
+            hist = {k: list(v) for k, v in self.hist.items()}
+            counters = dict(self.counters)
+            runs = {k: list(v) for k, v in self.runs.items()}
+        for (agent, stage), h in sorted(hist.items()):
+            for i, b in enumerate(BUCKETS):
+                lines.append(f"stex_stage_seconds_bucket{lbl(agent=agent, stage=stage, le=b)} {h[i]}")
+            lines.append(f"stex_stage_seconds_bucket{lbl(agent=agent, stage=stage, le='+Inf')} {h[len(BUCKETS)]}")
+            lines.append(f"stex_stage_seconds_sum{lbl(agent=agent, stage=stage)} {h[-1]:.6f}")
+            lines.append(f"stex_stage_seconds_count{lbl(agent=agent, stage=stage)} {h[len(BUCKETS)]}")
+        lines += ["# HELP stex_agent_events_total Agent counters.", "# TYPE stex_agent_events_total counter"]
+        for (agent, name), n in sorted(counters.items()):
+            lines.append(f"stex_agent_events_total{lbl(agent=agent, name=name)} {n:g}")
+        lines += ["# HELP stex_agent_runs_total Agent runs by status.", "# TYPE stex_agent_runs_total counter"]
+        for (agent, status), (n, _) in sorted(runs.items()):
+            lines.append(f"stex_agent_runs_total{lbl(agent=agent, status=status)} {n}")
+        lines += ["# HELP stex_agent_run_seconds_total Total agent run time.", "# TYPE stex_agent_run_seconds_total counter"]
+        for (agent, status), (_, sec) in sorted(runs.items()):
+            lines.append(f"stex_agent_run_seconds_total{lbl(agent=agent, status=status)} {sec:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = _Registry()
+
+
+def _observe(stage: str, sec: float) -> None:
+    rec = _current.get()
+    REGISTRY.observe(rec.agent if rec else "-", stage, sec)
+    if rec is not None:
+        rec.add(stage, sec)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """阶段计时；嵌套时子阶段耗时从父阶段扣除（独占时间）。"""
+    frame = [0.0]
+    token = _stack.set(_stack.get() + (frame,))
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = time.perf_counter() - t
+        _stack.reset(token)
+        parent = _stack.get()
+        if parent:
+            parent[-1][0] += total
+        _observe(stage, max(0.0, total - frame[0]))
+
+
+def observe(stage: str, sec: float) -> None:
+    """直接记录已测得的耗时（如流式响应跨多次 yield，无法用 span 包裹）。"""
+    _observe(stage, max(0.0, sec))
+
+
+def count(name: str, n: float = 1) -> None:
+    """累加计数（如 rows_written、api_retries）。"""
+    rec = _current.get()
+    REGISTRY.incr(rec.agent if rec else "-", name, n)
+    if rec is not None:
+        rec.incr(name, n)
+
+
+def sleep(sec: float) -> None:
+    """限流等待，计入 sleep 阶段。"""
+    with span("sleep"):
+        time.sleep(sec)
+
+
+def timed(stage: str) -> Callable:
+    """函数装饰器版 span。"""
+
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
+
+class _Instrumented:
+    """客户端代理：方法调用计入 <prefix>.<方法名> 阶段（如 api.tushare.daily），其余属性透传。"""
+
+    def __init__(self, target: Any, prefix: str):
+        self._target, self._prefix = target, prefix
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        stage = f"{self._prefix}.{name}"
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            with span(stage):
+                return attr(*args, **kwargs)
+
+        return call
+
+
+def instrument(target: Any, prefix: str) -> Any:
+    """包装数据源客户端，如 instrument(ts.pro_api(token), "api.tushare")。"""
+    return _Instrumented(target, prefix)
+
+
+def bind(fn: Callable) -> Callable:
+    """线程池任务沿用当前运行的记录器（新线程不继承 contextvars）；各任务的阶段为顶层，不从提交方扣除。"""
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        def inner():
+            _stack.set(())
+            return fn(*args, **kwargs)
+
+        return ctx.copy().run(inner)
+
+    return run
+
+
+@contextmanager
+def recording(agent: str) -> Iterator[Recorder]:
+    """建立一次运行的记录器；嵌套运行结束时样本并入外层。"""
+    parent = _current.get()
+    rec = Recorder(agent)
+    token = _current.set(rec)
+    try:
+        yield rec
+    finally:
+        _current.reset(token)
+        if parent is not None:
+            parent.absorb(rec)
+
+
+def _finish(rec: Recorder, result: Any) -> Any:
+    summary = rec.summary(result if isinstance(result, dict) else None)
+    status = "ok" if not isinstance(result, dict) or result.get("ok", "error" not in result) else "failed"
+    REGISTRY.run_done(rec.agent, status, summary["elapsed_sec"])
+    if isinstance(result, dict):
+        result["metrics"] = summary
+    return result
+
+
+def instrumented(agent: str) -> Callable:
+    """run_* 装饰器：本次运行的阶段耗时写入返回 dict 的 metrics，并累计到 /metrics（支持 async 函数）。"""
+
+    def deco(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                with recording(agent) as rec:
+                    try:
+                        result = await fn(*args, **kwargs)
+                    except Exception:
+                        REGISTRY.run_done(agent, "error", time.perf_counter() - rec.t0)
+                        raise
+                    return _finish(rec, result)
+
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with recording(agent) as rec:
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception:
+                    REGISTRY.run_done(agent, "error", time.perf_counter() - rec.t0)
+                    raise
+                return _finish(rec, result)
+
+        return wrapper
+
+    return deco
+
+
+class TimedCursor(psycopg.Cursor):
+    """get_conn 的游标：execute / executemany 计入 db，COPY 整段计入 db.copy。"""
+
+    def execute(self, query, params=None, **kwargs):
+        with span("db"):
+            return super().execute(query, params, **kwargs)
+
+    def executemany(self, query, params_seq, **kwargs):
+        with span("db"):
+            return super().executemany(query, params_seq, **kwargs)
+
+    @contextmanager
+    def copy(self, statement, params=None, **kwargs):
+        with span("db.copy"), super().copy(statement, params, **kwargs) as cp:
+            yield cp
+
+
+def render() -> str:
+    """Prometheus 文本格式（exposition format 0.0.4）。"""
+    return REGISTRY.render()
@@ -0,0 +1,227 @@
+"""
+时序表分区管理（迁移 014）：stex.stock_day、stex.signals 按月，stex.stock_min 按日（北京时间自然日）范围分区。
+- ensure_partitions：入库前预建当前及未来若干周期的分区（日线/分钟线无 DEFAULT 分区，写入未建分区的日期会失败）；
+  signals 的 DEFAULT 分区中落入新分区范围的行在建分区时一并迁入。建分区走独立连接、按表加事务级 advisory 锁串行，
+  并发的 agent / 调度线程同时预建时后到者跳过，不提交调用方事务
+- retire_partitions：早于保留期的整月/整日分区直接卸载，归档到 stex_archive schema（仍可查询）或删除，不再逐行 DELETE
+分区命名：<表>_pYYYYMM / <表>_pYYYYMMDD，另有 <表>_history（MINVALUE 起，迁移前的补录数据）与 signals_default。
+表尚未分区（未执行迁移 014）时各函数直接跳过。
+"""
+import logging
+import re
+from datetime import date, timedelta
+from typing import Any, Optional
+
+import psycopg
+
+from .collectors.stock import today_cn
+from .db import get_conn
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = "stex_archive"
+# 表 -> 分区键、周期（month / day）、预建的未来周期数
+PARTITIONED: dict[str, dict[str, Any]] = {
+    "stex.stock_day": {"key": "trade_date", "unit": "month", "ahead": 3},
+    "stex.signals": {"key": "ref_date", "unit": "month", "ahead": 3},
+    "stex.stock_min": {"key": "trade_time", "unit": "day", "ahead": 14},
+}
+_TS_KEYS = {"trade_time"}
+_NAME_RE = re.compile(r"_p(\d{6}|\d{8})$")
+
+
+def _period_start(d: date, unit: str) -> date:
+    return d.replace(day=1) if unit == "month" else d
+
+
+def _next_period(d: date, unit: str) -> date:
+    if unit == "day":
+        return d + timedelta(days=1)
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def _partition_name(table: str, start: date, unit: str) -> str:
+    return f"{table}_p{start:%Y%m}" if unit == "month" else f"{table}_p{start:%Y%m%d}"
+
+
+def _bound(table: str, d: date) -> str:
+    """分区边界字面量；timestamptz 分区键按北京时间 0 点切分。"""
+    return f"{d} 00:00:00+08" if PARTITIONED[table]["key"] in _TS_KEYS else str(d)
+
+
+def is_partitioned(conn, table: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def list_partitions(conn, table: str) -> list[dict[str, Any]]:
+    """
+    table 的各分区（按起始日期升序）：{ name, start, end, rows }，rows 为统计估算行数；
+    _history 分区 start 为 None，DEFAULT 分区 start/end 均为 None 且 default=True。
+    """
+    unit = PARTITIONED[table]["unit"]
+    schema = table.split(".")[0]
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.relname, c.reltuples::bigint, pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT'
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            (table,),
+        )
+        rows = cur.fetchall()
+    periodic, special = [], []
+    for name, tuples, is_default in rows:
+        item = {"name": f"{schema}.{name}", "start": None, "end": None, "rows": max(int(tuples), 0), "default": bool(is_default)}
+        m = _NAME_RE.search(name)
+        if m and not is_default:
+            s = m.group(1)
+            item["start"] = date(int(s[:4]), int(s[4:6]), int(s[6:8]) if len(s) == 8 else 1)
+            item["end"] = _next_period(item["start"], unit)
+            periodic.append(item)
+        else:
+            special.append(item)
+    periodic.sort(key=lambda p: p["start"])
+    history = [p for p in special if not p["default"]]
+    if history and periodic:
+        history[0]["end"] = periodic[0]["start"]
+    return history + periodic + [p for p in special if p["default"]]
+
+
+def _create_partition(conn, table: str, start: date, has_default: bool) -> Optional[str]:
+    """
+    建 [start, 下一周期) 分区；有 DEFAULT 分区时先把其中落入该范围的行迁出，再 ATTACH。不提交。
+    先取 table 的事务级 advisory 锁，并发调用方已建好该分区时返回 None。
+    """
+    spec = PARTITIONED[table]
+    name = _partition_name(table, start, spec["unit"])
+    lo, hi = _bound(table, start), _bound(table, _next_period(start, spec["unit"]))
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"partitions:{table}",))
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cur.fetchone()[0]:
+            return None
+        if not has_default:
+            cur.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{lo}') TO ('{hi}')")
+            return name
+        cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+        cur.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {table}_default WHERE {spec['key']} >= %s AND {spec['key']} < %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """,
+            (lo, hi),
+        )
+        cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')")
+    return name
+
+
+def ensure_partitions(conn, tables: Optional[list[str]] = None, start: Optional[date] = None, through: Optional[date] = None) -> list[str]:
+    """
+    为 tables（默认全部）建缺失的周期分区：从 start（默认今日）所在周期到 through（默认今日 + ahead 个周期）。
+    早于最早周期分区的日期由 _history 分区承接，不再另建。conn 只用于读分区目录；缺失的分区在独立连接上
+    逐个建并提交（不提交调用方事务），与其他进程 / 线程并发时由 advisory 锁串行，已被对方建好的跳过。
+    返回本次新建的分区名。
+    """
+    created: list[str] = []
+    today = today_cn()
+    for table in tables or list(PARTITIONED):
+        spec = PARTITIONED[table]
+        if not is_partitioned(conn, table):
+            logger.info("partitions: %s 未分区（未执行迁移 014），跳过", table)
+            continue
+        parts = list_partitions(conn, table)
+        existing = {p["start"] for p in parts if p["start"] is not None}
+        floor = min(existing) if existing else None
+        has_default = any(p["default"] for p in parts)
+        last = through
+        if last is None:
+            last = _period_start(today, spec["unit"])
+            for _ in range(spec["ahead"]):
+                last = _next_period(last, spec["unit"])
+        p = _period_start(start or today, spec["unit"])
+        if floor is not None and p < floor:
+            p = floor
+        missing = []
+        while p <= last:
+            if p not in existing:
+                missing.append(p)
+            p = _next_period(p, spec["unit"])
+        if missing:
+            created += _create_missing(table, missing, has_default)
+    if created:
+        logger.info("partitions: created %s", ", ".join(created))
+    return created
+
+
+def _create_missing(table: str, starts: list[date], has_default: bool) -> list[str]:
+    created = []
+    with get_conn() as own:
+        for p in starts:
+            try:
+                name = _create_partition(own, table, p, has_default)
+                own.commit()
+            except psycopg.errors.DuplicateTable:
+                # 未经 advisory 锁的建表方（如手工执行迁移）抢先建了同名分区
+                own.rollback()
+                continue
+            if name:
+                created.append(name)
+    return created
+
+
+def retire_partitions(conn, table: str, before: date, archive: bool = True) -> list[str]:
+    """
+    卸载 table 中整段早于 before 的周期分区：archive=True 移入 stex_archive schema，否则删除。
+    _history 与 DEFAULT 分区不动。返回处理的分区名。
+    """
+    if not is_partitioned(conn, table):
+        return []
+    retired = []
+    with conn.cursor() as cur:
+        if archive:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        for p in list_partitions(conn, table):
+            if p["start"] is None or p["end"] > before:
+                continue
+            cur.execute(f"ALTER TABLE {table} DETACH PARTITION {p['name']}")
+            if archive:
+                cur.execute(f"ALTER TABLE {p['name']} SET SCHEMA {ARCHIVE_SCHEMA}")
+            else:
+                cur.execute(f"DROP TABLE {p['name']}")
+            retired.append(p["name"])
+    conn.commit()
+    if retired:
+        logger.info("partitions: %s %s", "archived" if archive else "dropped", ", ".join(retired))
+    return retired
+
+
+def run_partition_maintenance(retention: Optional[dict[str, int]] = None, archive: bool = True) -> dict[str, Any]:
+    """
+    分区维护：预建全部时序表的未来分区；retention 为 表 -> 保留天数（如 {"stex.stock_min": 30}），
+    未传时按 STOCK_MIN_RETENTION_DAYS 只清理分钟线（0 为不清理）。
+    返回：{ ok, created, retired, partitions: { 表: 分区数 }, error }
+    """
+    from .config import STOCK_MIN_RETENTION_DAYS
+
+    if retention is None:
+        retention = {"stex.stock_min": STOCK_MIN_RETENTION_DAYS} if STOCK_MIN_RETENTION_DAYS > 0 else {}
+    try:
+        with get_conn() as conn:
+            created = ensure_partitions(conn)
+            retired = []
+            for table, days in retention.items():
+                if table not in PARTITIONED:
+                    return {"ok": False, "error": f"未知分区表: {table}；可选: {' | '.join(PARTITIONED)}"}
+                if days and days > 0:
+                    retired += retire_partitions(conn, table, today_cn() - timedelta(days=days), archive=archive)
+            counts = {t: len(list_partitions(conn, t)) for t in PARTITIONED if is_partitioned(conn, t)}
+        return {"ok": True, "created": created, "retired": retired, "partitions": counts}
+    except Exception as e:
+        logger.exception("partition maintenance failed")
+        return {"ok": False, "error": str(e), "created": [], "retired": []}
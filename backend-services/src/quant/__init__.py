@@ -0,0 +1 @@
+# 量化分析：向量化信号规则与回测
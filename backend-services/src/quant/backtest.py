@@ -0,0 +1,153 @@
+"""
+信号回测：在历史日线上重放各 _signal_* 规则（向量化，见 quant.signals），统计每类信号、每个方向
+在信号日收盘买入持有 N 个交易日后的表现：
+- hit_rate：看涨命中 = 前瞻收益 > 0，看跌命中 = 前瞻收益 < 0；中性/无信号/换手率分档按上涨概率统计
+- avg_return：前瞻 N 日收益均值（收盘价计）
+- avg_drawdown / max_drawdown：持有期内按方向计的最大回撤（看跌按做空计）的均值 / 最差值
+全市场按代码分块装载计算后累加统计量，内存占用与代码总数无关。
+"""
+import logging
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+from ..db import get_conn
+from .data import list_codes, load_market, padded_range
+from .signals import DIR_BEAR, DIRECTION_LABELS, compute_signals, signal_table
+
+logger = logging.getLogger(__name__)
+
+# 装载行情时 start 前预留的交易日数（覆盖各规则最长回看窗口）
+WARMUP_DAYS = 40
+CHUNK_CODES = 300
+# 基准行（全部有效交易日的持有收益）的方向码
+BASELINE = 99
+
+
+def forward_metrics(m: dict, horizon: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    每个 (代码, 行) 的前瞻 horizon 日收益、做多/做空最大回撤（<= 0），以及有效掩码（当日与第 horizon 行均存在且收盘价有效）。
+    """
+    close = m["close"]
+    n, T = close.shape
+    fwd = np.full_like(close, np.nan)
+    if horizon < T:
+        fwd[:, : T - horizon] = close[:, horizon:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ret = fwd / close - 1
+        peak = close.copy()
+        trough = close.copy()
+        dd_long = np.zeros_like(close)
+        dd_short = np.zeros_like(close)
+        for k in range(1, horizon + 1):
+            c = np.full_like(close, np.nan)
+            if k < T:
+                c[:, : T - k] = close[:, k:]
+            dd_long = np.fmin(dd_long, c / peak - 1)
+            dd_short = np.fmin(dd_short, trough / c - 1)
+            peak = np.fmax(peak, c)
+            trough = np.fmin(trough, c)
+    valid = m["exists"] & ~np.isnan(close) & (close > 0) & ~np.isnan(fwd)
+    return ret, dd_long, dd_short, valid
+
+
+class _Stats:
+    """按 (信号类型, 方向码) 累加的回测统计量。"""
+
+    def __init__(self):
+        self.acc: dict[tuple[str, int], list[float]] = {}
+
+    def add(self, key: tuple[str, int], ret: np.ndarray, dd: np.ndarray, hit: np.ndarray) -> None:
+        if not len(ret):
+            return
+        a = self.acc.setdefault(key, [0, 0, 0.0, 0.0, 0.0])
+        a[0] += len(ret)
+        a[1] += int(hit.sum())
+        a[2] += float(ret.sum())
+        a[3] += float(dd.sum())
+        a[4] = min(a[4], float(dd.min()))
+
+    def rows(self) -> list[dict[str, Any]]:
+        out = []
+        for (sig, d), (cnt, hits, s_ret, s_dd, worst) in self.acc.items():
+            out.append(
+                {
+                    "signal_type": sig,
+                    "direction": DIRECTION_LABELS.get(d, "基准"),
+                    "count": cnt,
+                    "hit_rate": round(hits / cnt, 4),
+                    "avg_return": round(s_ret / cnt, 6),
+                    "avg_drawdown": round(s_dd / cnt, 6),
+                    "max_drawdown": round(worst, 6),
+                }
+            )
+        out.sort(key=lambda r: (r["signal_type"], r["direction"]))
+        return out
+
+
+def evaluate(
+    m: dict,
+    horizon: int = 5,
+    params: Optional[dict[str, dict]] = None,
+    signals: Optional[list[str]] = None,
+    start=None,
+    end=None,
+    stats: Optional[_Stats] = None,
+) -> _Stats:
+    """在一块行情矩阵上计算信号并累加统计；仅统计 [start, end] 内的信号日。"""
+    stats = stats or _Stats()
+    ret, dd_long, dd_short, valid = forward_metrics(m, horizon)
+    if start is not None:
+        valid &= m["dates"] >= np.datetime64(start, "D")
+    if end is not None:
+        valid &= m["dates"] <= np.datetime64(end, "D")
+    stats.add(("全部交易日", BASELINE), ret[valid], dd_long[valid], ret[valid] > 0)
+    for sig, (direction, _) in compute_signals(m, params=params, signals=signals).items():
+        for d in np.unique(direction[valid]):
+            sel = valid & (direction == d)
+            r = ret[sel]
+            if d == DIR_BEAR:
+                stats.add((sig, int(d)), r, dd_short[sel], r < 0)
+            else:
+                stats.add((sig, int(d)), r, dd_long[sel], r > 0)
+    return stats
+
+
+def run_backtest(
+    codes: Optional[list[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    horizon: int = 5,
+    kind: str = "stock",
+    params: Optional[dict[str, dict]] = None,
+    signals: Optional[list[str]] = None,
+    chunk_codes: int = CHUNK_CODES,
+) -> dict[str, Any]:
+    """
+    回测 codes（为空则 kind 对应全部代码：stock 全市场 / index 指数日线）在 [start, end] 的信号表现。
+    返回：{ ok, codes, horizon, elapsed_sec, results: [{ signal_type, direction, count, hit_rate, avg_return, avg_drawdown, max_drawdown }] }
+    """
+    t0 = time.time()
+    if signals:
+        unknown = [s for s in signals if s not in signal_table(kind)]
+        if unknown:
+            return {"ok": False, "error": f"未知信号类型: {', '.join(unknown)}"}
+    load_start, load_end = padded_range(start, end, WARMUP_DAYS, horizon)
+    stats = _Stats()
+    with get_conn() as conn:
+        code_list = [str(c).strip() for c in codes if str(c).strip()] if codes else list_codes(conn, kind)
+        for i in range(0, len(code_list), chunk_codes):
+            chunk = code_list[i : i + chunk_codes]
+            m = load_market(conn, chunk, load_start, load_end, kind=kind)
+            evaluate(m, horizon=horizon, params=params, signals=signals, start=start, end=end, stats=stats)
+            logger.info("backtest: %s/%s codes", min(i + chunk_codes, len(code_list)), len(code_list))
+    return {
+        "ok": True,
+        "codes": len(code_list),
+        "horizon": horizon,
+        "start": start,
+        "end": end,
+        "elapsed_sec": round(time.time() - t0, 2),
+        "results": stats.rows(),
+    }
@@ -0,0 +1,223 @@
+"""
+回测/寻优用行情矩阵：按代码 × 行 装载日线（每只代码自身交易日序列，右对齐，左侧 NaN 填充），
+技术指标与资金流按 (code, trade_date) 对齐到日线行，与各信号 agent 逐只读取的语义一致。
+个股日线在日线列式镜像（store.ohlcv_parquet）已同步到最新时直接读镜像，否则查 stex.stock_day。
+"""
+from datetime import date, timedelta
+from typing import Any, Optional
+
+import numpy as np
+
+# kind -> 日线表、代码列、[(SQL 列, 字段名)]
+_DAY_SPECS = {
+    "stock": (
+        "stex.stock_day",
+        "code",
+        [("open", "open"), ("high", "high"), ("low", "low"), ("close", "close"), ("volume", "volume"), ("turnover_rate", "turnover_rate")],
+    ),
+    "index": ("stex.index_day", "index_code", [("open", "open"), ("high", "high"), ("low", "low"), ("close", "close"), ("vol", "volume")]),
+}
+_TECH_FIELDS = ["ma5", "ma10", "ma20"]
+
+
+def _to_date(v) -> Optional[date]:
+    if v is None or v == "":
+        return None
+    if isinstance(v, date):
+        return v
+    s = str(v).strip().replace("-", "")[:8]
+    return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+
+
+def list_codes(conn, kind: str = "stock") -> list[str]:
+    """有日线数据的全部代码（升序）。"""
+    table, code_col, _ = _DAY_SPECS[kind]
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT DISTINCT {code_col} FROM {table} ORDER BY 1")
+        return [str(r[0]) for r in cur.fetchall()]
+
+
+def _fetch(conn, sql: str, params: tuple) -> list[tuple]:
+    with conn.cursor(binary=True) as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def _day_rows(conn, kind: str, codes: list[str], start_d: date, end_d: date) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """日线行（按代码 COLLATE "C"、交易日升序）：(代码, 交易日 datetime64[D], n × 字段 float64)。"""
+    from ..store.ohlcv_parquet import is_current, load_ohlcv
+
+    table, code_col, cols = _DAY_SPECS[kind]
+    if kind == "stock" and codes and is_current(conn):
+        # 镜像按 (code, trade_date) 字节序排序，与 COLLATE "C" 一致
+        d = load_ohlcv(codes, start_d.isoformat(), end_d.isoformat(), fields=[name for _, name in cols])
+        values = np.column_stack([d[name] for _, name in cols]) if len(d["code"]) else np.zeros((0, len(cols)))
+        return d["code"], d["trade_date"].astype("datetime64[D]"), values
+    rows = _fetch(
+        conn,
+        f"""
+        SELECT {code_col}, trade_date, {", ".join(f"{c}::float8" for c, _ in cols)}
+        FROM {table}
+        WHERE {code_col} = ANY(%s) AND trade_date BETWEEN %s AND %s
+        ORDER BY {code_col} COLLATE "C", trade_date
+        """,
+        (codes, start_d, end_d),
+    )
+    return (
+        np.array([r[0] for r in rows], dtype=object),
+        np.array([r[1] for r in rows], dtype="datetime64[D]"),
+        np.array([r[2:] for r in rows], dtype=np.float64).reshape(len(rows), len(cols)),
+    )
+
+
+def _keys(code_idx: np.ndarray, dates: np.ndarray) -> np.ndarray:
+    return code_idx.astype(np.int64) * 1_000_000 + dates.astype("datetime64[D]").astype(np.int64)
+
+
+def load_market(
+    conn,
+    codes: list[str],
+    start=None,
+    end=None,
+    kind: str = "stock",
+    aux: bool = True,
+) -> dict[str, Any]:
+    """
+    装载 codes 在 [start, end] 的行情矩阵（start/end 为空表示不限）；aux=False 时 stock 不对齐技术指标与资金流。
+    codes 去重并按升序装载（与 SQL 排序一致，行按代码分段、对齐键有序），返回的 codes 即矩阵行序。
+    返回 dict：codes、dates (n × T, datetime64[D]，缺失 NaT)、exists (bool)、idx（行在该代码序列中的序号，-1 为填充），
+    以及 open/high/low/close/volume(/turnover_rate) 与 stock 的 ma5/ma10/ma20、net_mf、net_elg、mf_exists（float64，缺失 NaN）。
+    """
+    _, _, cols = _DAY_SPECS[kind]
+    start_d, end_d = _to_date(start) or date(1990, 1, 1), _to_date(end) or date(2100, 1, 1)
+    codes = sorted(dict.fromkeys(str(c) for c in codes))
+    code_pos = {c: i for i, c in enumerate(codes)}
+    row_codes, day_dates, values = _day_rows(conn, kind, codes, start_d, end_d)
+    n, nrows = len(codes), len(row_codes)
+    code_idx = np.fromiter((code_pos[str(c)] for c in row_codes), dtype=np.int64, count=nrows)
+    counts = np.bincount(code_idx, minlength=n) if nrows else np.zeros(n, dtype=np.int64)
+    T = int(counts.max()) if n else 0
+    # 右对齐：每只代码的第 k 行放在列 T - cnt + k
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if n else np.zeros(0, dtype=np.int64)
+    pos = np.arange(nrows) - starts[code_idx] if nrows else np.zeros(0, dtype=np.int64)
+    col = T - counts[code_idx] + pos
+
+    m: dict[str, Any] = {"codes": list(codes), "kind": kind}
+    dates = np.full((n, T), np.datetime64("NaT"), dtype="datetime64[D]")
+    dates[code_idx, col] = day_dates
+    m["dates"] = dates
+    m["exists"] = ~np.isnat(dates)
+    idx = np.full((n, T), -1, dtype=np.int64)
+    idx[code_idx, col] = pos
+    m["idx"] = idx
+    for j, (_, name) in enumerate(cols):
+        arr = np.full((n, T), np.nan)
+        arr[code_idx, col] = values[:, j]
+        m[name] = arr
+    if kind != "stock" or not aux:
+        return m
+
+    # 技术指标、资金流：按 (code, trade_date) 对齐到日线行
+    day_keys = _keys(code_idx, day_dates)
+
+    def _align(sql: str, names: list[str]) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        aux_rows = _fetch(conn, sql, (codes, start_d, end_d))
+        out = {name: np.full((n, T), np.nan) for name in names}
+        hit = np.zeros((n, T), dtype=bool)
+        if not aux_rows or not nrows:
+            return hit, out
+        aux_keys = _keys(
+            np.fromiter((code_pos[r[0]] for r in aux_rows), dtype=np.int64, count=len(aux_rows)),
+            np.array([r[1] for r in aux_rows], dtype="datetime64[D]"),
+        )
+        where = np.searchsorted(day_keys, aux_keys)
+        where_c = np.minimum(where, len(day_keys) - 1)
+        ok = day_keys[where_c] == aux_keys
+        rr, cc = code_idx[where_c[ok]], col[where_c[ok]]
+        hit[rr, cc] = True
+        vals = np.array([r[2:] for r in aux_rows], dtype=np.float64).reshape(len(aux_rows), len(names))[ok]
+        for j, name in enumerate(names):
+            out[name][rr, cc] = vals[:, j]
+        return hit, out
+
+    _, tech = _align(
+        """
+        SELECT code, trade_date, ma5::float8, ma10::float8, ma20::float8
+        FROM stex.technicals WHERE code = ANY(%s) AND trade_date BETWEEN %s AND %s
+        """,
+        _TECH_FIELDS,
+    )
+    m.update(tech)
+    mf_exists, mf = _align(
+        """
+        SELECT code, trade_date, net_mf_amount::float8, buy_elg_amount::float8, sell_elg_amount::float8
+        FROM stex.moneyflow WHERE code = ANY(%s) AND trade_date BETWEEN %s AND %s
+        """,
+        ["net_mf", "buy_elg", "sell_elg"],
+    )
+    m["net_mf"] = mf["net_mf"]
+    m["net_elg"] = mf["buy_elg"] - mf["sell_elg"]
+    m["mf_exists"] = mf_exists
+    return m
+
+
+def panel_market(panel, codes: Optional[list[str]] = None, min_rows: int = 0) -> dict[str, Any]:
+    """
+    由 store.panel 的 days 块组出与 load_market 同结构的行情矩阵（窗口即面板的右对齐窗口，idx 自窗口首行起算），
+    供 agent 直接复用已缓存的面板做向量化信号计算。min_rows：有效行数不足的代码不纳入。
+    """
+    block = panel.blocks["days"]
+    rows = [panel.index[c] for c in (codes if codes is not None else panel.codes) if c in panel.index]
+    dates = np.asarray(block.dates[rows]) if rows else np.full((0, panel.limit), np.datetime64("NaT"), dtype="datetime64[D]")
+    exists = ~np.isnat(dates)
+    keep = exists.sum(axis=1) >= min_rows
+    rows = [r for r, k in zip(rows, keep) if k]
+    dates, exists = dates[keep], exists[keep]
+    counts = exists.sum(axis=1)
+    idx = np.arange(panel.limit)[None, :] - (panel.limit - counts)[:, None]
+    m: dict[str, Any] = {
+        "codes": [panel.codes[r] for r in rows],
+        "kind": panel.kind,
+        "dates": dates,
+        "exists": exists,
+        "idx": np.where(exists, idx, -1),
+    }
+    values = np.asarray(block.values[rows]) if rows else np.zeros((0, panel.limit, len(block.fields)))
+    for j, name in enumerate(block.fields):
+        m[name] = values[:, :, j].copy()
+    return m
+
+
+def padded_range(start, end, lookback: int, horizon: int) -> tuple[Optional[date], Optional[date]]:
+    """回测装载区间：start 前留出 lookback 个交易日预热，end 后留出 horizon 个交易日计算前瞻收益（按日历日放宽）。"""
+    s, e = _to_date(start), _to_date(end)
+    return (
+        s - timedelta(days=int(lookback * 1.6) + 10) if s else None,
+        e + timedelta(days=int(horizon * 1.6) + 10) if e else None,
+    )
+
+
+def save_market(m: dict[str, Any], path: str) -> None:
+    """把行情矩阵逐数组写成 .npy（codes/kind 写入 meta.json），供多进程以只读内存映射共享。"""
+    import json
+    import os
+
+    os.makedirs(path, exist_ok=True)
+    for name, arr in m.items():
+        if isinstance(arr, np.ndarray):
+            np.save(os.path.join(path, f"{name}.npy"), arr)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"codes": m["codes"], "kind": m["kind"]}, f, ensure_ascii=False)
+
+
+def open_market(path: str) -> dict[str, Any]:
+    """以只读内存映射打开 save_market 写出的行情矩阵（各进程共享同一份页缓存）。"""
+    import json
+    import os
+
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        m: dict[str, Any] = json.load(f)
+    for fn in os.listdir(path):
+        if fn.endswith(".npy"):
+            m[fn[:-4]] = np.load(os.path.join(path, fn), mmap_mode="r")
+    return m
@@ -0,0 +1,201 @@
+"""
+选股特征宽表：以 ref_date 为基准（只用 ref_date 及之前的日线/均线/基本面），为 stex.corp 每只股票算一行特征，
+供选股快照（quant.screener）与每日物化表 stex.screen_daily（agents.screen_feature_agent）共用。
+- 最新收盘、1/5/20/63 日涨跌幅（%）、换手率、量比（当日量 / 前 20 日均量）取自各代码 ref_date 及之前最近的行
+- MA5/10/20 取最近一个三线齐全的交易日，ma_close 为该日收盘价，ma_state 为 多头排列 / 空头排列 / 均线纠缠
+- 策略标记口径同 backend-api selection.js：growth、tech_competition、classic_pattern、trend_following、low_vol_breakout、all_combined
+  （形态、突破的近 60 日窗口以 ref_date 起算）
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from .low_vol_breakout import evaluate as breakout
+from .low_vol_breakout import window_mean
+
+TEXT_FIELDS = ["code", "name", "market", "industry", "sector", "ma_state"]
+NUMERIC_FIELDS = [
+    "market_cap", "pe", "pb", "net_profit", "profit_growth",
+    "latest_close", "pct_1d", "pct_5d", "pct_20d", "pct_63d", "turnover_rate", "vol_ratio_20",
+    "ma5", "ma10", "ma20", "ma_close",
+]
+FLAG_FIELDS = ["growth", "tech_competition", "classic_pattern", "trend_following", "low_vol_breakout", "all_combined"]
+# all_combined 参与计数的策略
+COMBINED = ["growth", "tech_competition", "classic_pattern", "trend_following"]
+
+TECH_KEYWORDS = ["AI", "芯片", "太空", "航天", "新能源", "机器人", "卡脖子", "半导体", "人工智能"]
+CLASSIC_PATTERNS = ["cup_handle", "rising_three"]
+RECENT_DAYS = 60
+PCT_LAGS = {"pct_1d": 1, "pct_5d": 5, "pct_20d": 20, "pct_63d": 63}
+# 每只代码装载的日线行数：近 RECENT_DAYS 个日历日 + 前 20 日均量窗口 + 前一日收盘（同时覆盖 63 日涨跌幅）
+WINDOW_ROWS = RECENT_DAYS + 1 + 21
+
+
+def _fetch(conn, sql: str, params: tuple = ()) -> list[tuple]:
+    with conn.cursor(binary=True) as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def _codes_in(conn, sql: str, params: tuple, pos: dict[str, int], n: int) -> np.ndarray:
+    hit = np.zeros(n, dtype=bool)
+    for (code,) in _fetch(conn, sql, params):
+        i = pos.get(code)
+        if i is not None:
+            hit[i] = True
+    return hit
+
+
+def _growth(conn, pos: dict[str, int], n: int, ref_date: date) -> np.ndarray:
+    """最近 4 期（营收、净利润均非空）：r1>r2>r3、p1>p2>p3，且 r1>r4、p1>p4。"""
+    rows = _fetch(
+        conn,
+        """
+        SELECT c.code, f.revenue::float8, f.net_profit::float8
+        FROM stex.corp c
+        CROSS JOIN LATERAL (
+            SELECT report_date, revenue, net_profit FROM stex.financial
+            WHERE code = c.code AND revenue IS NOT NULL AND net_profit IS NOT NULL AND report_date <= %s
+            ORDER BY report_date DESC LIMIT 4
+        ) f
+        ORDER BY c.code, f.report_date DESC
+        """,
+        (ref_date,),
+    )
+    rev = np.full((n, 4), np.nan)
+    prof = np.full((n, 4), np.nan)
+    cnt = np.zeros(n, dtype=np.int64)
+    for code, r, p in rows:
+        i = pos[code]
+        rev[i, cnt[i]], prof[i, cnt[i]] = r, p
+        cnt[i] += 1
+    with np.errstate(invalid="ignore"):
+        return (
+            (cnt == 4)
+            & (rev[:, 0] > rev[:, 1]) & (rev[:, 1] > rev[:, 2])
+            & (prof[:, 0] > prof[:, 1]) & (prof[:, 1] > prof[:, 2])
+            & (rev[:, 0] > rev[:, 3]) & (prof[:, 0] > prof[:, 3])
+        )
+
+
+def _day_window(conn, pos: dict[str, int], n: int, ref_date: date) -> dict[str, np.ndarray]:
+    """每只代码 ref_date 及之前最近 WINDOW_ROWS 行日线，右对齐为 代码 × 行 矩阵（最后一列为最新行）。"""
+    rows = _fetch(
+        conn,
+        """
+        SELECT c.code, d.trade_date, d.close::float8, d.volume::float8, d.turnover_rate::float8
+        FROM stex.corp c
+        CROSS JOIN LATERAL (
+            SELECT trade_date, close, volume, turnover_rate FROM stex.stock_day
+            WHERE code = c.code AND trade_date <= %s ORDER BY trade_date DESC LIMIT %s
+        ) d
+        ORDER BY c.code, d.trade_date
+        """,
+        (ref_date, WINDOW_ROWS),
+    )
+    T = WINDOW_ROWS
+    w = {
+        "dates": np.full((n, T), np.datetime64("NaT"), dtype="datetime64[D]"),
+        "close": np.full((n, T), np.nan),
+        "volume": np.full((n, T), np.nan),
+        "turnover_rate": np.full((n, T), np.nan),
+    }
+    if rows:
+        code_idx = np.fromiter((pos[r[0]] for r in rows), dtype=np.int64, count=len(rows))
+        counts = np.bincount(code_idx, minlength=n)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        col = T - counts[code_idx] + (np.arange(len(rows)) - starts[code_idx])
+        w["dates"][code_idx, col] = np.array([r[1] for r in rows], dtype="datetime64[D]")
+        vals = np.array([[np.nan if v is None else v for v in r[2:]] for r in rows], dtype=np.float64).reshape(len(rows), 3)
+        for j, name in enumerate(["close", "volume", "turnover_rate"]):
+            w[name][code_idx, col] = vals[:, j]
+    w["exists"] = ~np.isnat(w["dates"])
+    return w
+
+
+def _low_vol_breakout(w: dict[str, np.ndarray], ref_date: date) -> np.ndarray:
+    """selection.js 低量横盘放量突破（quant.low_vol_breakout 默认参数）：ref_date 前 RECENT_DAYS 日内任一行命中即为真。"""
+    hit = breakout(w["close"], w["volume"], w["exists"])["hit"]
+    return (hit & (w["dates"] >= np.datetime64(ref_date - timedelta(days=RECENT_DAYS), "D"))).any(axis=1)
+
+
+def compute_features(conn, ref_date: date) -> dict[str, np.ndarray]:
+    """
+    计算 ref_date 的全市场特征宽表，按代码升序每只一行：
+    TEXT_FIELDS 为 object 数组（缺失 None），NUMERIC_FIELDS 为 float64（缺失 NaN），FLAG_FIELDS 为 bool，
+    另含 last_date（最新日线日期，datetime64[D]，无日线为 NaT）。
+    """
+    base = _fetch(
+        conn,
+        """
+        SELECT c.code, c.name, c.market, c.industry, c.sector,
+               COALESCE(c.market_cap, f.market_cap)::float8, COALESCE(c.pe, f.pe)::float8, c.pb::float8,
+               f.net_profit::float8, f.profit_growth::float8,
+               t.ma5::float8, t.ma10::float8, t.ma20::float8, td.close::float8
+        FROM stex.corp c
+        LEFT JOIN LATERAL (
+            SELECT market_cap, pe, net_profit, profit_growth FROM stex.fundamentals
+            WHERE code = c.code AND report_date <= %s ORDER BY report_date DESC LIMIT 1
+        ) f ON true
+        LEFT JOIN LATERAL (
+            SELECT trade_date, ma5, ma10, ma20 FROM stex.technicals
+            WHERE code = c.code AND trade_date <= %s AND ma5 IS NOT NULL AND ma10 IS NOT NULL AND ma20 IS NOT NULL
+            ORDER BY trade_date DESC LIMIT 1
+        ) t ON true
+        LEFT JOIN stex.stock_day td ON td.code = c.code AND td.trade_date = t.trade_date
+        ORDER BY c.code
+        """,
+        (ref_date, ref_date),
+    )
+    n = len(base)
+    out: dict[str, np.ndarray] = {}
+    for j, f in enumerate(["code", "name", "market", "industry", "sector"]):
+        out[f] = np.array([r[j] for r in base], dtype=object)
+    nums = np.array([[np.nan if v is None else v for v in r[5:]] for r in base], dtype=np.float64).reshape(n, 9)
+    for j, f in enumerate(["market_cap", "pe", "pb", "net_profit", "profit_growth", "ma5", "ma10", "ma20", "ma_close"]):
+        out[f] = nums[:, j]
+    pos = {c: i for i, c in enumerate(out["code"])}
+
+    w = _day_window(conn, pos, n, ref_date)
+    close = w["close"]
+    vol_ma20 = window_mean(w["volume"], range(1, 21))
+    out["last_date"] = w["dates"][:, -1]
+    out["latest_close"] = close[:, -1]
+    out["turnover_rate"] = w["turnover_rate"][:, -1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for f, k in PCT_LAGS.items():
+            prev = close[:, -1 - k]
+            out[f] = np.where((prev != 0) & ~np.isnan(prev), (close[:, -1] - prev) / prev * 100, np.nan)
+        out["vol_ratio_20"] = np.where(vol_ma20[:, -1] > 0, w["volume"][:, -1] / vol_ma20[:, -1], np.nan)
+        ma5, ma10, ma20 = out["ma5"], out["ma10"], out["ma20"]
+        bull, bear = (ma5 > ma10) & (ma10 > ma20), (ma5 < ma10) & (ma10 < ma20)
+        out["ma_state"] = np.where(
+            np.isnan(ma20), None, np.where(bull, "多头排列", np.where(bear, "空头排列", "均线纠缠"))
+        ).astype(object)
+        out["trend_following"] = bull & (out["ma_close"] >= ma20)
+
+    out["growth"] = _growth(conn, pos, n, ref_date)
+    out["tech_competition"] = _codes_in(
+        conn,
+        """
+        SELECT code FROM stex.corp_analysis
+        WHERE competitiveness_analysis IS NOT NULL AND competitiveness_analysis <> ''
+          AND competitiveness_analysis ILIKE ANY(%s)
+        """,
+        ([f"%{k}%" for k in TECH_KEYWORDS],),
+        pos,
+        n,
+    )
+    out["classic_pattern"] = _codes_in(
+        conn,
+        """
+        SELECT DISTINCT code FROM stex.pattern_signal
+        WHERE pattern_type = ANY(%s) AND ref_date >= %s::date - %s AND ref_date <= %s
+        """,
+        (CLASSIC_PATTERNS, ref_date, RECENT_DAYS, ref_date),
+        pos,
+        n,
+    )
+    out["low_vol_breakout"] = _low_vol_breakout(w, ref_date)
+    out["all_combined"] = np.sum([out[k] for k in COMBINED], axis=0) >= 3 if n else np.zeros(0, dtype=bool)
+    return out
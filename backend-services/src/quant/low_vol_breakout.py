@@ -0,0 +1,183 @@
+"""
+「持续低量横盘后放量突破」形态的向量化识别（原 scripts/analyze_low_vol_breakout.py 的逐行分析），
+口径与 backend-api selection.js 的 low_vol_breakout 策略一致，按每只代码自身交易日序列逐行判断：
+- 横盘窗口：当日前 gap+1 ～ gap+cons_days 行（默认前 2～8 行，共 7 日），均量 < cons_vol_ratio × 前 ma_days 日均量，
+  收盘振幅 (max - min) / ((max + min) / 2) < max_range_pct%
+- 突破：当日量 >= surge_ratio × 前 ma_days 日均量，且收盘高于前一日收盘
+均量按 SQL AVG 语义忽略缺失值。全市场扫描按代码分块装载日线矩阵，命中写入 stex.pattern_signal（pattern_type = low_vol_breakout）。
+"""
+import logging
+import time
+from datetime import date, timedelta
+from typing import Any, Optional
+
+import numpy as np
+
+from ..db import copy_upsert, get_conn
+from .data import _to_date, list_codes, load_market, padded_range
+
+logger = logging.getLogger(__name__)
+
+PATTERN_TYPE = "low_vol_breakout"
+DEFAULT_PARAMS: dict[str, Any] = {
+    "ma_days": 20,
+    "cons_days": 7,
+    "gap": 1,
+    "cons_vol_ratio": 0.8,
+    "max_range_pct": 5.0,
+    "surge_ratio": 1.3,
+}
+# 未指定区间时扫描最近的日历日数
+DEFAULT_SCAN_DAYS = 60
+CHUNK_CODES = 1000
+
+
+def lagged(a: np.ndarray, k: int) -> np.ndarray:
+    """沿行方向取 k 行之前的值，越界为 NaN。"""
+    v = np.full_like(a, np.nan)
+    v[:, k:] = a[:, : a.shape[1] - k]
+    return v
+
+
+def window_mean(a: np.ndarray, lags: range) -> np.ndarray:
+    """每行 lags 各滞后值的均值（忽略缺失，同 SQL AVG），全部缺失为 NaN。"""
+    s = np.zeros_like(a)
+    c = np.zeros_like(a)
+    for k in lags:
+        v = lagged(a, k)
+        ok = ~np.isnan(v)
+        s += np.where(ok, v, 0)
+        c += ok
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(c > 0, s / c, np.nan)
+
+
+def window_extreme(a: np.ndarray, lags: range, fn) -> np.ndarray:
+    """每行 lags 各滞后值按 fn（np.fmax / np.fmin）归并，忽略缺失。"""
+    out = np.full_like(a, np.nan)
+    for k in lags:
+        out = fn(out, lagged(a, k))
+    return out
+
+
+def evaluate(
+    close: np.ndarray,
+    volume: np.ndarray,
+    exists: np.ndarray,
+    ma_days: int = 20,
+    cons_days: int = 7,
+    gap: int = 1,
+    cons_vol_ratio: float = 0.8,
+    max_range_pct: float = 5.0,
+    surge_ratio: float = 1.3,
+) -> dict[str, np.ndarray]:
+    """
+    代码 × 行 矩阵上逐行求形态。返回 hit（是否命中）及各中间量：
+    vol_ma（前 ma_days 日均量）、cons_vol（横盘窗口均量）、range_pct（横盘振幅 %）、pct_up（当日涨幅 %）。
+    """
+    prev_close = lagged(close, 1)
+    cons = range(gap + 1, gap + cons_days + 1)
+    vol_ma = window_mean(volume, range(1, ma_days + 1))
+    cons_vol = window_mean(volume, cons)
+    cons_max = window_extreme(close, cons, np.fmax)
+    cons_min = window_extreme(close, cons, np.fmin)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mid = (cons_max + cons_min) / 2
+        range_pct = np.where(mid != 0, (cons_max - cons_min) / mid * 100, np.nan)
+        pct_up = np.where(prev_close != 0, (close - prev_close) / prev_close * 100, np.nan)
+        hit = (
+            exists
+            & (vol_ma > 0)
+            & ~np.isnan(prev_close)
+            & (cons_vol < cons_vol_ratio * vol_ma)
+            & (range_pct < max_range_pct)
+            & (volume >= surge_ratio * vol_ma)
+            & (close > prev_close)
+        )
+    return {"hit": hit, "vol_ma": vol_ma, "cons_vol": cons_vol, "range_pct": range_pct, "pct_up": pct_up}
+
+
+def _resolve_range(start, end) -> tuple[date, Optional[date]]:
+    end_d = _to_date(end)
+    start_d = _to_date(start) or (end_d or date.today()) - timedelta(days=DEFAULT_SCAN_DAYS)
+    return start_d, end_d
+
+
+def scan(
+    codes: Optional[list[str]] = None,
+    start=None,
+    end=None,
+    params: Optional[dict[str, Any]] = None,
+    save: bool = True,
+    details: bool = False,
+    chunk_codes: int = CHUNK_CODES,
+) -> dict[str, Any]:
+    """
+    扫描 codes（为空则全市场）在 [start, end]（start 默认 end/今日前 60 日，end 默认不限）每个交易日的形态。
+    save=True 时先删除范围内已有的 low_vol_breakout 记录再写入命中，重复扫描结果一致。
+    details=True 时返回每条命中的中间量（供 CLI 打印）。
+    返回：{ ok, codes, start, end, hits, saved, elapsed_sec, signals: [{ code, trade_date, ... }] }
+    """
+    t0 = time.time()
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    unknown = [k for k in (params or {}) if k not in DEFAULT_PARAMS]
+    if unknown:
+        return {"ok": False, "error": f"未知参数: {', '.join(unknown)}"}
+    start_d, end_d = _resolve_range(start, end)
+    load_start, load_end = padded_range(start_d, end_d, max(p["ma_days"], p["gap"] + p["cons_days"]) + 1, 0)
+    signals: list[dict[str, Any]] = []
+    saved = 0
+    with get_conn() as conn:
+        code_list = [str(c).strip() for c in codes if str(c).strip()] if codes else list_codes(conn, "stock")
+        if save:
+            sql = "DELETE FROM stex.pattern_signal WHERE pattern_type = %s AND ref_date >= %s"
+            args: list[Any] = [PATTERN_TYPE, start_d]
+            if end_d is not None:
+                sql += " AND ref_date <= %s"
+                args.append(end_d)
+            if codes:
+                sql += " AND code = ANY(%s)"
+                args.append(code_list)
+            with conn.cursor() as cur:
+                cur.execute(sql, args)
+        for i in range(0, len(code_list), chunk_codes):
+            chunk = code_list[i : i + chunk_codes]
+            m = load_market(conn, chunk, load_start, load_end, kind="stock", aux=False)
+            r = evaluate(m["close"], m["volume"], m["exists"], **p)
+            in_range = m["dates"] >= np.datetime64(start_d, "D")
+            if end_d is not None:
+                in_range &= m["dates"] <= np.datetime64(end_d, "D")
+            rr, cc = np.nonzero(r["hit"] & in_range)
+            chunk_signals = []
+            for a, b in zip(rr.tolist(), cc.tolist()):
+                sig: dict[str, Any] = {"code": m["codes"][a], "trade_date": m["dates"][a, b].item()}
+                if details:
+                    sig.update(
+                        close=float(m["close"][a, b]),
+                        volume=float(m["volume"][a, b]),
+                        **{k: round(float(r[k][a, b]), 4) for k in ("vol_ma", "cons_vol", "range_pct", "pct_up")},
+                    )
+                chunk_signals.append(sig)
+            if save and chunk_signals:
+                saved += copy_upsert(
+                    conn,
+                    "stex.pattern_signal",
+                    ["code", "pattern_type", "ref_date"],
+                    [(s["code"], PATTERN_TYPE, s["trade_date"]) for s in chunk_signals],
+                    key_columns=["code", "pattern_type", "ref_date"],
+                    update_columns=[],
+                )
+            signals.extend(chunk_signals)
+            logger.info("low_vol_breakout: %s/%s codes, %s hits", min(i + chunk_codes, len(code_list)), len(code_list), len(signals))
+        conn.commit()
+    signals.sort(key=lambda s: (s["trade_date"], s["code"]))
+    return {
+        "ok": True,
+        "codes": len(code_list),
+        "start": str(start_d),
+        "end": str(end_d) if end_d else None,
+        "hits": len(signals),
+        "saved": saved,
+        "elapsed_sec": round(time.time() - t0, 2),
+        "signals": signals,
+    }
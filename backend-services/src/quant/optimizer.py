@@ -0,0 +1,269 @@
+"""
+信号阈值寻优：在缓存的行情矩阵上对各信号的参数组合做网格 / 随机搜索，多进程并行评估，
+按样本外（split 日及之后）方向命中率排序，最优参数写入 stex.app_config（见 quant.params）供 agent 运行时读取。
+- 行情按代码分块装载一次写成 .npy，各工作进程以只读内存映射打开，不重复查库、不复制数据
+- 命中：看涨 = 前瞻 N 日收益 > 0，看跌 = < 0；换手率 交投清淡 按看跌计，正常活跃/异常活跃 按看涨计
+- 样本外有方向信号数少于 min_samples 的组合不参与排名；默认参数总是参与评估，作为对照
+"""
+import itertools
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import numpy as np
+
+from ..db import get_conn
+from .backtest import CHUNK_CODES, WARMUP_DAYS, forward_metrics
+from .data import list_codes, load_market, open_market, padded_range, save_market
+from .params import load_signal_params, save_signal_params
+from .signals import (
+    DIR_BEAR,
+    DIR_BULL,
+    SIG_SUPPORT_RESIST,
+    SIG_SUSTAINED_MF,
+    SIG_TURNOVER,
+    SIG_VOL_MA20,
+    SIG_VOL_MF_MA20,
+    SIG_VOL_PCT,
+    SIG_VOL_PRICE_DIV,
+    SIG_VOLATILITY_BREAK,
+    TURNOVER_HIGH,
+    TURNOVER_LOW,
+    TURNOVER_NORMAL,
+    index_ma,
+    signal_table,
+)
+
+logger = logging.getLogger(__name__)
+
+# 搜索空间：信号类型 -> {参数: 候选值}。回看窗口上限 30：agent 面板取近 65 行、计算最近 30 日
+_VOL_SPACE = {"avg_vol_days": [3, 5, 10], "volume_ratio_th": [1.1, 1.2, 1.5, 2.0]}
+_SR_SPACE = {"look": [10, 15, 20, 30], "near_pct": [0.01, 0.02, 0.03, 0.05]}
+PARAM_SPACE: dict[str, dict[str, dict[str, list]]] = {
+    "stock": {
+        SIG_VOL_MF_MA20: _VOL_SPACE,
+        SIG_VOL_PCT: _VOL_SPACE,
+        SIG_SUSTAINED_MF: {"look_days": [3, 4, 5, 7]},
+        SIG_SUPPORT_RESIST: _SR_SPACE,
+        SIG_TURNOVER: {"low_th": [1.0, 2.0, 3.0, 5.0], "high_th": [7.0, 10.0, 15.0, 20.0]},
+    },
+    "index": {
+        SIG_VOL_MA20: _VOL_SPACE,
+        SIG_VOL_PCT: _VOL_SPACE,
+        SIG_SUPPORT_RESIST: _SR_SPACE,
+        SIG_VOL_PRICE_DIV: {"look": [10, 15, 20, 30], "avg_vol_days": [3, 5]},
+        SIG_VOLATILITY_BREAK: {"look": [10, 20, 30], "vol_expand_ratio": [1.1, 1.2, 1.5, 2.0]},
+    },
+}
+
+# 无意义的组合（规则恒返回无信号/数据不足等）
+_CONSTRAINTS = {
+    SIG_TURNOVER: lambda p: p["low_th"] < p["high_th"],
+    SIG_VOL_PRICE_DIV: lambda p: p["look"] + 1 >= p["avg_vol_days"] * 2,
+}
+
+MIN_SAMPLES = 30
+OOS_RATIO = 0.3
+
+# 工作进程内的行情块（initializer 打开的内存映射）与样本内/外掩码
+_worker: dict[str, Any] = {}
+
+
+def _candidates(kind: str, sig: str, method: str, n_iter: int, rng: random.Random) -> list[dict[str, Any]]:
+    """sig 的候选参数组合：grid 为全部组合，random 为无放回抽取 n_iter 个；默认参数总在其中。"""
+    space = PARAM_SPACE[kind][sig]
+    keep = _CONSTRAINTS.get(sig, lambda p: True)
+    grid = [p for p in (dict(zip(space, vals)) for vals in itertools.product(*space.values())) if keep(p)]
+    if method == "random" and n_iter < len(grid):
+        grid = rng.sample(grid, n_iter)
+    default = dict(signal_table(kind)[sig][1])
+    if default not in grid:
+        grid.append(default)
+    return grid
+
+
+def _build_cache(conn, codes: list[str], start, end, horizon: int, kind: str, cache_dir: str, chunk_codes: int) -> list[str]:
+    """按代码分块装载行情，连同前瞻收益与有效掩码写入 cache_dir/<块号>，返回各块目录。"""
+    load_start, load_end = padded_range(start, end, WARMUP_DAYS, horizon)
+    paths = []
+    for i in range(0, len(codes), chunk_codes):
+        m = load_market(conn, codes[i : i + chunk_codes], load_start, load_end, kind=kind)
+        if kind == "index":
+            m.update(index_ma(m))
+        ret, _, _, valid = forward_metrics(m, horizon)
+        if start is not None:
+            valid &= m["dates"] >= np.datetime64(start, "D")
+        if end is not None:
+            valid &= m["dates"] <= np.datetime64(end, "D")
+        m["fwd_ret"], m["valid"] = ret, valid
+        path = os.path.join(cache_dir, f"{i // chunk_codes:05d}")
+        save_market(m, path)
+        paths.append(path)
+        logger.info("optimizer: cached %s/%s codes", min(i + chunk_codes, len(codes)), len(codes))
+    return paths
+
+
+def _split_date(paths: list[str], oos_ratio: float) -> Optional[np.datetime64]:
+    """按有效交易日（并集）的时间顺序，取后 oos_ratio 部分的首日作为样本外起点。"""
+    days = np.array([], dtype="datetime64[D]")
+    for p in paths:
+        m = open_market(p)
+        days = np.union1d(days, m["dates"][m["valid"]])
+    if len(days) < 2:
+        return None
+    return days[min(len(days) - 1, max(1, int(len(days) * (1 - oos_ratio))))]
+
+
+def _init_worker(paths: list[str], split: str) -> None:
+    split_d = np.datetime64(split, "D")
+    _worker["chunks"] = []
+    for p in paths:
+        m = open_market(p)
+        oos = m["valid"] & (m["dates"] >= split_d)
+        _worker["chunks"].append((m, m["valid"] & ~oos, oos))
+
+
+def _evaluate(task: tuple[str, dict[str, Any]]) -> dict[str, Any]:
+    """在本进程缓存的全部行情块上评估一个 (信号类型, 参数)：样本内/外的有方向信号数与命中数。"""
+    sig, params = task
+    acc = {"is_count": 0, "is_hits": 0, "oos_count": 0, "oos_hits": 0}
+    for m, ins, oos in _worker["chunks"]:
+        fn, defaults = signal_table(m["kind"])[sig]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            direction, _ = fn(m, **{**defaults, **params})
+        ret = m["fwd_ret"]
+        bull = (direction == DIR_BULL) | (direction == TURNOVER_NORMAL) | (direction == TURNOVER_HIGH)
+        bear = (direction == DIR_BEAR) | (direction == TURNOVER_LOW)
+        hit = (bull & (ret > 0)) | (bear & (ret < 0))
+        for prefix, mask in (("is", ins), ("oos", oos)):
+            sel = mask & (bull | bear)
+            acc[f"{prefix}_count"] += int(sel.sum())
+            acc[f"{prefix}_hits"] += int((hit & sel).sum())
+    row: dict[str, Any] = {"signal_type": sig, "params": params, **acc}
+    for prefix in ("is", "oos"):
+        cnt = acc[f"{prefix}_count"]
+        row[f"{prefix}_accuracy"] = round(acc[f"{prefix}_hits"] / cnt, 4) if cnt else None
+    return row
+
+
+def _manifest(codes: list[str], start, end, horizon: int, kind: str) -> dict[str, Any]:
+    return {"codes": codes, "start": str(start) if start else None, "end": str(end) if end else None, "horizon": horizon, "kind": kind}
+
+
+def run_optimizer(
+    codes: Optional[list[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    horizon: int = 5,
+    kind: str = "stock",
+    signals: Optional[list[str]] = None,
+    method: str = "grid",
+    n_iter: int = 20,
+    oos_ratio: float = OOS_RATIO,
+    split: Optional[str] = None,
+    min_samples: int = MIN_SAMPLES,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    top: int = 5,
+    save: bool = True,
+    cache_dir: Optional[str] = None,
+    chunk_codes: int = CHUNK_CODES,
+) -> dict[str, Any]:
+    """
+    对 kind 的带参数信号（或 signals 指定的）做参数寻优。
+    split 为样本外起始日（为空则按 oos_ratio 取有效交易日的后段）；cache_dir 指定时行情缓存保留，参数相同时复用。
+    save=True 时把各信号最优参数合并进 app_config 中已有参数。
+    返回：{ ok, codes, horizon, split, combos, elapsed_sec, best: {信号类型: 参数}, results: {信号类型: [前 top 名]}, saved }
+    """
+    t0 = time.time()
+    space = PARAM_SPACE.get(kind)
+    if space is None:
+        return {"ok": False, "error": f"未知 kind: {kind}"}
+    if method not in ("grid", "random"):
+        return {"ok": False, "error": f"未知搜索方式: {method}"}
+    sig_list = signals or list(space)
+    unknown = [s for s in sig_list if s not in space]
+    if unknown:
+        return {"ok": False, "error": f"无可寻优参数的信号类型: {', '.join(unknown)}"}
+
+    rng = random.Random(seed)
+    tasks = [(sig, p) for sig in sig_list for p in _candidates(kind, sig, method, n_iter, rng)]
+    own_dir = cache_dir is None
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix="signal_opt_")
+    try:
+        with get_conn() as conn:
+            code_list = [str(c).strip() for c in codes if str(c).strip()] if codes else list_codes(conn, kind)
+            manifest = _manifest(code_list, start, end, horizon, kind)
+            manifest_path = os.path.join(cache_dir, "manifest.json")
+            paths = None
+            if os.path.isfile(manifest_path):
+                with open(manifest_path, encoding="utf-8") as f:
+                    cached = json.load(f)
+                if {k: cached.get(k) for k in manifest} == manifest:
+                    paths = cached["paths"]
+                    logger.info("optimizer: reuse cache %s", cache_dir)
+            if paths is None:
+                paths = _build_cache(conn, code_list, start, end, horizon, kind, cache_dir, chunk_codes)
+                with open(manifest_path, "w", encoding="utf-8") as f:
+                    json.dump({**manifest, "paths": paths}, f, ensure_ascii=False)
+
+        split_d = np.datetime64(split, "D") if split else _split_date(paths, oos_ratio)
+        if split_d is None:
+            return {"ok": False, "error": "有效交易日不足，无法划分样本内/外"}
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(paths, str(split_d))) as pool:
+            rows = list(pool.map(_evaluate, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    finally:
+        if own_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    best: dict[str, dict[str, Any]] = {}
+    results: dict[str, list[dict[str, Any]]] = {}
+    for sig in sig_list:
+        default = dict(signal_table(kind)[sig][1])
+        sig_rows = [r for r in rows if r["signal_type"] == sig]
+        for r in sig_rows:
+            r["is_default"] = r["params"] == default
+        ranked = sorted(
+            (r for r in sig_rows if r["oos_count"] >= min_samples),
+            key=lambda r: (-r["oos_accuracy"], -r["oos_count"]),
+        )
+        results[sig] = ranked[:top] + [r for r in sig_rows if r["is_default"] and r not in ranked[:top]]
+        if ranked:
+            best[sig] = ranked[0]["params"]
+
+    saved = False
+    if save and best:
+        report = {
+            "kind": kind,
+            "horizon": horizon,
+            "start": start,
+            "end": end,
+            "split": str(split_d),
+            "method": method,
+            "codes": len(code_list),
+            "results": {sig: rows_[:1] + [r for r in rows_[1:] if r["is_default"]] for sig, rows_ in results.items()},
+        }
+        with get_conn() as conn:
+            merged = load_signal_params(conn, kind)
+            for sig, p in best.items():
+                merged[sig] = {**merged.get(sig, {}), **p}
+            save_signal_params(conn, merged, kind, report=report)
+        saved = True
+    return {
+        "ok": True,
+        "codes": len(code_list),
+        "horizon": horizon,
+        "split": str(split_d),
+        "combos": len(tasks),
+        "elapsed_sec": round(time.time() - t0, 2),
+        "best": best,
+        "results": results,
+        "saved": saved,
+    }
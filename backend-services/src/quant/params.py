@@ -0,0 +1,68 @@
+"""
+信号阈值参数：默认值取自 quant.signals 的信号表，寻优结果存 stex.app_config（JSON：信号类型 -> {参数: 取值}），
+signal_agent / index_signal_agent 运行时读取；未配置或配置无效时回落到默认值。
+"""
+import json
+import logging
+from typing import Any, Optional
+
+from .signals import signal_table
+
+logger = logging.getLogger(__name__)
+
+# kind -> app_config 键；寻优报告存 <键>_report
+PARAMS_KEYS = {"stock": "signal_params", "index": "index_signal_params"}
+
+
+def default_params(kind: str = "stock") -> dict[str, dict[str, Any]]:
+    """各带参数信号的默认参数（信号类型 -> {参数: 取值}）。"""
+    return {sig: dict(defaults) for sig, (_, defaults) in signal_table(kind).items() if defaults}
+
+
+def merge_params(saved: Optional[dict], kind: str = "stock") -> dict[str, dict[str, Any]]:
+    """默认参数叠加 saved 中的同名参数；未知信号/参数忽略，取值按默认值类型转换（int/float）。"""
+    out = default_params(kind)
+    for sig, overrides in (saved or {}).items():
+        if sig not in out or not isinstance(overrides, dict):
+            continue
+        for k, v in overrides.items():
+            if k not in out[sig]:
+                continue
+            try:
+                out[sig][k] = type(out[sig][k])(v)
+            except (TypeError, ValueError):
+                logger.warning("信号参数无效，忽略: %s.%s=%r", sig, k, v)
+    return out
+
+
+def load_signal_params(conn, kind: str = "stock") -> dict[str, dict[str, Any]]:
+    """读取 app_config 中的信号参数并与默认值合并。"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT value FROM stex.app_config WHERE key = %s", (PARAMS_KEYS[kind],))
+        row = cur.fetchone()
+    saved = None
+    if row and (row[0] or "").strip():
+        try:
+            saved = json.loads(row[0])
+        except ValueError:
+            logger.warning("app_config.%s 不是合法 JSON，使用默认信号参数", PARAMS_KEYS[kind])
+    return merge_params(saved if isinstance(saved, dict) else None, kind)
+
+
+def save_signal_params(conn, params: dict[str, dict], kind: str = "stock", report: Optional[dict] = None) -> None:
+    """写入信号参数（及可选的寻优报告）到 app_config。"""
+    key = PARAMS_KEYS[kind]
+    items = [(key, json.dumps(params, ensure_ascii=False))]
+    if report is not None:
+        items.append((f"{key}_report", json.dumps(report, ensure_ascii=False, default=str)))
+    with conn.cursor() as cur:
+        for k, v in items:
+            cur.execute(
+                """
+                INSERT INTO stex.app_config (key, value, updated_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+                """,
+                (k, v),
+            )
+    conn.commit()
@@ -0,0 +1,284 @@
+"""
+选股引擎：把全市场最新状态装入内存列式快照（每只股票一行，numpy 列），各选股策略与自定义条件都在快照上向量化求值，
+交互式筛选为毫秒级，不必每次请求执行多 CTE 扫描。特征与策略口径见 quant.features（与 backend-api selection.js 一致）：
+growth、tech_competition、classic_pattern、trend_following、low_vol_breakout、all_combined。
+快照优先读每日物化表 stex.screen_daily（其交易日须与 stock_day 最新交易日一致，否则现算），按 SCREEN_SNAPSHOT_TTL 秒过期；
+增量日线入库后 invalidate_snapshot() 作废。
+"""
+import logging
+import threading
+import time
+from datetime import date
+from typing import Any, Optional
+
+import numpy as np
+import psycopg
+
+from ..code_latest import market_latest_trade_date
+from ..collectors.stock import today_cn
+from ..config import SCREEN_SNAPSHOT_TTL
+from ..db import get_conn
+from .features import FLAG_FIELDS, NUMERIC_FIELDS, TEXT_FIELDS, compute_features
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_NAMES = {
+    "growth": "企业增长策略",
+    "tech_competition": "中美科技竞争战略",
+    "classic_pattern": "经典形态策略",
+    "trend_following": "趋势跟踪策略",
+    "low_vol_breakout": "低量横盘放量突破",
+    "all_combined": "全策略综合",
+}
+
+# 结果列表字段（与 selection.js 的策略选股列表一致）
+LIST_FIELDS = [
+    "code", "name", "market", "industry", "sector",
+    "market_cap", "pe", "pb", "net_profit", "profit_growth", "latest_close",
+]
+_TEXT_FIELDS = set(TEXT_FIELDS)
+
+_OPS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+_lock = threading.Lock()  # 只保护 _snapshot / _generation 的读写，装载快照不持有
+_build_lock = threading.Lock()  # 同一时刻只有一个请求在装载，其余沿用旧快照（无旧快照时等待）
+_snapshot: Optional["Snapshot"] = None
+_generation = 0  # invalidate_snapshot() 递增；装载期间被作废的结果不换入
+
+
+class Snapshot:
+    """
+    全市场最新状态：columns 为字段 -> 每只股票一个值（按代码升序），flags 为策略 -> 是否命中。
+    ref_date 为特征基准日（物化表的交易日或现算当日），built_on 为装载当日（北京时间）。
+    """
+
+    def __init__(self, columns: dict[str, np.ndarray], flags: dict[str, np.ndarray], built_on: date, ref_date: date):
+        self.columns = columns
+        self.flags = flags
+        self.built_on = built_on
+        self.ref_date = ref_date
+        self.built_at = time.time()
+        self.codes = columns["code"]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def mask(self, node: Optional[dict]) -> np.ndarray:
+        """
+        条件树求值，返回布尔掩码。节点形式：
+        { "and": [节点, ...] } / { "or": [节点, ...] } / { "not": 节点 }
+        { "strategy": "growth" }
+        { "field": "pe", "op": "<=", "value": 30 }，op 支持 > >= < <= == != between（value 为 [下限, 上限]）、in（value 为列表）、contains（文本字段）；
+        last_date 取值为 YYYY-MM-DD，支持比较运算
+        node 为空表示全部。字段或策略不存在、op 不支持时抛 ValueError。
+        """
+        if not node:
+            return np.ones(len(self), dtype=bool)
+        if not isinstance(node, dict):
+            raise ValueError(f"条件需为对象: {node!r}")
+        if "and" in node or "or" in node:
+            op = "and" if "and" in node else "or"
+            children = node[op]
+            if not isinstance(children, list) or not children:
+                raise ValueError(f"{op} 需为非空列表")
+            masks = [self.mask(c) for c in children]
+            return np.logical_and.reduce(masks) if op == "and" else np.logical_or.reduce(masks)
+        if "not" in node:
+            return ~self.mask(node["not"])
+        if "strategy" in node:
+            key = str(node["strategy"]).lower()
+            if key not in self.flags:
+                raise ValueError(f"未知策略: {node['strategy']}")
+            return self.flags[key].copy()
+        field, op, value = node.get("field"), node.get("op", "=="), node.get("value")
+        if field not in self.columns:
+            raise ValueError(f"未知字段: {field}")
+        col = self.columns[field]
+        if field in _TEXT_FIELDS:
+            if op == "in":
+                return np.isin(col, [str(v) for v in (value or [])])
+            if op == "contains":
+                return np.array([value is not None and str(value) in (v or "") for v in col], dtype=bool)
+            if op in ("==", "!="):
+                hit = col == str(value)
+                return hit if op == "==" else ~hit
+            raise ValueError(f"文本字段 {field} 不支持 {op}")
+        if col.dtype.kind == "M":
+            if op not in _OPS:
+                raise ValueError(f"日期字段 {field} 不支持 {op}")
+            return _OPS[op](col, np.datetime64(str(value)[:10], "D")) & ~np.isnat(col)
+        with np.errstate(invalid="ignore"):
+            if op == "between":
+                if not isinstance(value, (list, tuple)) or len(value) != 2:
+                    raise ValueError("between 需为 [下限, 上限]")
+                lo, hi = value
+                out = ~np.isnan(col)
+                if lo is not None:
+                    out &= col >= float(lo)
+                if hi is not None:
+                    out &= col <= float(hi)
+                return out
+            if op == "in":
+                return np.isin(col, [float(v) for v in (value or [])])
+            if op not in _OPS:
+                raise ValueError(f"不支持的 op: {op}")
+            return _OPS[op](col, float(value))
+
+    def rows(self, mask: np.ndarray, limit: Optional[int] = None) -> list[dict[str, Any]]:
+        """命中代码的列表行（按代码升序，最多 limit 条），NaN 转 None。"""
+        picked = np.flatnonzero(mask)[:limit]
+        out = []
+        for i in picked:
+            row = {}
+            for f in LIST_FIELDS:
+                v = self.columns[f][i]
+                if f in _TEXT_FIELDS:
+                    row[f] = v
+                else:
+                    row[f] = None if np.isnan(v) else float(v)
+            out.append(row)
+        return out
+
+
+def _load_materialized(conn, latest: Optional[date] = None) -> Optional[tuple[date, dict[str, np.ndarray]]]:
+    """
+    stex.screen_daily 最新交易日的物化特征；表不存在、无数据，或物化交易日早于 latest（stock_day 最新交易日，
+    如自选 / 全市场采集后尚未物化）时返回 None。
+    """
+    cols = ["code", "last_date"] + [f for f in TEXT_FIELDS if f != "code"] + NUMERIC_FIELDS + FLAG_FIELDS
+    select = ", ".join(f"{c}::float8" if c in NUMERIC_FIELDS else c for c in cols)
+    try:
+        with conn.cursor(binary=True) as cur:
+            cur.execute(
+                f"""
+                SELECT trade_date, {select} FROM stex.screen_daily
+                WHERE trade_date = (SELECT MAX(trade_date) FROM stex.screen_daily)
+                ORDER BY code
+                """
+            )
+            rows = cur.fetchall()
+    except psycopg.errors.UndefinedTable:
+        conn.rollback()
+        return None
+    if not rows:
+        return None
+    if latest is not None and rows[0][0] < latest:
+        logger.info("screener: screen_daily %s 早于日线最新交易日 %s，改为现算", rows[0][0], latest)
+        return None
+    out: dict[str, np.ndarray] = {}
+    for j, c in enumerate(cols, start=1):
+        values = [r[j] for r in rows]
+        if c in NUMERIC_FIELDS:
+            out[c] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        elif c in FLAG_FIELDS:
+            out[c] = np.array(values, dtype=bool)
+        elif c == "last_date":
+            out[c] = np.array(values, dtype="datetime64[D]")
+        else:
+            out[c] = np.array(values, dtype=object)
+    return rows[0][0], out
+
+
+def build_snapshot(conn) -> Snapshot:
+    """
+    装载全市场快照：优先读 stex.screen_daily 最新交易日的物化特征（入库后由 screen_feature_agent 生成），
+    无物化数据或物化交易日落后于 stock_day 时以当日为基准现算（quant.features.compute_features）。
+    """
+    t0 = time.time()
+    today = today_cn()
+    loaded = _load_materialized(conn, market_latest_trade_date(conn))
+    source = "screen_daily"
+    if loaded is None:
+        loaded, source = (today, compute_features(conn, today)), "live"
+    ref_date, features = loaded
+    columns = {f: v for f, v in features.items() if f not in FLAG_FIELDS}
+    flags = {f: features[f] for f in FLAG_FIELDS}
+    logger.info("screener: snapshot %s codes (%s, %s) in %.2fs", len(columns["code"]), source, ref_date, time.time() - t0)
+    return Snapshot(columns, flags, today, ref_date)
+
+
+def _fresh(snap: Optional[Snapshot]) -> bool:
+    return snap is not None and time.time() - snap.built_at <= SCREEN_SNAPSHOT_TTL and snap.built_on == today_cn()
+
+
+def get_snapshot(refresh: bool = False) -> Snapshot:
+    """
+    当前快照；过期（SCREEN_SNAPSHOT_TTL 秒，或跨北京时间自然日）、已作废或 refresh=True 时重建。
+    装载在锁外进行：已有旧快照时，其他请求在装载期间直接返回旧快照；refresh=True 或尚无快照时等待装载完成。
+    """
+    global _snapshot
+    while True:
+        with _lock:
+            snap, generation = _snapshot, _generation
+        if not refresh and _fresh(snap):
+            return snap
+        if not _build_lock.acquire(blocking=refresh or snap is None):
+            return snap
+        try:
+            with _lock:
+                # 等锁期间其他请求可能已装载完成
+                if not refresh and _fresh(_snapshot):
+                    return _snapshot
+                generation = _generation
+            with get_conn() as conn:
+                built = build_snapshot(conn)
+            with _lock:
+                if generation == _generation:
+                    _snapshot = built
+                    return built
+            # 装载期间数据入库、快照被作废：重新装载
+            refresh = True
+        finally:
+            _build_lock.release()
+
+
+def invalidate_snapshot() -> None:
+    """数据入库后调用：下次筛选时重建快照。"""
+    global _snapshot, _generation
+    with _lock:
+        _snapshot = None
+        _generation += 1
+
+
+def screen(
+    strategies: Optional[list[str]] = None,
+    combine: str = "or",
+    where: Optional[dict] = None,
+    limit: int = 10000,
+    refresh: bool = False,
+) -> dict[str, Any]:
+    """
+    策略选股 + 自定义条件：strategies 按 combine（and 交集 / or 并集）合并，再与 where 条件树取交集。
+    返回：{ ok, strategies, combine, count, list, snapshot_at, elapsed_ms }；参数无效时 { ok: False, error }。
+    """
+    t0 = time.perf_counter()
+    keys = [str(s).strip().lower() for s in (strategies or []) if str(s).strip()]
+    unknown = [k for k in keys if k not in STRATEGY_NAMES]
+    if unknown:
+        return {"ok": False, "error": f"未知策略: {', '.join(unknown)}；可选: {' | '.join(STRATEGY_NAMES)}"}
+    combine = "and" if str(combine or "or").lower() == "and" else "or"
+    snap = get_snapshot(refresh=refresh)
+    try:
+        mask = snap.mask(where)
+    except (ValueError, TypeError) as e:
+        return {"ok": False, "error": f"条件无效: {e}"}
+    if keys:
+        picked = [snap.flags[k] for k in keys]
+        mask &= np.logical_and.reduce(picked) if combine == "and" else np.logical_or.reduce(picked)
+    return {
+        "ok": True,
+        "strategies": [STRATEGY_NAMES[k] for k in keys],
+        "combine": combine,
+        "count": int(mask.sum()),
+        "list": snap.rows(mask, limit=max(0, min(int(limit), 10000))),
+        "snapshot_at": snap.built_at,
+        "ref_date": str(snap.ref_date),
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
@@ -0,0 +1,444 @@
+"""
+信号规则的向量化实现：输入 quant.data.load_market 的行情矩阵（代码 × 行），一次算出全部 (代码, 交易日) 的
+(方向码, 原因码)，与 signal_agent 中逐日的 _signal_* 规则逐条对应；index_signal_agent 直接以此计算指数信号：
+- 判断顺序、None/0 的处理与原规则一致；均值按原规则的求和顺序逐项累加，浮点结果逐位相同
+- 方向码见 DIR_*；原因码为 REASONS[信号类型] 的下标（填充行为 -1），可含 {look_days} 等占位符
+资金流按 (code, trade_date) 对齐到日线行；日线表中不存在的日期上的资金流行不参与计算。
+"""
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+# 方向码
+DIR_BULL = 1
+DIR_BEAR = -1
+DIR_NEUTRAL = 0
+DIR_NONE = -2
+TURNOVER_LOW = 2
+TURNOVER_NORMAL = 3
+TURNOVER_HIGH = 4
+
+DIRECTION_LABELS = {
+    DIR_BULL: "看涨",
+    DIR_BEAR: "看跌",
+    DIR_NEUTRAL: "中性",
+    DIR_NONE: "无信号",
+    TURNOVER_LOW: "交投清淡",
+    TURNOVER_NORMAL: "正常活跃",
+    TURNOVER_HIGH: "异常活跃",
+}
+
+# 信号类型（与 signal_agent / index_signal_agent 一致）
+SIG_VOL_MF_MA20 = "成交量资金MA20"
+SIG_VOL_MA20 = "成交量MA20"
+SIG_VOL_PCT = "成交量涨跌幅"
+SIG_SUSTAINED_MF = "持续资金流向"
+SIG_MA_CROSS = "均线金叉死叉"
+SIG_MA_ALIGN = "均线多空排列"
+SIG_MAIN_FORCE = "主力资金"
+SIG_SUPPORT_RESIST = "支撑阻力位"
+SIG_TURNOVER = "换手率"
+SIG_VOL_PRICE_DIV = "量价背离"
+SIG_VOLATILITY_BREAK = "波动率突破"
+
+REASONS: dict[str, list[str]] = {
+    SIG_VOL_MF_MA20: [
+        "缺日线或成交量", "历史日数不足", "均量无效", "未放量", "无资金流向数据",
+        "高位放量净流入", "低位放量净流入", "高位放量净流出", "低位放量净流出", "放量",
+    ],
+    SIG_VOL_MA20: ["历史日数不足或缺收盘价", "均量无效", "未放量", "无MA20", "低位放量", "高位放量"],
+    SIG_VOL_PCT: ["历史日数不足", "缺收盘价", "均量无效", "放量上涨", "缩量下跌", "放量下跌", "缩量上涨"],
+    SIG_SUSTAINED_MF: [
+        "无资金流向数据，请先执行「采集跟踪股票数据」并确认 Tushare 有资金流向权限(2000+积分)",
+        "无该日资金数据（需先执行采集跟踪股票数据或增量日线）",
+        "不足连续{look_days}日资金数据（当前仅{n}日）",
+        "部分日无净流入额",
+        "连续{look_days}日净流入",
+        "连续{look_days}日净流出",
+        "无持续单向净流入/净流出",
+    ],
+    SIG_MA_CROSS: ["无该日技术指标", "无前一日数据", "均线数据不全", "均线金叉", "均线死叉", "无金叉死叉"],
+    SIG_MA_ALIGN: ["均线数据不全", "多头排列", "空头排列", "均线纠缠"],
+    SIG_MAIN_FORCE: ["无特大单数据", "主力净流入", "主力净流出", "主力无净流入流出"],
+    SIG_SUPPORT_RESIST: [
+        "历史K线不足", "无前段区间", "无有效高低点", "区间无波动",
+        "触及或接近关键支撑位", "触及或接近关键阻力位", "同时接近支撑与阻力", "未触及关键支撑/阻力位",
+    ],
+    SIG_TURNOVER: ["无换手率数据", "换手率无效", "换手率为负", "换手率{rate:.2f}%"],
+    SIG_VOL_PRICE_DIV: [
+        "历史日数不足", "区间不足", "数据不足", "前段均量无效",
+        "顶背离(价创新高量缩)", "底背离(价创新低量缩)", "无显著量价背离",
+    ],
+    SIG_VOLATILITY_BREAK: ["历史日数不足", "无前段区间", "无有效高低点", "突破前段高点", "跌破前段低点", "波动率放大", "未突破"],
+}
+
+
+def _lag(a: np.ndarray, k: int, fill=np.nan) -> np.ndarray:
+    """沿行方向取 k 行之前的值（k<0 为之后），越界填 fill。"""
+    if k == 0:
+        return a
+    out = np.full_like(a, fill)
+    if k > 0:
+        out[:, k:] = a[:, :-k]
+    else:
+        out[:, :k] = a[:, -k:]
+    return out
+
+
+def _seq_sum(a: np.ndarray, lags: range) -> np.ndarray:
+    """按 lags 给定的顺序逐项累加（与 Python sum 对同一窗口的求和顺序一致）。"""
+    acc = None
+    for k in lags:
+        v = _lag(a, k)
+        acc = v.copy() if acc is None else acc + v
+    return acc
+
+
+def _vol0(m: dict) -> np.ndarray:
+    """成交量缺失记 0（同 day.get("volume") or 0）。"""
+    v = m["volume"]
+    return np.where(np.isnan(v), 0.0, v)
+
+
+def _avg_prev_vol(m: dict, avg_vol_days: int) -> np.ndarray:
+    """前 avg_vol_days 日均量（不含当日），顺序同 days[idx - n .. idx - 1]。"""
+    return _seq_sum(_vol0(m), range(avg_vol_days, 0, -1)) / avg_vol_days
+
+
+def _decide(m: dict, rules: list[tuple[np.ndarray, int, int]], default: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """按顺序取第一个成立的 (条件, 方向码, 原因码)；填充行方向为无信号、原因码 -1。"""
+    conds = [c for c, _, _ in rules]
+    direction = np.select(conds, [np.int8(d) for _, d, _ in rules], default=np.int8(default[0])).astype(np.int8)
+    reason = np.select(conds, [np.int8(r) for _, _, r in rules], default=np.int8(default[1])).astype(np.int8)
+    pad = ~m["exists"]
+    direction[pad] = DIR_NONE
+    reason[pad] = -1
+    return direction, reason
+
+
+def vol_mf_ma20(m: dict, avg_vol_days: int = 5, volume_ratio_th: float = 1.2) -> tuple[np.ndarray, np.ndarray]:
+    """成交量+资金+MA20（signal_agent._signal_vol_mf_ma20）。"""
+    close, ma20, net_mf = m["close"], m["ma20"], m["net_mf"]
+    vol = _vol0(m)
+    avg = _avg_prev_vol(m, avg_vol_days)
+    up = vol >= volume_ratio_th * avg
+    inflow = net_mf > 0
+    ma_nan = np.isnan(ma20)
+    high_pos = (~ma_nan & (close > ma20)) | ma_nan
+    low_pos = ~ma_nan & (close < ma20)
+    return _decide(
+        m,
+        [
+            (np.isnan(close) | (vol <= 0), DIR_NONE, 0),
+            (m["idx"] < avg_vol_days, DIR_NONE, 1),
+            (avg <= 0, DIR_NONE, 2),
+            (~up, DIR_NEUTRAL, 3),
+            (np.isnan(net_mf), DIR_NEUTRAL, 4),
+            (high_pos & inflow, DIR_NEUTRAL, 5),
+            (low_pos & inflow, DIR_BULL, 6),
+            (high_pos & ~inflow, DIR_NEUTRAL, 7),
+            (low_pos & ~inflow, DIR_BEAR, 8),
+        ],
+        (DIR_NEUTRAL, 9),
+    )
+
+
+def vol_ma20(m: dict, avg_vol_days: int = 5, volume_ratio_th: float = 1.2) -> tuple[np.ndarray, np.ndarray]:
+    """成交量+MA20 位置，无资金（指数）：低位放量→看涨，高位放量→中性，缩量→中性。"""
+    close, ma20 = m["close"], m["ma20"]
+    avg = _avg_prev_vol(m, avg_vol_days)
+    up = _vol0(m) >= volume_ratio_th * avg
+    return _decide(
+        m,
+        [
+            ((m["idx"] < avg_vol_days) | np.isnan(close), DIR_NONE, 0),
+            (avg <= 0, DIR_NEUTRAL, 1),
+            (~up, DIR_NEUTRAL, 2),
+            (np.isnan(ma20), DIR_NEUTRAL, 3),
+            (close < ma20, DIR_BULL, 4),
+        ],
+        (DIR_NEUTRAL, 5),
+    )
+
+
+def vol_pct(m: dict, avg_vol_days: int = 5, volume_ratio_th: float = 1.2) -> tuple[np.ndarray, np.ndarray]:
+    """成交量+涨跌幅（signal_agent._signal_vol_pct，指数同）。"""
+    close = m["close"]
+    prev_close = _lag(close, 1)
+    pct = (close - prev_close) / prev_close
+    avg = _avg_prev_vol(m, avg_vol_days)
+    up = _vol0(m) >= volume_ratio_th * avg
+    is_up = pct > 0
+    return _decide(
+        m,
+        [
+            ((m["idx"] < 1) | (m["idx"] < avg_vol_days), DIR_NONE, 0),
+            (np.isnan(close) | np.isnan(prev_close) | (prev_close == 0), DIR_NONE, 1),
+            (avg <= 0, DIR_NEUTRAL, 2),
+            (up & is_up, DIR_BULL, 3),
+            (~up & ~is_up, DIR_BEAR, 4),
+            (up & ~is_up, DIR_NEUTRAL, 5),
+        ],
+        (DIR_NEUTRAL, 6),
+    )
+
+
+def sustained_mf(m: dict, look_days: int = 5) -> tuple[np.ndarray, np.ndarray]:
+    """连续 look_days 日净流入/净流出（signal_agent._signal_sustained_mf），窗口按资金流自身的行序列取。"""
+    mf_exists = m["mf_exists"]
+    net_mf = m["net_mf"]
+    T = mf_exists.shape[1]
+    # 资金流行压缩为每只代码自身的连续序列（右对齐），在其上取最近 look_days 行，再映射回日线行
+    rows, cols = np.nonzero(mf_exists)
+    mf_count = np.cumsum(mf_exists, axis=1)
+    packed_col = T - mf_count[:, -1][rows] + mf_count[rows, cols] - 1 if T else cols
+    packed = np.full_like(net_mf, np.nan)
+    packed[rows, packed_col] = net_mf[rows, cols]
+    has_nan_p = np.zeros(mf_exists.shape, dtype=bool)
+    all_pos_p = np.ones(mf_exists.shape, dtype=bool)
+    all_neg_p = np.ones(mf_exists.shape, dtype=bool)
+    for k in range(look_days):
+        w = _lag(packed, k)
+        has_nan_p |= np.isnan(w)
+        all_pos_p &= w > 0
+        all_neg_p &= w < 0
+    has_nan = np.zeros(mf_exists.shape, dtype=bool)
+    all_pos = np.zeros(mf_exists.shape, dtype=bool)
+    all_neg = np.zeros(mf_exists.shape, dtype=bool)
+    has_nan[rows, cols] = has_nan_p[rows, packed_col]
+    all_pos[rows, cols] = all_pos_p[rows, packed_col]
+    all_neg[rows, cols] = all_neg_p[rows, packed_col]
+    any_mf = mf_exists.any(axis=1, keepdims=True)
+    return _decide(
+        m,
+        [
+            (np.broadcast_to(~any_mf, mf_exists.shape), DIR_NONE, 0),
+            (~mf_exists, DIR_NONE, 1),
+            (mf_count < look_days, DIR_NEUTRAL, 2),
+            (has_nan, DIR_NEUTRAL, 3),
+            (all_pos, DIR_BULL, 4),
+            (all_neg, DIR_BEAR, 5),
+        ],
+        (DIR_NEUTRAL, 6),
+    )
+
+
+def ma_cross(m: dict) -> tuple[np.ndarray, np.ndarray]:
+    """MA5/MA10 上穿/下穿 MA20（signal_agent._signal_ma_cross，指数同）。"""
+    ma5, ma10, ma20 = m["ma5"], m["ma10"], m["ma20"]
+    p5, p10, p20 = _lag(ma5, 1), _lag(ma10, 1), _lag(ma20, 1)
+    has10 = ~np.isnan(ma10) & ~np.isnan(p10)
+    golden = ((p5 <= p20) & (ma5 > ma20)) | (has10 & (p10 <= p20) & (ma10 > ma20))
+    death = ((p5 >= p20) & (ma5 < ma20)) | (has10 & (p10 >= p20) & (ma10 < ma20))
+    return _decide(
+        m,
+        [
+            (m["idx"] < 1, DIR_NEUTRAL, 1),
+            (np.isnan(ma5) | np.isnan(ma20) | np.isnan(p5) | np.isnan(p20), DIR_NEUTRAL, 2),
+            (golden, DIR_BULL, 3),
+            (death, DIR_BEAR, 4),
+        ],
+        (DIR_NEUTRAL, 5),
+    )
+
+
+def ma_align(m: dict) -> tuple[np.ndarray, np.ndarray]:
+    """均线多空排列（指数）：MA5>MA10>MA20→看涨，MA5<MA10<MA20→看跌，否则中性。"""
+    ma5, ma10, ma20 = m["ma5"], m["ma10"], m["ma20"]
+    return _decide(
+        m,
+        [
+            (np.isnan(ma5) | np.isnan(ma10) | np.isnan(ma20), DIR_NEUTRAL, 0),
+            ((ma5 > ma10) & (ma10 > ma20), DIR_BULL, 1),
+            ((ma5 < ma10) & (ma10 < ma20), DIR_BEAR, 2),
+        ],
+        (DIR_NEUTRAL, 3),
+    )
+
+
+def main_force(m: dict) -> tuple[np.ndarray, np.ndarray]:
+    """特大单净流入/净流出（signal_agent._signal_main_force）。"""
+    net_elg = m["net_elg"]
+    return _decide(
+        m,
+        [(np.isnan(net_elg), DIR_NEUTRAL, 0), (net_elg > 0, DIR_BULL, 1), (net_elg < 0, DIR_BEAR, 2)],
+        (DIR_NEUTRAL, 3),
+    )
+
+
+def support_resist(m: dict, look: int = 20, near_pct: float = 0.02) -> tuple[np.ndarray, np.ndarray]:
+    """接近前 look 日支撑/阻力（signal_agent._signal_support_resist，指数同）。"""
+    close, low, high = m["close"], m["low"], m["high"]
+    support = np.full_like(close, np.inf)
+    resistance = np.full_like(close, -np.inf)
+    for k in range(1, look + 1):
+        lo, hi = _lag(low, k), _lag(high, k)
+        # d.get("low") or close：缺失或为 0 时用当日收盘价
+        support = np.minimum(support, np.where(np.isnan(lo) | (lo == 0), close, lo))
+        resistance = np.maximum(resistance, np.where(np.isnan(hi) | (hi == 0), close, hi))
+    thr = np.where(resistance != support, near_pct * (resistance - support), 0.01 * close)
+    near_support = (~np.isnan(low) & (low <= support + thr)) | (close <= support + thr)
+    near_resist = (~np.isnan(high) & (high >= resistance - thr)) | (close >= resistance - thr)
+    return _decide(
+        m,
+        [
+            ((m["idx"] < look) | np.isnan(close), DIR_NONE, 0),
+            (thr <= 0, DIR_NEUTRAL, 3),
+            (near_support & ~near_resist, DIR_BULL, 4),
+            (near_resist & ~near_support, DIR_BEAR, 5),
+            (near_support & near_resist, DIR_NEUTRAL, 6),
+        ],
+        (DIR_NEUTRAL, 7),
+    )
+
+
+def turnover(m: dict, low_th: float = 3.0, high_th: float = 10.0) -> tuple[np.ndarray, np.ndarray]:
+    """换手率分档（signal_agent._signal_turnover）：< low_th 交投清淡，<= high_th 正常活跃，否则异常活跃。"""
+    rate = m["turnover_rate"]
+    return _decide(
+        m,
+        [
+            (np.isnan(rate), DIR_NONE, 0),
+            (rate < 0, DIR_NONE, 2),
+            (rate < low_th, TURNOVER_LOW, 3),
+            (rate <= high_th, TURNOVER_NORMAL, 3),
+        ],
+        (TURNOVER_HIGH, 3),
+    )
+
+
+def vol_price_divergence(m: dict, look: int = 10, avg_vol_days: int = 5) -> tuple[np.ndarray, np.ndarray]:
+    """量价背离（指数）：价创 look 日新高且量缩→看跌（顶背离），创新低且量缩→看涨（底背离）。"""
+    close = m["close"]
+    vol = _vol0(m)
+    recent = _seq_sum(vol, range(avg_vol_days - 1, -1, -1)) / avg_vol_days
+    prev = _seq_sum(vol, range(2 * avg_vol_days - 1, avg_vol_days - 1, -1)) / avg_vol_days
+    max_c = np.full_like(close, -np.inf)
+    min_c = np.full_like(close, np.inf)
+    for k in range(look + 1):
+        c = _lag(close, k)
+        max_c = np.where(np.isnan(c), max_c, np.maximum(max_c, c))
+        min_c = np.where(np.isnan(c), min_c, np.minimum(min_c, c))
+    shrink = recent < prev
+    short_window = np.full(close.shape, look + 1 < avg_vol_days * 2)
+    return _decide(
+        m,
+        [
+            ((m["idx"] < look) | np.isnan(close) | (m["idx"] < avg_vol_days * 2), DIR_NONE, 0),
+            (short_window, DIR_NEUTRAL, 2),
+            (prev <= 0, DIR_NEUTRAL, 3),
+            ((close >= max_c) & shrink, DIR_BEAR, 4),
+            ((close <= min_c) & shrink, DIR_BULL, 5),
+        ],
+        (DIR_NEUTRAL, 6),
+    )
+
+
+def _avg_range(m: dict, lags: range) -> np.ndarray:
+    """lags 内有效 K 线振幅 (high-low)/close 的均值，无有效 K 线为 0。"""
+    total = np.zeros_like(m["close"])
+    cnt = np.zeros_like(m["close"])
+    for k in lags:
+        h, l_, c = _lag(m["high"], k), _lag(m["low"], k), _lag(m["close"], k)
+        ok = ~np.isnan(h) & ~np.isnan(l_) & ((h - l_) > 0) & (c > 0)
+        total = total + np.where(ok, (h - l_) / np.where(ok, c, 1.0), 0.0)
+        cnt += ok
+    return np.where(cnt > 0, total / np.maximum(cnt, 1), 0.0)
+
+
+def volatility_breakout(m: dict, look: int = 20, vol_expand_ratio: float = 1.2) -> tuple[np.ndarray, np.ndarray]:
+    """突破前 look 日高低点→看涨/看跌；未突破但近 5 日振幅均值 ≥ 前 10 日的 vol_expand_ratio 倍→波动率放大（指数）。"""
+    close, high, low = m["close"], m["high"], m["low"]
+    resistance = np.full_like(close, -np.inf)
+    support = np.full_like(close, np.inf)
+    for k in range(1, look + 1):
+        c = _lag(close, k)
+        h = np.where(np.isnan(_lag(high, k)), c, _lag(high, k))
+        l_ = np.where(np.isnan(_lag(low, k)), c, _lag(low, k))
+        resistance = np.where(np.isnan(h), resistance, np.maximum(resistance, h))
+        support = np.where(np.isnan(l_), support, np.minimum(support, l_))
+    no_level = np.isinf(resistance) | np.isinf(support) | (resistance <= 0) | (support <= 0)
+    ar5 = _avg_range(m, range(5, -1, -1))
+    ar10 = _avg_range(m, range(15, 5, -1))
+    expand = (m["idx"] >= 15) & (ar10 > 0) & (ar5 >= vol_expand_ratio * ar10)
+    return _decide(
+        m,
+        [
+            ((m["idx"] < look) | np.isnan(close), DIR_NONE, 0),
+            (no_level, DIR_NEUTRAL, 2),
+            (close > resistance, DIR_BULL, 3),
+            (close < support, DIR_BEAR, 4),
+            (expand, DIR_NEUTRAL, 5),
+        ],
+        (DIR_NEUTRAL, 6),
+    )
+
+
+def index_ma(m: dict) -> dict[str, np.ndarray]:
+    """
+    由收盘价计算指数 MA5/MA10/MA20：
+    自序列第 20 行起、收盘价有效时计算，窗口内任一收盘价缺失或为 0 则该均线为 NaN。
+    """
+    close = m["close"]
+    truthy = ~np.isnan(close) & (close != 0)
+    base = (m["idx"] >= 19) & ~np.isnan(close)
+    out = {}
+    for n, name in ((5, "ma5"), (10, "ma10"), (20, "ma20")):
+        all_ok = np.ones_like(truthy)
+        for k in range(n):
+            all_ok &= _lag(truthy, k, False)
+        s = _seq_sum(close, range(n - 1, -1, -1)) / n
+        out[name] = np.where(base & all_ok, s, np.nan)
+    return out
+
+
+# 各类信号：(计算函数, 默认参数)。参数名与原 _signal_* 规则一致
+STOCK_SIGNALS: dict[str, tuple[Callable[..., tuple[np.ndarray, np.ndarray]], dict[str, Any]]] = {
+    SIG_VOL_MF_MA20: (vol_mf_ma20, {"avg_vol_days": 5, "volume_ratio_th": 1.2}),
+    SIG_VOL_PCT: (vol_pct, {"avg_vol_days": 5, "volume_ratio_th": 1.2}),
+    SIG_SUSTAINED_MF: (sustained_mf, {"look_days": 5}),
+    SIG_MA_CROSS: (ma_cross, {}),
+    SIG_MAIN_FORCE: (main_force, {}),
+    SIG_SUPPORT_RESIST: (support_resist, {"look": 20, "near_pct": 0.02}),
+    SIG_TURNOVER: (turnover, {"low_th": 3.0, "high_th": 10.0}),
+}
+
+INDEX_SIGNALS: dict[str, tuple[Callable[..., tuple[np.ndarray, np.ndarray]], dict[str, Any]]] = {
+    SIG_VOL_MA20: (vol_ma20, {"avg_vol_days": 5, "volume_ratio_th": 1.2}),
+    SIG_VOL_PCT: (vol_pct, {"avg_vol_days": 5, "volume_ratio_th": 1.2}),
+    SIG_MA_CROSS: (ma_cross, {}),
+    SIG_MA_ALIGN: (ma_align, {}),
+    SIG_SUPPORT_RESIST: (support_resist, {"look": 20, "near_pct": 0.02}),
+    SIG_VOL_PRICE_DIV: (vol_price_divergence, {"look": 10, "avg_vol_days": 5}),
+    SIG_VOLATILITY_BREAK: (volatility_breakout, {"look": 20, "vol_expand_ratio": 1.2}),
+}
+
+
+def signal_table(kind: str) -> dict[str, tuple[Callable[..., tuple[np.ndarray, np.ndarray]], dict[str, Any]]]:
+    return STOCK_SIGNALS if kind == "stock" else INDEX_SIGNALS
+
+
+def compute_signals(
+    m: dict,
+    params: Optional[dict[str, dict]] = None,
+    signals: Optional[list[str]] = None,
+) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    计算 m 上的全部（或 signals 指定的）信号。params：信号类型 -> 覆盖的参数。
+    指数行情（kind=index）先由收盘价补算 MA5/10/20。返回 信号类型 -> (方向码, 原因码)。
+    """
+    table = signal_table(m.get("kind", "stock"))
+    if m.get("kind") == "index" and "ma20" not in m:
+        m.update(index_ma(m))
+    out = {}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for name in signals or list(table):
+            fn, defaults = table[name]
+            out[name] = fn(m, **{**defaults, **((params or {}).get(name) or {})})
+    return out
+
+
+def reason_text(signal_type: str, reason_code: int, **fmt) -> str:
+    """原因码 -> 原因文本；含占位符的原因（如 {look_days}、{rate}）需传入对应取值。"""
+    text = REASONS[signal_type][reason_code]
+    return text.format(**fmt) if fmt else text
@@ -1,12 +1,18 @@
 """
 简单的 LLM 聊天接口，供 Node.js 后端调用。
+共享异步客户端（src/llm_client.py）：连接池复用、并发上限与请求超时；/llm/chat/stream 以 SSE 逐段返回。
+提示词缓存（src/llm_cache.py）：相同 / 近似提示词直接返回缓存答案，响应带 cached 标记。
 """
+import json
+from typing import Optional
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
 
-from openai import OpenAI
-from ..config import MOONSHOT_API_KEY, MOONSHOT_BASE_URL
+from .. import llm_client
+from ..config import MOONSHOT_API_KEY
+from ..llm_cache import get_cache
 
 router = APIRouter()
 
@@ -15,21 +21,84 @@ class ChatRequest(BaseModel):
     prompt: str
     max_tokens: Optional[int] = 1000
     model: Optional[str] = "moonshot-v1-8k"
+    timeout: Optional[float] = None  # 秒，默认 LLM_TIMEOUT_SEC
+    cache: Optional[bool] = True  # False 时不读缓存（结果仍写入）
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _cached(body: ChatRequest) -> Optional[dict]:
+    cache = get_cache()
+    if cache is None or body.cache is False:
+        return None
+    return cache.get(body.prompt, body.model or llm_client.DEFAULT_MODEL, body.max_tokens or 1000)
+
+
+def _remember(body: ChatRequest, content: str) -> None:
+    cache = get_cache()
+    if cache is not None:
+        cache.put(body.prompt, body.model or llm_client.DEFAULT_MODEL, body.max_tokens or 1000, content)
 
 
 @router.post("/llm/chat")
-def llm_chat(body: ChatRequest):
+async def llm_chat(body: ChatRequest):
     if not MOONSHOT_API_KEY:
         raise HTTPException(503, "MOONSHOT_API_KEY not configured")
-    
-    client = OpenAI(api_key=MOONSHOT_API_KEY, base_url=MOONSHOT_BASE_URL)
+    hit = _cached(body)
+    if hit:
+        return {"ok": True, "content": hit["content"], "cached": True, "cache_match": hit["match"], "similarity": hit["similarity"]}
     try:
-        resp = client.chat.completions.create(
-            model=body.model or "moonshot-v1-8k",
-            messages=[{"role": "user", "content": body.prompt}],
-            max_tokens=body.max_tokens or 1000,
-        )
-        content = (resp.choices[0].message.content or "").strip()
-        return {"ok": True, "content": content}
+        content = await llm_client.chat(body.prompt, model=body.model, max_tokens=body.max_tokens or 1000, timeout=body.timeout)
+        _remember(body, content)
+        return {"ok": True, "content": content, "cached": False}
+    except llm_client.LLMBusy as e:
+        raise HTTPException(503, str(e))
+    except llm_client.LLMTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
         raise HTTPException(500, f"LLM call failed: {e}")
+
+
+@router.post("/llm/chat/stream")
+async def llm_chat_stream(body: ChatRequest):
+    """
+    SSE：每个增量分片一条 data: {"delta": "..."}；结束时 event: done（data 为完整内容与 cached 标记），
+    出错时 event: error（data.error 为原因，已输出的分片仍有效）。缓存命中时整段答案作为一个分片返回。
+    """
+    if not MOONSHOT_API_KEY:
+        raise HTTPException(503, "MOONSHOT_API_KEY not configured")
+    hit = _cached(body)
+
+    async def events():
+        if hit:
+            yield _sse({"delta": hit["content"]})
+            yield _sse({"ok": True, "content": hit["content"], "cached": True, "cache_match": hit["match"], "similarity": hit["similarity"]}, event="done")
+            return
+        parts: list[str] = []
+        try:
+            async for delta in llm_client.chat_stream(
+                body.prompt, model=body.model, max_tokens=body.max_tokens or 1000, timeout=body.timeout
+            ):
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except llm_client.LLMBusy as e:
+            yield _sse({"ok": False, "error": str(e), "status": 503}, event="error")
+            return
+        except llm_client.LLMTimeout as e:
+            yield _sse({"ok": False, "error": str(e), "status": 504}, event="error")
+            return
+        except Exception as e:
+            yield _sse({"ok": False, "error": f"LLM call failed: {e}", "status": 500}, event="error")
+            return
+        content = "".join(parts).strip()
+        _remember(body, content)
+        yield _sse({"ok": True, "content": content, "cached": False}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
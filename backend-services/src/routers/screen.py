@@ -0,0 +1,54 @@
+"""
+选股接口：在内存列式快照上按策略（and/or 组合）与自定义条件树筛选，供 Node.js 后端或前端直接调用。
+"""
+from typing import Any, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from ..quant.screener import STRATEGY_NAMES, get_snapshot, screen
+
+router = APIRouter()
+
+
+class ScreenBody(BaseModel):
+    strategies: Optional[list[str]] = None  # growth | tech_competition | classic_pattern | trend_following | low_vol_breakout | all_combined
+    combine: str = "or"  # and 交集 / or 并集
+    where: Optional[dict[str, Any]] = None  # 条件树，如 {"and": [{"field": "pe", "op": "<=", "value": 30}, {"strategy": "growth"}]}
+    limit: int = 10000
+    refresh: bool = False  # 强制重建快照
+
+
+@router.get("/screen/strategies")
+def screen_strategies():
+    return {"strategies": [{"key": k, "name": v} for k, v in STRATEGY_NAMES.items()]}
+
+
+@router.post("/screen")
+def screen_codes(body: ScreenBody):
+    result = screen(
+        strategies=body.strategies,
+        combine=body.combine,
+        where=body.where,
+        limit=body.limit,
+        refresh=body.refresh,
+    )
+    if not result.get("ok"):
+        raise HTTPException(400, result.get("error"))
+    return result
+
+
+@router.get("/screen/strategy")
+def screen_strategy(strategy: str, limit: int = 10000):
+    """单策略选股，返回结构同 backend-api GET /selection/strategy。"""
+    key = (strategy or "").strip().lower()
+    if key not in STRATEGY_NAMES:
+        raise HTTPException(400, f"strategy 需为: {' | '.join(STRATEGY_NAMES)}")
+    result = screen(strategies=[key], limit=limit)
+    return {"strategy": key, "strategyName": STRATEGY_NAMES[key], "list": result["list"]}
+
+
+@router.post("/screen/refresh")
+def screen_refresh():
+    snap = get_snapshot(refresh=True)
+    return {"ok": True, "codes": len(snap), "snapshot_at": snap.built_at}
@@ -5,6 +5,7 @@ from pydantic import BaseModel
 from typing import Optional
 
 from ..config import MOONSHOT_API_KEY, DATA_SOURCE
+from ..code_latest import stalest_codes
 from ..db import get_conn
 from ..workflow import run_workflow
 from ..agents.corp_agent import run_corp_agent
@@ -18,6 +19,12 @@ from ..agents.index_signal_agent import run_index_signal_agent
 from ..agents.investment_summary_agent import run_investment_summary_agent
 from ..agents.pattern_agent import run_pattern_agent
 from ..agents.incremental_daily_agent import run_incremental_daily_agent
+from ..agents.screen_feature_agent import run_screen_feature_agent
+from ..agents.minute_data_agent import run_minute_data_agent
+from ..quant.low_vol_breakout import scan as scan_low_vol_breakout
+from ..partitions import run_partition_maintenance
+from ..scheduler import run_full_market_collection
+from ..store.ohlcv_parquet import sync_ohlcv_store
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -26,11 +33,18 @@ router = APIRouter()
 class TriggerBody(BaseModel):
     action: str = "collect"  # collect | analyze | collect_corp | collect_watchlist | collect_full_market | parse_corp_batch | compute_signals | compute_index_signals | news_signal | ...
     codes: Optional[list[str]] = None
-    interval_min: Optional[int] = None  # 日线=0, 15分钟=15 等
+    interval_min: Optional[int] = None  # 日线=0, 15分钟=15 等；collect_minute 时只聚合该周期（默认 5/15/30/60）
     batch_size: Optional[int] = None  # collect_full_market 每批数量，默认 80
     industry: Optional[str] = None  # parse_corp_batch 时可选：行业名，逗号分隔，不传则用默认科技/制造行业
     batches: Optional[int] = None  # collect_full_market / parse_corp_batch 时：连续批次数，默认 1
-    start_date: Optional[str] = None  # incremental_daily 时可选：起始日期 YYYY-MM-DD 或 YYYYMMDD，拉取该日（含）之后到最近交易日
+    workers: Optional[int] = None  # collect_full_market 时：并发采集线程数，默认 FULL_MARKET_WORKERS
+    start_date: Optional[str] = None  # incremental_daily 时可选：起始日期 YYYY-MM-DD 或 YYYYMMDD，拉取该日（含）之后到最近交易日；materialize_screen 时为物化交易日；scan_low_vol_breakout / collect_minute 时为起始日
+
+
+def _codes_lacking_daily(batch_size: int) -> list[str]:
+    """全市场采集选批：最新日线最旧（无日线优先）的 batch_size 只，读 stex.code_latest，不再聚合 stock_day。"""
+    with get_conn() as conn:
+        return stalest_codes(conn, batch_size)
 
 
 @router.post("/trigger")
@@ -94,30 +108,16 @@ async def trigger(body: TriggerBody):
             conn.commit()
         return {"ok": result.get("ok", False), "action": body.action, "result": result}
 
-    # Agent：全市场数据采集（支持批次数，后台异步串行执行，防止前端超时）
+    # Agent：全市场数据采集（优先队列调度：跟踪列表/缺日线多/市值大者优先，多线程并发，批大小与间隔随限流自适应，后台执行防止前端超时）
     if body.action == "collect_full_market":
         import threading
-        import time
 
         batch_size = min((body.batch_size or 80), 200)
-        batches = max(1, min(body.batches or 1, 20))  # 一次触发最多串行 20 批
-        delay_sec = 60  # 批次间隔，防限流，可按需调小
+        batches = max(1, min(body.batches or 1, 20))  # 一次触发最多处理约 20 批初始批大小的股票
+        workers = body.workers
 
         # 先探测是否有待更新股票
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT c.code FROM stex.corp c
-                    LEFT JOIN (
-                        SELECT code, MAX(trade_date) AS last_date FROM stex.stock_day GROUP BY code
-                    ) d ON d.code = c.code
-                    ORDER BY d.last_date NULLS FIRST, d.last_date ASC NULLS FIRST
-                    LIMIT %s
-                    """,
-                    (batch_size,),
-                )
-                codes_arg = [str(r[0]) for r in cur.fetchall()]
+        codes_arg = _codes_lacking_daily(batch_size)
         if not codes_arg:
             return {
                 "ok": True,
@@ -134,59 +134,19 @@ async def trigger(body: TriggerBody):
                     VALUES (%s, %s, %s, %s, NOW())
                     RETURNING id
                     """,
-                    ("collect_full_market", "watchlist_data_agent", f"全市场数据采集(计划 {batches} 批，每批约 {batch_size} 只)", "running"),
+                    ("collect_full_market", "watchlist_data_agent", f"全市场数据采集(计划约 {batches * batch_size} 只，初始每批 {batch_size} 只)", "running"),
                 )
                 row = cur.fetchone()
                 log_id = row[0] if row else None
             conn.commit()
 
         def _run_batches():
-            per_batch = []
-            total_processed = 0
-            ok_all = True
             try:
-                for b in range(batches):
-                    # 每批重新选择“最缺日线”的股票
-                    with get_conn() as conn:
-                        with conn.cursor() as cur:
-                            cur.execute(
-                                """
-                                SELECT c.code FROM stex.corp c
-                                LEFT JOIN (
-                                    SELECT code, MAX(trade_date) AS last_date FROM stex.stock_day GROUP BY code
-                                ) d ON d.code = c.code
-                                ORDER BY d.last_date NULLS FIRST, d.last_date ASC NULLS FIRST
-                                LIMIT %s
-                                """,
-                                (batch_size,),
-                            )
-                            codes_batch = [str(r[0]) for r in cur.fetchall()]
-                    if not codes_batch:
-                        per_batch.append({"batch": b + 1, "codes": 0, "ok": True, "message": "无待更新股票，提前结束"})
-                        break
-
-                    result = run_watchlist_data_agent(codes=codes_batch)
-                    result["batch_size"] = len(codes_batch)
-                    result["batch_index"] = b + 1
-                    total_processed += result.get("codes_processed", 0)
-                    ok_all = ok_all and result.get("ok", False)
-                    per_batch.append(result)
-                    logger.info("全市场数据采集 批次 %s 完成，共 %s 只", b + 1, result.get("codes_processed", 0))
-
-                    if b < batches - 1:
-                        time.sleep(delay_sec)
-
-                summary = {
-                    "ok": ok_all,
-                    "batches_requested": batches,
-                    "batches_run": len(per_batch),
-                    "total_processed": total_processed,
-                    "per_batch": per_batch,
-                }
-                status = "success" if ok_all else "failed"
+                summary = run_full_market_collection(max_codes=batches * batch_size, batch_size=batch_size, workers=workers)
+                status = "success" if summary.get("ok") else "failed"
             except Exception as e:
                 logger.exception("collect_full_market async")
-                summary = {"ok": False, "error": str(e), "per_batch": per_batch}
+                summary = {"ok": False, "error": str(e)}
                 status = "failed"
 
             # 写回日志
@@ -207,7 +167,7 @@ async def trigger(body: TriggerBody):
             "ok": True,
             "action": "collect_full_market",
             "result": {
-                "message": f"已后台启动，全市场数据采集计划 {batches} 批，每批约 {batch_size} 只，间隔 ~{delay_sec}s；请稍后在执行日志查看进度",
+                "message": f"已后台启动，全市场数据采集计划约 {batches * batch_size} 只（最旧优先，批大小与间隔自适应）；请稍后在执行日志查看进度",
                 "batches": batches,
                 "batch_size": batch_size,
                 "log_id": log_id,
@@ -228,7 +188,8 @@ async def trigger(body: TriggerBody):
             conn.commit()
         return {"ok": True, "action": "collect", "codes": body.codes, "message": "Task queued (placeholder)"}
 
-    if body.action == "analyze" and body.codes:
+    # 行情简评：codes 不传则分析全部收藏（一次取数，按 token 预算分批并发调用 LLM，每只一条 summary 信号）
+    if body.action == "analyze":
         if not MOONSHOT_API_KEY:
             raise HTTPException(503, "MOONSHOT_API_KEY not configured")
         result = await run_workflow(body.codes)
@@ -581,6 +542,164 @@ async def trigger(body: TriggerBody):
             conn.commit()
         return {"ok": result.get("ok", False), "action": "incremental_daily", "result": result}
 
+    # 日线列式镜像：将 stex.stock_day 增量同步为按月分区 Parquet（需配置 OHLCV_STORE_DIR；start_date 可强制从该日所在月重写）
+    if body.action == "sync_ohlcv_store":
+        log_id = None
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO stex.workflow_log (workflow_id, agent_id, task, status, started_at)
+                    VALUES (%s, %s, %s, %s, NOW())
+                    RETURNING id
+                    """,
+                    ("sync_ohlcv_store", "ohlcv_store", "日线 Parquet 镜像同步", "running"),
+                )
+                row = cur.fetchone()
+                log_id = row[0] if row else None
+            conn.commit()
+        try:
+            result = sync_ohlcv_store(since=body.start_date)
+        except Exception as e:
+            logger.exception("sync_ohlcv_store")
+            result = {"ok": False, "error": str(e)}
+        status = "success" if result.get("ok") else "failed"
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE stex.workflow_log SET status = %s, finished_at = NOW(), output_snapshot = %s WHERE id = %s",
+                    (status, json.dumps(result, default=str, ensure_ascii=False), log_id),
+                )
+            conn.commit()
+        return {"ok": result.get("ok", False), "action": "sync_ohlcv_store", "result": result}
+
+    # 选股特征物化：计算指定交易日（start_date，不传为最新交易日）全市场特征写入 stex.screen_daily（增量日线后已自动执行）
+    if body.action == "materialize_screen":
+        log_id = None
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO stex.workflow_log (workflow_id, agent_id, task, status, started_at)
+                    VALUES (%s, %s, %s, %s, NOW())
+                    RETURNING id
+                    """,
+                    ("materialize_screen", "screen_feature_agent", f"选股特征物化 {body.start_date or '最新交易日'}", "running"),
+                )
+                row = cur.fetchone()
+                log_id = row[0] if row else None
+            conn.commit()
+        result = run_screen_feature_agent(trade_date=body.start_date)
+        status = "success" if result.get("ok") else "failed"
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE stex.workflow_log SET status = %s, finished_at = NOW(), output_snapshot = %s WHERE id = %s",
+                    (status, json.dumps(result, default=str, ensure_ascii=False), log_id),
+                )
+            conn.commit()
+        return {"ok": result.get("ok", False), "action": "materialize_screen", "result": result}
+
+    # Agent：分钟线采集（MINUTE_SOURCE 数据源，codes 为空则 watchlist），1 分钟线聚合为 5/15/30/60 分钟写入 stex.stock_min
+    if body.action == "collect_minute":
+        codes_arg = body.codes if body.codes else None
+        intervals = [body.interval_min] if body.interval_min and body.interval_min > 1 else None
+        log_id = None
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO stex.workflow_log (workflow_id, agent_id, task, status, started_at)
+                    VALUES (%s, %s, %s, %s, NOW())
+                    RETURNING id
+                    """,
+                    (
+                        "collect_minute",
+                        "minute_data_agent",
+                        f"分钟线采集 {len(codes_arg) if codes_arg else 'watchlist'} 自 {body.start_date or '近7日'}",
+                        "running",
+                    ),
+                )
+                row = cur.fetchone()
+                log_id = row[0] if row else None
+            conn.commit()
+        result = run_minute_data_agent(codes=codes_arg, start_date=body.start_date, intervals=intervals)
+        status = "success" if result.get("ok") else "failed"
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE stex.workflow_log SET status = %s, finished_at = NOW(), output_snapshot = %s WHERE id = %s",
+                    (status, json.dumps(result, default=str, ensure_ascii=False), log_id),
+                )
+            conn.commit()
+        return {"ok": result.get("ok", False), "action": "collect_minute", "result": result}
+
+    # 时序表分区维护：预建 stock_day / signals / stock_min 未来分区，按 STOCK_MIN_RETENTION_DAYS 归档过期分钟线分区
+    if body.action == "maintain_partitions":
+        log_id = None
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO stex.workflow_log (workflow_id, agent_id, task, status, started_at)
+                    VALUES (%s, %s, %s, %s, NOW())
+                    RETURNING id
+                    """,
+                    ("maintain_partitions", "partitions", "时序表分区维护", "running"),
+                )
+                row = cur.fetchone()
+                log_id = row[0] if row else None
+            conn.commit()
+        result = run_partition_maintenance()
+        status = "success" if result.get("ok") else "failed"
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE stex.workflow_log SET status = %s, finished_at = NOW(), output_snapshot = %s WHERE id = %s",
+                    (status, json.dumps(result, default=str, ensure_ascii=False), log_id),
+                )
+            conn.commit()
+        return {"ok": result.get("ok", False), "action": "maintain_partitions", "result": result}
+
+    # 形态扫描：低量横盘放量突破（向量化，codes 为空则全市场），命中写入 stex.pattern_signal
+    if body.action == "scan_low_vol_breakout":
+        codes_arg = body.codes if body.codes else None
+        log_id = None
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO stex.workflow_log (workflow_id, agent_id, task, status, started_at)
+                    VALUES (%s, %s, %s, %s, NOW())
+                    RETURNING id
+                    """,
+                    (
+                        "scan_low_vol_breakout",
+                        "low_vol_breakout",
+                        f"低量横盘放量突破扫描 {len(codes_arg) if codes_arg else '全市场'} 自 {body.start_date or '近60日'}",
+                        "running",
+                    ),
+                )
+                row = cur.fetchone()
+                log_id = row[0] if row else None
+            conn.commit()
+        try:
+            result = scan_low_vol_breakout(codes=codes_arg, start=body.start_date, save=True)
+            # 命中明细在 pattern_signal 中，日志只留汇总
+            result.pop("signals", None)
+        except Exception as e:
+            logger.exception("scan_low_vol_breakout failed")
+            result = {"ok": False, "error": str(e)}
+        status = "success" if result.get("ok") else "failed"
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE stex.workflow_log SET status = %s, finished_at = NOW(), output_snapshot = %s WHERE id = %s",
+                    (status, json.dumps(result, default=str, ensure_ascii=False), log_id),
+                )
+            conn.commit()
+        return {"ok": result.get("ok", False), "action": "scan_low_vol_breakout", "result": result}
+
     # Agent：股票投资总结（信号+日线+技术+企业分析+大盘+财务 → LLM 输出建仓区间、持仓时间、关注信号，写入 stex.investment_summary）
     if body.action == "investment_summary":
         if not MOONSHOT_API_KEY:
@@ -777,4 +896,4 @@ async def trigger(body: TriggerBody):
             "result": {"steps": steps_summary},
         }
 
-    raise HTTPException(400, "Need action (collect_corp | collect_watchlist | collect_stock | collect_full_market | incremental_daily | collect | analyze | parse_corp | parse_corp_batch | compute_signals | compute_index_signals | news_signal | news_signal_batch | collect_index | investment_summary | detect_pattern | daily_tasks). collect_stock / parse_corp / compute_signals / news_signal / investment_summary 需 codes（news_signal_batch 使用 watchlist）。")
+    raise HTTPException(400, "Need action (collect_corp | collect_watchlist | collect_stock | collect_full_market | incremental_daily | sync_ohlcv_store | materialize_screen | scan_low_vol_breakout | collect_minute | maintain_partitions | collect | analyze | parse_corp | parse_corp_batch | compute_signals | compute_index_signals | news_signal | news_signal_batch | collect_index | investment_summary | detect_pattern | daily_tasks). collect_stock / parse_corp / compute_signals / news_signal / investment_summary 需 codes（news_signal_batch 使用 watchlist）。")
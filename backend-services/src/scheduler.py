@@ -0,0 +1,240 @@
+"""
+全市场日线采集调度：按「新鲜度 + 重要性」排的优先队列，多个采集线程并发领取批次，批大小与间隔随接口耗时/错误率自适应。
+- 选批一次性读 stex.code_latest（迁移 015），不再每批聚合；已到参考交易日的代码不入队，同一轮内每只最多领取一次（失败降级重排，限次重试）
+- 优先级：跟踪列表优先，其次缺日线交易日数多者，再按市值（流动性近似）大者
+- 自适应（AIMD）：一批无错误且单只耗时达标则批大小加性增大、间隔减半；错误率超阈值（多为限流）则批大小减半、间隔翻倍
+"""
+import heapq
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Any, Callable, Optional
+from zoneinfo import ZoneInfo
+
+from .db import get_conn
+from .trade_calendar import get_calendar
+
+logger = logging.getLogger(__name__)
+
+TZ = ZoneInfo("Asia/Shanghai")
+NEVER = 10**6  # 无日线的代码视为缺 NEVER 天
+PUBLISH_HOUR = 17  # 当日日线约收盘后此时（北京时间）可取
+
+
+def reference_trade_date(now: Optional[datetime] = None) -> date:
+    """参考交易日：最近一个已发布日线的交易日（共享交易日历）。"""
+    now = now or datetime.now(TZ)
+    d = now.date() if now.hour >= PUBLISH_HOUR else now.date() - timedelta(days=1)
+    return get_calendar().prev(d, inclusive=True)
+
+
+class StalenessQueue:
+    """线程安全的代码优先队列：(非跟踪, -缺失天数, -市值, 代码) 小顶堆。"""
+
+    def __init__(self, max_attempts: int = 2):
+        self._heap: list[tuple] = []
+        self._attempts: dict[str, int] = {}
+        self._taken: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.max_attempts = max_attempts
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, code: str, stale_days: int, watched: bool, market_cap: float) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, (0 if watched else 1, -stale_days, -market_cap, code))
+
+    def pop_batch(self, n: int) -> list[str]:
+        with self._lock:
+            out = []
+            while self._heap and len(out) < n:
+                item = heapq.heappop(self._heap)
+                self._attempts[item[3]] = self._attempts.get(item[3], 0) + 1
+                self._taken[item[3]] = item
+                out.append(item)
+            return [it[3] for it in out]
+
+    def retry(self, codes: list[str]) -> list[str]:
+        """失败代码降为非跟踪最低优先级重排；超过 max_attempts 的放弃，返回放弃的代码。"""
+        dropped = []
+        with self._lock:
+            for code in codes:
+                item = self._taken.get(code)
+                if item is None or self._attempts.get(code, 0) >= self.max_attempts:
+                    dropped.append(code)
+                    continue
+                heapq.heappush(self._heap, (2,) + item[1:])
+        return dropped
+
+    @classmethod
+    def load(cls, conn, reference: date, max_attempts: int = 2) -> "StalenessQueue":
+        """全市场（stex.corp）中日线早于 reference 的代码入队。"""
+        q = cls(max_attempts=max_attempts)
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT c.code, l.last_trade_date, w.code IS NOT NULL, COALESCE(c.market_cap, 0)
+                FROM stex.corp c
+                LEFT JOIN stex.code_latest l ON l.code = c.code
+                LEFT JOIN stex.watchlist w ON w.code = c.code
+                WHERE l.last_trade_date IS NULL OR l.last_trade_date < %s
+                """,
+                (reference,),
+            )
+            cal = get_calendar()
+            for code, last, watched, cap in cur.fetchall():
+                stale = cal.count(last, reference) if last else NEVER
+                q.push(str(code), stale, bool(watched), float(cap))
+        return q
+
+
+class AdaptiveBatch:
+    """批大小与批间隔的 AIMD 控制，多线程共享。"""
+
+    def __init__(
+        self,
+        size: int,
+        delay: float,
+        min_size: int = 5,
+        max_size: int = 200,
+        step: int = 10,
+        max_delay: float = 300.0,
+        target_sec_per_code: float = 4.0,
+        max_error_rate: float = 0.2,
+    ):
+        self.size, self.delay = size, delay
+        self.min_size, self.max_size, self.step = min_size, max_size, step
+        self.base_delay, self.max_delay = delay, max_delay
+        self.target_sec_per_code, self.max_error_rate = target_sec_per_code, max_error_rate
+        self._lock = threading.Lock()
+
+    def record(self, codes: int, elapsed: float, calls: int, errors: int) -> None:
+        if codes <= 0:
+            return
+        with self._lock:
+            error_rate = errors / calls if calls else 0.0
+            per_code = elapsed / codes
+            if error_rate > self.max_error_rate:
+                self.size = max(self.min_size, self.size // 2)
+                self.delay = min(self.max_delay, max(self.delay * 2, self.base_delay or 1.0))
+            elif per_code > self.target_sec_per_code * 1.5:
+                self.size = max(self.min_size, int(self.size * 0.75))
+            elif errors == 0:
+                self.size = min(self.max_size, self.size + self.step)
+                self.delay = self.delay / 2 if self.delay > 0.5 else 0.0
+            logger.info(
+                "scheduler: %s codes %.1fs (%.2fs/code, error_rate %.0f%%) -> batch %s, delay %.1fs",
+                codes, elapsed, per_code, error_rate * 100, self.size, self.delay,
+            )
+
+    def snapshot(self) -> tuple[int, float]:
+        with self._lock:
+            return self.size, self.delay
+
+
+def run_full_market_collection(
+    max_codes: int,
+    batch_size: int = 80,
+    workers: Optional[int] = None,
+    delay_sec: Optional[float] = None,
+    collect: Optional[Callable[[list[str]], dict[str, Any]]] = None,
+) -> dict[str, Any]:
+    """
+    全市场日线采集：按优先队列最多处理 max_codes 只，workers 个线程并发领取批次，每批调用 collect(codes)
+    （默认 run_watchlist_data_agent(codes, sync_store=False)，须返回 codes_processed / api_calls / api_errors / failed_codes）。
+    全部批次结束后统一增量同步日线列式镜像一次（已配置 OHLCV_STORE_DIR 时）。
+    返回：{ ok, reference_date, queued, total_processed, batches_run, failed_codes, final_batch_size, elapsed_sec, per_batch, ohlcv_store, error }
+    """
+    from .config import FULL_MARKET_DELAY_SEC, FULL_MARKET_WORKERS
+    from .store.ohlcv_parquet import sync_after_ingest
+
+    if collect is None:
+        from .agents.watchlist_data_agent import run_watchlist_data_agent
+
+        collect = partial(run_watchlist_data_agent, sync_store=False)
+    workers = max(1, min(workers or FULL_MARKET_WORKERS, 8))
+    t0 = time.monotonic()
+    reference = reference_trade_date()
+    try:
+        with get_conn() as conn:
+            queue = StalenessQueue.load(conn, reference)
+    except Exception as e:
+        logger.exception("scheduler: load queue failed")
+        return {"ok": False, "error": str(e), "total_processed": 0}
+    queued = len(queue)
+    control = AdaptiveBatch(size=batch_size, delay=FULL_MARKET_DELAY_SEC if delay_sec is None else delay_sec, max_size=max(batch_size, 200))
+    state = {"budget": max_codes, "processed": 0, "ok": True, "inflight": 0}
+    per_batch: list[dict[str, Any]] = []
+    dropped: list[str] = []
+    lock = threading.Lock()
+
+    def _worker(wid: int) -> None:
+        while True:
+            size, _ = control.snapshot()
+            with lock:
+                n = min(size, state["budget"])
+                codes = queue.pop_batch(n) if n > 0 else []
+                state["budget"] -= len(codes)
+                state["inflight"] += 1 if codes else 0
+                others_running = state["inflight"] > 0
+            if not codes:
+                # 其他线程的失败代码可能重排回队列（并退回预算），等其结束再判断
+                if others_running:
+                    time.sleep(1)
+                    continue
+                return
+            t = time.monotonic()
+            try:
+                result = collect(codes)
+            except Exception as e:
+                logger.exception("scheduler worker %s: batch failed", wid)
+                result = {"ok": False, "error": str(e), "codes_processed": 0, "api_calls": 1, "api_errors": 1, "failed_codes": codes}
+            elapsed = time.monotonic() - t
+            failed = list(result.get("failed_codes") or [])
+            control.record(len(codes), elapsed, result.get("api_calls", len(codes)), result.get("api_errors", len(failed)))
+            gave_up = queue.retry(failed)
+            with lock:
+                # 重排重试的代码不占新代码的预算
+                state["budget"] += len(failed) - len(gave_up)
+                state["inflight"] -= 1
+                state["processed"] += result.get("codes_processed", 0)
+                state["ok"] = state["ok"] and result.get("ok", False)
+                dropped.extend(gave_up)
+                per_batch.append(
+                    {
+                        "worker": wid,
+                        "codes": len(codes),
+                        "ok": result.get("ok", False),
+                        "elapsed_sec": round(elapsed, 1),
+                        "api_calls": result.get("api_calls"),
+                        "api_errors": result.get("api_errors"),
+                        "failed": len(failed),
+                        "error": result.get("error"),
+                    }
+                )
+            _, delay = control.snapshot()
+            if delay > 0:
+                time.sleep(delay)
+
+    threads = [threading.Thread(target=_worker, args=(i + 1,), daemon=True) for i in range(workers)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    store_sync = sync_after_ingest()
+    return {
+        "ok": state["ok"],
+        "reference_date": reference.isoformat(),
+        "queued": queued,
+        "remaining": len(queue),
+        "total_processed": state["processed"],
+        "batches_run": len(per_batch),
+        "failed_codes": dropped,
+        "final_batch_size": control.snapshot()[0],
+        "elapsed_sec": round(time.monotonic() - t0, 1),
+        "per_batch": per_batch,
+        "ohlcv_store": store_sync,
+    }
@@ -0,0 +1 @@
+# 本地数据存储：进程内日线面板、日线列式镜像、流式读取等
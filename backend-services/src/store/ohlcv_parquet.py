@@ -0,0 +1,280 @@
+"""
+日线列式镜像：将 stex.stock_day 按月分区镜像为 Parquet（hive 分区 trade_month=YYYY-MM），
+供分析/回测直接读取 NumPy 数组，不再逐行经 psycopg 读取并做 Decimal -> float 转换（quant.data.load_market 优先读镜像）。
+- mark_dirty：每个写 stock_day 的入库路径（增量日线、自选 / 全市场采集）提交后记下写入的最早日期
+- sync_ohlcv_store：增量同步（重写 [脏标记 / 高水位所在月, 库内最新月] 的分区）；增量日线、自选采集每次运行结束、
+  全市场采集全部批次结束后各调用一次（sync_after_ingest）
+- is_current：镜像无未同步的写入且高水位不早于库内最新交易日；否则读取方回退到数据库
+- load_ohlcv：按代码集合与日期区间加载，返回按 (code, trade_date) 排序的列数组
+同步与脏标记经目录下的文件锁串行（多线程 / 多进程安全）。依赖 pyarrow（pip install pyarrow）。
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Iterator, Optional
+
+from ..config import OHLCV_STORE_DIR
+from ..db import get_conn
+
+logger = logging.getLogger(__name__)
+
+# 镜像列（价格/金额在 SQL 侧转 float8，避免 Python 侧 Decimal 转换）
+PRICE_FIELDS = ["open", "high", "low", "close", "volume", "amount", "turnover_rate"]
+META_FILE = "_meta.json"
+LOCK_FILE = ".lock"
+_thread_lock = threading.Lock()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("请安装 pyarrow: pip install pyarrow") from e
+
+
+def _store_dir(store_dir: Optional[str] = None) -> str:
+    d = store_dir or OHLCV_STORE_DIR
+    if not d:
+        raise ValueError("未配置 OHLCV_STORE_DIR")
+    return d
+
+
+def _to_date(v) -> Optional[date]:
+    if v is None or v == "":
+        return None
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    s = str(v).strip().replace("-", "")[:8]
+    return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def _read_meta(store_dir: str) -> dict:
+    path = os.path.join(store_dir, META_FILE)
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+@contextmanager
+def _locked(store_dir: str) -> Iterator[None]:
+    """进程内线程锁 + 目录文件锁（flock），串行同步与脏标记。"""
+    os.makedirs(store_dir, exist_ok=True)
+    with _thread_lock:
+        with open(os.path.join(store_dir, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_meta(store_dir: str, meta: dict) -> None:
+    path = os.path.join(store_dir, META_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _write_month(conn, store_dir: str, month: date) -> int:
+    """从库中读取一个月的日线并整体重写该月分区（先写临时文件再原子替换）。"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT code, trade_date, open::float8, high::float8, low::float8, close::float8,
+                   volume::float8, amount::float8, turnover_rate::float8
+            FROM stex.stock_day
+            WHERE trade_date >= %s AND trade_date < %s
+            ORDER BY code, trade_date
+            """,
+            (month, _next_month(month)),
+        )
+        rows = cur.fetchall()
+    part_dir = os.path.join(store_dir, f"trade_month={month.strftime('%Y-%m')}")
+    path = os.path.join(part_dir, "data.parquet")
+    if not rows:
+        if os.path.isfile(path):
+            os.remove(path)
+        return 0
+    cols = list(zip(*rows))
+    table = pa.table(
+        {
+            "code": pa.array(cols[0], pa.string()),
+            "trade_date": pa.array(cols[1], pa.date32()),
+            **{f: pa.array(cols[i + 2], pa.float64()) for i, f in enumerate(PRICE_FIELDS)},
+        }
+    )
+    os.makedirs(part_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp, row_group_size=64 * 1024)
+    os.replace(tmp, path)
+    return len(rows)
+
+
+def mark_dirty(since, store_dir: Optional[str] = None) -> None:
+    """stock_day 写入（并提交）后调用：记下写入的最早日期，下次同步从该月起重写；未配置镜像时忽略。"""
+    store_dir = store_dir or OHLCV_STORE_DIR
+    since = _to_date(since)
+    if not store_dir or since is None:
+        return
+    with _locked(store_dir):
+        meta = _read_meta(store_dir)
+        prev = _to_date(meta.get("dirty_from"))
+        if prev is None or since < prev:
+            meta["dirty_from"] = since.isoformat()
+            _write_meta(store_dir, meta)
+
+
+def sync_ohlcv_store(since: Optional[str] = None, store_dir: Optional[str] = None) -> dict[str, Any]:
+    """
+    增量同步日线镜像：重写 [起始月, 库内最新月] 的各月分区，并清除脏标记。
+    起始月：since（YYYY-MM-DD / YYYYMMDD）、脏标记、上次同步高水位三者最早者所在月；首次同步为全量。
+    返回：{ ok, months, rows, high_water }
+    """
+    _require_pyarrow()
+    store_dir = _store_dir(store_dir)
+    with _locked(store_dir):
+        return _sync(store_dir, since)
+
+
+def _sync(store_dir: str, since: Optional[str]) -> dict[str, Any]:
+    meta = _read_meta(store_dir)
+    marks = [d for d in (_to_date(since), _to_date(meta.get("dirty_from")), _to_date(meta.get("high_water"))) if d]
+    start = min(marks) if marks and meta.get("high_water") else None
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(trade_date), MAX(trade_date) FROM stex.stock_day")
+            lo, hi = cur.fetchone()
+        if hi is None:
+            return {"ok": True, "months": 0, "rows": 0, "high_water": None, "message": "stock_day 无数据"}
+        month = _month_start(max(start, lo) if start else lo)
+        months, rows = 0, 0
+        while month <= hi:
+            rows += _write_month(conn, store_dir, month)
+            months += 1
+            month = _next_month(month)
+
+    meta.pop("dirty_from", None)
+    meta.update({"high_water": hi.isoformat(), "synced_at": datetime.now().isoformat(timespec="seconds")})
+    _write_meta(store_dir, meta)
+    logger.info("ohlcv_store: synced %s months, %s rows, high_water=%s", months, rows, hi)
+    return {"ok": True, "months": months, "rows": rows, "high_water": hi.isoformat()}
+
+
+def sync_after_ingest(since: Optional[str] = None) -> Optional[dict[str, Any]]:
+    """入库后调用：已配置 OHLCV_STORE_DIR 时增量同步镜像（含脏标记）；未配置返回 None，失败仅打日志（脏标记保留）。"""
+    if not OHLCV_STORE_DIR:
+        return None
+    try:
+        return sync_ohlcv_store(since=since)
+    except Exception as e:
+        logger.warning("ohlcv_store sync failed: %s", e)
+        return {"ok": False, "error": str(e)}
+
+
+def is_current(conn, store_dir: Optional[str] = None) -> bool:
+    """镜像可读：已配置、装有 pyarrow、已同步过、无未同步的写入，且高水位不早于 stock_day 最新交易日。"""
+    from ..code_latest import market_latest_trade_date
+
+    store_dir = store_dir or OHLCV_STORE_DIR
+    if not store_dir:
+        return False
+    try:
+        _require_pyarrow()
+    except ImportError:
+        return False
+    meta = _read_meta(store_dir) if os.path.isdir(store_dir) else {}
+    high = _to_date(meta.get("high_water"))
+    if high is None or meta.get("dirty_from"):
+        return False
+    latest = market_latest_trade_date(conn)
+    return latest is None or high >= latest
+
+
+def _column_numpy(col):
+    """ChunkedArray -> NumPy：数值列合并为单块后零拷贝视图（含空值先以 NaN 填充）；字符串/日期列需转换。"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    arr = col.combine_chunks() if isinstance(col, pa.ChunkedArray) else col
+    if arr.null_count and pa.types.is_floating(arr.type):
+        arr = pc.fill_null(arr, float("nan"))
+    if pa.types.is_floating(arr.type) or pa.types.is_integer(arr.type):
+        return arr.to_numpy(zero_copy_only=arr.null_count == 0)
+    return arr.to_numpy(zero_copy_only=False)
+
+
+def load_ohlcv(
+    codes: Optional[list[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    fields: Optional[list[str]] = None,
+    store_dir: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    从镜像加载日线。codes 为空则全市场；start/end 为闭区间日期。
+    返回 dict：code(object 数组)、trade_date(datetime64[D])、各字段 float64 数组（缺失为 NaN），
+    以及 offsets：code -> (起, 止) 行号切片，数据按 (code, trade_date) 升序。
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    store_dir = _store_dir(store_dir)
+    fields = list(fields or PRICE_FIELDS)
+    if not os.path.isdir(store_dir):
+        raise FileNotFoundError(f"日线镜像不存在：{store_dir}，请先执行 sync_ohlcv_store")
+    partitioning = ds.partitioning(pa.schema([("trade_month", pa.string())]), flavor="hive")
+    dataset = ds.dataset(store_dir, format="parquet", partitioning=partitioning, exclude_invalid_files=True)
+    start_d, end_d = _to_date(start), _to_date(end)
+    flt = None
+
+    def _and(expr):
+        nonlocal flt
+        flt = expr if flt is None else flt & expr
+
+    # 先按月分区裁剪，再按日期/代码过滤
+    if start_d:
+        _and(ds.field("trade_month") >= start_d.strftime("%Y-%m"))
+        _and(ds.field("trade_date") >= start_d)
+    if end_d:
+        _and(ds.field("trade_month") <= end_d.strftime("%Y-%m"))
+        _and(ds.field("trade_date") <= end_d)
+    if codes:
+        _and(ds.field("code").isin([str(c).strip() for c in codes]))
+    table = dataset.to_table(columns=["code", "trade_date", *fields], filter=flt)
+    if table.num_rows:
+        table = table.take(pc.sort_indices(table, sort_keys=[("code", "ascending"), ("trade_date", "ascending")]))
+
+    out: dict[str, Any] = {name: _column_numpy(table.column(name)) for name in ["code", "trade_date", *fields]}
+    code_arr = out["code"]
+    offsets: dict[str, tuple[int, int]] = {}
+    if len(code_arr):
+        import numpy as np
+
+        bounds = np.flatnonzero(code_arr[1:] != code_arr[:-1]) + 1
+        starts = np.concatenate(([0], bounds))
+        stops = np.concatenate((bounds, [len(code_arr)]))
+        offsets = {str(code_arr[s]): (int(s), int(e)) for s, e in zip(starts, stops)}
+    out["offsets"] = offsets
+    return out
@@ -0,0 +1,258 @@
+"""
+进程内日线面板缓存：将近 N 个交易日的日线/技术指标/资金流按 (代码 × 行 × 字段) 装入内存映射数组，
+信号、大盘信号等 agent 按代码切片读取，同一次 daily_tasks 内不再逐只重复查询。
+- 每个代码一行，窗口右对齐（最后一列为最近交易日），不足 N 日左侧以 NaN / NaT 填充
+- 各块（days/tech/mf）独立取每只代码最近 N 行，与原先各表 ORDER BY trade_date DESC LIMIT N 语义一致
+- 失效：按代码比对各表 MAX(trade_date) 高水位，仅重建变化/新增的代码；入库后调用 invalidate_panels() 全部作废
+"""
+import logging
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 块定义：kind -> 块名 -> (表, 代码列, [(SQL 列, 字段名)])
+_BLOCKS: dict[str, dict[str, tuple[str, str, list[tuple[str, str]]]]] = {
+    "stock": {
+        "days": (
+            "stex.stock_day",
+            "code",
+            [("open", "open"), ("high", "high"), ("low", "low"), ("close", "close"), ("volume", "volume"), ("turnover_rate", "turnover_rate")],
+        ),
+        "tech": ("stex.technicals", "code", [("ma5", "ma5"), ("ma10", "ma10"), ("ma20", "ma20")]),
+        "mf": (
+            "stex.moneyflow",
+            "code",
+            [("net_mf_amount", "net_mf_amount"), ("buy_elg_amount", "buy_elg_amount"), ("sell_elg_amount", "sell_elg_amount")],
+        ),
+    },
+    "index": {
+        "days": ("stex.index_day", "index_code", [("open", "open"), ("high", "high"), ("low", "low"), ("close", "close"), ("vol", "volume")]),
+    },
+}
+
+_lock = threading.Lock()
+_panels: dict[tuple[str, int], "OhlcvPanel"] = {}
+_generation = 0
+
+
+def _nan_to_none(values: list) -> list:
+    return [None if v != v else v for v in values]
+
+
+class _Block:
+    """单个数据块：dates (n × L, datetime64[D]) 与 values (n × L × F, float64)，均为内存映射数组。"""
+
+    def __init__(self, dates: np.ndarray, values: np.ndarray, fields: list[str]):
+        self.dates = dates
+        self.values = values
+        self.fields = fields
+
+
+class OhlcvPanel:
+    """
+    代码 × 行 × 字段 的面板。index 为 code -> 行号；window(code, block) 返回该代码有效行的 (dates, values) 视图。
+    days/technicals/moneyflow 返回与各 agent 原 _fetch_* 相同结构，便于直接替换。
+    """
+
+    def __init__(self, kind: str, limit: int, codes: list[str], blocks: dict[str, _Block], workdir: str, generation: int):
+        self.kind = kind
+        self.limit = limit
+        self.codes = codes
+        self.index = {c: i for i, c in enumerate(codes)}
+        self.blocks = blocks
+        self.workdir = workdir
+        self.generation = generation
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    def window(self, code: str, block: str = "days") -> tuple[np.ndarray, np.ndarray]:
+        b = self.blocks[block]
+        i = self.index.get(code)
+        if i is None:
+            return b.dates[:0, 0], b.values[:0, 0]
+        dates = b.dates[i]
+        valid = int(np.count_nonzero(~np.isnat(dates)))
+        return dates[self.limit - valid :], b.values[i, self.limit - valid :]
+
+    def _records(self, code: str, block: str) -> tuple[list[str], list[list]]:
+        dates, values = self.window(code, block)
+        if not len(dates):
+            return [], []
+        cols = [_nan_to_none(values[:, j].tolist()) for j in range(values.shape[1])]
+        return np.datetime_as_string(dates, unit="D").tolist(), cols
+
+    def days(self, code: str) -> list[dict]:
+        """近 limit 日 日线（升序日期），字段同 signal_agent._fetch_days；volume 缺失记 0。"""
+        tds, cols = self._records(code, "days")
+        fields = self.blocks["days"].fields
+        out = []
+        for k, td in enumerate(tds):
+            d = {"trade_date": td}
+            for j, f in enumerate(fields):
+                d[f] = cols[j][k]
+            d["volume"] = d.get("volume") or 0
+            out.append(d)
+        return out
+
+    def technicals(self, code: str) -> dict[str, dict]:
+        """trade_date -> { ma5, ma10, ma20 }"""
+        tds, cols = self._records(code, "tech")
+        return {td: {"ma5": cols[0][k], "ma10": cols[1][k], "ma20": cols[2][k]} for k, td in enumerate(tds)}
+
+    def moneyflow(self, code: str) -> dict[str, dict]:
+        """trade_date -> { net_mf_amount, buy_elg_amount, sell_elg_amount, net_elg }"""
+        tds, cols = self._records(code, "mf")
+        out = {}
+        for k, td in enumerate(tds):
+            buy_elg, sell_elg = cols[1][k], cols[2][k]
+            out[td] = {
+                "net_mf_amount": cols[0][k],
+                "buy_elg_amount": buy_elg,
+                "sell_elg_amount": sell_elg,
+                "net_elg": (buy_elg - sell_elg) if (buy_elg is not None and sell_elg is not None) else None,
+            }
+        return out
+
+    def close(self) -> None:
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def _alloc(workdir: str, name: str, shape: tuple, dtype, fill) -> np.ndarray:
+    arr = np.lib.format.open_memmap(f"{workdir}/{name}.npy", mode="w+", dtype=dtype, shape=shape)
+    arr[...] = fill
+    return arr
+
+
+def _load_block(conn, workdir: str, name: str, spec: tuple, codes: list[str], limit: int) -> _Block:
+    """LATERAL 按代码走 (code, trade_date DESC) 索引取最近 limit 行，整列写入右对齐窗口。"""
+    table, code_col, cols = spec
+    n = len(codes)
+    dates = _alloc(workdir, f"{name}_dates", (n, limit), "datetime64[D]", np.datetime64("NaT"))
+    values = _alloc(workdir, f"{name}_values", (n, limit, len(cols)), np.float64, np.nan)
+    select_cols = ", ".join(f"t.{c}::float8" for c, _ in cols)
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT c.ord, t.trade_date, {select_cols}
+            FROM unnest(%s::text[]) WITH ORDINALITY AS c(code, ord)
+            CROSS JOIN LATERAL (
+                SELECT * FROM {table} WHERE {code_col} = c.code ORDER BY trade_date DESC LIMIT %s
+            ) t
+            ORDER BY c.ord, t.trade_date
+            """,
+            (codes, limit),
+        )
+        rows = cur.fetchall()
+    if rows:
+        cols_data = list(zip(*rows))
+        row_idx = np.asarray(cols_data[0], dtype=np.int64) - 1
+        # 组内位置：按代码分组的升序序号，右对齐到窗口末尾
+        starts = np.flatnonzero(np.r_[True, row_idx[1:] != row_idx[:-1]])
+        counts = np.diff(np.r_[starts, len(row_idx)])
+        pos = np.arange(len(row_idx)) - np.repeat(starts, counts)
+        col_idx = limit - np.repeat(counts, counts) + pos
+        dates[row_idx, col_idx] = np.asarray(cols_data[1], dtype="datetime64[D]")
+        values[row_idx, col_idx] = np.array(cols_data[2:], dtype=np.float64).T
+    return _Block(dates, values, [f for _, f in cols])
+
+
+def _build(conn, kind: str, codes: list[str], limit: int, generation: int) -> OhlcvPanel:
+    workdir = tempfile.mkdtemp(prefix=f"stex_panel_{kind}_")
+    blocks = {name: _load_block(conn, workdir, name, spec, codes, limit) for name, spec in _BLOCKS[kind].items()}
+    return OhlcvPanel(kind, limit, codes, blocks, workdir, generation)
+
+
+def _combine(old: OhlcvPanel, keep: list[str], fresh: OhlcvPanel) -> OhlcvPanel:
+    """old 中保留 keep 的行，拼接 fresh 的全部行，写入新的内存映射面板。"""
+    codes = keep + fresh.codes
+    workdir = tempfile.mkdtemp(prefix=f"stex_panel_{old.kind}_")
+    keep_idx = np.array([old.index[c] for c in keep], dtype=np.int64)
+    blocks = {}
+    for name, ob in old.blocks.items():
+        fb = fresh.blocks[name]
+        dates = _alloc(workdir, f"{name}_dates", (len(codes), old.limit), "datetime64[D]", np.datetime64("NaT"))
+        values = _alloc(workdir, f"{name}_values", (len(codes), old.limit, len(ob.fields)), np.float64, np.nan)
+        dates[: len(keep)] = ob.dates[keep_idx]
+        values[: len(keep)] = ob.values[keep_idx]
+        dates[len(keep) :] = fb.dates
+        values[len(keep) :] = fb.values
+        blocks[name] = _Block(dates, values, ob.fields)
+    return OhlcvPanel(old.kind, old.limit, codes, blocks, workdir, old.generation)
+
+
+def _high_water(conn, kind: str, codes: list[str]) -> dict[str, np.ndarray]:
+    """各块按代码的 MAX(trade_date)（每只一次索引探测），无数据为 NaT。"""
+    specs = _BLOCKS[kind]
+    subqueries = ", ".join(
+        f"(SELECT MAX(trade_date) FROM {table} WHERE {code_col} = c.code)" for table, code_col, _ in specs.values()
+    )
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT {subqueries} FROM unnest(%s::text[]) WITH ORDINALITY AS c(code, ord) ORDER BY c.ord",
+            (codes,),
+        )
+        rows = cur.fetchall()
+    cols = list(zip(*rows)) if rows else [()] * len(specs)
+    return {
+        name: np.array([np.datetime64(v, "D") if v is not None else np.datetime64("NaT") for v in col], dtype="datetime64[D]")
+        for name, col in zip(specs, cols)
+    }
+
+
+def get_panel(conn, codes: list[str], kind: str = "stock", limit: int = 65) -> OhlcvPanel:
+    """
+    取覆盖 codes 的面板（kind: stock | index）。已缓存且各块高水位未变的代码直接复用，
+    高水位变化或未缓存的代码重新查询后并入缓存面板。
+    """
+    if kind not in _BLOCKS:
+        raise ValueError(f"未知面板类型: {kind}")
+    codes = list(dict.fromkeys(str(c).strip() for c in codes if c and str(c).strip()))
+    with _lock:
+        cached = _panels.get((kind, limit))
+        if cached is not None and cached.generation != _generation:
+            cached.close()
+            cached = None
+        if cached is None:
+            panel = _build(conn, kind, codes, limit, _generation)
+            _panels[(kind, limit)] = panel
+            logger.info("panel[%s/%s]: built %s codes", kind, limit, len(codes))
+            return panel
+
+        hw = _high_water(conn, kind, codes)
+        stale = []
+        for k, code in enumerate(codes):
+            i = cached.index.get(code)
+            if i is None:
+                stale.append(code)
+                continue
+            for name, block in cached.blocks.items():
+                cur_last, new_last = block.dates[i, -1], hw[name][k]
+                if np.isnat(cur_last) != np.isnat(new_last) or (not np.isnat(new_last) and cur_last != new_last):
+                    stale.append(code)
+                    break
+        if not stale:
+            return cached
+        stale_set = set(stale)
+        fresh = _build(conn, kind, stale, limit, _generation)
+        panel = _combine(cached, [c for c in cached.codes if c not in stale_set], fresh)
+        fresh.close()
+        cached.close()
+        _panels[(kind, limit)] = panel
+        logger.info("panel[%s/%s]: refreshed %s of %s codes", kind, limit, len(stale), len(panel.codes))
+        return panel
+
+
+def invalidate_panels() -> None:
+    """入库（日线/技术指标/资金流/指数日线）后调用：作废全部缓存面板，下次 get_panel 重建。"""
+    global _generation
+    with _lock:
+        _generation += 1
+        for panel in _panels.values():
+            panel.close()
+        _panels.clear()
+
@@ -0,0 +1,129 @@
+"""
+流式按代码读取日线窗口：服务端命名游标 + 二进制协议，按 (code, trade_date DESC) 顺序逐批拉取，
+后台线程预取并经有界队列交给调用方，全市场扫描内存占用恒定，且拉取与计算重叠。
+"""
+import logging
+import queue
+import threading
+from itertools import count
+from typing import Iterator, Optional
+
+from ..db import get_conn
+
+logger = logging.getLogger(__name__)
+
+DAY_FIELDS = ["open", "high", "low", "close", "volume", "turnover_rate"]
+# 每次网络往返拉取的行数
+FETCH_SIZE = 10000
+# 每个队列元素包含的代码数、队列最多积压的元素数
+CHUNK_CODES = 200
+PREFETCH_CHUNKS = 4
+
+_cursor_seq = count(1)
+_DONE = object()
+
+
+def _window_sql(fields: list[str], by_codes: bool) -> str:
+    if by_codes:
+        # 指定代码：每只走 (code, trade_date DESC) 索引取最近 limit 行
+        return f"""
+            SELECT c.code, t.trade_date, {", ".join(f"t.{f}::float8" for f in fields)}
+            FROM (SELECT DISTINCT unnest(%(codes)s::text[]) AS code) c
+            CROSS JOIN LATERAL (
+                SELECT * FROM stex.stock_day d WHERE d.code = c.code ORDER BY d.trade_date DESC LIMIT %(limit)s
+            ) t
+            ORDER BY c.code, t.trade_date DESC
+        """
+    return f"""
+        SELECT code, trade_date, {", ".join(f"{f}::float8" for f in fields)} FROM (
+            SELECT code, trade_date, {", ".join(fields)},
+                   ROW_NUMBER() OVER (PARTITION BY code ORDER BY trade_date DESC) AS rn
+            FROM stex.stock_day
+        ) t
+        WHERE rn <= %(limit)s
+        ORDER BY code, trade_date DESC
+    """
+
+
+def _to_day(fields: list[str], row: tuple) -> dict:
+    td = row[1]
+    d = {"trade_date": td.isoformat()[:10] if hasattr(td, "isoformat") else str(td)[:10]}
+    for i, f in enumerate(fields):
+        d[f] = row[i + 2]
+    if "volume" in d:
+        d["volume"] = d["volume"] or 0
+    return d
+
+
+def _produce(out: queue.Queue, stop: threading.Event, codes, limit: int, min_rows: int, fields: list[str]) -> None:
+    """后台线程：命名游标逐批拉取，按代码聚合为升序窗口，凑满 CHUNK_CODES 只放入队列。"""
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        with get_conn() as conn:
+            with conn.cursor(name=f"stex_stream_{next(_cursor_seq)}", binary=True) as cur:
+                cur.itersize = FETCH_SIZE
+                cur.execute(_window_sql(fields, bool(codes)), {"codes": codes, "limit": limit})
+                chunk: list[tuple[str, list[dict]]] = []
+                cur_code, rows = None, []
+
+                def _flush_code():
+                    if cur_code is not None and len(rows) >= min_rows:
+                        chunk.append((cur_code, [_to_day(fields, r) for r in reversed(rows)]))
+
+                for row in cur:
+                    if row[0] != cur_code:
+                        _flush_code()
+                        if len(chunk) >= CHUNK_CODES:
+                            if not _put(chunk):
+                                return
+                            chunk = []
+                        cur_code, rows = row[0], []
+                    rows.append(row)
+                _flush_code()
+                if chunk:
+                    _put(chunk)
+    except Exception as e:
+        logger.exception("stream: producer failed")
+        _put(e)
+    finally:
+        _put(_DONE)
+
+
+def iter_code_windows(
+    codes: Optional[list[str]] = None,
+    limit: int = 65,
+    min_rows: int = 1,
+    fields: Optional[list[str]] = None,
+) -> Iterator[tuple[str, list[dict]]]:
+    """
+    按代码升序逐只产出 (code, days)：days 为该代码最近 limit 个交易日日线（升序日期，字段同各 agent 的 _fetch_days）。
+    codes 为空则全市场；不足 min_rows 行的代码跳过（min_rows 需 <= limit）。
+    提前结束迭代（break / 异常）时后台线程随之停止并关闭游标。
+    """
+    fields = list(fields or DAY_FIELDS)
+    codes = sorted({str(c).strip() for c in codes if c and str(c).strip()}) if codes else None
+    out: queue.Queue = queue.Queue(maxsize=PREFETCH_CHUNKS)
+    stop = threading.Event()
+    worker = threading.Thread(
+        target=_produce, args=(out, stop, codes, limit, min_rows, fields), name="stex-stream", daemon=True
+    )
+    worker.start()
+    try:
+        while True:
+            item = out.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+    finally:
+        stop.set()
+        worker.join(timeout=5)
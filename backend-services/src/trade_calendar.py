@@ -0,0 +1,254 @@
+"""
+交易日历（上交所）：stex.trade_cal（迁移 017）一次载入进程内有序数组，各 Agent 共享，
+前后交易日 / 区间 / 是否开市均为二分查找，不再每次运行调用 pro.trade_cal 或逐代码查 stock_day 推交易日。
+- 表覆盖不到今日、或含未经 Tushare 确认的日期（迁移 017 按日线推断的回填，见迁移 020 的 verified）时，
+  经 Tushare trade_cal 自最早未确认日补齐到年底并落表（每进程每日至多一次）；无 Tushare 时沿用表内已有日期
+- 覆盖范围之外的日期按工作日近似（周一至周五开市）
+- 每个北京时间自然日重新载入一次；未执行迁移时以 stock_day / 上证指数日线的已有日期兜底
+"""
+import bisect
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Optional, Union
+
+import psycopg
+
+from .collectors.stock import today_cn
+from .db import copy_upsert, get_conn
+
+logger = logging.getLogger(__name__)
+
+SYNC_START = date(2000, 1, 1)  # 空表首次补齐的起点
+
+DateLike = Union[date, str]
+
+
+def _as_date(v: DateLike) -> date:
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    s = str(v).strip().replace("-", "")[:8]
+    return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+
+
+class TradingCalendar:
+    """开市日升序数组 + 覆盖区间 [start, end]；区间外按工作日近似。"""
+
+    def __init__(
+        self,
+        open_days: list[date],
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        unverified_from: Optional[date] = None,
+    ):
+        self.days = sorted(open_days)
+        self.start = start or (self.days[0] if self.days else None)
+        self.end = end or (self.days[-1] if self.days else None)
+        self.unverified_from = unverified_from  # 最早的未经 Tushare 确认的日期（按日线推断），None 为全部已确认
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def covers(self, d: DateLike) -> bool:
+        d = _as_date(d)
+        return self.start is not None and self.start <= d <= self.end
+
+    def is_open(self, d: DateLike) -> bool:
+        d = _as_date(d)
+        if not self.covers(d):
+            return d.weekday() < 5
+        i = bisect.bisect_left(self.days, d)
+        return i < len(self.days) and self.days[i] == d
+
+    def prev(self, d: DateLike, inclusive: bool = False) -> date:
+        """d 之前（inclusive 时含 d）最近的交易日。"""
+        d = _as_date(d)
+        if not inclusive:
+            d -= timedelta(days=1)
+        if self.start is not None and d >= self.start:
+            # 覆盖区间之后的部分按工作日近似，其余二分
+            while d > self.end:
+                if d.weekday() < 5:
+                    return d
+                d -= timedelta(days=1)
+            i = bisect.bisect_right(self.days, d)
+            if i:
+                return self.days[i - 1]
+            d = self.start - timedelta(days=1)
+        while d.weekday() >= 5:
+            d -= timedelta(days=1)
+        return d
+
+    def next(self, d: DateLike, inclusive: bool = False) -> date:
+        """d 之后（inclusive 时含 d）最近的交易日。"""
+        d = _as_date(d)
+        if not inclusive:
+            d += timedelta(days=1)
+        if self.start is not None and d <= self.end:
+            while d < self.start:
+                if d.weekday() < 5:
+                    return d
+                d += timedelta(days=1)
+            i = bisect.bisect_left(self.days, d)
+            if i < len(self.days):
+                return self.days[i]
+            d = self.end + timedelta(days=1)
+        while d.weekday() >= 5:
+            d += timedelta(days=1)
+        return d
+
+    def range(self, start: DateLike, end: DateLike) -> list[date]:
+        """[start, end] 内全部交易日，升序。"""
+        start, end = _as_date(start), _as_date(end)
+        if start > end:
+            return []
+        if self.start is None:
+            return _weekdays(start, end)
+        out = _weekdays(start, min(end, self.start - timedelta(days=1)))
+        lo = bisect.bisect_left(self.days, max(start, self.start))
+        hi = bisect.bisect_right(self.days, min(end, self.end))
+        out += self.days[lo:hi]
+        out += _weekdays(max(start, self.end + timedelta(days=1)), end)
+        return out
+
+    def recent(self, d: DateLike, n: int) -> list[date]:
+        """截至 d（含）最近 n 个交易日，降序。"""
+        d = _as_date(d)
+        out: list[date] = []
+        cur = self.prev(d, inclusive=True)
+        while len(out) < n:
+            out.append(cur)
+            cur = self.prev(cur)
+        return out
+
+    def count(self, after: DateLike, upto: DateLike) -> int:
+        """(after, upto] 内的交易日数。"""
+        return len(self.range(_as_date(after) + timedelta(days=1), upto))
+
+
+def _weekdays(start: date, end: date) -> list[date]:
+    out = []
+    d = start
+    while d <= end:
+        if d.weekday() < 5:
+            out.append(d)
+        d += timedelta(days=1)
+    return out
+
+
+def _load(conn) -> TradingCalendar:
+    try:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute("SELECT cal_date, is_open FROM stex.trade_cal ORDER BY cal_date")
+                rows = cur.fetchall()
+        if rows:
+            return TradingCalendar([r[0] for r in rows if r[1]], rows[0][0], rows[-1][0], _unverified_from(conn))
+    except psycopg.errors.UndefinedTable:
+        logger.warning("stex.trade_cal 不存在（未执行迁移 017），以已有日线日期推断交易日")
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT DISTINCT trade_date FROM stex.stock_day
+            UNION
+            SELECT trade_date FROM stex.index_day WHERE index_code = '000001.SH'
+            """
+        )
+        return TradingCalendar([r[0] for r in cur.fetchall()])
+
+
+def _unverified_from(conn) -> Optional[date]:
+    """最早的未确认日期；未执行迁移 020（无 verified 列）时视为全部已确认。"""
+    try:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute("SELECT MIN(cal_date) FROM stex.trade_cal WHERE NOT verified")
+                return cur.fetchone()[0]
+    except psycopg.errors.UndefinedColumn:
+        return None
+
+
+def sync_trade_cal(conn, pro: Any, start: DateLike, end: DateLike) -> int:
+    """
+    经 pro.trade_cal 拉取 [start, end] 的上交所日历（含休市日）写入 stex.trade_cal 并记为已确认（覆盖按日线推断的行），
+    不提交。返回写入行数。
+    """
+    start, end = _as_date(start), _as_date(end)
+    df = pro.trade_cal(exchange="SSE", start_date=start.strftime("%Y%m%d"), end_date=end.strftime("%Y%m%d"))
+    if df is None or df.empty or "cal_date" not in df.columns:
+        return 0
+    is_open = df["is_open"].astype(str).isin(["1", "True", "true"]) if "is_open" in df.columns else [True] * len(df)
+    rows = [(_as_date(c), bool(o)) for c, o in zip(df["cal_date"], is_open)]
+    try:
+        with conn.transaction():
+            return copy_upsert(
+                conn,
+                "stex.trade_cal",
+                ["cal_date", "is_open", "verified"],
+                [r + (True,) for r in rows],
+                ["cal_date"],
+                extra_set="updated_at = NOW()",
+            )
+    except psycopg.errors.UndefinedColumn:
+        logger.warning("stex.trade_cal 无 verified 列（未执行迁移 020），按旧结构写入")
+    return copy_upsert(conn, "stex.trade_cal", ["cal_date", "is_open"], rows, ["cal_date"], extra_set="updated_at = NOW()")
+
+
+def _tushare_pro():
+    from .collectors.tushare_cache import cached_pro
+    from .config import TUSHARE_TOKEN
+    from .metrics import instrument
+
+    if not TUSHARE_TOKEN:
+        return None
+    try:
+        import tushare as ts
+    except ImportError:
+        return None
+    return instrument(cached_pro(ts.pro_api(TUSHARE_TOKEN)), "api.tushare")
+
+
+_lock = threading.Lock()
+_cache: dict[str, Any] = {"cal": None, "loaded_on": None, "synced_on": None}
+
+
+def get_calendar(pro: Any = None, refresh: bool = False) -> TradingCalendar:
+    """
+    进程内共享日历：每日首次调用时载入；表未覆盖到今日或含未确认日期时，以 pro（默认按 TUSHARE_TOKEN 新建）
+    自最早未确认日（否则表末次日）补齐到年底后重载；refresh=True 时自 SYNC_START 起整表重拉。
+    读取失败时返回空日历（全部按工作日近似），不抛异常。
+    """
+    today = today_cn()
+    with _lock:
+        cal = _cache["cal"]
+        if cal is not None and not refresh and _cache["loaded_on"] == today:
+            return cal
+        try:
+            with get_conn() as conn:
+                cal = _load(conn)
+                stale = cal.end is None or cal.end < today or cal.unverified_from is not None
+                if refresh or (stale and _cache["synced_on"] != today):
+                    _cache["synced_on"] = today
+                    pro = pro or _tushare_pro()
+                    if pro is not None:
+                        if refresh or cal.end is None:
+                            start = SYNC_START
+                        elif cal.unverified_from is not None:
+                            start = min(cal.unverified_from, cal.end + timedelta(days=1))
+                        else:
+                            start = cal.end + timedelta(days=1)
+                        try:
+                            with conn.transaction():
+                                n = sync_trade_cal(conn, pro, start, date(today.year, 12, 31))
+                            conn.commit()
+                            logger.info("trade_calendar: synced %s days from %s", n, start)
+                            cal = _load(conn)
+                        except Exception as e:
+                            logger.warning("trade_calendar: trade_cal sync failed: %s", e)
+        except Exception as e:
+            logger.warning("trade_calendar: load failed, falling back to weekdays: %s", e)
+            cal = TradingCalendar([])
+        _cache.update(cal=cal, loaded_on=today)
+        return cal
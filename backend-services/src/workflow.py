@@ -1,58 +1,183 @@
 """
-工作流：从数据库拉取指定代码的数据，调用 Moonshot 做简要分析并写入 signals。
+工作流：从数据库拉取指定代码（缺省为全部收藏）的数据，调用 Moonshot 做简要分析并写入 signals。
+- 一次 LATERAL 查询取全部代码近 30 日日线，经 context_builder 压缩为统计摘要（趋势、均线、量能、异动 + 最近 3 根 K 线）
+- 按 token 预算与每批代码数上限切分为多批，经共享异步客户端（llm_client）并发调用，每批要求逐只一行结论
+- 每只股票一条 summary 信号，一次 COPY 写入；ref_date 留空（与按交易日的各 Agent 信号区分，不进入收藏汇总透视与可选日期）
 可后续替换为 CrewAI / LangGraph 多 Agent 编排。
 """
-import json
-from openai import OpenAI
-from .config import MOONSHOT_API_KEY, MOONSHOT_BASE_URL
+import asyncio
+import logging
+import re
+from typing import Any, Optional
+
+from . import llm_client
+from .config import LLM_MAX_CONCURRENCY, MOONSHOT_API_KEY
+from .context_builder import ContextBuilder, estimate_tokens, prompt_budget, summarize_bars
 from .db import get_conn
+from .metrics import instrumented, span
+
+logger = logging.getLogger(__name__)
+
+BARS = 30
+BATCH_MAX_CODES = 20  # 每批代码数上限（输出长度随代码数增长）
+OUTPUT_TOKENS_PER_CODE = 80
+MAX_PARALLEL_BATCHES = 4  # 本工作流同时在途的批次，其余在本地排队（不占共享客户端的排队超时）
+SIGNAL_TYPE = "summary"
+INSTRUCTION = (
+    "以下是中国A股部分股票的近期行情摘要，请逐只给出简要看法（偏多、偏空或中性）并用一两句话说明理由。\n"
+    "每只股票输出一行，格式：代码|偏多/偏空/中性|理由。不要输出其他内容。"
+)
+_DIRECTIONS = {"偏多": "看涨", "看涨": "看涨", "偏空": "看跌", "看跌": "看跌", "中性": "中性"}
+_LINE = re.compile(r"^[\s\-*•\d.、]*?(\d{6}(?:\.[A-Za-z]{2})?)\s*[|｜:：]\s*(偏多|偏空|中性|看涨|看跌)\s*[|｜:：,，]?\s*(.*)$")
+
+
+def _resolve_codes(conn, codes: Optional[list[str]]) -> list[str]:
+    """去重保序；codes 为 None 时取 stex.watchlist 全部（显式传空列表即不分析任何代码）。"""
+    out, seen = [], set()
+    for c in codes or []:
+        s = str(c).strip()
+        if s and s not in seen:
+            seen.add(s)
+            out.append(s)
+    if codes is None:
+        with conn.cursor() as cur:
+            cur.execute("SELECT code FROM stex.watchlist ORDER BY code")
+            out = [str(r[0]) for r in cur.fetchall()]
+    return out
+
+
+def _fetch_bars(conn, codes: list[str]) -> dict[str, list[tuple]]:
+    """全部代码近 BARS 日日线一次取回（LATERAL 走 (code, trade_date) 主键逆序扫描），按代码升序分组。"""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.code, t.trade_date, t.open, t.high, t.low, t.close, t.volume
+            FROM unnest(%s::text[]) AS c(code)
+            CROSS JOIN LATERAL (
+                SELECT trade_date, open, high, low, close, volume
+                FROM stex.stock_day WHERE code = c.code ORDER BY trade_date DESC LIMIT %s
+            ) t
+            ORDER BY c.code, t.trade_date
+            """,
+            (codes, BARS),
+        )
+        rows = cur.fetchall()
+    out: dict[str, list[tuple]] = {}
+    for r in rows:
+        out.setdefault(r[0], []).append(r[1:])
+    return out
+
+
+def _batches(sections: list[tuple[str, str]], budget: int) -> list[list[tuple[str, str]]]:
+    """按顺序贪心切批：累计估算 token 不超过 budget 且不超过 BATCH_MAX_CODES 只。"""
+    out: list[list[tuple[str, str]]] = []
+    cur: list[tuple[str, str]] = []
+    used = 0
+    for code, text in sections:
+        t = estimate_tokens(text) + 4
+        if cur and (used + t > budget or len(cur) >= BATCH_MAX_CODES):
+            out.append(cur)
+            cur, used = [], 0
+        cur.append((code, text))
+        used += t
+    if cur:
+        out.append(cur)
+    return out
+
 
+def _parse(content: str, codes: list[str]) -> dict[str, tuple[str, str]]:
+    """逐行解析「代码|方向|理由」，只收本批代码；返回 {code: (看涨/看跌/中性, 理由)}。"""
+    wanted = set(codes)
+    out: dict[str, tuple[str, str]] = {}
+    for line in (content or "").splitlines():
+        m = _LINE.match(line.strip())
+        if not m:
+            continue
+        code = m.group(1) if m.group(1) in wanted else m.group(1)[:6]
+        if code in wanted and code not in out:
+            out[code] = (_DIRECTIONS[m.group(2)], m.group(3).strip() or line.strip())
+    return out
 
-async def run_workflow(codes: list[str]) -> dict:
+
+async def _analyze(batch: list[tuple[str, str]], budget: int, gate: asyncio.Semaphore) -> dict[str, Any]:
+    codes = [c for c, _ in batch]
+    builder = ContextBuilder()
+    for code, text in batch:
+        builder.add(f"股票{code} 最近{BARS}日", text)
+    prompt = INSTRUCTION + "\n\n" + builder.build(budget)
+    max_tokens = OUTPUT_TOKENS_PER_CODE * len(codes) + 100
+    async with gate:
+        try:
+            content = await llm_client.chat(prompt, max_tokens=max_tokens)
+        except Exception as e:
+            logger.warning("workflow batch %s..%s failed: %s", codes[0], codes[-1], e)
+            return {"codes": codes, "content": "", "error": str(e), "verdicts": {}}
+    return {"codes": codes, "content": content, "error": None, "verdicts": _parse(content, codes)}
+
+
+@instrumented("workflow")
+async def run_workflow(codes: Optional[list[str]] = None) -> dict:
+    """
+    对指定股票（不传则为全部收藏，传空列表则直接返回空结果）做行情简评：一次取数、按 token 预算分批并发调用 LLM，
+    每只写一条 summary 信号（ref_date 为空）。
+    返回：{ ok, codes, batches, signals_written, summary, results[{code, ok, direction?, reason?, error?}] }
+    """
     if not MOONSHOT_API_KEY:
         return {"error": "MOONSHOT_API_KEY not set"}
-
-    client = OpenAI(api_key=MOONSHOT_API_KEY, base_url=MOONSHOT_BASE_URL)
-    summary_parts = []
+    if codes is not None and not any(str(c).strip() for c in codes):
+        return {"ok": True, "codes": [], "batches": 0, "signals_written": 0, "summary": "", "results": [], "error": None}
 
     with get_conn() as conn:
-        for code in codes[:5]:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT trade_date, open, high, low, close, volume FROM stex.stock_day WHERE code = %s ORDER BY trade_date DESC LIMIT 30",
-                    (code,),
-                )
-                rows = cur.fetchall()
+        code_list = _resolve_codes(conn, codes)
+        bars = _fetch_bars(conn, code_list) if code_list else {}
+    if not code_list:
+        return {"ok": False, "error": "请提供至少一只股票代码或先添加收藏", "codes": []}
+
+    results: list[dict[str, Any]] = []
+    sections: list[tuple[str, str]] = []
+    with span("compute.context"):
+        for code in code_list:
+            rows = bars.get(code)
             if not rows:
-                summary_parts.append(f"{code}: 无日线数据")
+                results.append({"code": code, "ok": False, "error": "无日线数据"})
                 continue
-            # 简单文本摘要供 LLM 参考
-            lines = [f"日期{r[0]} O{r[1]} H{r[2]} L{r[3]} C{r[4]} V{r[5]}" for r in reversed(rows)]
-            text = f"股票{code} 最近30日: " + " | ".join(lines[-10:])
-            summary_parts.append(text)
-
-    prompt = "以下是中国A股部分股票的近期行情摘要，请用一两句话给出简要看法（偏多、偏空或中性）并说明理由。\n\n" + "\n\n".join(summary_parts)
-    try:
-        resp = client.chat.completions.create(
-            model="moonshot-v1-8k",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-        )
-        content = resp.choices[0].message.content if resp.choices else ""
-    except Exception as e:
-        return {"error": str(e), "summary": ""}
+            cols = list(zip(*rows))
+            sections.append((code, summarize_bars([str(d)[:10] for d in cols[0]], *cols[1:6], tail=3)))
+
+    budget = prompt_budget(OUTPUT_TOKENS_PER_CODE * BATCH_MAX_CODES + 100, INSTRUCTION)
+    batches = _batches(sections, budget)
+    gate = asyncio.Semaphore(max(1, min(MAX_PARALLEL_BATCHES, LLM_MAX_CONCURRENCY)))
+    outcomes = await asyncio.gather(*(_analyze(b, budget, gate) for b in batches))
+
+    signal_rows = []
+    for out in outcomes:
+        for code in out["codes"]:
+            verdict = out["verdicts"].get(code)
+            if verdict is None:
+                results.append({"code": code, "ok": False, "error": out["error"] or "未解析到该股结论"})
+                continue
+            direction, reason = verdict
+            signal_rows.append((code, SIGNAL_TYPE, direction, reason[:2000], "moonshot"))
+            results.append({"code": code, "ok": True, "direction": direction, "reason": reason[:100]})
 
-    # 将结论写入 signals（简化：按第一只代码写入一条）
-    if codes and content:
+    written = 0
+    if signal_rows:
+        # ref_date 为空的行不受 (code, ref_date, signal_type) 部分唯一索引约束，逐次追加（同旧版工作流）
         with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO stex.signals (code, signal_type, direction, source, reason)
-                    VALUES (%s, 'summary', 'neutral', 'moonshot', %s)
-                    """,
-                    (codes[0], content[:2000]),
-                )
+                with cur.copy("COPY stex.signals (code, signal_type, direction, reason, source) FROM STDIN") as copy:
+                    for row in signal_rows:
+                        copy.write_row(row)
             conn.commit()
+        written = len(signal_rows)
 
-    return {"summary": content, "codes": codes}
+    errors = [o["error"] for o in outcomes if o["error"]]
+    return {
+        "ok": written > 0,
+        "codes": code_list,
+        "batches": len(batches),
+        "signals_written": written,
+        "summary": "\n".join(o["content"] for o in outcomes if o["content"]),
+        "results": results,
+        "error": errors[0] if errors and not written else None,
+    }
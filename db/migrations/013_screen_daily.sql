@@ -0,0 +1,50 @@
+-- 选股特征日表：每个交易日每只股票一行宽表特征（增量日线入库后由 screen_feature_agent 物化），
+-- 选股快照与各策略筛选直接读最新交易日的一行/股，不再逐次从原始表计算最新日期、均线、量能窗口与财报增长
+CREATE TABLE IF NOT EXISTS stex.screen_daily (
+  trade_date        DATE NOT NULL,
+  code              VARCHAR(10) NOT NULL,
+  last_date         DATE,
+  name              VARCHAR(100),
+  market            VARCHAR(20),
+  industry          VARCHAR(100),
+  sector            VARCHAR(100),
+  latest_close      NUMERIC(12,4),
+  pct_1d            NUMERIC(12,4),
+  pct_5d            NUMERIC(12,4),
+  pct_20d           NUMERIC(12,4),
+  pct_63d           NUMERIC(12,4),
+  turnover_rate     NUMERIC(8,4),
+  vol_ratio_20      NUMERIC(12,4),
+  ma5               NUMERIC(12,4),
+  ma10              NUMERIC(12,4),
+  ma20              NUMERIC(12,4),
+  ma_close          NUMERIC(12,4),
+  ma_state          VARCHAR(10),
+  market_cap        NUMERIC(20,2),
+  pe                NUMERIC(12,4),
+  pb                NUMERIC(12,4),
+  net_profit        NUMERIC(20,2),
+  profit_growth     NUMERIC(12,2),
+  growth            BOOLEAN NOT NULL DEFAULT FALSE,
+  tech_competition  BOOLEAN NOT NULL DEFAULT FALSE,
+  classic_pattern   BOOLEAN NOT NULL DEFAULT FALSE,
+  trend_following   BOOLEAN NOT NULL DEFAULT FALSE,
+  low_vol_breakout  BOOLEAN NOT NULL DEFAULT FALSE,
+  all_combined      BOOLEAN NOT NULL DEFAULT FALSE,
+  updated_at        TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (trade_date, code)
+);
+
+-- 按代码取最新一行（投资总结等单股读取）
+CREATE INDEX IF NOT EXISTS idx_screen_daily_code_date ON stex.screen_daily (code, trade_date DESC);
+-- 常用数值筛选列
+CREATE INDEX IF NOT EXISTS idx_screen_daily_date_cap ON stex.screen_daily (trade_date, market_cap);
+CREATE INDEX IF NOT EXISTS idx_screen_daily_date_pe ON stex.screen_daily (trade_date, pe);
+CREATE INDEX IF NOT EXISTS idx_screen_daily_date_industry ON stex.screen_daily (trade_date, industry);
+-- 策略标记：只索引命中行
+CREATE INDEX IF NOT EXISTS idx_screen_daily_growth ON stex.screen_daily (trade_date) WHERE growth;
+CREATE INDEX IF NOT EXISTS idx_screen_daily_trend ON stex.screen_daily (trade_date) WHERE trend_following;
+CREATE INDEX IF NOT EXISTS idx_screen_daily_breakout ON stex.screen_daily (trade_date) WHERE low_vol_breakout;
+CREATE INDEX IF NOT EXISTS idx_screen_daily_pattern ON stex.screen_daily (trade_date) WHERE classic_pattern;
+
+COMMENT ON TABLE stex.screen_daily IS '选股特征日表：涨跌幅(%)、均线状态、换手率、20日量比、估值、策略命中标记，trade_date 为特征基准交易日';
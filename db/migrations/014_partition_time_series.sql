@@ -0,0 +1,97 @@
+-- 时序大表改为范围分区：stock_day、signals 按月，stock_min 按日（北京时间自然日）。
+-- 按代码取最近 N 行（ORDER BY trade_date DESC LIMIT N）走各分区 (code, 日期) 索引按分区逆序追加，只触及最近的热分区；
+-- 过期分区可整体卸载归档或删除（backend-services src/partitions.py），不再逐行 DELETE。
+-- 旧表改名为 *_heap 后建同结构分区表，按已有数据范围建周期分区（至当前 + 3 个周期），更早的补录数据落 *_history（MINVALUE 起）；
+-- 不建 DEFAULT 分区（否则无法按分区顺序追加扫描），未来分区由入库前 ensure_partitions() 预建。signals 例外：ref_date 为空的行只能落 DEFAULT。
+-- 迁入数据后删除旧表。id 列保留原序列但不再作主键（分区表主键须含分区键）。已是分区表的跳过，可重复执行。
+
+BEGIN;
+
+CREATE FUNCTION pg_temp.partition_by_range(tbl text, key text, unit text, pk text, with_default boolean) RETURNS void AS $$
+DECLARE
+  heap text := tbl || '_heap';
+  seq text;
+  idx record;
+  is_ts boolean;
+  lo timestamp;
+  hi timestamp;
+  p timestamp;
+  step interval := ('1 ' || unit)::interval;
+  fmt text := CASE unit WHEN 'day' THEN 'YYYYMMDD' ELSE 'YYYYMM' END;
+  lo_lit text;
+  hi_lit text;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = ('stex.' || tbl)::regclass) = 'p' THEN
+    RAISE NOTICE 'stex.% 已是分区表，跳过', tbl;
+    RETURN;
+  END IF;
+
+  EXECUTE format('ALTER TABLE stex.%I RENAME TO %I', tbl, heap);
+  FOR idx IN SELECT indexname FROM pg_indexes WHERE schemaname = 'stex' AND tablename = heap LOOP
+    EXECUTE format('ALTER INDEX stex.%I RENAME TO %I', idx.indexname, idx.indexname || '_heap');
+  END LOOP;
+  seq := pg_get_serial_sequence('stex.' || heap, 'id');
+  IF seq IS NOT NULL THEN
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY NONE', seq);
+  END IF;
+
+  EXECUTE format(
+    'CREATE TABLE stex.%I (LIKE stex.%I INCLUDING DEFAULTS INCLUDING COMMENTS) PARTITION BY RANGE (%I)',
+    tbl, heap, key
+  );
+  IF pk IS NOT NULL THEN
+    EXECUTE format('ALTER TABLE stex.%I ADD PRIMARY KEY (%s)', tbl, pk);
+  END IF;
+  IF seq IS NOT NULL THEN
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY stex.%I.id', seq, tbl);
+  END IF;
+
+  SELECT data_type LIKE 'timestamp%' INTO is_ts
+  FROM information_schema.columns WHERE table_schema = 'stex' AND table_name = tbl AND column_name = key;
+  IF is_ts THEN
+    EXECUTE format('SELECT MIN(%I AT TIME ZONE ''Asia/Shanghai'') FROM stex.%I', key, heap) INTO lo;
+  ELSE
+    EXECUTE format('SELECT MIN(%I)::timestamp FROM stex.%I', key, heap) INTO lo;
+  END IF;
+  hi := date_trunc(unit, (NOW() AT TIME ZONE 'Asia/Shanghai')) + 3 * step;
+  p := date_trunc(unit, COALESCE(lo, NOW() AT TIME ZONE 'Asia/Shanghai'));
+  EXECUTE format(
+    'CREATE TABLE stex.%I PARTITION OF stex.%I FOR VALUES FROM (MINVALUE) TO (%L)',
+    tbl || '_history', tbl, to_char(p, 'YYYY-MM-DD') || CASE WHEN is_ts THEN ' 00:00:00+08' ELSE '' END
+  );
+  WHILE p <= hi LOOP
+    lo_lit := to_char(p, 'YYYY-MM-DD') || CASE WHEN is_ts THEN ' 00:00:00+08' ELSE '' END;
+    hi_lit := to_char(p + step, 'YYYY-MM-DD') || CASE WHEN is_ts THEN ' 00:00:00+08' ELSE '' END;
+    EXECUTE format(
+      'CREATE TABLE stex.%I PARTITION OF stex.%I FOR VALUES FROM (%L) TO (%L)',
+      tbl || '_p' || to_char(p, fmt), tbl, lo_lit, hi_lit
+    );
+    p := p + step;
+  END LOOP;
+  IF with_default THEN
+    EXECUTE format('CREATE TABLE stex.%I PARTITION OF stex.%I DEFAULT', tbl || '_default', tbl);
+  END IF;
+
+  EXECUTE format('INSERT INTO stex.%I SELECT * FROM stex.%I', tbl, heap);
+  EXECUTE format('DROP TABLE stex.%I', heap);
+END;
+$$ LANGUAGE plpgsql;
+
+-- 日线：按月，主键 (code, trade_date) 兼作按代码取最近 N 日的索引（可逆序扫描）
+SELECT pg_temp.partition_by_range('stock_day', 'trade_date', 'month', 'code, trade_date', false);
+
+-- 分钟线：按日，主键 (code, trade_time, interval_min)
+SELECT pg_temp.partition_by_range('stock_min', 'trade_time', 'day', 'code, trade_time, interval_min', false);
+
+-- 投资信号：按 ref_date 按月（ref_date 为空的落 DEFAULT 分区），唯一键同 005 迁移
+SELECT pg_temp.partition_by_range('signals', 'ref_date', 'month', NULL, true);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_signals_code_ref_type
+  ON stex.signals (code, ref_date, signal_type)
+  WHERE ref_date IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_signals_code_ref_date ON stex.signals (code, ref_date DESC);
+CREATE INDEX IF NOT EXISTS idx_signals_created ON stex.signals (created_at DESC);
+
+-- 卸载归档的分区移入此 schema（仍可查询，不再参与热表扫描）
+CREATE SCHEMA IF NOT EXISTS stex_archive;
+
+COMMIT;
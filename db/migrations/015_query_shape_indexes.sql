@@ -0,0 +1,66 @@
+-- 按各 Agent / 选股实际查询形态补覆盖索引与部分索引（见 backend-services scripts/index_advisor.py），去掉与唯一约束重复的索引；
+-- 新增 stex.code_latest：每只股票最新日线日期，入库时维护，「最旧优先」选批直接按它排序，不再对 stock_day 逐代码探测或 GROUP BY。
+
+BEGIN;
+
+-- 日线：按代码取最近 N 日窗口（选股特征、形态扫描、信号）只读 close/volume/换手率，INCLUDE 后走仅索引扫描
+CREATE INDEX IF NOT EXISTS idx_stock_day_code_date_cover
+  ON stex.stock_day (code, trade_date DESC) INCLUDE (close, volume, turnover_rate);
+DROP INDEX IF EXISTS stex.idx_stock_day_code_date;
+
+-- 技术指标：取最近一个 MA5/10/20 齐全的交易日（选股 ma_state / 趋势跟踪）
+CREATE INDEX IF NOT EXISTS idx_technicals_code_date_ma
+  ON stex.technicals (code, trade_date DESC) INCLUDE (ma5, ma10, ma20)
+  WHERE ma5 IS NOT NULL AND ma10 IS NOT NULL AND ma20 IS NOT NULL;
+DROP INDEX IF EXISTS stex.idx_technicals_code_date;
+
+-- 基本面：按代码取 report_date 最近一期的市值/市盈率/净利润
+CREATE INDEX IF NOT EXISTS idx_fundamentals_code_date_cover
+  ON stex.fundamentals (code, report_date DESC) INCLUDE (market_cap, pe, net_profit, profit_growth);
+DROP INDEX IF EXISTS stex.idx_fundamentals_code_date;
+
+-- 财务：企业增长策略取营收、净利润均非空的最近 4 期
+CREATE INDEX IF NOT EXISTS idx_financial_code_date_rev_profit
+  ON stex.financial (code, report_date DESC) INCLUDE (revenue, net_profit)
+  WHERE revenue IS NOT NULL AND net_profit IS NOT NULL;
+DROP INDEX IF EXISTS stex.idx_financial_code_date;
+
+-- 信号：按类型取各代码最新 ref_date（新闻舆论选批 MAX(ref_date) GROUP BY code）
+CREATE INDEX IF NOT EXISTS idx_signals_type_code_ref
+  ON stex.signals (signal_type, code, ref_date DESC)
+  WHERE ref_date IS NOT NULL;
+DROP INDEX IF EXISTS stex.idx_signals_code;
+
+-- 形态信号：按类型 + 日期区间取代码（经典形态策略）、近 60 日按类型计数
+CREATE INDEX IF NOT EXISTS idx_pattern_signal_type_ref
+  ON stex.pattern_signal (pattern_type, ref_date) INCLUDE (code);
+DROP INDEX IF EXISTS stex.idx_pattern_signal_type;
+DROP INDEX IF EXISTS stex.idx_pattern_signal_code;
+
+-- 与 UNIQUE 约束列相同（或为其前缀）的重复索引，只增加写入开销
+DROP INDEX IF EXISTS stex.idx_corp_code;
+DROP INDEX IF EXISTS stex.idx_watchlist_code;
+DROP INDEX IF EXISTS stex.idx_corp_analysis_code;
+DROP INDEX IF EXISTS stex.idx_moneyflow_code_date;
+
+-- 每只股票最新日线日期（日线入库同事务 GREATEST 更新）
+CREATE TABLE IF NOT EXISTS stex.code_latest (
+  code              VARCHAR(10) PRIMARY KEY,
+  last_trade_date   DATE,
+  updated_at        TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_code_latest_trade_date ON stex.code_latest (last_trade_date NULLS FIRST);
+
+INSERT INTO stex.code_latest (code, last_trade_date)
+SELECT code, MAX(trade_date) FROM stex.stock_day GROUP BY code
+ON CONFLICT (code) DO UPDATE SET
+  last_trade_date = GREATEST(stex.code_latest.last_trade_date, EXCLUDED.last_trade_date),
+  updated_at = NOW();
+
+COMMENT ON TABLE stex.code_latest IS '每只股票数据新鲜度：最新日线日期等，入库时维护';
+
+COMMIT;
+
+ANALYZE stex.stock_day;
+ANALYZE stex.signals;
+ANALYZE stex.code_latest;
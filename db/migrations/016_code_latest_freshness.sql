@@ -0,0 +1,39 @@
+-- stex.code_latest 扩展为每只股票的数据新鲜度表：除最新日线日期外，再记录最新技术信号日、最新新闻舆论日与最近一次企业解析时间。
+-- 各写入方（日线入库、信号、新闻舆论、解析企业）在同一事务内 GREATEST 推进；「最旧优先」选批直接按对应列排序，不再对 signals 聚合。
+-- 依赖迁移 015。可重复执行。
+
+BEGIN;
+
+ALTER TABLE stex.code_latest
+  ADD COLUMN IF NOT EXISTS last_signal_date DATE,
+  ADD COLUMN IF NOT EXISTS last_news_date   DATE,
+  ADD COLUMN IF NOT EXISTS last_analysis_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN stex.code_latest.last_trade_date IS '最新日线交易日';
+COMMENT ON COLUMN stex.code_latest.last_signal_date IS '最新技术信号 ref_date（不含新闻舆论）';
+COMMENT ON COLUMN stex.code_latest.last_news_date IS '最新新闻舆论信号 ref_date';
+COMMENT ON COLUMN stex.code_latest.last_analysis_at IS '最近一次解析企业（corp_analysis）时间';
+
+-- 新闻舆论选批：最早新闻优先
+CREATE INDEX IF NOT EXISTS idx_code_latest_news_date ON stex.code_latest (last_news_date NULLS FIRST);
+
+-- 回填（走 015 的 idx_signals_type_code_ref）
+INSERT INTO stex.code_latest AS l (code, last_signal_date)
+SELECT code, MAX(ref_date) FROM stex.signals
+WHERE ref_date IS NOT NULL AND signal_type <> '新闻舆论'
+GROUP BY code
+ON CONFLICT (code) DO UPDATE SET last_signal_date = GREATEST(l.last_signal_date, EXCLUDED.last_signal_date);
+
+INSERT INTO stex.code_latest AS l (code, last_news_date)
+SELECT code, MAX(ref_date) FROM stex.signals
+WHERE ref_date IS NOT NULL AND signal_type = '新闻舆论'
+GROUP BY code
+ON CONFLICT (code) DO UPDATE SET last_news_date = GREATEST(l.last_news_date, EXCLUDED.last_news_date);
+
+INSERT INTO stex.code_latest AS l (code, last_analysis_at)
+SELECT code, updated_at FROM stex.corp_analysis WHERE updated_at IS NOT NULL
+ON CONFLICT (code) DO UPDATE SET last_analysis_at = GREATEST(l.last_analysis_at, EXCLUDED.last_analysis_at);
+
+COMMIT;
+
+ANALYZE stex.code_latest;
@@ -0,0 +1,31 @@
+-- 新增 stex.trade_cal：上交所交易日历（含休市日），由 src/trade_calendar.py 一次载入进程内有序数组，
+-- 前后交易日 / 区间 / 是否开市均在内存中二分查找，各 Agent 不再每次运行调用 pro.trade_cal 或逐代码查 stock_day 推交易日。
+-- 覆盖不到今日时由 trade_calendar 经 Tushare trade_cal 补齐。可重复执行。
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS stex.trade_cal (
+  cal_date   DATE PRIMARY KEY,
+  is_open    BOOLEAN NOT NULL,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE stex.trade_cal IS '上交所交易日历：区间内逐日一行，is_open 为是否开市';
+
+-- 回填：已有日线（个股或上证指数）的日期为开市日，其间其余日期为休市；仅为推断，迁移 020 将其记为未确认，
+-- 由 trade_calendar 经 Tushare 日历覆盖
+WITH open_days AS (
+  SELECT DISTINCT trade_date FROM stex.stock_day
+  UNION
+  SELECT trade_date FROM stex.index_day WHERE index_code = '000001.SH'
+)
+INSERT INTO stex.trade_cal (cal_date, is_open)
+SELECT g::date, o.trade_date IS NOT NULL
+FROM (SELECT MIN(trade_date) AS lo, MAX(trade_date) AS hi FROM open_days) r
+CROSS JOIN generate_series(r.lo, r.hi, INTERVAL '1 day') AS g
+LEFT JOIN open_days o ON o.trade_date = g::date
+ON CONFLICT (cal_date) DO NOTHING;
+
+COMMIT;
+
+ANALYZE stex.trade_cal;
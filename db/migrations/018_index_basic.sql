@@ -0,0 +1,33 @@
+-- 新增 stex.index_basic：指数采集范围（核心大盘指数 + 申万一/二级行业 + 中证行业指数），
+-- 由 index_data_agent 经 Tushare index_basic / index_classify 同步，按 category 分组；
+-- 日线按每个指数已入库的最新日期增量拉取并批量写入 stex.index_day，index_signal_agent 对 enabled 的全部指数计算信号。
+-- 可重复执行。
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS stex.index_basic (
+  index_code  VARCHAR(20) PRIMARY KEY,
+  name        VARCHAR(100),
+  category    VARCHAR(20) NOT NULL,          -- core | sw_l1 | sw_l2 | csi_industry
+  market      VARCHAR(20),                   -- SSE / SZSE / CSI / SW
+  parent_code VARCHAR(20),                   -- 申万二级所属一级行业指数
+  enabled     BOOLEAN NOT NULL DEFAULT TRUE, -- 关闭后不再采集与计算信号（已入库日线保留）
+  updated_at  TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE stex.index_basic IS '指数采集范围：核心大盘指数与申万 / 中证行业指数，category 为采集分组';
+
+CREATE INDEX IF NOT EXISTS idx_index_basic_category ON stex.index_basic (category) WHERE enabled;
+
+-- 核心大盘指数（与前端展示一致）
+INSERT INTO stex.index_basic (index_code, name, category, market) VALUES
+  ('000001.SH', '上证指数', 'core', 'SSE'),
+  ('399001.SZ', '深证成指', 'core', 'SZSE'),
+  ('399006.SZ', '创业板指', 'core', 'SZSE'),
+  ('000300.SH', '沪深300', 'core', 'SSE'),
+  ('000905.SH', '中证500', 'core', 'SSE')
+ON CONFLICT (index_code) DO NOTHING;
+
+COMMIT;
+
+ANALYZE stex.index_basic;
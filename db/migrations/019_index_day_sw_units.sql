@@ -0,0 +1,21 @@
+-- stex.index_day 统一单位：vol 为手、amount 为千元（Tushare index_daily 口径）。
+-- 申万指数日线（sw_daily，万股 / 万元）此前原样入库，现由 index_data_agent 入库前换算（vol × 100、amount × 10）；
+-- 已入库的申万行无法区分是否已换算，此处一次性删除，由下次 index_data_agent 按新口径重新回补。
+-- 删除后在 stex.app_config 记 index_day_sw_units，重复执行不会再删。
+
+BEGIN;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM stex.app_config WHERE key = 'index_day_sw_units') THEN
+    DELETE FROM stex.index_day d
+    USING stex.index_basic b
+    WHERE b.index_code = d.index_code AND b.category IN ('sw_l1', 'sw_l2');
+    INSERT INTO stex.app_config (key, value) VALUES ('index_day_sw_units', '手/千元');
+  END IF;
+END $$;
+
+COMMENT ON COLUMN stex.index_day.vol IS '成交量(手)；申万指数由万股换算';
+COMMENT ON COLUMN stex.index_day.amount IS '成交额(千元)；申万指数由万元换算';
+
+COMMIT;
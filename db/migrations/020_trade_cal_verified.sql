@@ -0,0 +1,13 @@
+-- stex.trade_cal 增加 verified：是否已由 Tushare trade_cal 确认。
+-- 迁移 017 由已有日线回填的日期（无日线即记为休市）一律为未确认，数据缺口不会被当成永久休市：
+-- trade_calendar 首次载入时从最早的未确认日期起经 Tushare 重拉并标记为已确认。可重复执行。
+
+BEGIN;
+
+ALTER TABLE stex.trade_cal ADD COLUMN IF NOT EXISTS verified BOOLEAN NOT NULL DEFAULT FALSE;
+
+COMMENT ON COLUMN stex.trade_cal.verified IS '是否已由 Tushare trade_cal 确认（false 为按日线推断）';
+
+CREATE INDEX IF NOT EXISTS idx_trade_cal_unverified ON stex.trade_cal (cal_date) WHERE NOT verified;
+
+COMMIT;